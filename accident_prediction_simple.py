@@ -15,10 +15,22 @@ from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder, StandardScaler
 from sklearn.ensemble import RandomForestRegressor, GradientBoostingRegressor
 from sklearn.linear_model import Ridge
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
 import warnings
+import os
+import sys
 warnings.filterwarnings('ignore')
 
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'road_risk_game'))
+from utils.batch_scoring import dedup_predict
+from utils.evaluation import SEGMENT_COLUMNS, ModelEvaluator
+from utils.importance import permutation_importance
+from utils.oof import OOFStore, blend_submission, data_hash, run_oof
+from utils.profiling import StageProfiler
+from utils.risk_cube import RiskCube
+
+# Opt-in per-stage timing/memory report (PIPELINE_PROFILE=1)
+profiler = StageProfiler.from_env()
+
 # Set random seed for reproducibility
 np.random.seed(42)
 
@@ -33,6 +45,7 @@ print("="*60)
 # ========================================
 # 1. LOAD AND EXPLORE THE DATA
 # ========================================
+profiler.next_stage("1. Load and explore the data")
 print("\n[1] Loading Data...")
 train_df = pd.read_csv('train.csv')
 print(f"✓ Training data loaded: {train_df.shape[0]} rows, {train_df.shape[1]} columns")
@@ -60,6 +73,7 @@ print(f"Duplicates found: {duplicates}")
 # ========================================
 # 2. EXPLORATORY DATA ANALYSIS
 # ========================================
+profiler.next_stage("2. Exploratory data analysis")
 print("\n[8] Performing Exploratory Data Analysis...")
 
 # Categorical features
@@ -112,11 +126,12 @@ plt.savefig('02_correlation_matrix.png', dpi=300, bbox_inches='tight')
 print("✓ Saved: 02_correlation_matrix.png")
 plt.close()
 
-# Accident risk by categorical features
+# Accident risk by categorical features, answered from one pre-aggregated cube
+risk_cube = RiskCube.build(train_df, dimensions=categorical_features)
 fig, axes = plt.subplots(2, 4, figsize=(20, 10))
 axes = axes.ravel()
 for idx, col in enumerate(categorical_features):
-    train_df.groupby(col)['accident_risk'].mean().sort_values().plot(kind='barh', ax=axes[idx])
+    risk_cube.mean(col).sort_values().plot(kind='barh', ax=axes[idx])
     axes[idx].set_xlabel('Mean Accident Risk')
     axes[idx].set_title(f'Accident Risk by {col}')
 plt.tight_layout()
@@ -141,6 +156,7 @@ plt.close()
 # ========================================
 # 3. DATA PREPROCESSING
 # ========================================
+profiler.next_stage("3. Data preprocessing")
 print("\n[11] Data Preprocessing...")
 
 # Create a copy for preprocessing
@@ -169,6 +185,7 @@ print("✓ Created interaction features")
 # ========================================
 # 4. PREPARE DATA FOR MODELING
 # ========================================
+profiler.next_stage("4. Prepare data for modeling")
 print("\n[14] Preparing data for modeling...")
 
 # Separate features and target
@@ -192,6 +209,7 @@ print("✓ Features scaled")
 # ========================================
 # 5. MODEL BUILDING AND TRAINING
 # ========================================
+profiler.next_stage("5. Model building and training")
 print("\n[15] Building and Training Models...")
 
 models = {
@@ -200,47 +218,56 @@ models = {
     'Gradient Boosting': GradientBoostingRegressor(n_estimators=100, max_depth=5, learning_rate=0.1, random_state=42)
 }
 
+# Linear models are fitted on standardized features
+scaled_models = ['Ridge Regression']
+
 results = {}
 
+# Train metrics come from a 50k-row sample; test metrics from every test row
+evaluator = ModelEvaluator(train_sample=50_000, n_bootstrap=200, seed=42)
+segment_codes = X_test[list(SEGMENT_COLUMNS)]
+segment_labels = {col: label_encoders[col].classes_ for col in SEGMENT_COLUMNS}
+
 for name, model in models.items():
     print(f"\nTraining {name}...")
     
     # Use scaled data for linear models, original for tree-based
-    if name in ['Ridge Regression']:
-        model.fit(X_train_scaled, y_train)
-        y_pred_train = model.predict(X_train_scaled)
-        y_pred_test = model.predict(X_test_scaled)
+    if name in scaled_models:
+        X_fit, X_eval = X_train_scaled, X_test_scaled
     else:
-        model.fit(X_train, y_train)
-        y_pred_train = model.predict(X_train)
-        y_pred_test = model.predict(X_test)
-    
-    # Calculate metrics
-    train_mae = mean_absolute_error(y_train, y_pred_train)
-    test_mae = mean_absolute_error(y_test, y_pred_test)
-    train_rmse = np.sqrt(mean_squared_error(y_train, y_pred_train))
-    test_rmse = np.sqrt(mean_squared_error(y_test, y_pred_test))
-    train_r2 = r2_score(y_train, y_pred_train)
-    test_r2 = r2_score(y_test, y_pred_test)
+        X_fit, X_eval = X_train, X_test
+    with profiler.stage(f"fit {name}"):
+        model.fit(X_fit, y_train)
+    with profiler.stage(f"evaluate {name}"):
+        report = evaluator.evaluate(model, X_fit, y_train, X_eval, y_test,
+                                    segments=segment_codes, labels=segment_labels)
     
+    train, test, ci = report['train'], report['test'], report['test_ci']
     results[name] = {
         'model': model,
-        'train_mae': train_mae,
-        'test_mae': test_mae,
-        'train_rmse': train_rmse,
-        'test_rmse': test_rmse,
-        'train_r2': train_r2,
-        'test_r2': test_r2,
-        'y_pred_test': y_pred_test
+        'train_mae': train['mae'],
+        'test_mae': test['mae'],
+        'train_rmse': train['rmse'],
+        'test_rmse': test['rmse'],
+        'train_r2': train['r2'],
+        'test_r2': test['r2'],
+        'test_ci': ci,
+        'segments': report['segments'],
+        'y_pred_test': report['y_pred_test'],
     }
     
-    print(f"  Train MAE: {train_mae:.4f} | Test MAE: {test_mae:.4f}")
-    print(f"  Train RMSE: {train_rmse:.4f} | Test RMSE: {test_rmse:.4f}")
-    print(f"  Train R²: {train_r2:.4f} | Test R²: {test_r2:.4f}")
+    print(f"  Train MAE: {train['mae']:.4f} | Test MAE: {test['mae']:.4f} "
+          f"[{ci['mae'][0]:.4f}, {ci['mae'][1]:.4f}]")
+    print(f"  Train RMSE: {train['rmse']:.4f} | Test RMSE: {test['rmse']:.4f} "
+          f"[{ci['rmse'][0]:.4f}, {ci['rmse'][1]:.4f}]")
+    print(f"  Train R²: {train['r2']:.4f} | Test R²: {test['r2']:.4f} "
+          f"[{ci['r2'][0]:.4f}, {ci['r2'][1]:.4f}]")
+    print(f"  (train metrics on {report['train_rows']:,} rows, 95% bootstrap CIs on test)")
 
 # ========================================
 # 6. MODEL EVALUATION AND COMPARISON
 # ========================================
+profiler.next_stage("6. Model evaluation and comparison")
 print("\n[16] Model Comparison:")
 comparison_df = pd.DataFrame({
     'Model': list(results.keys()),
@@ -258,6 +285,11 @@ best_model_name = comparison_df.loc[comparison_df['Test R²'].idxmax(), 'Model']
 best_model = results[best_model_name]['model']
 print(f"\n✓ Best Model: {best_model_name} (Test R² = {comparison_df['Test R²'].max():.4f})")
 
+print(f"\nTest metrics of {best_model_name} by segment:")
+for col, segment_df in results[best_model_name]['segments'].items():
+    print(f"\n{col}:")
+    print(segment_df.round(4).to_string())
+
 # Visualize model comparison
 fig, axes = plt.subplots(1, 3, figsize=(18, 5))
 
@@ -284,25 +316,28 @@ plt.close()
 # ========================================
 # 7. FEATURE IMPORTANCE (for best model)
 # ========================================
-if hasattr(best_model, 'feature_importances_'):
-    print("\n[17] Feature Importance Analysis...")
-    feature_importance = pd.DataFrame({
-        'Feature': X.columns,
-        'Importance': best_model.feature_importances_
-    }).sort_values('Importance', ascending=False)
-    
-    print("\nTop 10 Most Important Features:")
-    print(feature_importance.head(10).to_string(index=False))
-    
-    plt.figure(figsize=(10, 8))
-    plt.barh(feature_importance['Feature'].head(15), feature_importance['Importance'].head(15))
-    plt.xlabel('Importance')
-    plt.title(f'Top 15 Feature Importances - {best_model_name}')
-    plt.gca().invert_yaxis()
-    plt.tight_layout()
-    plt.savefig('06_feature_importance.png', dpi=300, bbox_inches='tight')
-    print("✓ Saved: 06_feature_importance.png")
-    plt.close()
+profiler.next_stage("7. Feature importance (for best model)")
+print("\n[17] Feature Importance Analysis...")
+
+# Drop in test R² when a feature is shuffled, for linear and tree models
+# alike; 5 shuffles per feature on a 20k-row stratified test sample
+X_importance = X_test_scaled if best_model_name in scaled_models else X_test
+feature_importance = permutation_importance(best_model, X_importance, y_test, n_repeats=5, sample=20_000,
+                                            n_jobs=-1, seed=42, feature_names=X.columns)
+
+print(f"\nTop 10 Most Important Features (permutation, {feature_importance.attrs['rows']:,} test rows):")
+print(feature_importance.head(10).to_string(index=False))
+
+plt.figure(figsize=(10, 8))
+top_features = feature_importance.head(15)
+plt.barh(top_features['feature'], top_features['importance_mean'], xerr=top_features['importance_std'])
+plt.xlabel('Drop in R² When Shuffled')
+plt.title(f'Top 15 Permutation Importances - {best_model_name}')
+plt.gca().invert_yaxis()
+plt.tight_layout()
+plt.savefig('06_feature_importance.png', dpi=300, bbox_inches='tight')
+print("✓ Saved: 06_feature_importance.png")
+plt.close()
 
 # Predictions vs Actual plot
 plt.figure(figsize=(10, 8))
@@ -320,6 +355,7 @@ plt.close()
 # ========================================
 # 8. PREDICTIONS ON TEST SET
 # ========================================
+profiler.next_stage("8. Predictions on test set")
 print("\n[18] Generating Predictions for Test Set...")
 
 # Load test data
@@ -343,8 +379,9 @@ test_processed['lanes_accidents'] = test_processed['num_lanes'] * test_processed
 test_processed['high_speed'] = (test_processed['speed_limit'] >= 60).astype(int)
 test_processed['sharp_curve'] = (test_processed['curvature'] >= 0.7).astype(int)
 
-# Make predictions
-predictions = best_model.predict(test_processed)
+# Make predictions, scoring each distinct feature row once
+predictions, dedup_stats = dedup_predict(best_model, test_processed)
+print(f"✓ Scored {dedup_stats['unique_rows']:,} unique rows ({dedup_stats['dedup_ratio']:.1f}x dedup)")
 
 # Create submission file
 submission = pd.DataFrame({
@@ -356,9 +393,29 @@ print("✓ Saved: submission.csv")
 print(f"\nPrediction Statistics:")
 print(submission['accident_risk'].describe())
 
+# Opt-in out-of-fold stage (OOF_DIR=<store>): 5-fold predictions of every
+# model are kept in the store, and their blend replaces the submission.
+# Re-blend later without refitting: python -m utils.oof <store>
+oof_dir = os.environ.get('OOF_DIR')
+if oof_dir:
+    print("\nOut-of-fold predictions...")
+    oof_store = OOFStore(oof_dir)
+    with profiler.stage("out-of-fold fits"):
+        oof_summary = run_oof(models, X, y, test_processed, oof_store, test_ids=test_ids,
+                              scaled=scaled_models, n_splits=5, seed=42)
+    for name, entry in oof_summary.items():
+        print(f"  {name}: OOF R² {entry['oof_r2']:.4f}{' (from store)' if entry['cached'] else ''}")
+    # Only the current zoo; the store may also hold models removed since
+    blend = blend_submission(oof_store, 'submission.csv', digest=data_hash(X, y, test_processed),
+                             names=list(models))
+    print(f"✓ Blend CV R² {blend['cv_score']:.4f}, weights "
+          + ", ".join(f"{name} {weight:.3f}" for name, weight in blend['weights'].items()))
+    print("✓ Saved: submission.csv (blend)")
+
 # ========================================
 # 9. SUMMARY
 # ========================================
+profiler.next_stage("9. Summary")
 print("\n" + "="*60)
 print("MODEL SUMMARY")
 print("="*60)
@@ -377,10 +434,11 @@ print("  - 02_correlation_matrix.png")
 print("  - 03_categorical_analysis.png")
 print("  - 04_numerical_scatter.png")
 print("  - 05_model_comparison.png")
-if hasattr(best_model, 'feature_importances_'):
-    print("  - 06_feature_importance.png")
+print("  - 06_feature_importance.png")
 print("  - 07_predictions_vs_actual.png")
 print("  - submission.csv")
 print("="*60)
 print("✓ Analysis Complete!")
 print("="*60)
+
+profiler.finish()
@@ -4,14 +4,58 @@ FastAPI Backend for Road Risk Game
 Provides API endpoints for the ML model predictions.
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import (
+    BackgroundTasks, Depends, FastAPI, Header, HTTPException, Query, Request, Response
+)
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import FileResponse, StreamingResponse
+from pydantic import BaseModel, TypeAdapter, ValidationError
 import joblib
+import json
 import pandas as pd
 import numpy as np
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional, Union
 import os
+import sys
+import time
+from functools import partial
+
+# Add road_risk_game to path so utils is importable when run from api/
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from utils.batch_scoring import dedup_predict
+from utils.columnar import (
+    BINARY_MEDIA_TYPES, MEDIA_JSON, BatchTooLargeError, ColumnValidationError,
+    UnsupportedMediaTypeError, decode_columns, encode_columns, media_type, negotiate,
+    validate_columns
+)
+from utils.drift import (
+    DEFAULT_MIN_ROWS, REFERENCE_FILENAME, DriftMonitor, default_layout, load_reference
+)
+from utils.explain import TreePathExplainer
+from utils.features import FeatureEncoder, UnknownCategoryError
+from utils.compact_model import COMPACT_BUNDLE_FILENAME
+from utils.model_bundle import BUNDLE_FILENAME, load_bundle, vocabularies_from_encoders
+from utils.model_pool import (
+    MODEL_HEADER, ModelPool, PooledModel, UnknownModelError, load_pooled_model, parse_weights
+)
+from utils.jobs import (
+    COMPLETED, DEFAULT_CHUNK_ROWS, JOB_FORMATS, JobManager, JobNotFoundError
+)
+from utils.prediction_log import DEFAULT_CAPACITY as DEFAULT_LOG_CAPACITY, PredictionLog
+from utils.routes import MAX_ROUTE_SEGMENTS as DEFAULT_MAX_ROUTE_SEGMENTS, RouteError, score_routes
+from utils.segment_store import (
+    DYNAMIC_FEATURES, SegmentStore, SegmentStoreError, UnknownSegmentError
+)
+from utils.similar_roads import SimilarRoadsError, SimilarRoadsIndex
+from utils.shadow import DEFAULT_FRACTION as DEFAULT_SHADOW_FRACTION, ShadowEvaluator
+from utils.streaming import (
+    DEFAULT_BATCH_ROWS, MEDIA_NDJSON, LineTooLongError, NDJSONScorer, iter_batches
+)
+from utils.sensitivity import (
+    MAX_GRID_SIZE, GridTooLargeError, InvalidSweepError, build_sweep_grid, grid_shape
+)
 
 app = FastAPI(title="Road Risk Prediction API", version="1.0.0")
 
@@ -25,28 +69,207 @@ app.add_middleware(
 )
 
 # Load model and encoders on startup
-MODEL_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "accident_risk_model.joblib")
-ENCODERS_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "label_encoders.joblib")
-FEATURES_PATH = os.path.join(os.path.dirname(__file__), "..", "models", "feature_names.joblib")
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
+BUNDLE_PATH = os.path.join(MODELS_DIR, BUNDLE_FILENAME)
+MODEL_PATH = os.path.join(MODELS_DIR, "accident_risk_model.joblib")
+ENCODERS_PATH = os.path.join(MODELS_DIR, "label_encoders.joblib")
+FEATURES_PATH = os.path.join(MODELS_DIR, "feature_names.joblib")
+DRIFT_REFERENCE_PATH = os.path.join(MODELS_DIR, REFERENCE_FILENAME)
+
+# Models served next to the production model 'gbr': the compacted bundle
+# (when present) as 'compact' and an optional 'experimental' bundle.
+# Requests pick one with the X-Model header; the rest follow MODEL_WEIGHTS,
+# e.g. "gbr=0.9,compact=0.1" (default: everything to gbr)
+COMPACT_BUNDLE_PATH = os.path.join(MODELS_DIR, COMPACT_BUNDLE_FILENAME)
+EXPERIMENTAL_BUNDLE_PATH = os.environ.get("EXPERIMENTAL_BUNDLE_PATH")
+MODEL_WEIGHTS = os.environ.get("MODEL_WEIGHTS", "")
+
+# Unseen category policy: 'error' (422), 'default' (code 0) or 'nan'; 'nan'
+# needs models that accept missing values and is refused at startup otherwise
+UNKNOWN_CATEGORY_POLICY = os.environ.get("UNKNOWN_CATEGORY_POLICY", "error")
+
+# Most scenarios accepted in one /predict_batch body
+MAX_BATCH_ROWS = int(os.environ.get("MAX_BATCH_ROWS", 100_000))
+
+# Scenarios scored per model call by /predict_stream
+STREAM_BATCH_ROWS = int(os.environ.get("STREAM_BATCH_ROWS", DEFAULT_BATCH_ROWS))
+
+# Bulk scoring jobs: concurrency limit and where metadata and outputs live
+MAX_CONCURRENT_JOBS = int(os.environ.get("MAX_CONCURRENT_JOBS", 2))
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(os.path.dirname(__file__), "..", "jobs"))
+# Largest file accepted by /jobs/upload
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 1 << 30))
+
+# Live rows needed before /metrics/drift scores drift
+DRIFT_MIN_ROWS = int(os.environ.get("DRIFT_MIN_ROWS", DEFAULT_MIN_ROWS))
+
+# Pre-encoded static attributes of road segments for /predict_segments,
+# built with `python -m utils.segment_store`
+SEGMENT_STORE_DIR = os.environ.get("SEGMENT_STORE_DIR", os.path.join(MODELS_DIR, "segments"))
+
+# Training rows indexed for /similar_roads, built by save_model.py or
+# `python -m utils.similar_roads`; the most rows one request may ask for
+SIMILAR_ROADS_DIR = os.environ.get("SIMILAR_ROADS_DIR", os.path.join(MODELS_DIR, "similar_roads"))
+MAX_SIMILAR_ROADS = int(os.environ.get("MAX_SIMILAR_ROADS", 100))
+
+# Prediction audit log: directory, 'parquet' or 'arrow', buffered records
+# and what to do when the buffer is full ('drop' or 'block')
+PREDICTION_LOG_DIR = os.environ.get(
+    "PREDICTION_LOG_DIR", os.path.join(os.path.dirname(__file__), "..", "prediction_logs"))
+PREDICTION_LOG_FORMAT = os.environ.get("PREDICTION_LOG_FORMAT", "parquet")
+PREDICTION_LOG_CAPACITY = int(os.environ.get("PREDICTION_LOG_CAPACITY", DEFAULT_LOG_CAPACITY))
+PREDICTION_LOG_POLICY = os.environ.get("PREDICTION_LOG_POLICY", "drop")
+
+# Shadow evaluation of a candidate bundle (e.g. game_models/model_bundle.joblib
+# from save_model.py) on a sample of /predict traffic; off when unset
+SHADOW_BUNDLE_PATH = os.environ.get("SHADOW_BUNDLE_PATH")
+SHADOW_FRACTION = float(os.environ.get("SHADOW_FRACTION", DEFAULT_SHADOW_FRACTION))
+SHADOW_WORKERS = int(os.environ.get("SHADOW_WORKERS", 1))
+
+# Largest what-if grid scored by /sensitivity in one request
+MAX_SENSITIVITY_GRID = int(os.environ.get("MAX_SENSITIVITY_GRID", MAX_GRID_SIZE))
+
+# Most segments, over all routes, scored by /predict_routes in one request
+MAX_ROUTE_SEGMENTS = int(os.environ.get("MAX_ROUTE_SEGMENTS", DEFAULT_MAX_ROUTE_SEGMENTS))
 
 model = None
-label_encoders = None
+encoder = None
+explainer = None
 feature_names = None
+schema_hash = None
+job_manager = None
+drift_monitor = None
+model_pool = None
+segment_store = None
+similar_roads = None
+prediction_log = None
+shadow = None
 
 @app.on_event("startup")
 async def load_model():
     """Load the ML model and encoders when the API starts."""
-    global model, label_encoders, feature_names
+    global model, encoder, explainer, feature_names, schema_hash, drift_monitor, model_pool
     try:
-        model = joblib.load(MODEL_PATH)
-        label_encoders = joblib.load(ENCODERS_PATH)
-        feature_names = joblib.load(FEATURES_PATH)
-        print("✓ Model and encoders loaded successfully")
+        if os.path.exists(BUNDLE_PATH):
+            # One file open; schema skew is rejected here rather than mid-request
+            bundle = load_bundle(BUNDLE_PATH, mmap_mode='r')
+            model = bundle['model']
+            vocabularies = bundle['vocabularies']
+            feature_names = bundle['feature_names']
+            schema_hash = bundle['schema_hash']
+        else:
+            model = joblib.load(MODEL_PATH)
+            vocabularies = vocabularies_from_encoders(joblib.load(ENCODERS_PATH))
+            feature_names = joblib.load(FEATURES_PATH)
+        encoder = FeatureEncoder(vocabularies, feature_names, unknown=UNKNOWN_CATEGORY_POLICY)
+        try:
+            explainer = TreePathExplainer(model, feature_names)
+        except ValueError as e:
+            print(f"Explanations disabled: {e}")
+        if os.path.exists(DRIFT_REFERENCE_PATH):
+            drift_monitor = DriftMonitor.from_reference(load_reference(DRIFT_REFERENCE_PATH),
+                                                        min_rows=DRIFT_MIN_ROWS)
+        else:
+            # Still sketch live traffic; drift is scored once a reference is shipped
+            drift_monitor = DriftMonitor(default_layout(vocabularies), min_rows=DRIFT_MIN_ROWS)
+        model_pool = ModelPool()
+        model_pool.add(PooledModel('gbr', model, encoder, schema_hash=schema_hash,
+                                   explainer=explainer, weight=1.0,
+                                   source=BUNDLE_PATH if schema_hash else MODEL_PATH))
+        if os.path.exists(COMPACT_BUNDLE_PATH):
+            model_pool.add(load_pooled_model('compact', COMPACT_BUNDLE_PATH,
+                                             unknown=UNKNOWN_CATEGORY_POLICY))
+        if EXPERIMENTAL_BUNDLE_PATH:
+            model_pool.add(load_pooled_model('experimental', EXPERIMENTAL_BUNDLE_PATH,
+                                             unknown=UNKNOWN_CATEGORY_POLICY))
+        if MODEL_WEIGHTS:
+            model_pool.set_weights(parse_weights(MODEL_WEIGHTS))
+        print(f"✓ Model and encoders loaded successfully (models: {', '.join(model_pool.names)})")
     except Exception as e:
         print(f"Error loading model: {e}")
         raise
 
 
+@app.on_event("startup")
+async def load_segment_store():
+    """Open the road segment store, if one has been built."""
+    global segment_store
+    if not os.path.isdir(SEGMENT_STORE_DIR):
+        return
+    try:
+        segment_store = SegmentStore(SEGMENT_STORE_DIR)
+        print(f"✓ Loaded {len(segment_store)} road segments")
+    except SegmentStoreError as e:
+        print(f"Segment scoring disabled: {e}")
+
+
+@app.on_event("startup")
+async def load_similar_roads():
+    """Open the similar-roads index, if one has been built."""
+    global similar_roads
+    if not os.path.isdir(SIMILAR_ROADS_DIR):
+        return
+    try:
+        similar_roads = SimilarRoadsIndex(SIMILAR_ROADS_DIR)
+        print(f"✓ Loaded {len(similar_roads)} historical roads for similarity lookups")
+    except SimilarRoadsError as e:
+        print(f"Similar-road lookups disabled: {e}")
+
+
+@app.on_event("startup")
+async def start_job_manager():
+    """Start the bulk job pool and pick up jobs interrupted by a restart."""
+    global job_manager
+    job_manager = JobManager(os.path.join(JOBS_DIR, "jobs.sqlite"), JOBS_DIR, MODELS_DIR,
+                             max_workers=MAX_CONCURRENT_JOBS)
+    resumed = job_manager.resume()
+    if resumed:
+        print(f"✓ Resumed {len(resumed)} scoring job(s)")
+
+
+@app.on_event("shutdown")
+async def stop_job_manager():
+    """Stop the job pool without waiting; unfinished jobs resume on next start."""
+    if job_manager is not None:
+        job_manager.shutdown(wait=False)
+
+
+@app.on_event("startup")
+async def start_prediction_log():
+    """Start the background prediction log writer."""
+    global prediction_log
+    try:
+        prediction_log = PredictionLog(PREDICTION_LOG_DIR, fmt=PREDICTION_LOG_FORMAT,
+                                       capacity=PREDICTION_LOG_CAPACITY,
+                                       policy=PREDICTION_LOG_POLICY)
+    except ImportError as e:
+        print(f"Prediction log disabled: {e}")
+
+
+@app.on_event("shutdown")
+async def stop_prediction_log():
+    """Flush buffered predictions and close the current log file."""
+    if prediction_log is not None:
+        prediction_log.close()
+
+
+@app.on_event("startup")
+async def start_shadow():
+    """Start scoring sampled traffic with the candidate model, if one is configured."""
+    global shadow
+    if SHADOW_BUNDLE_PATH:
+        shadow = ShadowEvaluator(SHADOW_BUNDLE_PATH, fraction=SHADOW_FRACTION,
+                                 max_workers=SHADOW_WORKERS)
+        print(f"✓ Shadowing {SHADOW_FRACTION:.1%} of /predict with {SHADOW_BUNDLE_PATH}")
+
+
+@app.on_event("shutdown")
+async def stop_shadow():
+    """Stop shadow scoring without waiting for buffered samples."""
+    if shadow is not None:
+        shadow.close(wait=False)
+
+
 class RoadScenario(BaseModel):
     """Schema for road scenario input."""
     road_type: str
@@ -63,39 +286,150 @@ class RoadScenario(BaseModel):
     num_reported_accidents: int
 
 
+class FeatureContribution(BaseModel):
+    """Schema for one feature's share of a prediction."""
+    feature: str
+    contribution: float
+
+
 class PredictionResponse(BaseModel):
     """Schema for prediction response."""
     accident_risk: float
     risk_level: str
     risk_percentage: str
+    model: Optional[str] = None
+    top_features: Optional[List[FeatureContribution]] = None
+
+
+class BatchRequest(BaseModel):
+    """Schema for a JSON batch of scenarios."""
+    scenarios: List[RoadScenario]
+
+
+class BatchResponse(BaseModel):
+    """Schema for a JSON batch prediction response."""
+    accident_risk: List[float]
+    count: int
+    model: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    """Schema for a bulk scoring job over a server-side file."""
+    input_path: str
+    format: Optional[str] = None
+    chunk_rows: int = DEFAULT_CHUNK_ROWS
+
+
+class JobStatus(BaseModel):
+    """Schema for the state of a bulk scoring job."""
+    id: str
+    status: str
+    format: str
+    total_rows: Optional[int] = None
+    rows_done: int
+    chunks_done: int
+    progress: Optional[float] = None
+    error: Optional[str] = None
+    created_at: float
+    updated_at: float
+
+
+class SegmentRequest(BaseModel):
+    """Schema for stored road segments under the given conditions.
+    
+    Each condition is one value for every segment or a list with one
+    value per segment.
+    """
+    segment_ids: List[str]
+    lighting: Union[str, List[str]]
+    weather: Union[str, List[str]]
+    time_of_day: Union[str, List[str]]
+    holiday: Union[bool, List[bool]]
+    school_season: Union[bool, List[bool]]
+
+
+class RouteSegment(RoadScenario):
+    """Schema for one road segment of a route."""
+    length: Optional[float] = None
+
+
+class RouteRequest(BaseModel):
+    """Schema for routes, each an ordered list of segments."""
+    routes: List[List[RouteSegment]]
+    reference_length: Optional[float] = None
+
+
+class RouteResult(BaseModel):
+    """Schema for the risk of one route."""
+    accident_risk: List[float]
+    segments: int
+    length: Optional[float] = None
+    max_risk: float
+    mean_risk: float
+    combined_risk: float
+
+
+class RouteResponse(BaseModel):
+    """Schema for a route scoring response."""
+    routes: List[RouteResult]
+    segments: int
+    unique_segments: int
+    model: Optional[str] = None
+
+
+class SimilarRoad(RoadScenario):
+    """Schema for one historical training row."""
+    id: int
+    accident_risk: float
+    distance: float
+
+
+class SimilarRoadsResponse(BaseModel):
+    """Schema for the training rows nearest a scenario."""
+    roads: List[SimilarRoad]
+    count: int
 
 
-def preprocess_scenario(scenario: Dict[str, Any]) -> pd.DataFrame:
+class SensitivityRequest(BaseModel):
+    """Schema for a what-if analysis around one scenario."""
+    scenario: RoadScenario
+    sweeps: Dict[str, List[Any]]
+
+
+class SensitivityResponse(BaseModel):
+    """Schema for a what-if risk surface."""
+    base_risk: float
+    features: List[str]
+    values: List[List[Any]]
+    risks: List[Any]
+    min_risk: float
+    max_risk: float
+    grid_size: int
+    model: Optional[str] = None
+
+
+def preprocess_scenario(scenario: Dict[str, Any],
+                        scenario_encoder: Optional[FeatureEncoder] = None) -> pd.DataFrame:
     """
     Preprocess a road scenario for prediction.
     
     Args:
         scenario: Dictionary with road characteristics
+        scenario_encoder: Encoder of the model that will score it
+                          (default: the production model's)
     
     Returns:
         Preprocessed DataFrame ready for prediction
     """
-    df = pd.DataFrame([scenario])
-    
-    # Encode categorical variables
-    categorical_features = ['road_type', 'lighting', 'weather', 'road_signs_present',
-                          'public_road', 'time_of_day', 'holiday', 'school_season']
-    
-    for col in categorical_features:
-        df[col] = label_encoders[col].transform(df[col])
-    
-    # Create engineered features
-    df['speed_curvature'] = df['speed_limit'] * df['curvature']
-    df['lanes_accidents'] = df['num_lanes'] * df['num_reported_accidents']
-    df['high_speed'] = (df['speed_limit'] >= 60).astype(int)
-    df['sharp_curve'] = (df['curvature'] >= 0.7).astype(int)
-    
-    return df
+    return (scenario_encoder or encoder).transform([scenario])
+
+
+def select_model(name: Optional[str]) -> PooledModel:
+    """Model named by the X-Model header, or one picked by the traffic split."""
+    try:
+        return model_pool.select(name)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
 
 
 def get_risk_level(risk_score: float) -> str:
@@ -130,47 +464,698 @@ async def root():
     }
 
 
-@app.post("/predict", response_model=PredictionResponse)
-async def predict_risk(scenario: RoadScenario):
+@app.post("/predict", response_model=PredictionResponse, response_model_exclude_none=True)
+async def predict_risk(scenario: RoadScenario, background_tasks: BackgroundTasks,
+                       response: Response, explain: bool = False,
+                       top_k: int = Query(3, ge=1),
+                       model_name: Optional[str] = Header(None, alias=MODEL_HEADER)):
     """
     Predict accident risk for a road scenario.
     
+    The prediction is logged, and when shadow evaluation is on a sample
+    of requests is handed to the candidate model, after the response has
+    been sent.
+    
     Args:
         scenario: Road characteristics
+        background_tasks: Work run after the response is sent
+        response: Response whose X-Model header names the model that answered
+        explain: Also return the features that contributed most
+        top_k: Number of contributing features to return
+        model_name: Model to use (X-Model header); routed by weight when absent
     
     Returns:
-        Prediction with risk score and level
+        Prediction with risk score, level and the model that answered
     """
     if model is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
+    entry = select_model(model_name)
+    if explain and entry.explainer is None:
+        raise HTTPException(status_code=501, detail="Explanations not available for this model")
     
     try:
+        start = time.perf_counter()
         # Convert to dict and preprocess
         scenario_dict = scenario.dict()
-        processed_data = preprocess_scenario(scenario_dict)
+        processed_data = preprocess_scenario(scenario_dict, entry.encoder)
+        drift_monitor.observe(scenario_dict)
         
         # Make prediction
-        risk_score = float(model.predict(processed_data)[0])
+        top_features = None
+        if explain:
+            # Contributions sum exactly to the prediction
+            contributions = entry.explainer.contributions(processed_data)
+            risk_score = float(entry.explainer.bias + contributions[0].sum())
+            top_features = entry.explainer.top_features(contributions, top_k=top_k)[0]
+        else:
+            risk_score = float(entry.model.predict(processed_data)[0])
+        
+        latency_ms = (time.perf_counter() - start) * 1000
+        entry.record(latency_ms)
+        if prediction_log is not None:
+            # Sent after the response from the thread pool: under the 'block'
+            # policy a full buffer must not stall the event loop
+            background_tasks.add_task(prediction_log.log, dict(
+                scenario_dict, endpoint='/predict', model_version=entry.version,
+                latency_ms=latency_ms, accident_risk=risk_score))
+        if shadow is not None and shadow.sample():
+            background_tasks.add_task(shadow.submit, scenario_dict, risk_score, latency_ms)
         
         # Prepare response
+        response.headers[MODEL_HEADER] = entry.name
         return PredictionResponse(
             accident_risk=risk_score,
             risk_level=get_risk_level(risk_score),
-            risk_percentage=f"{risk_score * 100:.1f}%"
+            risk_percentage=f"{risk_score * 100:.1f}%",
+            model=entry.name,
+            top_features=top_features
         )
     
+    except UnknownCategoryError as e:
+        entry.record_error()
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
+        entry.record_error()
         raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
 
 
+def category_vocabularies(
+        scenario_encoder: Optional[FeatureEncoder] = None) -> Optional[Dict[str, Any]]:
+    """Vocabularies to validate against, or None when unknown values are tolerated."""
+    if UNKNOWN_CATEGORY_POLICY != 'error':
+        return None
+    vocabularies = (scenario_encoder or encoder).vocabularies
+    return {col: vocabulary.classes_ for col, vocabulary in vocabularies.items()}
+
+
+def check_batch_size(rows: int, max_rows: Optional[int]):
+    """Raise BatchTooLargeError for a batch over max_rows (None: no limit)."""
+    if max_rows is not None and rows > max_rows:
+        raise BatchTooLargeError(f"Batch has {rows} scenarios; the limit is {max_rows}")
+
+
+def read_batch(body: bytes, content_type: str,
+               scenario_encoder: Optional[FeatureEncoder] = None,
+               max_rows: Optional[int] = None) -> pd.DataFrame:
+    """
+    Decode and validate a batch request body.
+    
+    JSON bodies go through the per-object RoadScenario schema; binary
+    bodies are decoded as columns and validated one column at a time.
+    
+    Args:
+        body: Raw request body
+        content_type: Media type of the body
+        scenario_encoder: Encoder whose vocabularies binary columns are
+                          checked against (default: the production model's)
+        max_rows: Most scenarios accepted; None for no limit
+    
+    Returns:
+        Raw scenarios, one row per scenario
+    
+    Raises:
+        BatchTooLargeError: If the body holds more than max_rows scenarios
+    """
+    if content_type == MEDIA_JSON:
+        request = BatchRequest.model_validate_json(body)
+        check_batch_size(len(request.scenarios), max_rows)
+        # Columns named explicitly so an empty batch still has them
+        return pd.DataFrame([scenario.dict() for scenario in request.scenarios],
+                            columns=list(RoadScenario.model_fields))
+    if content_type not in BINARY_MEDIA_TYPES:
+        raise UnsupportedMediaTypeError(f"Unsupported content type '{content_type}'")
+    
+    columns = decode_columns(body, content_type)
+    check_batch_size(max((len(values) for values in columns.values()), default=0), max_rows)
+    return pd.DataFrame(validate_columns(columns, category_vocabularies(scenario_encoder)))
+
+
+async def request_body(request: Request) -> bytes:
+    """Whole request body, read on the event loop so the handler can run in a thread."""
+    return await request.body()
+
+
+@app.post("/predict_batch", response_model=BatchResponse)
+def predict_batch(request: Request, response: Response, body: bytes = Depends(request_body)):
+    """
+    Predict accident risk for many scenarios in one call.
+    
+    The body is either JSON ({"scenarios": [...]}) or a columnar binary
+    payload (npy, Arrow IPC or msgpack) chosen by Content-Type, with at
+    most MAX_BATCH_ROWS scenarios. The response format follows the Accept
+    header; binary responses carry a single accident_risk column. The
+    X-Model request header picks the model; the response's X-Model header
+    names the one that answered. Decoding and scoring run in the thread
+    pool, so a large batch does not hold up other requests.
+    
+    Returns:
+        Risks in request order
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    entry = select_model(request.headers.get(MODEL_HEADER))
+    
+    try:
+        response_type = negotiate(request.headers.get('accept'))
+    except UnsupportedMediaTypeError as e:
+        raise HTTPException(status_code=406, detail=str(e))
+    
+    try:
+        start = time.perf_counter()
+        scenarios = read_batch(body, media_type(request.headers.get('content-type')),
+                               entry.encoder, max_rows=MAX_BATCH_ROWS)
+        risks, _ = dedup_predict(entry.model, entry.encoder.transform(scenarios))
+        latency_ms = (time.perf_counter() - start) * 1000
+        entry.record(latency_ms, rows=len(risks))
+        drift_monitor.observe_frame(scenarios)
+        if prediction_log is not None:
+            prediction_log.log_batch(scenarios, risks, '/predict_batch', entry.version, latency_ms)
+    except UnsupportedMediaTypeError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+    except BatchTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    except (ColumnValidationError, UnknownCategoryError) as e:
+        entry.record_error()
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        entry.record_error()
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+    
+    if response_type == MEDIA_JSON:
+        response.headers[MODEL_HEADER] = entry.name
+        return BatchResponse(accident_risk=risks.tolist(), count=len(risks), model=entry.name)
+    return Response(content=encode_columns({'accident_risk': risks}, response_type),
+                    media_type=response_type, headers={MODEL_HEADER: entry.name})
+
+
+def score_frame(scenarios: pd.DataFrame, entry: Optional[PooledModel] = None) -> np.ndarray:
+    """
+    Validate raw scenario columns and score them.
+    
+    Args:
+        scenarios: Raw scenarios, one row per scenario
+        entry: Pool model to score with (default: the production model)
+    
+    Returns:
+        Predicted risks in row order
+    """
+    entry = entry or model_pool.default
+    start = time.perf_counter()
+    columns = validate_columns({col: scenarios[col].to_numpy() for col in scenarios.columns},
+                               category_vocabularies(entry.encoder))
+    risks, _ = dedup_predict(entry.model, entry.encoder.transform(columns))
+    entry.record((time.perf_counter() - start) * 1000, rows=len(risks))
+    drift_monitor.observe_frame(scenarios)
+    return risks
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse whose body generator also reads the request body.
+    
+    The stock response listens for client disconnects by calling receive()
+    concurrently, which would steal request body messages from the
+    generator. Here the generator is the only reader, and a disconnect
+    surfaces to it as ClientDisconnect from request.stream().
+    """
+    
+    async def __call__(self, scope, receive, send):
+        await self.stream_response(send)
+
+
+@app.post("/predict_stream")
+async def predict_stream(request: Request):
+    """
+    Score newline-delimited JSON scenarios as they stream in.
+    
+    Lines are scored in micro-batches of STREAM_BATCH_ROWS and each
+    batch's results are streamed back as NDJSON before more input is
+    read, so memory stays bounded and a slow reader throttles the work.
+    Every input line yields one output line with either accident_risk or
+    error. The whole stream is scored by the model the X-Model header
+    picks (or the traffic split), named in the response's X-Model header.
+    
+    Returns:
+        Streaming NDJSON response
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    entry = select_model(request.headers.get(MODEL_HEADER))
+    
+    scorer = NDJSONScorer(partial(score_frame, entry=entry))
+    
+    async def results():
+        next_line = 1
+        try:
+            async for lines in iter_batches(request.stream(), STREAM_BATCH_ROWS):
+                # Scoring runs off the event loop; the next batch is only read
+                # once this one has been handed to the client
+                yield await run_in_threadpool(scorer.score_lines, lines, next_line)
+                next_line += len(lines)
+        except LineTooLongError as e:
+            # Headers are already sent; report in-band and stop
+            yield (json.dumps({'line': next_line, 'error': str(e)}) + "\n").encode()
+    
+    return DuplexStreamingResponse(results(), media_type=MEDIA_NDJSON,
+                                   headers={MODEL_HEADER: entry.name})
+
+
+@app.post("/predict_segments", response_model=BatchResponse)
+def predict_segments(request: SegmentRequest, response: Response,
+                     model_name: Optional[str] = Header(None, alias=MODEL_HEADER)):
+    """
+    Predict accident risk for stored road segments.
+    
+    Clients send segment IDs and the current conditions only; the static
+    road attributes and engineered features come pre-encoded from the
+    segment store and are joined with the conditions in one gather.
+    
+    Args:
+        request: Segment IDs and conditions
+        response: Response whose X-Model header names the model that answered
+        model_name: Model to use (X-Model header); routed by weight when absent
+    
+    Returns:
+        Risks in segment order
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    if segment_store is None:
+        raise HTTPException(status_code=503, detail="No segment store loaded")
+    entry = select_model(model_name)
+    try:
+        segment_store.check_schema(entry.schema_hash)
+    except SegmentStoreError as e:
+        raise HTTPException(status_code=409,
+                            detail=f"Model '{entry.name}' cannot use the segment store: {e}")
+    
+    conditions = {col: getattr(request, col) for col in DYNAMIC_FEATURES}
+    wrong_length = [col for col, values in conditions.items()
+                    if isinstance(values, list) and len(values) != len(request.segment_ids)]
+    if wrong_length:
+        raise HTTPException(status_code=422,
+                            detail=f"Conditions {wrong_length} need one value per segment "
+                                   "or a single value")
+    
+    try:
+        start = time.perf_counter()
+        X = segment_store.join(request.segment_ids, conditions, entry.encoder)
+        risks, _ = dedup_predict(entry.model, X)
+        entry.record((time.perf_counter() - start) * 1000, rows=len(risks))
+    except UnknownSegmentError as e:
+        raise HTTPException(status_code=404, detail=e.args[0])
+    except UnknownCategoryError as e:
+        entry.record_error()
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        entry.record_error()
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+    
+    response.headers[MODEL_HEADER] = entry.name
+    return BatchResponse(accident_risk=risks.tolist(), count=len(risks), model=entry.name)
+
+
+@app.post("/predict_routes", response_model=RouteResponse)
+def predict_routes(request: RouteRequest, response: Response,
+                   model_name: Optional[str] = Header(None, alias=MODEL_HEADER)):
+    """
+    Predict the accident risk of whole routes.
+    
+    All segments of all routes are scored in one batched model call;
+    segments shared between routes are predicted once.
+    
+    Args:
+        request: Routes and an optional reference_length, the length one
+                 predicted risk refers to (in the unit of segment lengths)
+        response: Response whose X-Model header names the model that answered
+        model_name: Model to use (X-Model header); routed by weight when absent
+    
+    Returns:
+        Per route: segment risks, max_risk, length-weighted mean_risk and
+        combined_risk (probability of at least one incident)
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    entry = select_model(model_name)
+    
+    try:
+        start = time.perf_counter()
+        routes = [[segment.dict() for segment in route] for route in request.routes]
+        results, stats = score_routes(entry.model, entry.encoder, routes,
+                                      reference_length=request.reference_length,
+                                      max_segments=MAX_ROUTE_SEGMENTS)
+        entry.record((time.perf_counter() - start) * 1000, rows=stats['segments'])
+    except RouteError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except UnknownCategoryError as e:
+        entry.record_error()
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        entry.record_error()
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+    
+    response.headers[MODEL_HEADER] = entry.name
+    return RouteResponse(
+        routes=[RouteResult(accident_risk=result['risks'].tolist(),
+                            **{key: value for key, value in result.items() if key != 'risks'})
+                for result in results],
+        segments=stats['segments'],
+        unique_segments=stats['unique_segments'],
+        model=entry.name
+    )
+
+
+@app.post("/similar_roads", response_model=SimilarRoadsResponse)
+def find_similar_roads(scenario: RoadScenario, k: int = 5):
+    """
+    Historical training rows most similar to a scenario.
+    
+    Rows with the same road type, conditions, lanes, speed limit and
+    accident history come first, ordered by curvature; near misses follow
+    by weighted distance.
+    
+    Args:
+        scenario: Road scenario
+        k: Rows to return
+    
+    Returns:
+        Up to k rows with their observed accident risk, nearest first
+    """
+    if similar_roads is None:
+        raise HTTPException(status_code=503, detail="No similar-roads index loaded")
+    if not 1 <= k <= MAX_SIMILAR_ROADS:
+        raise HTTPException(status_code=422, detail=f"k must be between 1 and {MAX_SIMILAR_ROADS}")
+    
+    try:
+        roads = similar_roads.neighbors(scenario.dict(), k=k)
+    except SimilarRoadsError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return SimilarRoadsResponse(roads=roads, count=len(roads))
+
+
+def validate_sweeps(sweeps: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+    """
+    Check swept values against the RoadScenario field types.
+    
+    Args:
+        sweeps: Mapping of feature name to the values to try
+    
+    Returns:
+        Sweeps with values coerced like RoadScenario fields (e.g. "3" to 3)
+    
+    Raises:
+        HTTPException: 422 for an unknown feature or a value of the wrong type
+    """
+    validated = {}
+    for feature, values in sweeps.items():
+        field = RoadScenario.model_fields.get(feature)
+        if field is None:
+            raise HTTPException(status_code=422, detail=f"Cannot sweep unknown feature '{feature}'")
+        try:
+            validated[feature] = TypeAdapter(List[field.annotation]).validate_python(values)
+        except ValidationError as e:
+            raise HTTPException(status_code=422, detail=[
+                dict(error, loc=('body', 'sweeps', feature) + tuple(error['loc']))
+                for error in e.errors(include_url=False, include_context=False)
+            ])
+    return validated
+
+
+@app.post("/sensitivity", response_model=SensitivityResponse)
+def sensitivity_analysis(request: SensitivityRequest, response: Response,
+                         model_name: Optional[str] = Header(None, alias=MODEL_HEADER)):
+    """
+    Score every combination of feature sweeps around a base scenario.
+    
+    Args:
+        request: Base scenario and the values to try per feature
+        response: Response whose X-Model header names the model that answered
+        model_name: Model to use (X-Model header); routed by weight when absent
+    
+    Returns:
+        Risk surface with one nested-list axis per swept feature
+    """
+    if model is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    entry = select_model(model_name)
+    sweeps = validate_sweeps(request.sweeps)
+    
+    try:
+        start = time.perf_counter()
+        base = request.scenario.dict()
+        grid = build_sweep_grid(base, sweeps, max_grid_size=MAX_SENSITIVITY_GRID)
+        
+        # Variants and the base scenario go through the model in one call
+        risks = entry.model.predict(entry.encoder.transform(pd.concat(
+            [grid, entry.encoder.to_frame(base)], ignore_index=True)))
+        surface = risks[:-1]
+        entry.record((time.perf_counter() - start) * 1000, rows=len(risks))
+    except UnknownCategoryError as e:
+        entry.record_error()
+        raise HTTPException(status_code=422, detail=str(e))
+    except (GridTooLargeError, InvalidSweepError) as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except Exception as e:
+        entry.record_error()
+        raise HTTPException(status_code=500, detail=f"Prediction error: {str(e)}")
+    
+    response.headers[MODEL_HEADER] = entry.name
+    return SensitivityResponse(
+        base_risk=float(risks[-1]),
+        features=list(sweeps),
+        values=list(sweeps.values()),
+        risks=surface.reshape(grid_shape(sweeps)).tolist(),
+        min_risk=float(surface.min()),
+        max_risk=float(surface.max()),
+        grid_size=len(surface),
+        model=entry.name
+    )
+
+
+def job_status(job: Dict[str, Any]) -> JobStatus:
+    """Public view of a job row."""
+    progress = None
+    if job['total_rows']:
+        progress = job['rows_done'] / job['total_rows']
+    elif job['status'] == COMPLETED:
+        progress = 1.0
+    return JobStatus(progress=progress, **{key: job[key] for key in JobStatus.model_fields
+                                           if key in job})
+
+
+def get_job(job_id: str) -> Dict[str, Any]:
+    """Job row, or 404."""
+    try:
+        return job_manager.store.get(job_id)
+    except JobNotFoundError:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+
+@app.post("/jobs", response_model=JobStatus, status_code=202)
+def submit_job(request: JobRequest):
+    """
+    Score a CSV or Parquet file on the server in the background.
+    
+    Args:
+        request: Input path, optional format and chunk size
+    
+    Returns:
+        The queued job; poll GET /jobs/{id} for progress
+    """
+    try:
+        job_id = job_manager.submit(request.input_path, request.format, request.chunk_rows)
+    except FileNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return job_status(get_job(job_id))
+
+
+@app.post("/jobs/upload", response_model=JobStatus, status_code=202)
+async def upload_job(request: Request, format: str = 'csv', chunk_rows: int = DEFAULT_CHUNK_ROWS):
+    """
+    Upload a file as the raw request body and score it in the background.
+    
+    The body is written to disk in the thread pool as it arrives; uploads
+    over MAX_UPLOAD_BYTES are refused and nothing is left behind when the
+    upload or the job submission fails.
+    
+    Args:
+        format: 'csv' or 'parquet'
+        chunk_rows: Rows scored per chunk
+    
+    Returns:
+        The queued job
+    """
+    if format not in JOB_FORMATS:
+        raise HTTPException(status_code=422, detail=f"format must be one of {JOB_FORMATS}")
+    too_large = HTTPException(status_code=413,
+                              detail=f"Uploads are limited to {MAX_UPLOAD_BYTES} bytes")
+    try:
+        declared = int(request.headers.get('content-length', 0))
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed Content-Length header")
+    if declared > MAX_UPLOAD_BYTES:
+        raise too_large
+    
+    uploads = os.path.join(JOBS_DIR, "uploads")
+    os.makedirs(uploads, exist_ok=True)
+    path = os.path.join(uploads, f"{os.urandom(8).hex()}.{format}")
+    try:
+        written = 0
+        with open(path, 'wb') as f:
+            async for chunk in request.stream():
+                written += len(chunk)
+                if written > MAX_UPLOAD_BYTES:
+                    raise too_large
+                await run_in_threadpool(f.write, chunk)
+        job_id = await run_in_threadpool(job_manager.submit, path, format, chunk_rows)
+    except ValueError as e:
+        os.remove(path)
+        raise HTTPException(status_code=422, detail=str(e))
+    except BaseException:
+        # Oversized upload, client disconnect or cancellation
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return job_status(get_job(job_id))
+
+
+@app.get("/jobs", response_model=List[JobStatus])
+def list_jobs(status: Optional[str] = None):
+    """All jobs, newest first."""
+    return [job_status(job) for job in job_manager.store.list(status)]
+
+
+@app.get("/jobs/{job_id}", response_model=JobStatus)
+def job_progress(job_id: str):
+    """Status and progress of one job."""
+    return job_status(get_job(job_id))
+
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobStatus)
+def cancel_job(job_id: str):
+    """Cancel a job; a running job stops after its current chunk."""
+    get_job(job_id)
+    return job_status(job_manager.store.request_cancel(job_id))
+
+
+@app.get("/jobs/{job_id}/result")
+def job_result(job_id: str):
+    """Download the predictions of a completed job as CSV."""
+    job = get_job(job_id)
+    if job['status'] != COMPLETED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    return FileResponse(job['result_path'], media_type="text/csv",
+                        filename=f"predictions-{job_id}.csv")
+
+
+@app.get("/models")
+def list_models():
+    """
+    Models in the pool with their traffic weights and usage.
+    
+    Returns:
+        Per model: version, weight, request/row/error counts and a latency
+        histogram with bucketed p50/p95/p99
+    """
+    if model_pool is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    return model_pool.stats()
+
+
+@app.put("/models/weights")
+def set_model_weights(weights: Dict[str, float]):
+    """
+    Change the traffic split of requests without an X-Model header.
+    
+    Args:
+        weights: Model name to weight; unlisted models get no traffic
+    
+    Returns:
+        Updated pool stats
+    """
+    if model_pool is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    try:
+        model_pool.set_weights(weights)
+    except UnknownModelError as e:
+        raise HTTPException(status_code=400, detail=e.args[0])
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return model_pool.stats()
+
+
+@app.get("/metrics/drift")
+def drift_metrics():
+    """
+    Feature drift of live prediction traffic against the training data.
+    
+    Returns:
+        PSI, KL divergence and live/reference proportions per feature
+    """
+    if drift_monitor is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    return drift_monitor.report()
+
+
+@app.post("/metrics/drift/reset")
+def reset_drift_metrics():
+    """Start a new drift window, e.g. after a deployment."""
+    if drift_monitor is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    drift_monitor.reset()
+    return {"status": "reset"}
+
+
+@app.get("/metrics/prediction_log")
+def prediction_log_metrics():
+    """
+    Prediction log counters.
+    
+    Returns:
+        Logged, written and dropped records, buffer fill and flush latency
+    """
+    if prediction_log is None:
+        raise HTTPException(status_code=503, detail="Prediction log not running")
+    return prediction_log.stats()
+
+
+@app.get("/metrics/shadow")
+def shadow_metrics():
+    """
+    Divergence and cost of the shadow model against the serving model.
+    
+    Returns:
+        Sampling counters, mean/max absolute delta, pair rank agreement
+        and the shadow model's CPU time per prediction
+    """
+    if shadow is None:
+        raise HTTPException(status_code=404, detail="Shadow evaluation is not enabled")
+    return shadow.report()
+
+
+@app.post("/metrics/shadow/reset")
+def reset_shadow_metrics():
+    """Start a new shadow statistics window."""
+    if shadow is None:
+        raise HTTPException(status_code=404, detail="Shadow evaluation is not enabled")
+    shadow.reset()
+    return {"status": "reset"}
+
+
 @app.get("/health")
 async def health_check():
     """Detailed health check."""
     return {
         "status": "healthy",
         "model_loaded": model is not None,
-        "encoders_loaded": label_encoders is not None,
-        "features_count": len(feature_names) if feature_names else 0
+        "encoders_loaded": encoder is not None,
+        "features_count": len(feature_names) if feature_names else 0,
+        "schema_hash": schema_hash,
+        "models": model_pool.names if model_pool is not None else []
     }
 
 
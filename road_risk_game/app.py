@@ -5,6 +5,7 @@ Interactive game to predict which road scenario has higher accident risk.
 """
 
 import streamlit as st
+import random
 import sys
 import os
 
@@ -13,6 +14,7 @@ sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from utils.game_logic import ScenarioGenerator, GameScoring, RoadVisualizer
 from utils.model_utils import RiskPredictor
+from utils.scenario_bank import load_banks
 
 # Page configuration
 st.set_page_config(
@@ -90,6 +92,13 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
+
+@st.cache_resource
+def get_scenario_banks():
+    """Memory-mapped scenario banks, shared by every session of this process."""
+    return load_banks(os.path.join(os.path.dirname(__file__), "models"))
+
+
 # Initialize session state
 if 'initialized' not in st.session_state:
     st.session_state.initialized = True
@@ -99,12 +108,30 @@ if 'initialized' not in st.session_state:
     st.session_state.games_won = 0
     st.session_state.difficulty = 'medium'
     st.session_state.current_scenarios = None
+    st.session_state.current_risks = None
+    st.session_state.seen_pairs = {}
     st.session_state.show_result = False
     st.session_state.predictor = RiskPredictor(models_dir="models")
     st.session_state.last_result = None
 
 # Initialize predictor
 predictor = st.session_state.predictor
+scenario_banks = get_scenario_banks()
+
+
+def resolve_round(scenario1, scenario2):
+    """
+    Risks and explanation for the current round.
+    
+    Banked rounds already carry their risks; the model is only asked for
+    the explanation shown with the result.
+    """
+    comparison = predictor.explain_comparison(scenario1, scenario2)
+    if st.session_state.current_risks is not None:
+        risk1, risk2 = st.session_state.current_risks
+        comparison['risk1'], comparison['risk2'] = risk1, risk2
+        comparison['higher_risk_index'] = 0 if risk1 > risk2 else 1
+    return comparison
 
 # Title
 st.markdown('<h1 class="main-title">🚗 Road Risk Game 🛣️</h1>', unsafe_allow_html=True)
@@ -162,6 +189,8 @@ with st.sidebar:
         st.session_state.games_played = 0
         st.session_state.games_won = 0
         st.session_state.current_scenarios = None
+        st.session_state.current_risks = None
+        st.session_state.seen_pairs = {}
         st.session_state.show_result = False
         st.session_state.last_result = None
         st.rerun()
@@ -222,18 +251,33 @@ if st.session_state.show_result and st.session_state.last_result:
         st.markdown(f"### {emoji2} Riesgo: {risk2:.1%}")
         st.progress(risk2)
     
+    # Explain what made the difference between both roads
+    with st.expander("🔍 ¿Por qué?", expanded=True):
+        for line in RoadVisualizer.get_explanation_lines(result.get('top_features', [])):
+            st.write(f"• {line}")
+    
     st.divider()
     
     if st.button("➡️ Siguiente Ronda", type="primary", use_container_width=True):
         st.session_state.show_result = False
         st.session_state.current_scenarios = None
+        st.session_state.current_risks = None
         st.session_state.last_result = None
         st.rerun()
 
 else:
     # Generate new scenarios if needed
     if st.session_state.current_scenarios is None:
-        scenario1, scenario2 = ScenarioGenerator.generate_contrasting_scenarios(st.session_state.difficulty)
+        bank = scenario_banks.get(st.session_state.difficulty)
+        if bank is not None:
+            # Precomputed pair: no sampling or model work for this round
+            seen = st.session_state.seen_pairs.setdefault(st.session_state.difficulty, set())
+            scenario1, scenario2, risk1, risk2 = bank.pair(bank.draw_index(random, seen))
+            st.session_state.current_risks = (risk1, risk2)
+        else:
+            scenario1, scenario2 = ScenarioGenerator.generate_contrasting_scenarios(
+                st.session_state.difficulty)
+            st.session_state.current_risks = None
         st.session_state.current_scenarios = (scenario1, scenario2)
     
     scenario1, scenario2 = st.session_state.current_scenarios
@@ -253,7 +297,9 @@ else:
         
         if st.button("🎯 Seleccionar Camino A", key="btn_a", type="primary", use_container_width=True):
             # Make prediction
-            risk1, risk2, higher_risk = predictor.compare_scenarios(scenario1, scenario2)
+            comparison = resolve_round(scenario1, scenario2)
+            risk1, risk2 = comparison['risk1'], comparison['risk2']
+            higher_risk = comparison['higher_risk_index']
             user_choice = 0  # User chose scenario A
             correct = (user_choice == higher_risk)
             
@@ -278,7 +324,8 @@ else:
                 'message': message,
                 'risk1': risk1,
                 'risk2': risk2,
-                'higher_risk': higher_risk
+                'higher_risk': higher_risk,
+                'top_features': comparison['top_features']
             }
             st.session_state.show_result = True
             st.rerun()
@@ -293,7 +340,9 @@ else:
         
         if st.button("🎯 Seleccionar Camino B", key="btn_b", type="primary", use_container_width=True):
             # Make prediction
-            risk1, risk2, higher_risk = predictor.compare_scenarios(scenario1, scenario2)
+            comparison = resolve_round(scenario1, scenario2)
+            risk1, risk2 = comparison['risk1'], comparison['risk2']
+            higher_risk = comparison['higher_risk_index']
             user_choice = 1  # User chose scenario B
             correct = (user_choice == higher_risk)
             
@@ -318,7 +367,8 @@ else:
                 'message': message,
                 'risk1': risk1,
                 'risk2': risk2,
-                'higher_risk': higher_risk
+                'higher_risk': higher_risk,
+                'top_features': comparison['top_features']
             }
             st.session_state.show_result = True
             st.rerun()
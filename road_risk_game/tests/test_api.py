@@ -0,0 +1,277 @@
+"""
+Tests for the prediction API
+"""
+import asyncio
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+from fastapi.testclient import TestClient
+
+from api import main
+from utils.columnar import MEDIA_MSGPACK, encode_columns
+from utils.model_bundle import load_bundle
+from utils.model_pool import PooledModel
+from utils.segment_store import build_segment_store
+
+SCENARIO = {
+    'road_type': 'urban', 'num_lanes': 2, 'curvature': 0.3, 'speed_limit': 45,
+    'lighting': 'daylight', 'weather': 'clear', 'road_signs_present': True,
+    'public_road': True, 'time_of_day': 'morning', 'holiday': False,
+    'school_season': True, 'num_reported_accidents': 1,
+}
+
+
+class ConstantModel:
+    """Model predicting 0.25 for every row"""
+
+    def predict(self, X):
+        return np.full(len(X), 0.25)
+
+
+@pytest.fixture
+def settings(tmp_path, monkeypatch):
+    """Point the API's writable directories at a temporary directory"""
+    monkeypatch.setattr(main, 'JOBS_DIR', str(tmp_path / "jobs"))
+    monkeypatch.setattr(main, 'PREDICTION_LOG_DIR', str(tmp_path / "prediction_logs"))
+    monkeypatch.setattr(main, 'SEGMENT_STORE_DIR', str(tmp_path / "segments"))
+    monkeypatch.setattr(main, 'SIMILAR_ROADS_DIR', str(tmp_path / "similar_roads"))
+    monkeypatch.setattr(main, 'SHADOW_BUNDLE_PATH', None)
+    monkeypatch.setattr(main, 'EXPERIMENTAL_BUNDLE_PATH', None)
+    return monkeypatch
+
+
+@pytest.fixture
+def client(settings):
+    """Started API with the shipped model"""
+    with TestClient(main.app) as client:
+        yield client
+
+
+class TestUnknownCategories:
+    """Test the unseen category policy"""
+
+    def test_error_policy(self, client):
+        """Test an unseen road type is a 422, counted against the model"""
+        response = client.post('/predict', json=dict(SCENARIO, road_type='motorway'))
+
+        assert response.status_code == 422
+        assert 'motorway' in response.json()['detail']
+        assert client.get('/models').json()['models']['gbr']['errors'] == 1
+
+    def test_nan_policy_refused_for_shipped_model(self, settings):
+        """Test 'nan' fails at startup when the model rejects missing values"""
+        settings.setattr(main, 'UNKNOWN_CATEGORY_POLICY', 'nan')
+
+        with pytest.raises(ValueError, match="missing values"):
+            with TestClient(main.app):
+                pass
+
+
+class TestExplain:
+    """Test explanations on /predict"""
+
+    def test_top_k(self, client):
+        """Test top_k features are returned and top_k below 1 is a 422"""
+        response = client.post('/predict?explain=true&top_k=2', json=SCENARIO)
+
+        assert len(response.json()['top_features']) == 2
+        for top_k in (0, -2):
+            response = client.post(f'/predict?explain=true&top_k={top_k}', json=SCENARIO)
+            assert response.status_code == 422
+
+
+class TestSensitivity:
+    """Test what-if sweeps"""
+
+    def test_surface(self, client):
+        """Test one risk per combination, with values coerced to the field types"""
+        response = client.post('/sensitivity', json={
+            'scenario': SCENARIO, 'sweeps': {'curvature': [0.1, 0.9], 'num_lanes': ["1", 2, 3]}})
+
+        assert response.status_code == 200
+        body = response.json()
+        assert body['values'] == [[0.1, 0.9], [1, 2, 3]]
+        assert len(body['risks']) == 2 and len(body['risks'][0]) == 3
+
+    def test_routed_through_pool(self, client):
+        """Test the X-Model header picks the model, which is named and counted"""
+        gbr = main.model_pool['gbr']
+        main.model_pool.add(PooledModel('constant', ConstantModel(), gbr.encoder))
+        body = {'scenario': SCENARIO, 'sweeps': {'curvature': [0.1, 0.5, 0.9]}}
+
+        response = client.post('/sensitivity', json=body, headers={'X-Model': 'constant'})
+
+        assert response.status_code == 200
+        assert response.headers['X-Model'] == response.json()['model'] == 'constant'
+        assert response.json()['risks'] == [0.25, 0.25, 0.25]
+        assert client.get('/models').json()['models']['constant']['rows'] == 4
+        unknown = client.post('/sensitivity', json=body, headers={'X-Model': 'xgboost'})
+        assert unknown.status_code == 400
+
+    @pytest.mark.parametrize('sweeps', [
+        {'curvature': ['abc']},
+        {'num_lanes': [{'a': 1}]},
+        {'weather': [3]},
+        {'altitude': [100]},
+        {},
+    ])
+    def test_bad_values(self, client, sweeps):
+        """Test values of the wrong type and unknown features are 422s"""
+        response = client.post('/sensitivity', json={'scenario': SCENARIO, 'sweeps': sweeps})
+
+        assert response.status_code == 422
+
+
+class TestPredictBatch:
+    """Test batch scoring"""
+
+    def test_json_batch(self, client):
+        """Test one risk per scenario, in order"""
+        scenarios = [SCENARIO, dict(SCENARIO, curvature=0.9)]
+
+        response = client.post('/predict_batch', json={'scenarios': scenarios})
+
+        assert response.status_code == 200
+        assert response.json()['count'] == 2
+
+    def test_empty_batch(self, client):
+        """Test an empty batch is answered with no risks and no model error"""
+        response = client.post('/predict_batch', json={'scenarios': []})
+
+        assert response.status_code == 200
+        assert response.json()['count'] == 0
+        assert client.get('/models').json()['models']['gbr']['errors'] == 0
+
+    def test_runs_off_the_event_loop(self):
+        """Test the handler is synchronous, so FastAPI runs it in the thread pool"""
+        assert not asyncio.iscoroutinefunction(main.predict_batch)
+
+    def test_row_limit(self, settings, client):
+        """Test JSON and binary batches over MAX_BATCH_ROWS are 413s"""
+        settings.setattr(main, 'MAX_BATCH_ROWS', 2)
+        columns = {col: np.repeat(np.asarray([value]), 3) for col, value in SCENARIO.items()}
+
+        json_response = client.post('/predict_batch', json={'scenarios': [SCENARIO] * 3})
+        binary_response = client.post('/predict_batch',
+                                      content=encode_columns(columns, MEDIA_MSGPACK),
+                                      headers={'content-type': MEDIA_MSGPACK})
+
+        assert json_response.status_code == binary_response.status_code == 413
+        assert client.post('/predict_batch', json={'scenarios': [SCENARIO] * 2}).status_code == 200
+
+
+class TestUploadJob:
+    """Test uploading files for bulk scoring"""
+
+    def uploads(self):
+        """Files left in the upload directory"""
+        directory = os.path.join(main.JOBS_DIR, "uploads")
+        return os.listdir(directory) if os.path.isdir(directory) else []
+
+    def test_upload_queues_job(self, client):
+        """Test an upload is stored and queued"""
+        csv = "road_type,num_lanes\nurban,2\n"
+
+        response = client.post('/jobs/upload?format=csv', content=csv)
+
+        assert response.status_code == 202
+        assert len(self.uploads()) == 1
+
+    def test_too_large(self, settings, client):
+        """Test uploads over MAX_UPLOAD_BYTES are 413s and not kept"""
+        settings.setattr(main, 'MAX_UPLOAD_BYTES', 10)
+
+        declared = client.post('/jobs/upload', content=b"x" * 11)
+        streamed = client.post('/jobs/upload', content=iter([b"x" * 6, b"x" * 6]))
+
+        assert declared.status_code == streamed.status_code == 413
+        assert self.uploads() == []
+
+    def test_malformed_content_length(self, client):
+        """Test an unparseable Content-Length is a 400"""
+        response = client.post('/jobs/upload', content=b"road_type\nurban\n",
+                               headers={'content-length': 'lots'})
+
+        assert response.status_code == 400
+        assert self.uploads() == []
+
+    def test_rejected_job_removes_file(self, client):
+        """Test a job refused at submission leaves no file behind"""
+        response = client.post('/jobs/upload?chunk_rows=0', content=b"road_type\nurban\n")
+
+        assert response.status_code == 422
+        assert self.uploads() == []
+
+
+class RecordingLog:
+    """Prediction log that notes whether each call ran on the event loop"""
+
+    def __init__(self):
+        self.on_loop = []
+
+    def _record(self):
+        try:
+            asyncio.get_running_loop()
+            self.on_loop.append(True)
+        except RuntimeError:
+            self.on_loop.append(False)
+
+    def log(self, record):
+        self._record()
+
+    def log_batch(self, *args):
+        self._record()
+
+    def close(self):
+        pass
+
+
+class TestPredictionLog:
+    """Test prediction logging stays off the event loop"""
+
+    def test_logged_off_loop(self, settings, client):
+        """Test /predict and /predict_batch log from worker threads"""
+        log = RecordingLog()
+        settings.setattr(main, 'prediction_log', log)
+
+        assert client.post('/predict', json=SCENARIO).status_code == 200
+        assert client.post('/predict_batch', json={'scenarios': [SCENARIO]}).status_code == 200
+
+        assert log.on_loop == [False, False]
+
+
+class TestPredictSegments:
+    """Test scoring stored segments"""
+
+    def test_unknown_condition_counted_as_error(self, settings, tmp_path):
+        """Test an unseen weather value is a 422 counted against the model"""
+        bundle = load_bundle(main.BUNDLE_PATH)
+        segments = pd.DataFrame([dict(SCENARIO, segment_id='road-1')])
+        build_segment_store(segments, main.SEGMENT_STORE_DIR, bundle['vocabularies'],
+                            bundle['feature_names'])
+        request = {'segment_ids': ['road-1'], 'lighting': 'daylight', 'time_of_day': 'morning',
+                   'holiday': False, 'school_season': True}
+
+        with TestClient(main.app) as client:
+            ok = client.post('/predict_segments', json=dict(request, weather='clear'))
+            bad = client.post('/predict_segments', json=dict(request, weather='snowy'))
+            stats = client.get('/models').json()['models']['gbr']
+
+        assert ok.status_code == 200
+        assert bad.status_code == 422
+        assert (stats['requests'], stats['errors']) == (1, 1)
+
+
+class TestPredictRoutes:
+    """Test scoring whole routes"""
+
+    def test_unknown_category_counted_as_error(self, client):
+        """Test an unseen road type is a 422 counted against the model"""
+        routes = {'routes': [[SCENARIO, dict(SCENARIO, road_type='motorway')]]}
+
+        response = client.post('/predict_routes', json=routes)
+
+        assert response.status_code == 422
+        assert client.get('/models').json()['models']['gbr']['errors'] == 1
@@ -0,0 +1,98 @@
+"""
+Tests for duplicate-collapsing batch scoring
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.batch_scoring import (
+    dedup_predict,
+    main,
+    quantize_curvature,
+    score_scenarios,
+    unique_rows,
+)
+from utils.game_logic import ScenarioGenerator
+from utils.model_utils import RiskPredictor
+
+
+@pytest.fixture(scope="module")
+def predictor():
+    """Create predictor instance"""
+    return RiskPredictor(models_dir="models")
+
+
+@pytest.fixture
+def scenarios():
+    """Generated scenarios with every row repeated three times"""
+    frame = ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(300, seed=11))
+    return pd.concat([frame] * 3, ignore_index=True).sample(frac=1.0, random_state=0)
+
+
+class TestBatchScoring:
+    """Test grouping, scattering and quantization"""
+
+    def test_unique_rows_reconstructs_matrix(self):
+        """Test first rows and group ids rebuild the input"""
+        X = pd.DataFrame({'a': [1, 2, 1, 1, 2], 'b': [0.5, 0.5, 0.5, 0.7, 0.5]})
+
+        first, groups = unique_rows(X)
+
+        assert first.tolist() == [0, 1, 3]
+        assert groups.tolist() == [0, 1, 0, 2, 1]
+        assert np.array_equal(X.to_numpy()[first][groups], X.to_numpy())
+
+    def test_identical_to_full_scoring(self, predictor, scenarios):
+        """Test dedup output matches scoring every row"""
+        risks, stats = score_scenarios(predictor, scenarios)
+
+        assert np.array_equal(risks, predictor.predict_batch(scenarios))
+        assert stats['rows'] == 900
+        assert stats['unique_rows'] == 300
+        assert stats['dedup_ratio'] == pytest.approx(3.0)
+        assert stats['curvature_max_error'] == 0.0
+
+    def test_dedup_predict_calls_model_on_unique_rows(self, predictor, scenarios):
+        """Test the model only sees one row per group"""
+        seen = []
+
+        class CountingModel:
+            def predict(self, X):
+                seen.append(len(X))
+                return predictor.model.predict(X)
+
+        dedup_predict(CountingModel(), predictor.preprocess_batch(scenarios))
+
+        assert seen == [300]
+
+    def test_quantize_curvature(self):
+        """Test lossless rounding reports no error and lossy rounding does"""
+        data = pd.DataFrame({'curvature': [0.12, 0.5, 0.87]})
+
+        lossless, error = quantize_curvature(data, 2)
+        assert error == 0.0
+        assert lossless['curvature'].tolist() == [0.12, 0.5, 0.87]
+
+        lossy, error = quantize_curvature(data, 1)
+        assert error == pytest.approx(0.03)
+        assert lossy['curvature'].tolist() == [0.1, 0.5, 0.9]
+        assert data['curvature'].tolist() == [0.12, 0.5, 0.87]
+
+    def test_empty_batch(self, predictor, scenarios):
+        """Test an empty frame scores to an empty array"""
+        risks, stats = score_scenarios(predictor, scenarios.iloc[:0])
+
+        assert len(risks) == 0
+        assert stats['unique_rows'] == 0
+
+    def test_cli_writes_predictions(self, predictor, scenarios, tmp_path):
+        """Test the CLI keeps ids and row order"""
+        data = scenarios.reset_index(drop=True)
+        data.insert(0, 'id', np.arange(len(data)) + 1000)
+        data.to_csv(tmp_path / "test.csv", index=False)
+
+        main([str(tmp_path / "test.csv"), str(tmp_path / "out.csv"), '--models-dir', 'models'])
+
+        output = pd.read_csv(tmp_path / "out.csv")
+        assert output['id'].tolist() == data['id'].tolist()
+        assert np.allclose(output['accident_risk'], predictor.predict_batch(data))
@@ -0,0 +1,75 @@
+"""
+Tests for the staged n_estimators search
+"""
+import numpy as np
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.metrics import r2_score
+from sklearn.model_selection import GridSearchCV, KFold
+
+from utils.boosting_search import StagedBoostingSearch, _validation_curve
+
+
+@pytest.fixture(scope="module")
+def data():
+    """Small noisy regression problem"""
+    rng = np.random.default_rng(0)
+    X = rng.uniform(size=(600, 4))
+    y = X[:, 0] * 2 + np.sin(6 * X[:, 1]) + rng.normal(0, 0.1, 600)
+    return X, y
+
+
+class TestStagedBoostingSearch:
+    """Test prefix scoring, early stopping and equivalence with GridSearchCV"""
+
+    def test_curve_matches_staged_predict(self, data):
+        """Test the accumulated curve equals staged_predict scores"""
+        X, y = data
+        train_idx, val_idx = np.arange(450), np.arange(450, 600)
+        estimator = GradientBoostingRegressor(max_depth=2, random_state=0)
+
+        curve = _validation_curve(estimator, {'n_estimators': 30}, X, y,
+                                  train_idx, val_idx, patience=None, tol=0.0)
+
+        model = GradientBoostingRegressor(max_depth=2, n_estimators=30, random_state=0)
+        model.fit(X[train_idx], y[train_idx])
+        expected = [r2_score(y[val_idx], pred) for pred in model.staged_predict(X[val_idx])]
+        assert np.allclose(curve, expected)
+
+    def test_scores_match_grid_search(self, data):
+        """Test grid n_estimators values score as GridSearchCV scores them"""
+        X, y = data
+        grid = {'n_estimators': [10, 20], 'max_depth': [2, 3]}
+
+        search = StagedBoostingSearch(GradientBoostingRegressor(random_state=0), grid,
+                                      cv=3).fit(X, y)
+        reference = GridSearchCV(GradientBoostingRegressor(random_state=0), grid,
+                                 cv=KFold(3), scoring='r2').fit(X, y)
+
+        scores = reference.cv_results_['mean_test_score']
+        assert np.allclose(search.score_at(10), scores[0::2])
+        assert np.allclose(search.score_at(20), scores[1::2])
+        assert search.best_score_ >= scores.max() - 1e-12
+
+    def test_best_count_refit(self, data):
+        """Test the refit model uses the selected tree count"""
+        X, y = data
+        grid = {'n_estimators': [40], 'learning_rate': [0.3]}
+
+        search = StagedBoostingSearch(GradientBoostingRegressor(random_state=0), grid,
+                                      cv=3).fit(X, y)
+
+        best = search.best_params_['n_estimators']
+        assert 1 <= best <= 40
+        assert search.best_estimator_.n_estimators_ == best
+
+    def test_early_stopping(self, data):
+        """Test fits stop once validation loss plateaus"""
+        X, y = data
+
+        search = StagedBoostingSearch(GradientBoostingRegressor(random_state=0),
+                                      {'n_estimators': [500], 'learning_rate': [0.5]},
+                                      cv=3, patience=5, refit=False).fit(X, y)
+
+        assert search.cv_results_[0]['stages_fitted'] < 500
+        assert not hasattr(search, 'best_estimator_')
@@ -0,0 +1,140 @@
+"""
+Tests for columnar request and response payloads
+"""
+import numpy as np
+import pytest
+
+from utils.columnar import (
+    MEDIA_ARROW,
+    MEDIA_JSON,
+    MEDIA_MSGPACK,
+    MEDIA_NPY,
+    ColumnValidationError,
+    UnsupportedMediaTypeError,
+    decode_columns,
+    encode_columns,
+    media_type,
+    negotiate,
+    validate_columns,
+)
+from utils.game_logic import ScenarioGenerator
+
+VOCABULARIES = {
+    'road_type': ['highway', 'rural', 'urban'],
+    'lighting': ['daylight', 'dim', 'night'],
+    'weather': ['clear', 'foggy', 'rainy'],
+    'time_of_day': ['afternoon', 'evening', 'morning'],
+}
+
+
+@pytest.fixture
+def columns():
+    """Raw scenario columns with string categories"""
+    batch = ScenarioGenerator.generate_batch(50, seed=2)
+    for col, categories in ScenarioGenerator.BATCH_CATEGORIES.items():
+        batch[col] = np.asarray(categories)[batch[col]]
+    return batch
+
+
+class TestNegotiation:
+    """Test media type parsing and Accept negotiation"""
+
+    def test_media_type_strips_parameters(self):
+        """Test parameters and case are ignored"""
+        assert media_type('Application/X-NPY; charset=binary') == MEDIA_NPY
+        assert media_type(None) == MEDIA_JSON
+
+    def test_negotiate_prefers_quality(self):
+        """Test the highest q-value available type wins"""
+        assert negotiate(f"{MEDIA_JSON};q=0.5, {MEDIA_NPY}") == MEDIA_NPY
+        assert negotiate("*/*") == MEDIA_JSON
+        assert negotiate(None) == MEDIA_JSON
+
+    def test_negotiate_rejects_unavailable(self):
+        """Test an Accept header with nothing usable raises"""
+        with pytest.raises(UnsupportedMediaTypeError):
+            negotiate("text/csv")
+
+
+class TestCodecs:
+    """Test binary round trips"""
+
+    @pytest.mark.parametrize("content_type", [MEDIA_NPY, MEDIA_ARROW, MEDIA_MSGPACK])
+    def test_round_trip(self, columns, content_type):
+        """Test every format decodes to the columns it encoded"""
+        if content_type == MEDIA_ARROW:
+            pytest.importorskip("pyarrow")
+        if content_type == MEDIA_MSGPACK:
+            pytest.importorskip("msgpack")
+
+        decoded = decode_columns(encode_columns(columns, content_type), content_type)
+
+        assert set(decoded) == set(columns)
+        for col, values in columns.items():
+            assert decoded[col].tolist() == values.tolist()
+
+    def test_unstructured_npy_rejected(self):
+        """Test a plain npy array is not accepted as a batch"""
+        import io
+        buffer = io.BytesIO()
+        np.save(buffer, np.zeros(3))
+
+        with pytest.raises(ColumnValidationError):
+            decode_columns(buffer.getvalue(), MEDIA_NPY)
+
+    def test_unknown_content_type(self):
+        """Test an unknown format raises"""
+        with pytest.raises(UnsupportedMediaTypeError):
+            decode_columns(b"", "text/csv")
+
+
+class TestValidation:
+    """Test whole-column validation"""
+
+    def test_valid_batch(self, columns):
+        """Test a generated batch passes and keeps its length"""
+        validated = validate_columns(columns, VOCABULARIES)
+
+        assert all(len(values) == 50 for values in validated.values())
+        assert validated['holiday'].dtype == bool
+
+    def test_missing_column(self, columns):
+        """Test a missing column is reported"""
+        del columns['weather']
+
+        with pytest.raises(ColumnValidationError, match="weather"):
+            validate_columns(columns)
+
+    def test_out_of_range(self, columns):
+        """Test range violations name the rows"""
+        columns['curvature'] = columns['curvature'].copy()
+        columns['curvature'][7] = 1.5
+
+        with pytest.raises(ColumnValidationError, match="rows 7"):
+            validate_columns(columns)
+
+    def test_unknown_category(self, columns):
+        """Test values outside the vocabulary are rejected"""
+        columns['weather'] = columns['weather'].astype(object)
+        columns['weather'][3] = 'snowy'
+
+        with pytest.raises(ColumnValidationError, match="snowy"):
+            validate_columns(columns, VOCABULARIES)
+
+    def test_integer_booleans_and_floats(self, columns):
+        """Test 0/1 flags and whole-number floats are normalized"""
+        columns['holiday'] = columns['holiday'].astype(np.int8)
+        columns['num_lanes'] = columns['num_lanes'].astype(float)
+
+        validated = validate_columns(columns)
+
+        assert validated['holiday'].dtype == bool
+        assert validated['num_lanes'].dtype == np.int64
+
+    def test_fractional_integer_column(self, columns):
+        """Test a fractional lane count is rejected"""
+        columns['num_lanes'] = columns['num_lanes'].astype(float)
+        columns['num_lanes'][0] = 2.5
+
+        with pytest.raises(ColumnValidationError, match="num_lanes"):
+            validate_columns(columns)
@@ -0,0 +1,116 @@
+"""
+Tests for model compaction
+"""
+import numpy as np
+import pytest
+from pathlib import Path
+from sklearn.tree import DecisionTreeRegressor
+
+from utils.compact_model import (
+    CompactTreeEnsemble,
+    CompactionRejectedError,
+    _float32_floor,
+    compact_bundle,
+)
+from utils.features import FeatureEncoder
+from utils.game_logic import ScenarioGenerator
+from utils.model_bundle import bundle_from_legacy, load_bundle, save_bundle
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+
+
+@pytest.fixture(scope="module")
+def legacy():
+    """Production model, vocabularies and feature names"""
+    return bundle_from_legacy(MODELS_DIR)
+
+
+@pytest.fixture(scope="module")
+def X_check(legacy):
+    """Encoded generated scenarios"""
+    encoder = FeatureEncoder(legacy['vocabularies'], legacy['feature_names'])
+    return encoder.transform(ScenarioGenerator.generate_batch(5000, seed=11),
+                             categories=ScenarioGenerator.BATCH_CATEGORIES)
+
+
+@pytest.fixture
+def source_bundle(legacy, tmp_path):
+    """Full model bundle on disk"""
+    path = tmp_path / "bundle.joblib"
+    save_bundle(path, legacy['model'], legacy['vocabularies'], legacy['feature_names'])
+    return path
+
+
+class TestCompactTreeEnsemble:
+    """Test the compacted model against the original"""
+
+    def test_lossless_without_merging(self, legacy, X_check):
+        """Test float32 storage alone keeps predictions to float32 precision"""
+        compact = CompactTreeEnsemble(legacy['model'])
+
+        assert np.abs(compact.predict(X_check) - legacy['model'].predict(X_check)).max() < 1e-6
+        assert compact.threshold.dtype == compact.value.dtype == np.float32
+
+    def test_merging_bounded(self, legacy, X_check):
+        """Test merged leaves shift each tree by at most depth * tolerance"""
+        model = legacy['model']
+        compact = CompactTreeEnsemble(model, tolerance=1e-4)
+
+        deviation = np.abs(compact.predict(X_check) - model.predict(X_check)).max()
+
+        assert compact.n_leaves < sum(e.tree_.n_leaves for e in model.estimators_[:, 0])
+        assert deviation <= len(model.estimators_) * compact.depth * 1e-4
+
+    def test_missing_values_follow_sklearn_trees(self, legacy, X_check):
+        """Test NaN inputs take each split's missing-value branch as sklearn trees do"""
+        model = legacy['model']
+        X = np.ascontiguousarray(X_check, dtype=np.float32)
+        X[::3, 2] = np.nan
+        X[::5, 3] = np.nan
+
+        # GradientBoostingRegressor.predict rejects NaN, so sum the raw trees
+        expected = model.init_.constant_[0, 0] + model.learning_rate * sum(
+            e.tree_.value[e.tree_.apply(X), 0, 0] for e in model.estimators_[:, 0])
+
+        assert np.allclose(CompactTreeEnsemble(model).predict(X), expected, atol=1e-6)
+
+    def test_float32_floor(self):
+        """Test rounded thresholds never move above the original"""
+        values = np.array([0.1, 0.35000000000000003, 60.5, -2.2])
+
+        floored = _float32_floor(values)
+
+        assert (floored.astype(np.float64) <= values).all()
+        assert (np.nextafter(floored, np.float32(np.inf)).astype(np.float64) > values).all()
+
+    def test_unsupported_model(self):
+        """Test non-boosted models are rejected"""
+        tree = DecisionTreeRegressor().fit([[0], [1]], [0, 1])
+        with pytest.raises(ValueError):
+            CompactTreeEnsemble(tree)
+
+
+class TestCompactBundle:
+    """Test the deviation gate and the written artifact"""
+
+    def test_writes_smaller_bundle(self, source_bundle, X_check, tmp_path):
+        """Test an accepted compaction is smaller and loads as a bundle"""
+        output = tmp_path / "compact.joblib"
+
+        report = compact_bundle(source_bundle, output, X_check, tolerance=0.0)
+        bundle = load_bundle(output)
+
+        assert report['compact_bytes'] < report['original_bytes']
+        assert report['max_deviation'] < 1e-6
+        assert bundle['metadata']['compaction_tolerance'] == 0.0
+        assert np.allclose(bundle['model'].predict(X_check),
+                           load_bundle(source_bundle)['model'].predict(X_check))
+
+    def test_gate_rejects_large_deviation(self, source_bundle, X_check, tmp_path):
+        """Test nothing is written when the deviation exceeds the bound"""
+        output = tmp_path / "compact.joblib"
+
+        with pytest.raises(CompactionRejectedError):
+            compact_bundle(source_bundle, output, X_check, tolerance=1e-2,
+                           max_allowed_deviation=1e-4)
+        assert not output.exists()
@@ -0,0 +1,143 @@
+"""
+Tests for feature drift monitoring
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from utils.drift import (
+    DriftMonitor,
+    _bin,
+    build_reference,
+    default_layout,
+    load_reference,
+    psi,
+    save_reference,
+)
+from utils.game_logic import ScenarioGenerator
+
+VOCABULARIES = {
+    'road_type': ['highway', 'rural', 'urban'],
+    'lighting': ['daylight', 'dim', 'night'],
+    'weather': ['clear', 'foggy', 'rainy'],
+    'road_signs_present': [False, True],
+    'public_road': [False, True],
+    'time_of_day': ['afternoon', 'evening', 'morning'],
+    'holiday': [False, True],
+    'school_season': [False, True],
+}
+
+
+@pytest.fixture(scope="module")
+def scenarios():
+    """2000 generated raw scenarios"""
+    return ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(2000, seed=8))
+
+
+@pytest.fixture(scope="module")
+def reference(scenarios):
+    """Reference sketch of the generated scenarios"""
+    return build_reference(scenarios, VOCABULARIES)
+
+
+class TestSketches:
+    """Test binning and counting"""
+
+    def test_bin_edges(self):
+        """Test underflow, inner bins, the closed last bin and overflow"""
+        edges = [0.0, 0.5, 1.0]
+
+        assert [_bin(edges, v) for v in (-0.1, 0.0, 0.5, 1.0, 1.2)] == [0, 1, 2, 2, 3]
+
+    def test_single_and_batch_updates_agree(self, scenarios, reference):
+        """Test per-scenario and per-frame recording give the same counts"""
+        monitor = DriftMonitor(default_layout(VOCABULARIES))
+        for record in scenarios.to_dict('records'):
+            monitor.observe(record)
+
+        assert monitor.snapshot() == reference
+
+    def test_unknown_category_counted_as_other(self):
+        """Test values outside the vocabulary land in the other slot"""
+        monitor = DriftMonitor(default_layout(VOCABULARIES))
+        monitor.observe({'road_type': 'motorway', 'curvature': 0.5})
+
+        counts = monitor.snapshot()['counts']
+        assert counts['road_type'] == [0, 0, 0, 1]
+        assert sum(counts['speed_limit']) == 0
+
+    def test_threads_count_into_own_shards(self):
+        """Test concurrent updates from many threads are all counted"""
+        monitor = DriftMonitor(default_layout(VOCABULARIES))
+        scenario = {'road_type': 'urban', 'curvature': 0.2}
+
+        def work():
+            for _ in range(1000):
+                monitor.observe(scenario)
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        snapshot = monitor.snapshot()
+        assert snapshot['rows'] == 8000
+        assert snapshot['counts']['road_type'][2] == 8000
+
+    def test_reset(self, scenarios):
+        """Test a reset starts a new window"""
+        monitor = DriftMonitor(default_layout(VOCABULARIES))
+        monitor.observe_frame(scenarios)
+        monitor.reset()
+        monitor.observe(scenarios.iloc[0].to_dict())
+
+        assert monitor.snapshot()['rows'] == 1
+
+
+class TestDriftReport:
+    """Test PSI/KL reports against a reference"""
+
+    def test_same_distribution_is_stable(self, scenarios, reference):
+        """Test traffic like the training data shows no drift"""
+        monitor = DriftMonitor.from_reference(reference, min_rows=100)
+        monitor.observe_frame(scenarios.iloc[:1000])
+
+        report = monitor.report()
+
+        assert report['status'] == 'ok'
+        assert all(feature['drift'] == 'none' for feature in report['features'].values())
+
+    def test_shift_detected(self, scenarios, reference):
+        """Test a shifted feature is flagged"""
+        shifted = scenarios.copy()
+        shifted['weather'] = 'foggy'
+        monitor = DriftMonitor.from_reference(reference, min_rows=100)
+        monitor.observe_frame(shifted)
+
+        features = monitor.report()['features']
+
+        assert features['weather']['drift'] == 'significant'
+        assert features['weather']['kl'] > 0
+        assert features['road_type']['drift'] == 'none'
+
+    def test_insufficient_data(self, reference):
+        """Test drift is not scored on too few rows"""
+        monitor = DriftMonitor.from_reference(reference, min_rows=100)
+
+        report = monitor.report()
+
+        assert report['status'] == 'insufficient_data'
+        assert 'psi' not in report['features']['curvature']
+
+    def test_psi_zero_for_identical(self):
+        """Test identical histograms have zero PSI"""
+        assert psi(np.array([10, 20, 30]), np.array([1, 2, 3])) == pytest.approx(0.0)
+
+    def test_reference_round_trip(self, reference, tmp_path):
+        """Test references survive JSON"""
+        path = tmp_path / "drift_reference.json"
+        save_reference(path, reference)
+
+        assert load_reference(path) == reference
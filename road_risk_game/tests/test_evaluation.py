@@ -0,0 +1,109 @@
+"""
+Tests for one-pass model evaluation
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
+from utils.evaluation import ModelEvaluator, bootstrap_ci, regression_metrics, segment_metrics
+
+
+@pytest.fixture(scope="module")
+def predictions():
+    """Targets, noisy predictions and three segment codes"""
+    rng = np.random.default_rng(0)
+    y_true = rng.uniform(0, 1, 3000)
+    y_pred = y_true + rng.normal(0, 0.1, 3000)
+    codes = rng.integers(0, 3, 3000)
+    return y_true, y_pred, codes
+
+
+class TestRegressionMetrics:
+    """Test the one-pass metrics"""
+
+    def test_matches_sklearn(self, predictions):
+        """Test MAE, RMSE and R² equal the sklearn functions"""
+        y_true, y_pred, _ = predictions
+
+        metrics = regression_metrics(y_true, y_pred)
+
+        assert metrics['mae'] == pytest.approx(mean_absolute_error(y_true, y_pred))
+        assert metrics['rmse'] == pytest.approx(np.sqrt(mean_squared_error(y_true, y_pred)))
+        assert metrics['r2'] == pytest.approx(r2_score(y_true, y_pred))
+
+    def test_constant_target(self):
+        """Test R² is undefined without target variance"""
+        assert np.isnan(regression_metrics([0.5, 0.5], [0.4, 0.6])['r2'])
+
+
+class TestSegmentMetrics:
+    """Test per-segment breakdowns"""
+
+    def test_matches_grouped_metrics(self, predictions):
+        """Test each segment equals metrics on its own rows"""
+        y_true, y_pred, codes = predictions
+
+        frame = segment_metrics(y_true, y_pred, codes, labels=['rural', 'urban', 'highway'])
+
+        assert list(frame.index) == ['rural', 'urban', 'highway']
+        for code, label in enumerate(frame.index):
+            rows = codes == code
+            assert frame.loc[label, 'count'] == rows.sum()
+            assert frame.loc[label, 'mean_risk'] == pytest.approx(y_true[rows].mean())
+            assert frame.loc[label, 'r2'] == pytest.approx(r2_score(y_true[rows], y_pred[rows]))
+
+    def test_empty_segments_dropped(self):
+        """Test codes without rows are left out"""
+        frame = segment_metrics([0.1, 0.2, 0.3], [0.1, 0.2, 0.3], [0, 2, 2])
+
+        assert list(frame.index) == [0, 2]
+
+    def test_code_without_label(self):
+        """Test codes beyond the label list are rejected"""
+        with pytest.raises(ValueError):
+            segment_metrics([0.1, 0.2], [0.1, 0.2], [0, 2], labels=['a', 'b'])
+
+
+class TestBootstrap:
+    """Test vectorized bootstrap intervals"""
+
+    def test_interval_contains_estimate(self, predictions):
+        """Test each interval brackets the point estimate"""
+        y_true, y_pred, _ = predictions
+        metrics = regression_metrics(y_true, y_pred)
+
+        intervals = bootstrap_ci(y_true, y_pred, n_bootstrap=300, seed=1)
+
+        for name, (low, high) in intervals.items():
+            assert low < metrics[name] < high
+
+    def test_reproducible(self, predictions):
+        """Test a fixed seed gives the same intervals"""
+        y_true, y_pred, _ = predictions
+
+        assert bootstrap_ci(y_true, y_pred, 50, seed=3) == bootstrap_ci(y_true, y_pred, 50, seed=3)
+
+
+class TestModelEvaluator:
+    """Test evaluating fitted models"""
+
+    def test_sampled_train_metrics(self):
+        """Test train metrics come from the sample and test metrics from every row"""
+        rng = np.random.default_rng(2)
+        X = pd.DataFrame({'a': rng.uniform(size=1000), 'road_type': rng.integers(0, 3, 1000)})
+        y = 2 * X['a'] + rng.normal(0, 0.1, 1000)
+        model = LinearRegression().fit(X[:800], y[:800])
+
+        report = ModelEvaluator(train_sample=100, n_bootstrap=20).evaluate(
+            model, X[:800], y[:800], X[800:], y[800:], segments=X[800:][['road_type']])
+
+        assert report['train_rows'] == 100
+        assert report['test']['r2'] == pytest.approx(r2_score(y[800:], model.predict(X[800:])))
+        assert set(report['test_ci']) == {'mae', 'rmse', 'r2'}
+        assert report['segments']['road_type']['count'].sum() == 200
+
+    def test_sample_covers_small_sets(self):
+        """Test every row is used when the set is smaller than the sample"""
+        assert len(ModelEvaluator(train_sample=500).sample_rows(300)) == 300
@@ -0,0 +1,104 @@
+"""
+Tests for tree-path prediction explanations
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.explain import TreePathExplainer
+from utils.game_logic import ScenarioGenerator
+from utils.model_utils import RiskPredictor
+
+
+@pytest.fixture(scope="module")
+def predictor():
+    """Create predictor instance"""
+    return RiskPredictor(models_dir="models")
+
+
+@pytest.fixture(scope="module")
+def scenarios():
+    """Random batch of scenarios"""
+    return [ScenarioGenerator.generate_scenario() for _ in range(300)]
+
+
+class TestTreePathExplainer:
+    """Test exactness and shape of contributions"""
+
+    def test_contributions_sum_to_prediction(self, predictor, scenarios):
+        """Test bias plus contributions reproduces the model prediction"""
+        X = predictor.preprocess_batch(scenarios)
+
+        contributions = predictor.explainer.contributions(X)
+
+        assert contributions.shape == (len(scenarios), len(predictor.feature_names))
+        np.testing.assert_allclose(predictor.explainer.bias + contributions.sum(axis=1),
+                                   predictor.model.predict(X), atol=1e-10)
+
+    def test_top_features_sorted_by_magnitude(self, predictor, scenarios):
+        """Test top features are the largest absolute contributions"""
+        X = predictor.preprocess_batch(scenarios[:5])
+        contributions = predictor.explainer.contributions(X)
+
+        explanations = predictor.explainer.top_features(contributions, top_k=4)
+
+        for row, explanation in zip(contributions, explanations):
+            magnitudes = [abs(item['contribution']) for item in explanation]
+            assert len(explanation) == 4
+            assert magnitudes == sorted(magnitudes, reverse=True)
+            assert magnitudes[0] == pytest.approx(np.abs(row).max())
+
+    def test_top_k_must_be_positive(self, predictor, scenarios):
+        """Test zero or negative top_k raises instead of slicing from the end"""
+        contributions = predictor.explainer.contributions(predictor.preprocess_batch(scenarios[:1]))
+
+        for top_k in (0, -2):
+            with pytest.raises(ValueError):
+                predictor.explainer.top_features(contributions, top_k=top_k)
+
+    def test_contributions_frame(self, predictor, scenarios):
+        """Test the DataFrame view keeps feature names and index"""
+        X = predictor.preprocess_batch(scenarios[:3])
+
+        frame = predictor.explainer.contributions_frame(X)
+
+        assert isinstance(frame, pd.DataFrame)
+        assert list(frame.columns) == predictor.feature_names
+        assert frame.index.equals(X.index)
+
+    def test_rejects_non_boosted_model(self):
+        """Test unsupported models are rejected"""
+        with pytest.raises(ValueError):
+            TreePathExplainer(object())
+
+
+class TestPredictorExplanations:
+    """Test RiskPredictor explanation helpers"""
+
+    def test_explain_matches_predict(self, predictor, scenarios):
+        """Test explained risk equals the plain prediction"""
+        risk, top_features = predictor.explain(scenarios[0], top_k=3)
+
+        assert risk == pytest.approx(predictor.predict(scenarios[0]))
+        assert len(top_features) == 3
+        assert {'feature', 'contribution'} <= set(top_features[0])
+
+    def test_explain_batch(self, predictor, scenarios):
+        """Test batch explanations cover every scenario"""
+        risks, explanations = predictor.explain_batch(scenarios[:10], top_k=2)
+
+        np.testing.assert_allclose(risks, predictor.predict_batch(scenarios[:10]), atol=1e-10)
+        assert len(explanations) == 10
+        assert all(len(items) == 2 for items in explanations)
+
+    def test_explain_comparison(self, predictor):
+        """Test the comparison agrees with compare_scenarios"""
+        scenario1, scenario2 = ScenarioGenerator.generate_contrasting_scenarios('easy')
+
+        comparison = predictor.explain_comparison(scenario1, scenario2)
+        risk1, risk2, higher = predictor.compare_scenarios(scenario1, scenario2)
+
+        assert comparison['risk1'] == pytest.approx(risk1)
+        assert comparison['risk2'] == pytest.approx(risk2)
+        assert comparison['higher_risk_index'] == higher
+        assert len(comparison['top_features']) == 3
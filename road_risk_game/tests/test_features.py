@@ -0,0 +1,125 @@
+"""
+Tests for encoder-free feature encoding
+"""
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from pathlib import Path
+
+from utils.features import (
+    CategoryVocabulary,
+    FeatureEncoder,
+    UnknownCategoryError,
+)
+from utils.game_logic import ScenarioGenerator
+from utils.model_bundle import BUNDLE_FILENAME, load_bundle
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+
+
+@pytest.fixture(scope="module")
+def bundle():
+    """Shipped model bundle"""
+    return load_bundle(MODELS_DIR / BUNDLE_FILENAME)
+
+
+class TestCategoryVocabulary:
+    """Test vectorized category lookups"""
+
+    def test_transform_strings(self):
+        """Test string categories map to their training codes"""
+        vocab = CategoryVocabulary('time_of_day', ['afternoon', 'evening', 'morning'])
+
+        codes = vocab.transform(['morning', 'afternoon', 'evening', 'morning'])
+
+        np.testing.assert_array_equal(codes, [2, 0, 1, 2])
+
+    def test_transform_booleans(self):
+        """Test booleans map directly to 0/1"""
+        vocab = CategoryVocabulary('holiday', [False, True])
+
+        assert vocab.is_boolean
+        np.testing.assert_array_equal(vocab.transform([True, False, True]), [1, 0, 1])
+
+    def test_unknown_error(self):
+        """Test the error policy rejects unseen values"""
+        vocab = CategoryVocabulary('weather', ['clear', 'foggy', 'rainy'])
+
+        with pytest.raises(UnknownCategoryError):
+            vocab.transform(['clear', 'snowy'])
+
+    def test_unknown_default(self):
+        """Test the default policy substitutes the default code"""
+        vocab = CategoryVocabulary('weather', ['clear', 'foggy', 'rainy'],
+                                   unknown='default', default_code=2)
+
+        np.testing.assert_array_equal(vocab.transform(['snowy', 'foggy']), [2, 1])
+
+    def test_unknown_nan(self):
+        """Test the nan policy marks unseen values as NaN"""
+        vocab = CategoryVocabulary('weather', ['clear', 'foggy', 'rainy'], unknown='nan')
+
+        codes = vocab.transform(['snowy', 'rainy'])
+
+        assert np.isnan(codes[0])
+        assert codes[1] == 2
+
+    def test_invalid_policy(self):
+        """Test an unknown policy name raises"""
+        with pytest.raises(ValueError):
+            CategoryVocabulary('weather', ['clear'], unknown='ignore')
+
+    def test_recode_table(self):
+        """Test codes over another category order are translated"""
+        vocab = CategoryVocabulary('time_of_day', ['afternoon', 'evening', 'morning'])
+
+        table = vocab.recode_table(ScenarioGenerator.TIME_OF_DAY)
+
+        np.testing.assert_array_equal(table[[0, 1, 2]], [2, 0, 1])
+
+    def test_code_single_value(self):
+        """Test scalar lookups agree with transform and follow the unknown policy"""
+        vocab = CategoryVocabulary('weather', ['clear', 'foggy', 'rainy'], unknown='default',
+                                   default_code=1)
+
+        assert vocab.code('rainy') == vocab.transform(['rainy'])[0] == 2
+        assert vocab.code('snowy') == 1
+        with pytest.raises(UnknownCategoryError):
+            CategoryVocabulary('weather', ['clear']).code('snowy')
+
+
+class TestFeatureEncoder:
+    """Test scenario encoding against the trained encoders"""
+
+    def test_matches_label_encoders(self, bundle):
+        """Test lookups reproduce the pickled LabelEncoders exactly"""
+        label_encoders = joblib.load(MODELS_DIR / "label_encoders.joblib")
+        encoder = FeatureEncoder(bundle['vocabularies'], bundle['feature_names'])
+        raw = pd.DataFrame([ScenarioGenerator.generate_scenario() for _ in range(200)])
+
+        encoded = encoder.transform(raw)
+
+        for col, label_encoder in label_encoders.items():
+            np.testing.assert_array_equal(encoded[col], label_encoder.transform(raw[col]))
+
+    def test_output_columns(self, bundle):
+        """Test output follows the model feature order"""
+        encoder = FeatureEncoder(bundle['vocabularies'], bundle['feature_names'])
+
+        encoded = encoder.transform(ScenarioGenerator.generate_scenario())
+
+        assert list(encoded.columns) == bundle['feature_names']
+        assert len(encoded) == 1
+
+    def test_batch_input_shapes(self, bundle):
+        """Test list, column-dict and DataFrame inputs encode identically"""
+        encoder = FeatureEncoder(bundle['vocabularies'], bundle['feature_names'])
+        scenarios = [ScenarioGenerator.generate_scenario() for _ in range(20)]
+        frame = pd.DataFrame(scenarios)
+        columns = {col: frame[col].to_numpy() for col in frame.columns}
+
+        expected = encoder.transform(frame)
+
+        pd.testing.assert_frame_equal(encoder.transform(scenarios), expected)
+        pd.testing.assert_frame_equal(encoder.transform(columns), expected)
@@ -1,6 +1,7 @@
 """
 Tests for game logic
 """
+import numpy as np
 import pytest
 from utils.game_logic import ScenarioGenerator, GameScoring, RoadVisualizer
 
@@ -53,6 +54,49 @@ class TestScenarioGenerator:
         
         for feature in required_features:
             assert feature in scenario, f"Missing feature: {feature}"
+    
+    def test_generate_batch(self):
+        """Test batch generation shapes and value ranges"""
+        batch = ScenarioGenerator.generate_batch(1000, seed=0)
+        
+        assert all(len(values) == 1000 for values in batch.values())
+        assert set(np.unique(batch['num_lanes'])) <= {1, 2, 3, 4}
+        assert set(np.unique(batch['speed_limit'])) <= set(ScenarioGenerator.SPEED_LIMITS)
+        assert batch['curvature'].min() >= 0.0 and batch['curvature'].max() <= 1.0
+        assert batch['road_type'].max() < len(ScenarioGenerator.ROAD_TYPES)
+        assert batch['holiday'].dtype == bool
+    
+    def test_generate_batch_seeded(self):
+        """Test the same seed reproduces the same batch"""
+        first = ScenarioGenerator.generate_batch(50, seed=7)
+        second = ScenarioGenerator.generate_batch(50, seed=7)
+        
+        for col in first:
+            assert np.array_equal(first[col], second[col])
+    
+    @pytest.mark.parametrize("difficulty", ['easy', 'medium', 'hard'])
+    def test_generate_contrasting_batch(self, difficulty):
+        """Test batched pairs follow the per-difficulty contrast rules"""
+        batch1, batch2 = ScenarioGenerator.generate_contrasting_batch(2000, difficulty, seed=1)
+        
+        if difficulty == 'easy':
+            assert np.all(batch1['speed_limit'] != batch2['speed_limit'])
+            assert np.all(batch1['weather'] != batch2['weather'])
+        elif difficulty == 'medium':
+            assert np.all(np.abs(batch1['speed_limit'] - batch2['speed_limit']) >= 20)
+            assert np.allclose(batch1['curvature'] + batch2['curvature'], 1.0)
+        else:
+            assert np.all(batch1['road_signs_present'] != batch2['road_signs_present'])
+            assert np.all(np.abs(batch1['num_lanes'] - batch2['num_lanes']) <= 1)
+            assert batch2['curvature'].min() >= 0.0 and batch2['curvature'].max() <= 1.0
+        assert np.array_equal(batch1['time_of_day'], batch2['time_of_day'])
+    
+    def test_batch_to_frame(self):
+        """Test decoded batches hold the same values generate_scenario uses"""
+        frame = ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(100, seed=3))
+        
+        assert set(frame['road_type']) <= set(ScenarioGenerator.ROAD_TYPES)
+        assert set(frame['time_of_day']) <= set(ScenarioGenerator.TIME_OF_DAY)
 
 
 class TestGameScoring:
@@ -134,3 +178,15 @@ class TestRoadVisualizer:
         
         # Check that description contains some scenario details
         assert str(scenario['num_lanes']) in description or 'lane' in description.lower()
+    
+    def test_get_explanation_lines(self):
+        """Test explanation lines name the riskier road"""
+        top_features = [
+            {'feature': 'lighting', 'contribution': 0.12},
+            {'feature': 'curvature', 'contribution': -0.05}
+        ]
+        lines = RoadVisualizer.get_explanation_lines(top_features)
+        
+        assert len(lines) == 2
+        assert 'Iluminación' in lines[0] and 'Camino B' in lines[0]
+        assert 'Curvatura' in lines[1] and 'Camino A' in lines[1]
@@ -0,0 +1,114 @@
+"""
+Tests for sampled, parallel permutation importance
+"""
+import warnings
+
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.linear_model import LinearRegression
+from sklearn.metrics import r2_score
+
+from utils.importance import permutation_importance, permutation_scores, stratified_sample
+
+
+@pytest.fixture(scope="module")
+def data():
+    """Target driven by x0 strongly, x1 weakly and x2 not at all"""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(size=(3000, 3)), columns=['x0', 'x1', 'x2'])
+    y = 3 * X['x0'] + 0.5 * X['x1'] + rng.normal(0, 0.05, len(X))
+    return X, y
+
+
+@pytest.fixture(scope="module")
+def linear(data):
+    """Linear model fitted on the frame"""
+    X, y = data
+    return LinearRegression().fit(X, y)
+
+
+class TestStratifiedSample:
+    """Test the subsample"""
+
+    def test_size_and_quantiles(self):
+        """Test the exact size is drawn and target quantiles are kept"""
+        y = np.random.default_rng(1).exponential(size=10_000)
+
+        rows = stratified_sample(y, 1000, seed=0)
+
+        assert len(rows) == len(np.unique(rows)) == 1000
+        np.testing.assert_allclose(np.quantile(y[rows], [0.25, 0.5, 0.75]),
+                                   np.quantile(y, [0.25, 0.5, 0.75]), rtol=0.1)
+
+    def test_given_strata(self):
+        """Test each stratum keeps its share"""
+        strata = np.repeat(['a', 'b', 'c'], [500, 300, 200])
+
+        rows = stratified_sample(np.zeros(1000), 100, strata=strata, seed=0)
+
+        assert pd.Series(strata[rows]).value_counts().to_dict() == {'a': 50, 'b': 30, 'c': 20}
+
+    def test_all_rows(self):
+        """Test no sample size takes every row"""
+        assert len(stratified_sample(np.arange(10), None)) == 10
+        assert len(stratified_sample(np.arange(10), 50)) == 10
+
+
+class TestPermutationImportance:
+    """Test scores, ranking and the in-place buffer"""
+
+    def test_scores_match_copied_permutation(self, data, linear):
+        """Test each score equals permuting a copy with the same generator"""
+        X, y = data
+        _, scores = permutation_scores(linear, X, y, n_repeats=2, n_jobs=1, seed=7)
+
+        shuffled = X.copy()
+        shuffled['x1'] = X['x1'].to_numpy()[np.random.default_rng([7, 1, 1]).permutation(len(X))]
+        assert scores[1, 1] == pytest.approx(r2_score(y, linear.predict(shuffled)))
+
+    def test_parallel_matches_serial(self, data, linear):
+        """Test results do not depend on the number of workers"""
+        X, y = data
+
+        _, serial = permutation_scores(linear, X, y, n_repeats=3, n_jobs=1)
+        _, parallel = permutation_scores(linear, X, y, n_repeats=3, n_jobs=2)
+
+        np.testing.assert_array_equal(serial, parallel)
+
+    def test_ranked_table(self, data):
+        """Test the ranking follows the true effects, with spread per feature"""
+        X, y = data
+        model = GradientBoostingRegressor(n_estimators=50, random_state=0).fit(X, y)
+
+        with warnings.catch_warnings():
+            warnings.simplefilter('error')  # feature names must reach the model
+            table = permutation_importance(model, X, y, n_repeats=4, sample=1000, n_jobs=1)
+
+        assert table['feature'].tolist() == ['x0', 'x1', 'x2']
+        assert table['importance_mean'].iloc[2] == pytest.approx(0.0, abs=0.01)
+        assert (table['importance_std'] >= 0).all()
+        np.testing.assert_allclose(table['importance_var'], table['importance_std'] ** 2)
+        assert table.attrs['rows'] == 1000
+
+    def test_input_unchanged(self, data, linear):
+        """Test the caller's matrix is never permuted"""
+        X, y = data
+        before = X.to_numpy().copy()
+
+        permutation_importance(linear, X, y, n_repeats=2, sample=500, n_jobs=1)
+
+        np.testing.assert_array_equal(X.to_numpy(), before)
+
+    def test_array_input_and_errors(self, data):
+        """Test arrays get given names, and unknown metrics are refused"""
+        X, y = data
+        model = LinearRegression().fit(X.to_numpy(), y)
+
+        table = permutation_importance(model, X.to_numpy(), y, n_repeats=2, sample=None, n_jobs=1,
+                                       scoring='mae', feature_names=['a', 'b', 'c'])
+
+        assert table['feature'].iloc[0] == 'a'
+        with pytest.raises(ValueError):
+            permutation_scores(model, X.to_numpy(), y, scoring='auc')
@@ -0,0 +1,169 @@
+"""
+Tests for bulk scoring jobs
+"""
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.game_logic import ScenarioGenerator
+from utils.jobs import (
+    CANCELLED,
+    COMPLETED,
+    FAILED,
+    QUEUED,
+    JobManager,
+    JobNotFoundError,
+    JobStore,
+    count_rows,
+    iter_chunks,
+    part_path,
+    run_job,
+)
+from utils.model_utils import RiskPredictor
+
+MODELS_DIR = os.path.join(os.path.dirname(__file__), "..", "models")
+
+
+@pytest.fixture(scope="module")
+def predictor():
+    """Create predictor instance"""
+    return RiskPredictor(models_dir="models")
+
+
+@pytest.fixture
+def input_csv(tmp_path):
+    """CSV of 250 generated scenarios with ids"""
+    frame = ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(250, seed=4))
+    frame.insert(0, 'id', np.arange(len(frame)) + 500)
+    path = tmp_path / "input.csv"
+    frame.to_csv(path, index=False)
+    return path, frame
+
+
+class TestJobStore:
+    """Test job metadata"""
+
+    def test_create_and_get(self, tmp_path):
+        """Test a new job is queued with its settings"""
+        store = JobStore(tmp_path / "jobs.sqlite")
+
+        job_id = store.create("data.csv", 'csv', chunk_rows=10)
+        job = store.get(job_id)
+
+        assert job['status'] == QUEUED
+        assert job['chunk_rows'] == 10
+        assert store.unfinished()[0]['id'] == job_id
+
+    def test_unknown_job(self, tmp_path):
+        """Test an unknown id raises"""
+        with pytest.raises(JobNotFoundError):
+            JobStore(tmp_path / "jobs.sqlite").get("missing")
+
+    def test_invalid_format(self, tmp_path):
+        """Test unsupported formats are rejected"""
+        with pytest.raises(ValueError):
+            JobStore(tmp_path / "jobs.sqlite").create("data.json", 'json')
+
+    def test_cancel_queued_job(self, tmp_path):
+        """Test cancelling a queued job finishes it at once"""
+        store = JobStore(tmp_path / "jobs.sqlite")
+        job_id = store.create("data.csv", 'csv')
+
+        assert store.request_cancel(job_id)['status'] == CANCELLED
+        assert store.unfinished() == []
+
+
+class TestJobManager:
+    """Test the job pool"""
+
+    def test_creates_missing_jobs_dir(self, tmp_path):
+        """Test a manager starts when neither the jobs dir nor its database exist"""
+        jobs_dir = tmp_path / "fresh" / "jobs"
+
+        manager = JobManager(jobs_dir / "jobs.sqlite", jobs_dir, MODELS_DIR, max_workers=1)
+        try:
+            assert jobs_dir.is_dir()
+            assert manager.store.list() == []
+        finally:
+            manager.shutdown()
+
+
+class TestChunks:
+    """Test chunked reading"""
+
+    def test_count_rows(self, input_csv):
+        """Test rows are counted without the header"""
+        path, frame = input_csv
+
+        assert count_rows(path, 'csv') == len(frame)
+
+    def test_skip_chunks(self, input_csv):
+        """Test resumed reads start at the first unscored chunk"""
+        path, frame = input_csv
+
+        chunks = list(iter_chunks(path, 'csv', chunk_rows=100, skip_chunks=1))
+
+        assert [len(chunk) for chunk in chunks] == [100, 50]
+        assert chunks[0]['id'].iloc[0] == frame['id'].iloc[100]
+
+
+class TestRunJob:
+    """Test running, cancelling and resuming jobs in-process"""
+
+    def test_job_scores_every_row(self, tmp_path, input_csv, predictor):
+        """Test the result keeps ids and matches the model"""
+        path, frame = input_csv
+        store = JobStore(tmp_path / "jobs.sqlite")
+        job_id = store.create(path, 'csv', chunk_rows=100)
+
+        status = run_job(store.db_path, str(tmp_path), job_id, MODELS_DIR)
+
+        job = store.get(job_id)
+        result = pd.read_csv(job['result_path'])
+        assert status == COMPLETED
+        assert job['rows_done'] == job['total_rows'] == 250
+        assert job['chunks_done'] == 3
+        assert result['id'].tolist() == frame['id'].tolist()
+        assert np.allclose(result['accident_risk'], predictor.predict_batch(frame))
+
+    def test_resume_after_completed_chunk(self, tmp_path, input_csv, predictor):
+        """Test a job restarts after the chunks it already wrote"""
+        path, frame = input_csv
+        store = JobStore(tmp_path / "jobs.sqlite")
+        job_id = store.create(path, 'csv', chunk_rows=100)
+
+        # First chunk finished before an interruption; mark it so it is not rescored
+        job_dir = tmp_path / job_id
+        job_dir.mkdir()
+        pd.DataFrame({'id': frame['id'][:100], 'accident_risk': -1.0}).to_csv(
+            part_path(job_dir, 0), index=False)
+        store.update(job_id, status='running', chunks_done=1, rows_done=100)
+
+        run_job(store.db_path, str(tmp_path), job_id, MODELS_DIR)
+
+        result = pd.read_csv(store.get(job_id)['result_path'])
+        assert len(result) == 250
+        assert (result['accident_risk'][:100] == -1.0).all()
+        assert np.allclose(result['accident_risk'][100:], predictor.predict_batch(frame.iloc[100:]))
+
+    def test_cancelled_job_does_not_run(self, tmp_path, input_csv):
+        """Test a job cancelled while queued is skipped by the worker"""
+        path, _ = input_csv
+        store = JobStore(tmp_path / "jobs.sqlite")
+        job_id = store.create(path, 'csv')
+        store.request_cancel(job_id)
+
+        assert run_job(store.db_path, str(tmp_path), job_id, MODELS_DIR) == CANCELLED
+        assert store.get(job_id)['rows_done'] == 0
+
+    def test_bad_input_fails_job(self, tmp_path):
+        """Test scoring errors are recorded on the job"""
+        path = tmp_path / "bad.csv"
+        pd.DataFrame({'road_type': ['urban']}).to_csv(path, index=False)
+        store = JobStore(tmp_path / "jobs.sqlite")
+        job_id = store.create(path, 'csv')
+
+        assert run_job(store.db_path, str(tmp_path), job_id, MODELS_DIR) == FAILED
+        assert store.get(job_id)['error']
@@ -0,0 +1,98 @@
+"""
+Tests for the model bundle format
+"""
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from pathlib import Path
+
+from utils.model_bundle import (
+    BundleError,
+    bundle_from_legacy,
+    compute_schema_hash,
+    load_bundle,
+    save_bundle,
+)
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+
+
+@pytest.fixture(scope="module")
+def legacy():
+    """Legacy artifacts converted to bundle parts"""
+    return bundle_from_legacy(MODELS_DIR)
+
+
+class TestModelBundle:
+    """Test bundle round trips and validation"""
+
+    def test_round_trip_uncompressed_mmap(self, legacy, tmp_path):
+        """Test an uncompressed bundle loads memory-mapped and predicts identically"""
+        path = tmp_path / "bundle.joblib"
+        schema_hash = save_bundle(path, legacy['model'], legacy['vocabularies'],
+                                  legacy['feature_names'])
+
+        bundle = load_bundle(path, mmap_mode='r')
+
+        assert bundle['schema_hash'] == schema_hash
+        assert bundle['feature_names'] == legacy['feature_names']
+        assert bundle['vocabularies'] == legacy['vocabularies']
+
+        X = pd.DataFrame(np.zeros((3, len(legacy['feature_names']))),
+                         columns=legacy['feature_names'])
+        np.testing.assert_array_equal(bundle['model'].predict(X), legacy['model'].predict(X))
+
+    @pytest.mark.parametrize("codec", ['zlib', 'lzma'])
+    def test_round_trip_compressed(self, legacy, tmp_path, codec):
+        """Test compressed bundles are smaller and still load"""
+        plain = tmp_path / "plain.joblib"
+        packed = tmp_path / f"packed_{codec}.joblib"
+        save_bundle(plain, legacy['model'], legacy['vocabularies'], legacy['feature_names'])
+        save_bundle(packed, legacy['model'], legacy['vocabularies'], legacy['feature_names'],
+                    compress=(codec, 3))
+
+        bundle = load_bundle(packed, mmap_mode='r')
+
+        assert packed.stat().st_size < plain.stat().st_size
+        assert bundle['feature_names'] == legacy['feature_names']
+
+    def test_unknown_codec_rejected(self, legacy, tmp_path):
+        """Test an unsupported codec raises"""
+        with pytest.raises(ValueError):
+            save_bundle(tmp_path / "b.joblib", legacy['model'], legacy['vocabularies'],
+                        legacy['feature_names'], compress='snappy')
+
+    def test_feature_mismatch_rejected_on_save(self, legacy, tmp_path):
+        """Test a model cannot be bundled with a different feature order"""
+        with pytest.raises(BundleError):
+            save_bundle(tmp_path / "b.joblib", legacy['model'], legacy['vocabularies'],
+                        legacy['feature_names'][::-1])
+
+    def test_vocabulary_skew_detected_on_load(self, legacy, tmp_path):
+        """Test tampered vocabularies are caught at load time"""
+        path = tmp_path / "bundle.joblib"
+        save_bundle(path, legacy['model'], legacy['vocabularies'], legacy['feature_names'])
+
+        raw = joblib.load(path)
+        raw['vocabularies']['road_type'] = ['highway', 'urban', 'rural']
+        joblib.dump(raw, path)
+
+        with pytest.raises(BundleError):
+            load_bundle(path)
+
+    def test_schema_hash_depends_on_order(self, legacy):
+        """Test the schema hash changes when category order changes"""
+        vocabularies = dict(legacy['vocabularies'])
+        original = compute_schema_hash(legacy['feature_names'], vocabularies)
+        vocabularies['lighting'] = vocabularies['lighting'][::-1]
+
+        assert compute_schema_hash(legacy['feature_names'], vocabularies) != original
+
+    def test_not_a_bundle(self, tmp_path):
+        """Test loading an arbitrary joblib file raises"""
+        path = tmp_path / "other.joblib"
+        joblib.dump(['not', 'a', 'bundle'], path)
+
+        with pytest.raises(BundleError):
+            load_bundle(path)
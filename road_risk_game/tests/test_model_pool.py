@@ -0,0 +1,141 @@
+"""
+Tests for the multi-model pool
+"""
+import pytest
+from pathlib import Path
+from sklearn.ensemble import HistGradientBoostingRegressor
+
+from utils.features import FeatureEncoder
+from utils.model_pool import (
+    LatencyHistogram,
+    ModelPool,
+    PooledModel,
+    UnknownModelError,
+    load_pooled_model,
+    parse_weights,
+)
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+BUNDLE_PATH = MODELS_DIR / "model_bundle.joblib"
+
+
+class ConstantModel:
+    """Model predicting one value"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def predict(self, X):
+        return [self.value] * len(X)
+
+
+def pool_of(weights, seed=0):
+    """Pool of constant models with the given weights"""
+    pool = ModelPool(seed=seed)
+    for name, weight in weights.items():
+        pool.add(PooledModel(name, ConstantModel(weight), encoder=None, weight=weight))
+    return pool
+
+
+class TestLatencyHistogram:
+    """Test latency bucketing"""
+
+    def test_buckets_and_quantiles(self):
+        """Test values land in their buckets and quantiles report bucket edges"""
+        histogram = LatencyHistogram(edges=[1.0, 5.0, 10.0])
+        for latency in (0.5, 1.0, 3.0, 3.0, 7.0, 50.0):
+            histogram.record(latency)
+
+        summary = histogram.summary()
+
+        assert summary['buckets'] == {'<=1': 2, '<=5': 2, '<=10': 1, '>10': 1}
+        assert summary['p50_ms'] == 5.0
+        assert summary['p99_ms'] == 50.0
+        assert summary['max_ms'] == 50.0
+        assert summary['mean_ms'] == pytest.approx(64.5 / 6)
+
+    def test_empty(self):
+        """Test an empty histogram has no quantiles"""
+        assert LatencyHistogram().summary()['p50_ms'] is None
+
+
+class TestModelPool:
+    """Test routing"""
+
+    def test_header_selects_model(self):
+        """Test a named model is always used"""
+        pool = pool_of({'gbr': 1.0, 'compact': 0.0})
+
+        assert all(pool.select('compact').name == 'compact' for _ in range(20))
+
+    def test_unknown_model(self):
+        """Test unknown names are rejected"""
+        with pytest.raises(UnknownModelError):
+            pool_of({'gbr': 1.0}).select('xgboost')
+
+    def test_weighted_split(self):
+        """Test unrouted traffic follows the weights"""
+        pool = pool_of({'gbr': 3.0, 'compact': 1.0, 'experimental': 0.0})
+
+        picks = [pool.select().name for _ in range(4000)]
+
+        assert picks.count('experimental') == 0
+        assert 0.7 < picks.count('gbr') / len(picks) < 0.8
+
+    def test_no_weights_uses_default(self):
+        """Test the first model added answers when nothing has a weight"""
+        pool = pool_of({'gbr': 0.0, 'compact': 0.0})
+
+        assert pool.select().name == 'gbr'
+
+    def test_set_weights(self):
+        """Test changing the split; unlisted models get no traffic"""
+        pool = pool_of({'gbr': 1.0, 'compact': 0.0})
+        pool.set_weights({'compact': 2.0})
+
+        assert pool['gbr'].weight == 0.0
+        assert {pool.select().name for _ in range(50)} == {'compact'}
+        with pytest.raises(UnknownModelError):
+            pool.set_weights({'xgboost': 1.0})
+
+    def test_counters(self):
+        """Test per-model request, row, error and latency counts"""
+        pool = pool_of({'gbr': 1.0})
+        entry = pool['gbr']
+        entry.record(2.0)
+        entry.record(30.0, rows=100)
+        entry.record_error()
+
+        stats = pool.stats()['models']['gbr']
+
+        assert (stats['requests'], stats['rows'], stats['errors']) == (2, 101, 1)
+        assert stats['latency']['count'] == 2
+        assert stats['version'] == 'gbr@legacy'
+
+    def test_parse_weights(self):
+        """Test the MODEL_WEIGHTS format"""
+        assert parse_weights("gbr=0.9, compact=0.1,") == {'gbr': 0.9, 'compact': 0.1}
+        with pytest.raises(ValueError):
+            parse_weights("gbr")
+        with pytest.raises(ValueError):
+            parse_weights("gbr=-1")
+
+    def test_load_bundle_entry(self):
+        """Test a bundle loads with its encoder, explainer and version"""
+        entry = load_pooled_model('gbr', BUNDLE_PATH, weight=1.0)
+
+        assert entry.explainer is not None
+        assert entry.version.startswith('gbr@') and len(entry.version) == 16
+        assert len(entry.encoder.feature_names) == entry.model.n_features_in_
+
+    def test_nan_policy_needs_nan_capable_model(self):
+        """Test the 'nan' policy is refused for models that reject missing values"""
+        with pytest.raises(ValueError, match="missing values"):
+            load_pooled_model('gbr', BUNDLE_PATH, unknown='nan')
+
+        entry = load_pooled_model('gbr', BUNDLE_PATH)
+        vocabularies = {col: vocabulary.classes_
+                        for col, vocabulary in entry.encoder.vocabularies.items()}
+        nan_encoder = FeatureEncoder(vocabularies, entry.encoder.feature_names, unknown='nan')
+        entry = PooledModel('hist', HistGradientBoostingRegressor(), nan_encoder)
+        assert entry.encoder is nan_encoder
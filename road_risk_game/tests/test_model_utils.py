@@ -164,3 +164,13 @@ class TestRiskPredictor:
         
         # Should have all feature columns
         assert len(processed.columns) == len(predictor.feature_names)
+    
+    def test_predict_batch_from_codes(self, predictor):
+        """Test integer-coded generator batches score like decoded rows"""
+        from utils.game_logic import ScenarioGenerator
+        batch = ScenarioGenerator.generate_batch(200, seed=5)
+        
+        from_codes = predictor.predict_batch(batch, categories=ScenarioGenerator.BATCH_CATEGORIES)
+        from_values = predictor.predict_batch(ScenarioGenerator.batch_to_frame(batch))
+        
+        assert np.allclose(from_codes, from_values)
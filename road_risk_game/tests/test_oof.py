@@ -0,0 +1,135 @@
+"""
+Tests for the out-of-fold store and blender
+"""
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LinearRegression, Ridge
+from sklearn.model_selection import KFold
+from sklearn.tree import DecisionTreeRegressor
+
+from utils.oof import (
+    Blender,
+    OOFStore,
+    OOFStoreError,
+    blend_submission,
+    data_hash,
+    model_key,
+    run_oof,
+)
+
+
+@pytest.fixture(scope="module")
+def data():
+    """Small noisy regression problem with test rows"""
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame(rng.uniform(size=(600, 4)), columns=['a', 'b', 'c', 'd'])
+    y = 2 * X['a'] + np.sin(6 * X['b']) + rng.normal(0, 0.1, 600)
+    X_test = pd.DataFrame(rng.uniform(size=(100, 4)), columns=X.columns)
+    return X, y, X_test
+
+
+def zoo():
+    """Two dissimilar candidates"""
+    return {'linear': LinearRegression(),
+            'tree': DecisionTreeRegressor(max_depth=4, random_state=0)}
+
+
+class TestRunOOF:
+    """Test fold fits and the store"""
+
+    def test_matches_manual_folds(self, data, tmp_path):
+        """Test stored predictions equal fitting each fold by hand"""
+        X, y, X_test = data
+        summary = run_oof(zoo(), X, y, X_test, OOFStore(tmp_path), n_splits=3, seed=1, n_jobs=1)
+
+        oof = np.empty(len(y))
+        test = np.zeros(len(X_test))
+        for train_idx, val_idx in KFold(3, shuffle=True, random_state=1).split(X):
+            model = DecisionTreeRegressor(max_depth=4, random_state=0)
+            model.fit(X.values[train_idx], y.values[train_idx])
+            oof[val_idx] = model.predict(X.values[val_idx])
+            test += model.predict(X_test.values) / 3
+
+        entry = OOFStore(tmp_path).load(data_hash(X, y, X_test), summary['tree']['key'])
+        np.testing.assert_allclose(entry['oof'], oof, rtol=1e-6)
+        np.testing.assert_allclose(entry['test'], test, rtol=1e-6)
+        assert entry['oof'].dtype == np.float32
+        assert len(entry['fold_scores']) == 3
+
+    def test_stored_candidates_not_refitted(self, data, tmp_path):
+        """Test a second run reads the store and only new candidates are fitted"""
+        X, y, X_test = data
+        store = OOFStore(tmp_path)
+        run_oof(zoo(), X, y, X_test, store, n_jobs=1)
+
+        candidates = dict(zoo(), deeper=DecisionTreeRegressor(max_depth=6, random_state=0))
+        summary = run_oof(candidates, X, y, X_test, store, n_jobs=1)
+
+        assert {name: entry['cached'] for name, entry in summary.items()} == {
+            'linear': True, 'tree': True, 'deeper': False}
+
+    def test_keys(self, data):
+        """Test keys follow parameters and scaling, and data hashes follow the data"""
+        X, y, X_test = data
+        key = model_key(Ridge(alpha=1.0), False, 5, 42)
+
+        assert key == model_key(Ridge(alpha=1.0), False, 5, 42)
+        assert key != model_key(Ridge(alpha=2.0), False, 5, 42)
+        assert model_key(Ridge(), False, 5, 42) != model_key(Ridge(), True, 5, 42)
+        assert data_hash(X, y, X_test) != data_hash(X, y + 1, X_test)
+
+    def test_missing_entries(self, data, tmp_path):
+        """Test unknown datasets and candidates raise OOFStoreError"""
+        X, y, X_test = data
+        store = OOFStore(tmp_path)
+        with pytest.raises(OOFStoreError):
+            store.latest_dataset()
+        run_oof(zoo(), X, y, X_test, store, n_jobs=1)
+        with pytest.raises(OOFStoreError):
+            store.frames(data_hash(X, y, X_test), ['linear', 'forest'])
+
+
+class TestBlender:
+    """Test blending stored predictions"""
+
+    def test_linear_weights(self):
+        """Test non-negative weights recover a known mix"""
+        rng = np.random.default_rng(0)
+        oof = pd.DataFrame(rng.normal(size=(500, 3)), columns=['a', 'b', 'c'])
+        y = 0.7 * oof['a'] + 0.3 * oof['b'] - 0.2 * oof['c']
+
+        blender = Blender('linear').fit(oof, y)
+
+        assert blender.weights_['a'] == pytest.approx(0.7, abs=0.05)
+        assert blender.weights_['c'] == 0.0
+        assert blender.predict(oof[['c', 'b', 'a']]).shape == (500,)
+
+    def test_stacked(self):
+        """Test a level-2 regressor fits the predictions"""
+        rng = np.random.default_rng(1)
+        oof = pd.DataFrame(rng.normal(size=(300, 2)), columns=['a', 'b'])
+        y = oof['a'] - oof['b'] + 0.5
+
+        blender = Blender('stacked').fit(oof, y)
+
+        assert blender.cv_score_ > 0.99
+        np.testing.assert_allclose(blender.predict(oof), y, atol=0.05)
+
+    def test_unknown_method(self):
+        """Test unknown methods are refused"""
+        with pytest.raises(ValueError):
+            Blender('median')
+
+    def test_submission(self, data, tmp_path):
+        """Test a blend is at least as good as its best candidate and writes ids"""
+        X, y, X_test = data
+        store = OOFStore(tmp_path / "store")
+        summary = run_oof(zoo(), X, y, X_test, store, test_ids=np.arange(1000, 1100), n_jobs=1)
+
+        result = blend_submission(store, tmp_path / "submission.csv")
+
+        submission = pd.read_csv(tmp_path / "submission.csv")
+        assert list(submission.columns) == ['id', 'accident_risk']
+        assert submission['id'].tolist() == list(range(1000, 1100))
+        assert result['cv_score'] >= max(entry['oof_r2'] for entry in summary.values()) - 0.01
@@ -0,0 +1,160 @@
+"""
+Tests for the background prediction log
+"""
+import threading
+
+import numpy as np
+import pytest
+
+from utils.game_logic import ScenarioGenerator
+from utils.prediction_log import IN_PROGRESS_SUFFIX, PredictionLog, read_log
+
+pytest.importorskip("pyarrow")
+
+SCENARIO = {
+    'road_type': 'urban', 'num_lanes': 2, 'curvature': 0.3, 'speed_limit': 35,
+    'lighting': 'daylight', 'weather': 'clear', 'road_signs_present': True,
+    'public_road': True, 'time_of_day': 'morning', 'holiday': False,
+    'school_season': True, 'num_reported_accidents': 0,
+}
+
+
+def record(risk: float) -> dict:
+    """One /predict log record"""
+    return dict(SCENARIO, endpoint='/predict', model_version='abc', latency_ms=1.5,
+                accident_risk=risk)
+
+
+@pytest.fixture(scope="module")
+def scenarios():
+    """500 generated raw scenarios"""
+    return ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(500, seed=4))
+
+
+def read_all(directory):
+    """Every finished file in a log directory, in order"""
+    files = sorted(p for p in directory.iterdir() if not p.name.endswith(IN_PROGRESS_SUFFIX))
+    return files, [read_log(path) for path in files]
+
+
+class TestPredictionLog:
+    """Test buffering, writing and rotation"""
+
+    @pytest.mark.parametrize("fmt", ['parquet', 'arrow'])
+    def test_round_trip(self, fmt, scenarios, tmp_path):
+        """Test single records and batches come back with their inputs"""
+        log = PredictionLog(tmp_path, fmt=fmt)
+        for i in range(10):
+            log.log(record(i / 10))
+        log.log_batch(scenarios, np.linspace(0, 1, len(scenarios)), '/predict_batch', 'abc', 12.0)
+        log.close()
+
+        files, frames = read_all(tmp_path)
+
+        assert len(files) == 1 and files[0].suffix == '.' + fmt
+        frame = frames[0]
+        assert len(frame) == 10 + len(scenarios)
+        risks = frame['accident_risk'].iloc[:10].tolist()
+        assert risks == pytest.approx([i / 10 for i in range(10)])
+        assert frame['road_type'].iloc[10:].tolist() == scenarios['road_type'].tolist()
+        assert frame['num_lanes'].iloc[10:].tolist() == scenarios['num_lanes'].tolist()
+        assert (frame['endpoint'].iloc[10:] == '/predict_batch').all()
+        assert str(frame['timestamp'].dt.tz) == 'UTC'
+
+    def test_rotation(self, scenarios, tmp_path):
+        """Test files rotate after rotate_rows and every row is kept"""
+        log = PredictionLog(tmp_path, batch_rows=100, rotate_rows=200)
+        for start in range(0, len(scenarios), 100):
+            log.log_batch(scenarios.iloc[start:start + 100], np.zeros(100), '/predict_batch',
+                          'abc', 1.0)
+            assert log.flush()
+        log.close()
+
+        files, frames = read_all(tmp_path)
+
+        assert len(files) == 3
+        assert sum(len(frame) for frame in frames) == len(scenarios)
+        assert log.stats()['files_closed'] == 3
+
+    def test_flush_writes_without_full_batch(self, tmp_path):
+        """Test flush writes a partial batch before the interval elapses"""
+        log = PredictionLog(tmp_path, flush_interval=60)
+        log.log(record(0.5))
+
+        assert log.flush()
+        stats = log.stats()
+        log.close()
+
+        assert stats['written'] == 1
+        assert stats['buffered'] == 0
+        assert stats['flush_ms_max'] >= 0
+
+    def test_close_flushes_buffer(self, tmp_path):
+        """Test records buffered at shutdown are written"""
+        log = PredictionLog(tmp_path, flush_interval=60)
+        for i in range(50):
+            log.log(record(0.1))
+        log.close()
+
+        _, frames = read_all(tmp_path)
+
+        assert sum(len(frame) for frame in frames) == 50
+        assert not list(tmp_path.glob('*' + IN_PROGRESS_SUFFIX))
+
+    def test_invalid_arguments(self, tmp_path):
+        """Test unknown formats and policies are rejected"""
+        with pytest.raises(ValueError):
+            PredictionLog(tmp_path, fmt='csv')
+        with pytest.raises(ValueError):
+            PredictionLog(tmp_path, policy='spill')
+
+
+class TestOverflow:
+    """Test the full-buffer policies"""
+
+    def test_drop_policy_counts_dropped(self, tmp_path):
+        """Test records beyond capacity are dropped and counted"""
+        log = PredictionLog(tmp_path, capacity=10, batch_rows=1000, flush_interval=60)
+        accepted = [log.log(record(0.1)) for _ in range(25)]
+        stats = log.stats()
+        log.close()
+
+        assert accepted.count(True) == 10
+        assert stats['dropped'] == 15
+        assert stats['buffered'] == 10
+
+    def test_drop_policy_drops_whole_batch(self, scenarios, tmp_path):
+        """Test a batch that does not fit is dropped as a unit"""
+        log = PredictionLog(tmp_path, capacity=100, flush_interval=60)
+
+        assert not log.log_batch(scenarios, np.zeros(len(scenarios)), '/predict_batch', 'abc', 1.0)
+        assert log.stats()['dropped'] == len(scenarios)
+        log.close()
+
+    def test_block_policy_waits_for_writer(self, tmp_path):
+        """Test blocked producers get room once the writer drains the buffer"""
+        log = PredictionLog(tmp_path, capacity=10, batch_rows=10, policy='block', block_timeout=10)
+
+        def work():
+            for _ in range(100):
+                log.log(record(0.2))
+
+        threads = [threading.Thread(target=work) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        log.close()
+
+        _, frames = read_all(tmp_path)
+
+        assert log.stats()['dropped'] == 0
+        assert sum(len(frame) for frame in frames) == 400
+
+    def test_logging_after_close_is_dropped(self, tmp_path):
+        """Test records arriving after shutdown are counted, not lost silently"""
+        log = PredictionLog(tmp_path)
+        log.close()
+
+        assert not log.log(record(0.3))
+        assert log.stats()['dropped'] == 1
@@ -0,0 +1,81 @@
+"""
+Tests for the pipeline stage profiler
+"""
+import json
+
+from utils import profiling
+from utils.profiling import StageProfiler, compare_reports
+
+
+class TestStageProfiler:
+    """Test stage recording and reports"""
+
+    def test_disabled_records_nothing(self, tmp_path):
+        """Test a disabled profiler is a no-op"""
+        profiler = StageProfiler(enabled=False, output_dir=tmp_path)
+
+        profiler.next_stage("1. Load")
+        with profiler.stage("fit"):
+            pass
+
+        assert profiler.finish() is None
+        assert profiler.records == []
+        assert not (tmp_path / "profile_report.json").exists()
+
+    def test_linear_and_nested_stages(self, tmp_path):
+        """Test sections close in order and nested stages get a depth"""
+        profiler = StageProfiler(output_dir=tmp_path)
+
+        profiler.next_stage("1. Load")
+        profiler.next_stage("2. Train")
+        with profiler.stage("fit"):
+            sum(range(10_000))
+        report_path = profiler.finish()
+
+        names = [record['name'] for record in sorted(profiler.records, key=lambda r: r['start_s'])]
+        assert names == ["1. Load", "2. Train", "fit"]
+        assert {r['name']: r['depth'] for r in profiler.records}["fit"] == 1
+        report = json.loads(report_path.read_text())
+        assert len(report['stages']) == 3
+        assert all(stage['wall_s'] >= 0 and stage['peak_rss_mb'] > 0 for stage in report['stages'])
+
+    def test_allocations_and_cprofile(self, tmp_path):
+        """Test tracemalloc hot spots and the cProfile dump for the chosen stage"""
+        profiler = StageProfiler(trace_allocations=True, cprofile_stage="build",
+                                 output_dir=tmp_path)
+
+        with profiler.stage("build"):
+            kept = [list(range(100)) for _ in range(1000)]
+        profiler.finish()
+
+        record = profiler.records[0]
+        assert record['top_allocations'][0]['size_diff_mb'] > 0
+        assert (tmp_path / "profile_build.prof").exists()
+        assert len(kept) == 1000
+
+    def test_compare_reports(self):
+        """Test the comparison lists changed, new and removed stages"""
+        old = {'stages': [{'name': 'fit', 'wall_s': 2.0, 'peak_rss_mb': 100.0},
+                          {'name': 'plot', 'wall_s': 1.0, 'peak_rss_mb': 90.0}]}
+        new = {'stages': [{'name': 'fit', 'wall_s': 3.0, 'peak_rss_mb': 120.0},
+                          {'name': 'tune', 'wall_s': 5.0, 'peak_rss_mb': 150.0}]}
+
+        table = compare_reports(old, new)
+
+        assert "+50.0%" in table
+        assert "new" in table and "removed" in table
+
+    def test_without_resource_module(self, tmp_path, monkeypatch):
+        """Test peak RSS is reported as unavailable where resource and /proc are missing"""
+        monkeypatch.setattr(profiling, 'resource', None)
+        monkeypatch.setattr(profiling, '_STATUS', str(tmp_path / "missing"))
+        profiler = StageProfiler(output_dir=tmp_path)
+
+        with profiler.stage("fit"):
+            pass
+        profiler.finish()
+
+        assert profiler.records[0]['peak_rss_mb'] is None
+        assert profiler.report()['peak_rss_scope'] == 'unavailable'
+        assert "n/a" in profiler.summary()
+        assert "n/a" in compare_reports(profiler.report(), profiler.report())
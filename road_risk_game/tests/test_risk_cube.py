@@ -0,0 +1,125 @@
+"""
+Tests for the pre-aggregated risk cube
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.game_logic import ScenarioGenerator
+from utils.risk_cube import CUBE_DIMENSIONS, TARGET, CubeQueryError, RiskCube
+
+
+@pytest.fixture(scope="module")
+def data():
+    """2000 generated scenarios with a noisy risk"""
+    frame = ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(2000, seed=47))
+    rng = np.random.default_rng(47)
+    frame[TARGET] = 0.3 + 0.2 * (frame['weather'] == 'foggy') + rng.normal(0, 0.1, len(frame))
+    return frame
+
+
+@pytest.fixture(scope="module")
+def cube(data):
+    """Cube over the default dimensions"""
+    return RiskCube.build(data)
+
+
+def grouped(frame, by):
+    """Reference groupby with the cube's columns"""
+    return frame.groupby(by)[TARGET].agg(['count', 'sum', 'mean', 'std'])
+
+
+def assert_same(result, expected):
+    """Compare a cube query with a groupby, ignoring dtypes"""
+    assert list(result.index) == list(expected.index)
+    np.testing.assert_array_equal(result['count'].to_numpy(), expected['count'].to_numpy())
+    for col in ('sum', 'mean', 'std'):
+        np.testing.assert_allclose(result[col].to_numpy(), expected[col].to_numpy(), rtol=1e-9)
+
+
+class TestRiskCube:
+    """Test building and querying"""
+
+    def test_shape(self, cube, data):
+        """Test one axis per dimension and every row counted once"""
+        assert cube.shape == tuple(data[col].nunique() for col in CUBE_DIMENSIONS)
+        assert cube.counts.sum() == len(data)
+
+    def test_single_dimension(self, cube, data):
+        """Test a one-column group-by matches pandas"""
+        assert_same(cube.query('road_type'), grouped(data, 'road_type'))
+
+    def test_several_dimensions(self, cube, data):
+        """Test the requested dimension order is kept"""
+        by = ['time_of_day', 'lighting', 'holiday']
+
+        assert_same(cube.query(by), grouped(data, by))
+
+    def test_filter(self, cube, data):
+        """Test single values and lists of values in where"""
+        rows = data[data['holiday'] & data['weather'].isin(['rainy', 'foggy'])]
+
+        result = cube.query('road_type', where={'holiday': True, 'weather': ['rainy', 'foggy']})
+
+        assert_same(result, grouped(rows, 'road_type'))
+
+    def test_total(self, cube, data):
+        """Test no group-by gives one row over all data"""
+        total = cube.query()
+
+        assert len(total) == 1
+        assert total['count'].iloc[0] == len(data)
+        assert total['mean'].iloc[0] == pytest.approx(data[TARGET].mean())
+        assert total['std'].iloc[0] == pytest.approx(data[TARGET].std())
+
+    def test_aggregate_arrays(self, cube, data):
+        """Test the array form is shaped one axis per group-by dimension"""
+        totals = cube.aggregate(['weather', 'road_type'])
+
+        assert totals['count'].shape == (len(cube.dimensions['weather']),
+                                         len(cube.dimensions['road_type']))
+        assert totals['count'].sum() == len(data)
+
+    def test_empty_cells(self):
+        """Test groups without rows are dropped unless asked for"""
+        frame = pd.DataFrame({'a': ['x', 'x', 'y'], 'b': [True, False, True],
+                              TARGET: [0.1, 0.2, 0.3]})
+        cube = RiskCube.build(frame, dimensions=['a', 'b'])
+
+        assert len(cube.query(['a', 'b'])) == 3
+        full = cube.query(['a', 'b'], keep_empty=True)
+        assert len(full) == 4
+        assert full.loc[('y', False), 'count'] == 0
+        assert np.isnan(full.loc[('y', False), 'mean'])
+
+    def test_mean(self, cube, data):
+        """Test the groupby().mean() shortcut"""
+        pd.testing.assert_series_equal(cube.mean('weather'), data.groupby('weather')[TARGET].mean(),
+                                       check_exact=False)
+
+    def test_unknown_dimension_or_value(self, cube):
+        """Test bad queries raise CubeQueryError"""
+        with pytest.raises(CubeQueryError):
+            cube.query('num_lanes')
+        with pytest.raises(CubeQueryError):
+            cube.query('road_type', where={'weather': 'snowy'})
+
+    def test_vocabulary(self, data):
+        """Test a fixed vocabulary keeps unseen labels and refuses unknown ones"""
+        vocabularies = {'weather': ['clear', 'foggy', 'rainy', 'snowy']}
+        cube = RiskCube.build(data, dimensions=['weather'], vocabularies=vocabularies)
+
+        assert cube.query('weather', keep_empty=True).loc['snowy', 'count'] == 0
+        with pytest.raises(ValueError):
+            RiskCube.build(data, dimensions=['weather'], vocabularies={'weather': ['clear']})
+
+    def test_save_load(self, cube, tmp_path):
+        """Test a saved cube answers the same queries"""
+        path = tmp_path / "risk_cube.npz"
+        cube.save(path)
+
+        loaded = RiskCube.load(path)
+
+        assert loaded.dimensions == cube.dimensions
+        pd.testing.assert_frame_equal(loaded.query(['holiday', 'weather']),
+                                      cube.query(['holiday', 'weather']))
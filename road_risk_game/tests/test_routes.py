@@ -0,0 +1,95 @@
+"""
+Tests for route-level risk scoring
+"""
+import numpy as np
+import pytest
+
+from utils.game_logic import ScenarioGenerator
+from utils.model_utils import RiskPredictor
+from utils.routes import RouteError, flatten_routes, route_aggregates
+
+
+@pytest.fixture(scope="module")
+def predictor():
+    """Shipped model"""
+    return RiskPredictor()
+
+
+@pytest.fixture(scope="module")
+def scenarios():
+    """50 generated raw scenarios"""
+    batch = ScenarioGenerator.generate_batch(50, seed=31)
+    return ScenarioGenerator.batch_to_frame(batch).to_dict('records')
+
+
+class TestRouteAggregates:
+    """Test the per-route reductions"""
+
+    def test_without_lengths(self):
+        """Test equal weights and one exposure per segment"""
+        risks = np.array([0.1, 0.5, 0.2, 0.3])
+        aggregates = route_aggregates(risks, np.array([0, 2]), np.full(4, np.nan))
+
+        np.testing.assert_allclose(aggregates['max_risk'], [0.5, 0.3])
+        np.testing.assert_allclose(aggregates['mean_risk'], [0.3, 0.25])
+        np.testing.assert_allclose(aggregates['combined_risk'], [1 - 0.9 * 0.5, 1 - 0.8 * 0.7])
+        assert np.isnan(aggregates['length']).all()
+
+    def test_with_lengths(self):
+        """Test length-weighted mean and length-scaled exposure"""
+        risks = np.array([0.1, 0.4])
+        lengths = np.array([3.0, 1.0])
+
+        aggregates = route_aggregates(risks, np.array([0]), lengths, reference_length=2.0)
+
+        assert aggregates['length'][0] == 4.0
+        assert aggregates['mean_risk'][0] == pytest.approx((0.3 + 0.4) / 4)
+        assert aggregates['combined_risk'][0] == pytest.approx(1 - 0.9 ** 1.5 * 0.6 ** 0.5)
+
+    def test_risks_clipped_for_combination(self):
+        """Test out-of-range regression outputs still give a probability"""
+        aggregates = route_aggregates(np.array([-0.05, 1.2]), np.array([0, 1]), np.full(2, np.nan))
+
+        np.testing.assert_allclose(aggregates['combined_risk'], [0.0, 1.0])
+
+    def test_mixed_lengths_rejected(self):
+        """Test a route with lengths on only some segments is refused"""
+        with pytest.raises(RouteError):
+            route_aggregates(np.array([0.1, 0.2]), np.array([0]), np.array([1.0, np.nan]))
+
+    def test_invalid_routes(self, scenarios):
+        """Test empty calls, empty routes and oversized calls are refused"""
+        with pytest.raises(RouteError):
+            flatten_routes([])
+        with pytest.raises(RouteError):
+            flatten_routes([scenarios[:2], []])
+        with pytest.raises(RouteError):
+            flatten_routes([scenarios[:10]], max_segments=5)
+
+
+class TestScoreRoutes:
+    """Test batched route scoring"""
+
+    def test_matches_segment_predictions(self, predictor, scenarios):
+        """Test segment risks equal single predictions and aggregates follow"""
+        route = [dict(scenario, length=float(i + 1)) for i, scenario in enumerate(scenarios[:6])]
+
+        results, _ = predictor.score_routes([route])
+        expected = np.array([predictor.predict(segment) for segment in route])
+
+        result = results[0]
+        np.testing.assert_allclose(result['risks'], expected)
+        assert result['max_risk'] == pytest.approx(expected.max())
+        assert result['mean_risk'] == pytest.approx(np.average(expected, weights=np.arange(1, 7)))
+        assert result['length'] == 21.0
+
+    def test_shared_segments_scored_once(self, predictor, scenarios):
+        """Test segments repeated across routes are deduplicated"""
+        routes = [scenarios[:10], scenarios[5:15], scenarios[:10][::-1]]
+
+        results, stats = predictor.score_routes(routes)
+
+        assert stats['segments'] == 30
+        assert stats['unique_segments'] == 15
+        np.testing.assert_allclose(results[2]['risks'], results[0]['risks'][::-1])
+        assert [result['segments'] for result in results] == [10, 10, 10]
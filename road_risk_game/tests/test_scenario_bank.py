@@ -0,0 +1,74 @@
+"""
+Tests for the precomputed scenario-pair bank
+"""
+import random
+
+import numpy as np
+import pytest
+
+from utils.game_logic import ScenarioGenerator
+from utils.model_utils import RiskPredictor
+from utils.scenario_bank import (
+    ScenarioBank,
+    bank_path,
+    build_bank,
+    pack_pairs,
+    load_banks,
+    save_bank,
+)
+
+
+@pytest.fixture(scope="module")
+def predictor():
+    """Create predictor instance"""
+    return RiskPredictor(models_dir="models")
+
+
+class TestScenarioBank:
+    """Test bank building, storage and drawing"""
+
+    @pytest.mark.parametrize("difficulty", ['easy', 'medium', 'hard'])
+    def test_build_bank_respects_gap_range(self, predictor, difficulty):
+        """Test kept pairs lie within the difficulty's risk gap range"""
+        settings = ScenarioGenerator.DIFFICULTY_SETTINGS[difficulty]
+
+        records = build_bank(predictor, difficulty, n_pairs=40, batch_size=500)
+
+        assert len(records) == 40
+        assert (records['gap'] >= settings['min_difference']).all()
+        assert (records['gap'] <= settings['max_difference']).all()
+
+    def test_stored_risks_match_model(self, predictor, tmp_path):
+        """Test a memory-mapped bank returns the scored risks"""
+        records = build_bank(predictor, 'easy', n_pairs=10, batch_size=200)
+        save_bank(bank_path(tmp_path, 'easy'), records)
+
+        bank = load_banks(tmp_path)['easy']
+        scenario1, scenario2, risk1, risk2 = bank.pair(3)
+
+        assert isinstance(bank.records, np.memmap)
+        assert risk1 == pytest.approx(predictor.predict(scenario1), abs=1e-6)
+        assert risk2 == pytest.approx(predictor.predict(scenario2), abs=1e-6)
+
+    def test_draw_without_repeats(self, tmp_path):
+        """Test a session sees every pair once before any repeat"""
+        records = pack_pairs(ScenarioGenerator.generate_batch(25, seed=1),
+                             ScenarioGenerator.generate_batch(25, seed=2),
+                             np.zeros(25), np.ones(25))
+        save_bank(tmp_path / "bank.npy", records)
+        bank = ScenarioBank(tmp_path / "bank.npy")
+        rng = random.Random(0)
+        seen = set()
+
+        drawn = [bank.draw_index(rng, seen) for _ in range(25)]
+
+        assert sorted(drawn) == list(range(25))
+        bank.draw_index(rng, seen)
+        assert len(seen) == 1
+
+    def test_rejects_foreign_array(self, tmp_path):
+        """Test arbitrary arrays are not accepted as banks"""
+        np.save(tmp_path / "other.npy", np.arange(10))
+
+        with pytest.raises(ValueError):
+            ScenarioBank(tmp_path / "other.npy")
@@ -0,0 +1,112 @@
+"""
+Tests for the road segment feature store
+"""
+import numpy as np
+import pytest
+from pathlib import Path
+
+from utils.features import FeatureEncoder, UnknownCategoryError
+from utils.game_logic import ScenarioGenerator
+from utils.model_bundle import BUNDLE_FILENAME, load_bundle
+from utils.segment_store import (
+    DYNAMIC_FEATURES,
+    SegmentStore,
+    SegmentStoreError,
+    UnknownSegmentError,
+    build_segment_store,
+)
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+
+
+@pytest.fixture(scope="module")
+def bundle():
+    """Shipped model bundle"""
+    return load_bundle(MODELS_DIR / BUNDLE_FILENAME)
+
+
+@pytest.fixture(scope="module")
+def encoder(bundle):
+    """Encoder of the shipped model"""
+    return FeatureEncoder(bundle['vocabularies'], bundle['feature_names'])
+
+
+@pytest.fixture(scope="module")
+def segments():
+    """1000 generated scenarios with shuffled segment ids"""
+    frame = ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(1000, seed=21))
+    frame['segment_id'] = [f"road-{i}" for i in np.random.default_rng(0).permutation(len(frame))]
+    return frame
+
+
+@pytest.fixture(scope="module")
+def store(bundle, segments, tmp_path_factory):
+    """Store built from the generated segments"""
+    directory = tmp_path_factory.mktemp("segments")
+    build_segment_store(segments, directory, bundle['vocabularies'], bundle['feature_names'])
+    return SegmentStore(directory)
+
+
+class TestSegmentStore:
+    """Test building, lookups and joins"""
+
+    def test_join_matches_full_encoding(self, store, segments, encoder, bundle):
+        """Test store rows plus conditions equal encoding the whole scenario"""
+        sample = segments.sample(200, random_state=1)
+        conditions = {col: sample[col].to_numpy() for col in DYNAMIC_FEATURES}
+
+        X = store.join(sample['segment_id'].to_numpy(), conditions, encoder)
+        expected = encoder.transform(sample.drop(columns='segment_id'))
+
+        np.testing.assert_array_equal(X.to_numpy(), expected.to_numpy(dtype=np.float64))
+        assert list(X.columns) == bundle['feature_names']
+        np.testing.assert_array_equal(bundle['model'].predict(X), bundle['model'].predict(expected))
+
+    def test_scalar_conditions_broadcast(self, store, segments, encoder):
+        """Test single condition values apply to every segment"""
+        ids = segments['segment_id'].iloc[:5].to_numpy()
+        conditions = {'lighting': 'night', 'weather': 'rainy', 'time_of_day': 'evening',
+                      'holiday': True, 'school_season': False}
+
+        X = store.join(ids, conditions, encoder)
+        static = segments.iloc[:5].drop(columns='segment_id')
+        expected = encoder.transform(static.assign(**conditions))
+
+        np.testing.assert_array_equal(X.to_numpy(), expected.to_numpy(dtype=np.float64))
+
+    def test_memory_mapped(self, store):
+        """Test the feature matrix is read through a memory map"""
+        assert isinstance(store.features, np.memmap)
+        assert len(store) == 1000
+
+    def test_unknown_segments(self, store):
+        """Test every missing id is reported"""
+        with pytest.raises(UnknownSegmentError) as error:
+            store.rows(['road-3', 'nowhere', 'zzz'])
+
+        assert error.value.missing == ['nowhere', 'zzz']
+
+    def test_unknown_condition(self, store, encoder):
+        """Test conditions outside the vocabulary are rejected"""
+        conditions = {'lighting': 'night', 'weather': 'hail', 'time_of_day': 'evening',
+                      'holiday': True, 'school_season': False}
+
+        with pytest.raises(UnknownCategoryError):
+            store.join(['road-3'], conditions, encoder)
+
+    def test_schema_check(self, store, bundle):
+        """Test a store refuses models encoded differently"""
+        store.check_schema(bundle['schema_hash'])
+        with pytest.raises(SegmentStoreError):
+            store.check_schema('0' * 64)
+
+    def test_duplicate_ids_rejected(self, bundle, segments, tmp_path):
+        """Test duplicate segment ids are refused and nothing is written"""
+        duplicated = segments.copy()
+        duplicated.loc[duplicated.index[1], 'segment_id'] = duplicated['segment_id'].iloc[0]
+
+        with pytest.raises(SegmentStoreError):
+            build_segment_store(duplicated, tmp_path, bundle['vocabularies'],
+                                bundle['feature_names'])
+        with pytest.raises(SegmentStoreError):
+            SegmentStore(tmp_path)
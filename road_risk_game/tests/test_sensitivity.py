@@ -0,0 +1,83 @@
+"""
+Tests for what-if sensitivity analysis
+"""
+import numpy as np
+import pytest
+
+from utils.model_utils import RiskPredictor
+from utils.sensitivity import GridTooLargeError, InvalidSweepError, build_sweep_grid, grid_shape
+
+BASE_SCENARIO = {
+    'road_type': 'rural',
+    'num_lanes': 2,
+    'curvature': 0.6,
+    'speed_limit': 60,
+    'lighting': 'dim',
+    'weather': 'rainy',
+    'road_signs_present': False,
+    'public_road': True,
+    'time_of_day': 'evening',
+    'holiday': False,
+    'school_season': True,
+    'num_reported_accidents': 1
+}
+
+
+class TestSweepGrid:
+    """Test grid materialization"""
+
+    def test_grid_is_cartesian_product(self):
+        """Test every combination appears once in C order"""
+        sweeps = {'speed_limit': [25, 45, 70], 'road_signs_present': [False, True]}
+
+        grid = build_sweep_grid(BASE_SCENARIO, sweeps)
+
+        assert len(grid) == 6
+        assert grid['speed_limit'].tolist() == [25, 25, 45, 45, 70, 70]
+        assert grid['road_signs_present'].tolist() == [False, True] * 3
+        assert (grid['weather'] == 'rainy').all()
+        assert grid_shape(sweeps) == (3, 2)
+
+    def test_grid_cap(self):
+        """Test oversized grids are rejected before materializing"""
+        sweeps = {'curvature': np.linspace(0, 1, 101), 'num_lanes': [1, 2, 3, 4]}
+
+        with pytest.raises(GridTooLargeError):
+            build_sweep_grid(BASE_SCENARIO, sweeps, max_grid_size=400)
+
+    def test_unknown_feature(self):
+        """Test sweeping a feature the model does not use raises"""
+        with pytest.raises(ValueError):
+            build_sweep_grid(BASE_SCENARIO, {'traffic': [1, 2]})
+
+    def test_empty_sweep(self):
+        """Test a sweep without values raises"""
+        with pytest.raises(ValueError):
+            build_sweep_grid(BASE_SCENARIO, {'curvature': []})
+
+    def test_no_sweeps(self):
+        """Test an empty set of sweeps raises instead of giving a 0-d surface"""
+        with pytest.raises(InvalidSweepError):
+            build_sweep_grid(BASE_SCENARIO, {})
+
+
+class TestPredictorSensitivity:
+    """Test the batched risk surface"""
+
+    @pytest.fixture
+    def predictor(self):
+        """Create predictor instance"""
+        return RiskPredictor(models_dir="models")
+
+    def test_surface_matches_single_predictions(self, predictor):
+        """Test the batched surface equals one-by-one predictions"""
+        sweeps = {'speed_limit': [25, 70], 'curvature': [0.1, 0.5, 0.9]}
+
+        result = predictor.sensitivity(BASE_SCENARIO, sweeps)
+
+        assert result['risks'].shape == (2, 3)
+        assert result['base_risk'] == pytest.approx(predictor.predict(BASE_SCENARIO))
+        for i, speed in enumerate(sweeps['speed_limit']):
+            for j, curvature in enumerate(sweeps['curvature']):
+                variant = dict(BASE_SCENARIO, speed_limit=speed, curvature=curvature)
+                assert result['risks'][i, j] == pytest.approx(predictor.predict(variant))
@@ -0,0 +1,140 @@
+"""
+Tests for shadow model evaluation
+"""
+import pytest
+from pathlib import Path
+
+from utils.game_logic import ScenarioGenerator
+from utils.model_utils import RiskPredictor
+from utils.shadow import ShadowEvaluator, ShadowStats, higher_risk_index
+
+MODELS_DIR = Path(__file__).parent.parent / "models"
+BUNDLE_PATH = MODELS_DIR / "model_bundle.joblib"
+
+
+@pytest.fixture(scope="module")
+def predictor():
+    """Serving model"""
+    return RiskPredictor(models_dir=str(MODELS_DIR))
+
+
+@pytest.fixture(scope="module")
+def traffic(predictor):
+    """300 raw scenarios and the serving model's risks"""
+    frame = ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(300, seed=12))
+    return frame.to_dict('records'), predictor.predict_batch(frame)
+
+
+class TestShadowStats:
+    """Test divergence aggregation"""
+
+    def test_deltas(self):
+        """Test absolute, signed and max deltas"""
+        stats = ShadowStats()
+        stats.add([0.1, 0.5, 0.3], [0.2, 0.5, 0.1], primary_latency_ms=3.0, shadow_cpu_ms=0.6)
+
+        summary = stats.summary()
+
+        assert summary['scored'] == 3
+        assert summary['mean_abs_delta'] == pytest.approx(0.1)
+        assert summary['mean_delta'] == pytest.approx(-0.1 / 3)
+        assert summary['max_abs_delta'] == pytest.approx(0.2)
+        assert summary['cpu_overhead'] == pytest.approx(0.2)
+
+    def test_rank_agreement_spans_batches(self):
+        """Test consecutive requests are paired, including across batches"""
+        stats = ShadowStats()
+        stats.add([0.1, 0.2], [0.1, 0.2], 1.0, 0.1)
+        # 0.2 -> 0.3 agrees, 0.3 -> 0.1 flips in the shadow
+        stats.add([0.3, 0.1], [0.3, 0.4], 1.0, 0.1)
+
+        summary = stats.summary()
+
+        assert summary['pairs'] == 3
+        assert summary['rank_agreement'] == pytest.approx(2 / 3)
+
+    def test_empty_and_reset(self):
+        """Test averages are None without results and after a reset"""
+        stats = ShadowStats()
+        assert stats.summary()['mean_abs_delta'] is None
+
+        stats.add([0.1], [0.2], 1.0, 0.1)
+        stats.reset()
+
+        assert stats.summary()['scored'] == 0
+        assert stats.summary()['rank_agreement'] is None
+
+    def test_higher_risk_index_matches_compare_scenarios(self, predictor, traffic):
+        """Test the pair rule is the one compare_scenarios uses"""
+        scenarios, risks = traffic
+        for i in range(5):
+            _, _, higher = predictor.compare_scenarios(scenarios[i], scenarios[i + 1])
+            assert higher_risk_index(risks[i], risks[i + 1]) == higher
+
+
+class TestShadowEvaluator:
+    """Test sampling and scoring in the worker pool"""
+
+    def test_same_model_agrees(self, traffic):
+        """Test the serving bundle as its own shadow shows no divergence"""
+        scenarios, risks = traffic
+        shadow = ShadowEvaluator(str(BUNDLE_PATH), fraction=1.0, batch_rows=64)
+        try:
+            for scenario, risk in zip(scenarios, risks):
+                assert shadow.submit(scenario, float(risk), 1.0)
+            assert shadow.drain(timeout=60)
+            report = shadow.report()
+        finally:
+            shadow.close()
+
+        assert report['scored'] == len(scenarios)
+        assert report['max_abs_delta'] < 1e-12
+        assert report['rank_agreement'] == 1.0
+        assert report['shadow_cpu_ms'] >= 0
+
+    def test_full_buffer_drops(self, traffic):
+        """Test samples beyond max_pending are dropped and counted"""
+        scenarios, risks = traffic
+        shadow = ShadowEvaluator(str(BUNDLE_PATH), batch_rows=1000, flush_interval=60,
+                                 max_pending=10)
+        try:
+            accepted = [shadow.submit(scenario, float(risk), 1.0)
+                        for scenario, risk in zip(scenarios[:25], risks)]
+            report = shadow.report()
+        finally:
+            shadow.close(wait=False)
+
+        assert accepted.count(True) == 10
+        assert report['dropped'] == 15
+        assert report['pending'] == 10
+
+    def test_failures_counted(self, traffic, tmp_path):
+        """Test a bundle that cannot be loaded is reported, not raised"""
+        scenarios, risks = traffic
+        shadow = ShadowEvaluator(str(tmp_path / "missing.joblib"), batch_rows=10)
+        try:
+            for scenario, risk in zip(scenarios[:10], risks):
+                shadow.submit(scenario, float(risk), 1.0)
+            assert shadow.drain(timeout=60)
+            report = shadow.report()
+        finally:
+            shadow.close()
+
+        assert report['failed'] == 10
+        assert report['errors'] == 1
+        assert report['scored'] == 0
+
+    def test_sampling_fraction(self):
+        """Test roughly the configured share of requests is sampled"""
+        shadow = ShadowEvaluator(str(BUNDLE_PATH), fraction=0.2, seed=0)
+        try:
+            sampled = sum(shadow.sample() for _ in range(10_000))
+        finally:
+            shadow.close()
+
+        assert 1800 < sampled < 2200
+
+    def test_invalid_fraction(self):
+        """Test fractions outside [0, 1] are rejected"""
+        with pytest.raises(ValueError):
+            ShadowEvaluator(str(BUNDLE_PATH), fraction=1.5)
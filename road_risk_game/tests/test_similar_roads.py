@@ -0,0 +1,123 @@
+"""
+Tests for the similar-roads index
+"""
+import numpy as np
+import pytest
+
+from utils.game_logic import ScenarioGenerator
+from utils.similar_roads import (
+    KEY_COLUMNS,
+    ORDINAL_COLUMNS,
+    SimilarRoadsError,
+    SimilarRoadsIndex,
+    build_similar_roads_index,
+)
+
+
+@pytest.fixture(scope="module")
+def training():
+    """20000 generated rows with rounded curvature and a random risk"""
+    frame = ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(20000, seed=48))
+    rng = np.random.default_rng(48)
+    frame['curvature'] = frame['curvature'].round(2)
+    frame['accident_risk'] = rng.uniform(0, 1, len(frame)).round(2)
+    frame.insert(0, 'id', np.arange(100, 100 + len(frame)))
+    return frame
+
+
+@pytest.fixture(scope="module")
+def index(training, tmp_path_factory):
+    """Index over the training rows, memory-mapped"""
+    directory = tmp_path_factory.mktemp("similar_roads")
+    build_similar_roads_index(training, directory)
+    return SimilarRoadsIndex(directory)
+
+
+def brute_force(training, scenario, k):
+    """k smallest distances over every row"""
+    distance = np.zeros(len(training))
+    for col in KEY_COLUMNS + ['curvature']:
+        values = training[col].to_numpy()
+        if col in ORDINAL_COLUMNS + ['curvature']:
+            values = values.astype(float)
+            distance += np.abs(values - scenario[col]) / (values.max() - values.min())
+        else:
+            distance += values != scenario[col]
+    return np.sort(distance)[:k]
+
+
+class TestSimilarRoadsIndex:
+    """Test building and searching"""
+
+    def test_partitions(self, index, training):
+        """Test every row is stored once and partitions are curvature-sorted"""
+        assert len(index) == len(training)
+        assert sorted(np.asarray(index.ids)) == sorted(training['id'])
+        for start, end in zip(index.offsets[:50], index.offsets[1:51]):
+            assert np.all(np.diff(index.curvature[start:end]) >= 0)
+
+    def test_exact_row_found_first(self, index, training):
+        """Test a training row is its own nearest neighbor"""
+        row = training.iloc[123].to_dict()
+
+        nearest = index.neighbors(row, k=1)[0]
+
+        assert nearest['distance'] == 0.0
+        assert {col: nearest[col] for col in KEY_COLUMNS} == {col: row[col] for col in KEY_COLUMNS}
+
+    def test_matches_brute_force(self, index, training):
+        """Test distances equal a full scan for seen keys"""
+        rng = np.random.default_rng(0)
+        for position in rng.integers(len(training), size=20):
+            scenario = dict(training.iloc[position].to_dict(), curvature=float(rng.uniform(0, 1)))
+
+            distances = [road['distance'] for road in index.neighbors(scenario, k=5)]
+
+            np.testing.assert_allclose(distances, brute_force(training, scenario, 5))
+
+    def test_unseen_value_falls_back(self, index, training):
+        """Test values never seen in training are ranked over all rows"""
+        scenario = dict(training.iloc[0].to_dict(), speed_limit=55, weather='snowy')
+
+        roads = index.neighbors(scenario, k=3)
+
+        np.testing.assert_allclose([road['distance'] for road in roads],
+                                   brute_force(training, scenario, 3))
+
+    def test_query_frame(self, index, training):
+        """Test the DataFrame form keeps the neighbor order"""
+        scenario = training.iloc[7].to_dict()
+
+        frame = index.query(scenario, k=4)
+
+        assert len(frame) == 4
+        assert list(frame.columns[:4]) == ['id', 'distance', 'accident_risk', 'curvature']
+        assert frame['distance'].is_monotonic_increasing
+
+    def test_k_beyond_rows(self, training, tmp_path):
+        """Test asking for more rows than indexed returns them all"""
+        build_similar_roads_index(training.head(3), tmp_path)
+
+        assert len(SimilarRoadsIndex(tmp_path).neighbors(training.iloc[0].to_dict(), k=10)) == 3
+
+    def test_weights(self, training, tmp_path):
+        """Test weights change the ranking and unknown columns are refused"""
+        build_similar_roads_index(training, tmp_path)
+        scenario = training.iloc[5].to_dict()
+
+        nearest = SimilarRoadsIndex(tmp_path, weights={'weather': 10.0}).neighbors(scenario, k=20)
+
+        assert all(road['weather'] == scenario['weather'] for road in nearest)
+        with pytest.raises(SimilarRoadsError):
+            SimilarRoadsIndex(tmp_path, weights={'colour': 1.0})
+
+    def test_invalid(self, index, training, tmp_path):
+        """Test missing columns, bad k and missing indexes"""
+        with pytest.raises(SimilarRoadsError):
+            index.neighbors({'road_type': 'urban'})
+        with pytest.raises(SimilarRoadsError):
+            index.neighbors(training.iloc[0].to_dict(), k=0)
+        with pytest.raises(SimilarRoadsError):
+            build_similar_roads_index(training.drop(columns=['curvature']), tmp_path)
+        with pytest.raises(SimilarRoadsError):
+            SimilarRoadsIndex(tmp_path / "missing")
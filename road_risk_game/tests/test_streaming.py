@@ -0,0 +1,110 @@
+"""
+Tests for NDJSON streaming scoring
+"""
+import asyncio
+import json
+
+import numpy as np
+import pytest
+
+from utils.streaming import LineTooLongError, NDJSONScorer, iter_batches, iter_lines
+
+SCENARIO = {
+    'road_type': 'urban',
+    'num_lanes': 2,
+    'curvature': 0.3,
+    'speed_limit': 35,
+    'lighting': 'daylight',
+    'weather': 'clear',
+    'road_signs_present': True,
+    'public_road': True,
+    'time_of_day': 'morning',
+    'holiday': False,
+    'school_season': True,
+    'num_reported_accidents': 0
+}
+
+
+async def _chunks(parts):
+    """Async byte stream from a list of chunks"""
+    for part in parts:
+        yield part
+
+
+async def _collect(aiter):
+    """Drain an async iterator into a list"""
+    return [item async for item in aiter]
+
+
+def score_curvature(frame):
+    """Fake scorer that rejects curvature above 1"""
+    if (frame['curvature'] > 1).any():
+        raise ValueError("curvature out of range")
+    return frame['curvature'].to_numpy() * 2
+
+
+class TestLineFraming:
+    """Test splitting a byte stream into lines and batches"""
+
+    def test_lines_split_across_chunks(self):
+        """Test lines that straddle chunk boundaries are rejoined"""
+        chunks = _chunks([b'{"a"', b': 1}\n{"b": ', b'2}\n', b'{"c": 3}'])
+
+        lines = asyncio.run(_collect(iter_lines(chunks)))
+
+        assert lines == [b'{"a": 1}', b'{"b": 2}', b'{"c": 3}']
+
+    def test_batches_bounded(self):
+        """Test batches never exceed the requested size"""
+        body = b"".join(b'{}\n' for _ in range(25))
+        chunks = _chunks([body[:10], body[10:]])
+
+        batches = asyncio.run(_collect(iter_batches(chunks, batch_rows=10)))
+
+        assert [len(batch) for batch in batches] == [10, 10, 5]
+
+    def test_line_too_long(self):
+        """Test a stream without newlines is cut off"""
+        with pytest.raises(LineTooLongError):
+            asyncio.run(_collect(iter_lines(_chunks([b'x' * 60, b'x' * 60]), max_line_bytes=100)))
+
+
+class TestNDJSONScorer:
+    """Test per-line results"""
+
+    def test_one_output_line_per_input_line(self):
+        """Test results keep order, line numbers and ids"""
+        lines = [json.dumps({'curvature': 0.1, 'id': 'a'}).encode(),
+                 json.dumps({'curvature': 0.2}).encode()]
+
+        output = NDJSONScorer(score_curvature).score_lines(lines, first_line=11)
+        records = [json.loads(line) for line in output.decode().splitlines()]
+
+        assert records == [{'line': 11, 'id': 'a', 'accident_risk': 0.2},
+                           {'line': 12, 'accident_risk': 0.4}]
+
+    def test_bad_rows_are_isolated(self):
+        """Test malformed and invalid rows report errors without failing the batch"""
+        lines = [json.dumps({'curvature': c}).encode() for c in (0.1, 0.2, 5.0, 0.3)]
+        lines.insert(1, b'{not json')
+        lines.insert(2, b'')
+
+        output = NDJSONScorer(score_curvature).score_lines(lines)
+        records = [json.loads(line) for line in output.decode().splitlines()]
+
+        assert [record['line'] for record in records] == [1, 2, 3, 4, 5, 6]
+        assert 'error' in records[1] and 'error' in records[2]
+        assert records[4]['error'] == "curvature out of range"
+        assert [records[i]['accident_risk'] for i in (0, 3, 5)] == pytest.approx([0.2, 0.4, 0.6])
+
+    def test_matches_model(self):
+        """Test streamed risks equal direct predictions"""
+        from utils.model_utils import RiskPredictor
+        predictor = RiskPredictor(models_dir="models")
+        scenarios = [dict(SCENARIO, curvature=c) for c in np.linspace(0, 1, 7).round(2)]
+
+        output = NDJSONScorer(predictor.predict_batch).score_lines(
+            [json.dumps(s).encode() for s in scenarios])
+        risks = [json.loads(line)['accident_risk'] for line in output.decode().splitlines()]
+
+        assert np.allclose(risks, predictor.predict_batch(scenarios))
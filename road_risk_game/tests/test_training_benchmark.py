@@ -0,0 +1,87 @@
+"""
+Tests for the training benchmark
+"""
+import numpy as np
+import pytest
+from sklearn.tree import DecisionTreeRegressor
+
+from utils.features import CATEGORICAL_FEATURES
+from utils.game_logic import ScenarioGenerator
+from utils.training_benchmark import (
+    BASELINE,
+    break_even,
+    encode_training_frame,
+    run_benchmark,
+    size_grid,
+    upsample,
+)
+
+
+@pytest.fixture(scope="module")
+def training_data():
+    """Encoded features and a target for 1000 generated scenarios"""
+    frame = ScenarioGenerator.batch_to_frame(ScenarioGenerator.generate_batch(1000, seed=5))
+    frame['accident_risk'] = frame['curvature'] * 0.5 + frame['speed_limit'] / 200
+    return encode_training_frame(frame)
+
+
+def tree(depth):
+    """Fast stand-in trainer"""
+    return lambda n_threads: DecisionTreeRegressor(max_depth=depth, random_state=0)
+
+
+class TestPreparation:
+    """Test encoding, upsampling and size selection"""
+
+    def test_encoding_matches_label_encoder(self, training_data):
+        """Test categories get LabelEncoder's sorted codes"""
+        X, y = training_data
+
+        assert list(X.columns[-4:]) == ['speed_curvature', 'lanes_accidents', 'high_speed',
+                                        'sharp_curve']
+        assert all(X[col].min() == 0 for col in CATEGORICAL_FEATURES)
+        assert len(y) == len(X)
+
+    def test_upsample_keeps_originals(self, training_data):
+        """Test upsampling appends jittered copies after the original rows"""
+        X, y = training_data
+
+        X_big, y_big = upsample(X, y, 2.5, seed=0)
+
+        assert len(X_big) == len(y_big) == 2500
+        assert np.array_equal(X_big['num_lanes'][:1000], X['num_lanes'])
+        assert X_big['curvature'].between(0, 1).all()
+        assert np.allclose(X_big['speed_curvature'], X_big['speed_limit'] * X_big['curvature'])
+
+    def test_size_grid(self):
+        """Test sizes grow geometrically to the full set, then upsample"""
+        assert size_grid(50_000, 10_000, 2.0, (2, 5)) == [10_000, 20_000, 40_000, 50_000,
+                                                          100_000, 250_000]
+
+
+class TestRunBenchmark:
+    """Test measurements and break-even points"""
+
+    def test_every_combination_measured(self, training_data):
+        """Test threaded trainers run once per thread count and others once"""
+        X, y = training_data
+        trainers = {BASELINE: (tree(8), False), 'stump': (tree(1), True)}
+
+        results = run_benchmark(X, y, [200, 800, 1600], threads=[1, 2], trainers=trainers, log=None)
+
+        assert len(results) == 3 * (1 + 2)
+        assert [r['source'] for r in results[::3]] == ['subsample', 'full', 'upsampled']
+        assert all(r['fit_s'] >= 0 and r['peak_rss_mb'] > 0 for r in results)
+        assert all(-1 < r['val_r2'] <= 1 for r in results)
+
+    def test_break_even(self):
+        """Test the first size where an alternative is faster is reported"""
+        results = [
+            {'trainer': BASELINE, 'threads': 1, 'rows': 10, 'fit_s': 1.0},
+            {'trainer': BASELINE, 'threads': 1, 'rows': 100, 'fit_s': 5.0},
+            {'trainer': 'fast', 'threads': 4, 'rows': 10, 'fit_s': 2.0},
+            {'trainer': 'fast', 'threads': 4, 'rows': 100, 'fit_s': 3.0},
+            {'trainer': 'slow', 'threads': 1, 'rows': 100, 'fit_s': 9.0},
+        ]
+
+        assert break_even(results) == {'fast@4': 100, 'slow@1': None}
@@ -0,0 +1,164 @@
+"""
+Staged Boosting Search
+======================
+Grid search for gradient boosting that picks ``n_estimators`` from one fit.
+
+A boosted model with k trees is the first k trees of a bigger one, so
+fitting every ``n_estimators`` candidate separately repeats work. Here each
+combination of the other parameters is fitted once per fold at the largest
+estimator count, and the validation score of every prefix length is
+accumulated tree by tree while it fits (the same values ``staged_predict``
+would return). The best prefix length becomes ``n_estimators``. A fit can
+also stop early once the validation loss has not improved for a number of
+trees.
+"""
+
+from itertools import product
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.base import clone
+from sklearn.model_selection import KFold
+
+
+def _validation_curve(estimator, params: Dict, X: np.ndarray, y: np.ndarray,
+                      train_idx: np.ndarray, val_idx: np.ndarray,
+                      patience: Optional[int], tol: float) -> np.ndarray:
+    """
+    Validation R² after every boosting stage of one fold.
+
+    Args:
+        estimator: Unfitted boosting regressor
+        params: Parameters for this candidate, including the maximum n_estimators
+        X: Feature matrix
+        y: Target
+        train_idx: Rows to fit on
+        val_idx: Rows to score
+        patience: Stop after this many stages without improvement; None never stops
+        tol: Smallest loss decrease that counts as an improvement
+
+    Returns:
+        R² of each prefix length, for as many stages as were fitted
+    """
+    model = clone(estimator).set_params(**params)
+    X_val = np.ascontiguousarray(X[val_idx], dtype=np.float32)
+    y_val = y[val_idx]
+    losses: List[float] = []
+    state = {'raw': None, 'best': np.inf, 'best_stage': 0}
+
+    def monitor(stage, fitted, _locals):
+        # Identity-link losses: the raw score is the prediction
+        if state['raw'] is None:
+            init = fitted.init_
+            state['raw'] = (np.zeros(len(y_val)) if init == 'zero'
+                            else np.asarray(init.predict(X_val), dtype=np.float64).ravel())
+        state['raw'] += fitted.learning_rate * fitted.estimators_[stage, 0].predict(X_val)
+        loss = float(np.mean((y_val - state['raw']) ** 2))
+        losses.append(loss)
+
+        if loss < state['best'] - tol:
+            state['best'], state['best_stage'] = loss, stage
+        return patience is not None and stage - state['best_stage'] >= patience
+
+    model.fit(X[train_idx], y[train_idx], monitor=monitor)
+    return 1.0 - np.asarray(losses) / np.var(y_val)
+
+
+class StagedBoostingSearch:
+    """GridSearchCV-style search that scores every n_estimators from one fit."""
+
+    def __init__(self, estimator, param_grid: Dict[str, Sequence], cv: int = 5,
+                 patience: Optional[int] = None, tol: float = 0.0,
+                 n_jobs: Optional[int] = None, refit: bool = True,
+                 random_state: Optional[int] = None):
+        """
+        Initialize the search.
+
+        Args:
+            estimator: Unfitted GradientBoostingRegressor (or compatible)
+            param_grid: Parameter grid; ``n_estimators`` sets the largest count tried
+            cv: Number of folds
+            patience: Early-stopping patience in stages; None fits every tree
+            tol: Smallest validation loss decrease that resets patience
+            n_jobs: Parallel (candidate, fold) fits, as in joblib
+            refit: Refit the best candidate on all data as best_estimator_
+            random_state: Seed for shuffling the folds; None keeps row order
+        """
+        self.estimator = estimator
+        self.param_grid = param_grid
+        self.cv = cv
+        self.patience = patience
+        self.tol = tol
+        self.n_jobs = n_jobs
+        self.refit = refit
+        self.random_state = random_state
+
+    def _candidates(self) -> List[Dict]:
+        """Every combination of the grid without n_estimators."""
+        grid = {key: list(values) for key, values in self.param_grid.items()
+                if key != 'n_estimators'}
+        return [dict(zip(grid, values)) for values in product(*grid.values())]
+
+    def fit(self, X, y) -> "StagedBoostingSearch":
+        """
+        Run the search.
+
+        Args:
+            X: Feature matrix (DataFrame or array)
+            y: Target
+
+        Returns:
+            self, with best_params_, best_score_, best_estimator_ and
+            cv_results_ set
+        """
+        max_estimators = max(self.param_grid.get(
+            'n_estimators', [self.estimator.get_params()['n_estimators']]))
+        candidates = self._candidates()
+        X_array = np.asarray(X)
+        y_array = np.asarray(y, dtype=np.float64)
+
+        folds = list(KFold(self.cv, shuffle=self.random_state is not None,
+                           random_state=self.random_state).split(X_array))
+        curves = Parallel(n_jobs=self.n_jobs)(
+            delayed(_validation_curve)(self.estimator, dict(params, n_estimators=max_estimators),
+                                       X_array, y_array, train_idx, val_idx,
+                                       self.patience, self.tol)
+            for params in candidates for train_idx, val_idx in folds
+        )
+
+        self.cv_results_ = []
+        for index, params in enumerate(candidates):
+            fold_curves = curves[index * len(folds):(index + 1) * len(folds)]
+            # Folds may stop early at different stages; compare the common prefix
+            length = min(len(curve) for curve in fold_curves)
+            mean_curve = np.mean([curve[:length] for curve in fold_curves], axis=0)
+            best_stage = int(np.argmax(mean_curve))
+            self.cv_results_.append({
+                'params': dict(params, n_estimators=best_stage + 1),
+                'mean_test_score': float(mean_curve[best_stage]),
+                'stages_fitted': length,
+                'curve': mean_curve,
+            })
+
+        best = max(self.cv_results_, key=lambda result: result['mean_test_score'])
+        self.best_params_ = best['params']
+        self.best_score_ = best['mean_test_score']
+        self.best_index_ = self.cv_results_.index(best)
+
+        if self.refit:
+            self.best_estimator_ = clone(self.estimator).set_params(**self.best_params_).fit(X, y)
+        return self
+
+    def score_at(self, n_estimators: int) -> List[float]:
+        """
+        Mean CV R² of every candidate at a given estimator count.
+
+        Args:
+            n_estimators: Prefix length to read off the curves
+
+        Returns:
+            One score per candidate (NaN where the fit stopped earlier)
+        """
+        return [float(result['curve'][n_estimators - 1]) if n_estimators <= len(result['curve'])
+                else float('nan') for result in self.cv_results_]
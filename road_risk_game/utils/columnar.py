@@ -0,0 +1,293 @@
+"""
+Columnar Payloads
+=================
+Binary request and response bodies for high-volume API clients.
+
+A batch travels as whole columns instead of one JSON object per scenario:
+
+- ``application/x-npy``: a NumPy structured array, one field per column
+- ``application/vnd.apache.arrow.stream``: an Arrow IPC stream (needs pyarrow)
+- ``application/msgpack``: a map of column name to list (needs msgpack)
+
+Validation runs once per column over the whole array, so its cost does not
+grow with a per-object schema check.
+"""
+
+import io
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+from utils.features import BOOLEAN_FEATURES, INPUT_FEATURES
+
+try:
+    import pyarrow as pa
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional dependency
+    msgpack = None
+
+MEDIA_JSON = "application/json"
+MEDIA_NPY = "application/x-npy"
+MEDIA_ARROW = "application/vnd.apache.arrow.stream"
+MEDIA_MSGPACK = "application/msgpack"
+
+BINARY_MEDIA_TYPES = (MEDIA_NPY, MEDIA_ARROW, MEDIA_MSGPACK)
+
+# Inclusive bounds for numeric columns; None leaves that side open
+NUMERIC_RANGES = {
+    'num_lanes': (1, None),
+    'curvature': (0.0, 1.0),
+    'speed_limit': (1, None),
+    'num_reported_accidents': (0, None),
+}
+
+INTEGER_FEATURES = ['num_lanes', 'speed_limit', 'num_reported_accidents']
+
+# Offending row numbers quoted in a validation error
+_MAX_REPORTED_ROWS = 5
+
+
+class UnsupportedMediaTypeError(ValueError):
+    """Raised for a payload format that is unknown or whose library is missing."""
+
+
+class ColumnValidationError(ValueError):
+    """Raised when a columnar batch fails validation."""
+
+
+class BatchTooLargeError(ValueError):
+    """Raised when a batch holds more rows than the server accepts."""
+
+
+def media_type(header: Optional[str]) -> str:
+    """
+    Bare media type of a Content-Type header, without parameters.
+
+    Args:
+        header: Header value, e.g. 'application/json; charset=utf-8'
+
+    Returns:
+        Lower-cased media type; JSON when the header is missing
+    """
+    if not header:
+        return MEDIA_JSON
+    return header.split(';', 1)[0].strip().lower()
+
+
+def available_media_types() -> Tuple[str, ...]:
+    """Media types this process can decode and encode."""
+    types = [MEDIA_JSON, MEDIA_NPY]
+    if pa is not None:
+        types.append(MEDIA_ARROW)
+    if msgpack is not None:
+        types.append(MEDIA_MSGPACK)
+    return tuple(types)
+
+
+def negotiate(accept: Optional[str], default: str = MEDIA_JSON) -> str:
+    """
+    Pick the response media type from an Accept header.
+
+    Entries are tried by descending q-value; wildcards resolve to
+    ``default``.
+
+    Args:
+        accept: Accept header value
+        default: Media type used when the client accepts anything
+
+    Returns:
+        Chosen media type
+
+    Raises:
+        UnsupportedMediaTypeError: If no acceptable type is available
+    """
+    if not accept:
+        return default
+
+    candidates = []
+    for position, entry in enumerate(accept.split(',')):
+        parts = [part.strip() for part in entry.split(';')]
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if quality > 0:
+            candidates.append((-quality, position, parts[0].lower()))
+
+    available = available_media_types()
+    for _, _, candidate in sorted(candidates):
+        if candidate in ('*/*', 'application/*'):
+            return default
+        if candidate in available:
+            return candidate
+    raise UnsupportedMediaTypeError(f"None of '{accept}' is available; use one of {available}")
+
+
+def _require(module, name: str, content_type: str):
+    """Fail clearly when the library behind a media type is not installed."""
+    if module is None:
+        raise UnsupportedMediaTypeError(f"{content_type} needs the '{name}' package")
+
+
+def decode_columns(body: bytes, content_type: str) -> Dict[str, np.ndarray]:
+    """
+    Decode a binary request body into column arrays.
+
+    Args:
+        body: Raw request body
+        content_type: One of BINARY_MEDIA_TYPES
+
+    Returns:
+        Mapping of column name to 1-d array
+
+    Raises:
+        UnsupportedMediaTypeError: For an unknown or unavailable format
+        ColumnValidationError: If the body cannot be read as columns
+    """
+    try:
+        if content_type == MEDIA_NPY:
+            array = np.load(io.BytesIO(body), allow_pickle=False)
+            if array.dtype.names is None:
+                raise ColumnValidationError("npy body must be a structured array with named fields")
+            return {name: array[name] for name in array.dtype.names}
+
+        if content_type == MEDIA_ARROW:
+            _require(pa, 'pyarrow', content_type)
+            table = pa.ipc.open_stream(body).read_all()
+            return {name: table.column(name).to_numpy() for name in table.column_names}
+
+        if content_type == MEDIA_MSGPACK:
+            _require(msgpack, 'msgpack', content_type)
+            data = msgpack.unpackb(body, raw=False)
+            if not isinstance(data, dict):
+                raise ColumnValidationError("msgpack body must be a map of column name to values")
+            return {name: np.asarray(values) for name, values in data.items()}
+
+    except (UnsupportedMediaTypeError, ColumnValidationError):
+        raise
+    except Exception as e:
+        raise ColumnValidationError(f"Could not decode {content_type} body: {e}")
+
+    raise UnsupportedMediaTypeError(f"Unsupported content type '{content_type}'")
+
+
+def encode_columns(columns: Mapping[str, np.ndarray], content_type: str) -> bytes:
+    """
+    Encode column arrays as a response body.
+
+    Args:
+        columns: Mapping of column name to 1-d array of equal length
+        content_type: One of BINARY_MEDIA_TYPES
+
+    Returns:
+        Encoded body
+    """
+    if content_type == MEDIA_NPY:
+        arrays = [np.asarray(values) for values in columns.values()]
+        records = np.empty(len(arrays[0]) if arrays else 0,
+                           dtype=[(name, values.dtype) for name, values in zip(columns, arrays)])
+        for name, values in zip(columns, arrays):
+            records[name] = values
+        buffer = io.BytesIO()
+        np.save(buffer, records, allow_pickle=False)
+        return buffer.getvalue()
+
+    if content_type == MEDIA_ARROW:
+        _require(pa, 'pyarrow', content_type)
+        table = pa.table({name: np.asarray(values) for name, values in columns.items()})
+        sink = pa.BufferOutputStream()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+        return sink.getvalue().to_pybytes()
+
+    if content_type == MEDIA_MSGPACK:
+        _require(msgpack, 'msgpack', content_type)
+        return msgpack.packb({name: np.asarray(values).tolist()
+                              for name, values in columns.items()})
+
+    raise UnsupportedMediaTypeError(f"Unsupported content type '{content_type}'")
+
+
+def _bad_rows(mask: np.ndarray) -> str:
+    """First offending row numbers, for error messages."""
+    rows = np.flatnonzero(mask)
+    shown = ', '.join(str(row) for row in rows[:_MAX_REPORTED_ROWS])
+    more = f" and {len(rows) - _MAX_REPORTED_ROWS} more" if len(rows) > _MAX_REPORTED_ROWS else ""
+    return f"rows {shown}{more}"
+
+
+def validate_columns(
+        columns: Mapping[str, np.ndarray],
+        vocabularies: Optional[Mapping[str, Sequence]] = None) -> Dict[str, np.ndarray]:
+    """
+    Check a columnar batch and normalize its dtypes, one column at a time.
+
+    Args:
+        columns: Mapping of input column to values
+        vocabularies: Allowed values per categorical column; categories are
+                      not checked when omitted
+
+    Returns:
+        Columns restricted to INPUT_FEATURES, with bool and numeric dtypes
+
+    Raises:
+        ColumnValidationError: Describing the first failing column
+    """
+    missing = [col for col in INPUT_FEATURES if col not in columns]
+    if missing:
+        raise ColumnValidationError(f"Missing columns: {missing}")
+
+    lengths = {col: len(columns[col]) for col in INPUT_FEATURES}
+    if len(set(lengths.values())) > 1:
+        raise ColumnValidationError(f"Columns have different lengths: {lengths}")
+
+    validated = {}
+    for col in INPUT_FEATURES:
+        values = np.asarray(columns[col])
+
+        if col in BOOLEAN_FEATURES:
+            if values.dtype != bool:
+                if values.dtype.kind not in 'iuf' or not np.isin(values, (0, 1)).all():
+                    raise ColumnValidationError(f"{col} must be boolean or 0/1")
+                values = values.astype(bool)
+
+        elif col in NUMERIC_RANGES:
+            if values.dtype.kind not in 'iuf':
+                raise ColumnValidationError(f"{col} must be numeric, got {values.dtype}")
+            if values.dtype.kind == 'f':
+                bad = ~np.isfinite(values)
+                if col in INTEGER_FEATURES:
+                    bad |= values != np.round(values)
+                if bad.any():
+                    raise ColumnValidationError(f"{col} has invalid values at {_bad_rows(bad)}")
+            low, high = NUMERIC_RANGES[col]
+            bad = np.zeros(len(values), dtype=bool)
+            if low is not None:
+                bad |= values < low
+            if high is not None:
+                bad |= values > high
+            if bad.any():
+                raise ColumnValidationError(
+                    f"{col} out of range [{low}, {high}] at {_bad_rows(bad)}")
+            if col in INTEGER_FEATURES:
+                values = values.astype(np.int64)
+
+        else:
+            if values.dtype.kind == 'S':
+                values = values.astype(str)
+            if vocabularies is not None and col in vocabularies:
+                bad = ~np.isin(values, np.asarray(list(vocabularies[col])))
+                if bad.any():
+                    unknown = list(np.unique(values[bad])[:_MAX_REPORTED_ROWS])
+                    raise ColumnValidationError(
+                        f"{col} has unknown values {unknown} at {_bad_rows(bad)}")
+
+        validated[col] = values
+    return validated
@@ -0,0 +1,338 @@
+"""
+Model Compaction
+================
+Prediction-only export of a fitted GradientBoostingRegressor.
+
+A fitted sklearn ensemble keeps one estimator object per tree, each with
+impurity, sample counts and a float64 value array for every node, none of
+which prediction uses. Compaction keeps only the split feature, threshold
+and missing-value direction of every split and the leaf values, as a few
+(trees x nodes) arrays in a complete-tree layout:
+
+- sibling leaves whose (learning-rate scaled) values differ by less than a
+  tolerance are merged into their parent, repeatedly, bottom up
+- thresholds are stored as float32, rounded down to the largest float32
+  not above the original so comparisons on float32 inputs (which sklearn
+  trees use) are unchanged
+- leaf values are stored as float32 with the learning rate folded in
+
+A compacted bundle is only written when its largest prediction deviation
+from the original on a check set stays within a configured bound.
+
+Usage:
+    python -m utils.compact_model models/model_bundle.joblib models/model_bundle_compact.joblib \\
+        --tolerance 1e-4 --max-deviation 1e-3
+"""
+
+import argparse
+import os
+import time
+from pathlib import Path
+from typing import Dict, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from utils.model_bundle import load_bundle, save_bundle
+
+COMPACT_BUNDLE_FILENAME = "model_bundle_compact.joblib"
+DEFAULT_TOLERANCE = 1e-4
+DEFAULT_MAX_DEVIATION = 1e-3
+
+# Deepest trees the complete layout accepts (2**depth leaves per tree)
+MAX_DEPTH = 12
+
+# Bound on rows * trees traversed at once; small enough to stay in cache
+_TRAVERSAL_BUDGET = 50_000
+
+
+class CompactionRejectedError(ValueError):
+    """Raised when a compacted model deviates from the original by more than allowed."""
+
+
+def _float32_floor(values: np.ndarray) -> np.ndarray:
+    """Largest float32 not above each value; exact for ``x <= t`` on float32 x."""
+    rounded = values.astype(np.float32)
+    above = rounded.astype(np.float64) > values
+    rounded[above] = np.nextafter(rounded[above], np.float32(-np.inf))
+    return rounded
+
+
+def _merge_leaves(tree, scale: float,
+                  tolerance: float) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Merge near-identical sibling leaves of one tree.
+
+    Children always have larger ids than their parent in sklearn trees, so
+    one pass from the last node backwards sees merged children before
+    their parent and lets merges cascade.
+
+    Args:
+        tree: Fitted sklearn ``Tree``
+        scale: Learning rate applied to the tree's values
+        tolerance: Largest scaled value difference that is merged
+
+    Returns:
+        Tuple of (children_left, children_right, values), with merged
+        nodes turned into leaves
+    """
+    left = tree.children_left.copy()
+    right = tree.children_right.copy()
+    values = tree.value[:, 0, 0].astype(np.float64)
+    weights = tree.weighted_n_node_samples.astype(np.float64)
+
+    for node in range(tree.node_count - 1, -1, -1):
+        l, r = left[node], right[node]
+        if l < 0 or left[l] >= 0 or left[r] >= 0:
+            continue
+        if abs(values[l] - values[r]) * scale < tolerance:
+            values[node] = ((weights[l] * values[l] + weights[r] * values[r])
+                            / (weights[l] + weights[r]))
+            left[node] = right[node] = -1
+    return left, right, values
+
+
+def _depth(left: np.ndarray, right: np.ndarray) -> int:
+    """Depth of the tree below node 0."""
+    depth, level = 0, [0]
+    while True:
+        level = [child for node in level if left[node] >= 0 for child in (left[node], right[node])]
+        if not level:
+            return depth
+        depth += 1
+
+
+class CompactTreeEnsemble:
+    """Prediction-only gradient boosting ensemble in a complete-tree layout."""
+
+    def __init__(self, model, tolerance: float = 0.0):
+        """
+        Compact a fitted model.
+
+        Every tree is laid out as a complete binary tree of the ensemble's
+        depth (node i has children 2i+1 and 2i+2), so traversal needs no
+        child arrays. Leaves above the last level and merged subtrees
+        become pass-through nodes that always go left.
+
+        Args:
+            model: Fitted single-output GradientBoostingRegressor
+            tolerance: Merge sibling leaves whose contributions differ by
+                       less than this; 0 keeps every leaf
+
+        Raises:
+            ValueError: If the model is not a supported boosted tree ensemble
+        """
+        estimators = getattr(model, 'estimators_', None)
+        if estimators is None or np.ndim(estimators) != 2 or estimators.shape[1] != 1:
+            raise ValueError("CompactTreeEnsemble needs a fitted single-output boosted tree model")
+        constant = getattr(model.init_, 'constant_', None) if model.init_ != 'zero' else 0.0
+        if constant is None:
+            raise ValueError("CompactTreeEnsemble needs a constant init estimator")
+
+        self.n_features_in_ = model.n_features_in_
+        if hasattr(model, 'feature_names_in_'):
+            self.feature_names_in_ = model.feature_names_in_
+        self.base = float(np.ravel(constant)[0])
+        self.tolerance = tolerance
+
+        scale = model.learning_rate
+        merged = [_merge_leaves(estimator.tree_, scale, tolerance)
+                  for estimator in estimators[:, 0]]
+        depth = max(_depth(left, right) for left, right, _ in merged)
+        if depth > MAX_DEPTH:
+            raise ValueError(f"Trees of depth {depth} are too deep for the complete layout "
+                             f"(max {MAX_DEPTH})")
+
+        n_trees, n_internal = len(merged), 2 ** depth - 1
+        self.depth = depth
+        feature_dtype = np.int16 if self.n_features_in_ < 2 ** 15 else np.int32
+        self.feature = np.zeros((n_trees, n_internal), dtype=feature_dtype)
+        self.threshold = np.full((n_trees, n_internal), np.inf, dtype=np.float32)
+        self.missing_go_to_left = np.ones((n_trees, n_internal), dtype=bool)
+        self.value = np.zeros((n_trees, 2 ** depth), dtype=np.float32)
+        self.n_leaves = 0
+
+        for t, (estimator, (left, right, values)) in enumerate(zip(estimators[:, 0], merged)):
+            tree = estimator.tree_
+            # (original node, complete-layout position, level)
+            stack = [(0, 0, 0)]
+            while stack:
+                node, position, level = stack.pop()
+                if left[node] < 0:
+                    # A leaf above the last level repeats down its leftmost path
+                    leaf = (position + 1) * 2 ** (depth - level) - 1 - n_internal
+                    self.value[t, leaf] = values[node] * scale
+                    self.n_leaves += 1
+                    continue
+                self.feature[t, position] = tree.feature[node]
+                self.threshold[t, position] = _float32_floor(tree.threshold[node:node + 1])[0]
+                self.missing_go_to_left[t, position] = tree.missing_go_to_left[node]
+                stack.append((left[node], 2 * position + 1, level + 1))
+                stack.append((right[node], 2 * position + 2, level + 1))
+
+    @property
+    def nbytes(self) -> int:
+        """Bytes held by the node arrays."""
+        return sum(array.nbytes for array in (self.feature, self.threshold,
+                                              self.missing_go_to_left, self.value))
+
+    def predict(self, X) -> np.ndarray:
+        """
+        Predict for an encoded feature matrix.
+
+        Args:
+            X: Encoded feature matrix in model feature order
+
+        Returns:
+            Predictions as float64
+        """
+        X32 = np.ascontiguousarray(X, dtype=np.float32)
+        n_rows, n_features = X32.shape
+        n_trees, n_internal = self.feature.shape
+        has_nan = bool(np.isnan(X32).any())
+        flat_x = X32.ravel()
+        feature = self.feature.ravel().astype(np.intp)
+        threshold = self.threshold.ravel()
+        go_right_on_nan = ~self.missing_go_to_left.ravel()
+        value = self.value.ravel()
+        internal_offset = np.arange(n_trees) * n_internal
+        leaf_offset = np.arange(n_trees) * (n_internal + 1) - n_internal
+        result = np.empty(n_rows)
+
+        chunk = max(1, _TRAVERSAL_BUDGET // max(1, n_trees))
+        for start in range(0, n_rows, chunk):
+            stop = min(start + chunk, n_rows)
+            row_offset = (np.arange(start, stop) * n_features)[:, None]
+            nodes = np.zeros((stop - start, n_trees), dtype=np.intp)
+            for _ in range(self.depth):
+                index = nodes + internal_offset
+                x = flat_x[row_offset + feature[index]]
+                go_right = x > threshold[index]
+                if has_nan:
+                    go_right |= np.isnan(x) & go_right_on_nan[index]
+                nodes = 2 * nodes + 1 + go_right
+            leaves = value[nodes + leaf_offset]
+            result[start:stop] = self.base + leaves.sum(axis=1, dtype=np.float64)
+        return result
+
+
+def _load_seconds(path: Union[str, Path]) -> float:
+    """Time to load and validate a bundle."""
+    start = time.perf_counter()
+    load_bundle(path)
+    return time.perf_counter() - start
+
+
+def compact_bundle(source: Union[str, Path], output: Union[str, Path], X_check,
+                   tolerance: float = DEFAULT_TOLERANCE,
+                   max_allowed_deviation: float = DEFAULT_MAX_DEVIATION) -> Dict:
+    """
+    Write a compacted copy of a model bundle if it is accurate enough.
+
+    Args:
+        source: Bundle to compact
+        output: Where to write the compacted bundle
+        X_check: Encoded rows the deviation is measured on
+        tolerance: Leaf-merge tolerance
+        max_allowed_deviation: Largest prediction deviation accepted
+
+    Returns:
+        Report with node counts, sizes, load and predict times and the deviation
+
+    Raises:
+        CompactionRejectedError: If the deviation exceeds the bound; nothing is written
+    """
+    bundle = load_bundle(source)
+    model = bundle['model']
+    compact = CompactTreeEnsemble(model, tolerance=tolerance)
+
+    start = time.perf_counter()
+    reference = model.predict(X_check)
+    original_predict_s = time.perf_counter() - start
+    start = time.perf_counter()
+    compacted = compact.predict(X_check)
+    compact_predict_s = time.perf_counter() - start
+    deviation = float(np.max(np.abs(reference - compacted))) if len(reference) else 0.0
+
+    report = {
+        'tolerance': tolerance,
+        'max_deviation': deviation,
+        'max_allowed_deviation': max_allowed_deviation,
+        'check_rows': len(reference),
+        'original_leaves': int(sum(e.tree_.n_leaves for e in model.estimators_[:, 0])),
+        'compact_leaves': compact.n_leaves,
+        'original_predict_s': original_predict_s,
+        'compact_predict_s': compact_predict_s,
+    }
+    if deviation > max_allowed_deviation:
+        raise CompactionRejectedError(
+            f"Compacted model deviates by {deviation:.3g}, "
+            f"above the allowed {max_allowed_deviation:.3g}")
+
+    metadata = dict(bundle['metadata'], compacted_from=bundle['metadata'].get('model_type'),
+                    compaction_tolerance=tolerance, compaction_max_deviation=deviation)
+    save_bundle(output, compact, bundle['vocabularies'], bundle['feature_names'], metadata=metadata)
+
+    report.update({
+        'original_bytes': os.path.getsize(source),
+        'compact_bytes': os.path.getsize(output),
+        'original_load_s': _load_seconds(source),
+        'compact_load_s': _load_seconds(output),
+    })
+    return report
+
+
+def format_report(report: Dict) -> str:
+    """Compaction report as readable lines."""
+    return "\n".join([
+        f"  Leaves:        {report['original_leaves']:,} → {report['compact_leaves']:,}",
+        f"  Artifact size: {report['original_bytes'] / 1024:,.1f} KB → "
+        f"{report['compact_bytes'] / 1024:,.1f} KB",
+        f"  Load time:     {report['original_load_s'] * 1000:.1f} ms → "
+        f"{report['compact_load_s'] * 1000:.1f} ms",
+        f"  Predict time:  {report['original_predict_s'] * 1000:.1f} ms → "
+        f"{report['compact_predict_s'] * 1000:.1f} ms ({report['check_rows']:,} rows)",
+        f"  Max deviation: {report['max_deviation']:.3g} "
+        f"(allowed {report['max_allowed_deviation']:.3g})",
+    ])
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Compact a model bundle, checking it on generated scenarios."""
+    from utils.features import FeatureEncoder
+    from utils.game_logic import ScenarioGenerator
+
+    parser = argparse.ArgumentParser(
+        description="Write a pruned, float32 prediction-only model bundle")
+    parser.add_argument('bundle', help="Bundle to compact")
+    parser.add_argument('output', nargs='?',
+                        help=f"Output path (default: {COMPACT_BUNDLE_FILENAME} next to the input)")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="Merge sibling leaves whose contributions differ by less than this")
+    parser.add_argument('--max-deviation', type=float, default=DEFAULT_MAX_DEVIATION,
+                        help="Reject compaction above this prediction deviation")
+    parser.add_argument('--check-csv',
+                        help="Raw scenarios to check deviation on (default: generated)")
+    parser.add_argument('--check-rows', type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    bundle = load_bundle(args.bundle)
+    encoder = FeatureEncoder(bundle['vocabularies'], bundle['feature_names'])
+    if args.check_csv:
+        import pandas as pd
+        X_check = encoder.transform(pd.read_csv(args.check_csv, nrows=args.check_rows))
+    else:
+        X_check = encoder.transform(ScenarioGenerator.generate_batch(args.check_rows, seed=0),
+                                    categories=ScenarioGenerator.BATCH_CATEGORIES)
+
+    output = (Path(args.output) if args.output
+              else Path(args.bundle).with_name(COMPACT_BUNDLE_FILENAME))
+    try:
+        report = compact_bundle(args.bundle, output, X_check, args.tolerance, args.max_deviation)
+    except CompactionRejectedError as e:
+        raise SystemExit(f"✗ {e}")
+    print(f"✓ Saved compacted bundle to: {output}")
+    print(format_report(report))
+
+
+if __name__ == "__main__":
+    main()
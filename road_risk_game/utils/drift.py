@@ -0,0 +1,338 @@
+"""
+Feature Drift Monitoring
+========================
+Streaming sketches of live prediction inputs, compared with training data.
+
+Every categorical column keeps a counter per training category (plus one
+for anything else), and curvature, speed_limit, num_lanes and
+num_reported_accidents keep fixed-bin histograms with underflow and
+overflow bins. Recording a scenario is one dict lookup or bisect and one
+increment per column.
+
+Counters are sharded per thread: each thread increments its own lists
+without taking a lock, and a report sums the shards. The only lock is
+taken once per thread, when its shard is created.
+
+The same sketch built over train.csv at training time is the reference.
+Reports give the population stability index (PSI) and KL divergence of
+the live distribution against it for every column:
+
+    PSI < 0.1 stable, 0.1-0.25 moderate shift, > 0.25 significant shift
+"""
+
+import json
+import threading
+from bisect import bisect_right
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+REFERENCE_FILENAME = "drift_reference.json"
+
+# Fixed bin edges; values below the first edge or above the last are
+# counted in underflow/overflow bins
+NUMERIC_EDGES: Dict[str, List[float]] = {
+    'curvature': [round(0.1 * i, 1) for i in range(11)],
+    'speed_limit': [0, 30, 40, 50, 60, 70, 80],
+    'num_lanes': [1, 2, 3, 4, 5],
+    'num_reported_accidents': [0, 1, 2, 3, 4, 5, 6, 7, 10],
+}
+
+OTHER = '__other__'
+PSI_MODERATE = 0.1
+PSI_SIGNIFICANT = 0.25
+DEFAULT_MIN_ROWS = 500
+
+# Floor on bin proportions so empty bins keep PSI and KL finite
+_EPSILON = 1e-4
+
+
+def _bin(edges: Sequence[float], value: float) -> int:
+    """
+    Histogram slot of one value.
+
+    Args:
+        edges: Increasing bin edges; the last bin includes its upper edge
+        value: Value to place
+
+    Returns:
+        0 for underflow, 1..len(edges)-1 for the bins, len(edges) for overflow
+    """
+    slot = bisect_right(edges, value)
+    if slot == len(edges) and value == edges[-1]:
+        return slot - 1
+    return slot
+
+
+def default_layout(vocabularies: Mapping[str, Sequence]) -> Dict[str, Any]:
+    """
+    Sketch layout from training vocabularies and the fixed numeric edges.
+
+    Args:
+        vocabularies: Categorical column to classes
+
+    Returns:
+        Dict with 'categorical' (column -> category labels) and 'numeric'
+        (column -> bin edges)
+    """
+    return {
+        'categorical': {col: [str(c) for c in classes] for col, classes in vocabularies.items()},
+        'numeric': {col: list(edges) for col, edges in NUMERIC_EDGES.items()},
+    }
+
+
+def psi(reference: np.ndarray, live: np.ndarray) -> float:
+    """
+    Population stability index between two histograms.
+
+    Args:
+        reference: Reference counts
+        live: Live counts over the same bins
+
+    Returns:
+        Symmetric divergence; 0 for identical distributions
+    """
+    p = np.maximum(np.asarray(reference, dtype=np.float64) / max(np.sum(reference), 1), _EPSILON)
+    q = np.maximum(np.asarray(live, dtype=np.float64) / max(np.sum(live), 1), _EPSILON)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def kl_divergence(reference: np.ndarray, live: np.ndarray) -> float:
+    """
+    KL divergence of the live histogram from the reference.
+
+    Args:
+        reference: Reference counts
+        live: Live counts over the same bins
+
+    Returns:
+        KL(live || reference) in nats
+    """
+    p = np.maximum(np.asarray(reference, dtype=np.float64) / max(np.sum(reference), 1), _EPSILON)
+    q = np.maximum(np.asarray(live, dtype=np.float64) / max(np.sum(live), 1), _EPSILON)
+    return float(np.sum(q * np.log(q / p)))
+
+
+def drift_level(value: float) -> str:
+    """Verdict for a PSI value."""
+    if value >= PSI_SIGNIFICANT:
+        return 'significant'
+    if value >= PSI_MODERATE:
+        return 'moderate'
+    return 'none'
+
+
+class _Shard:
+    """Counters owned by one thread."""
+
+    def __init__(self, sizes: Mapping[str, int], generation: int):
+        self.generation = generation
+        self.rows = 0
+        self.counts: Dict[str, List[int]] = {col: [0] * size for col, size in sizes.items()}
+
+
+class DriftMonitor:
+    """Thread-sharded feature histograms with PSI/KL reports against a reference."""
+
+    def __init__(self, layout: Mapping[str, Any], reference: Optional[Mapping[str, Any]] = None,
+                 min_rows: int = DEFAULT_MIN_ROWS):
+        """
+        Initialize the monitor.
+
+        Args:
+            layout: Output of default_layout (or a reference's 'layout')
+            reference: Reference sketch from build_reference; None reports
+                       live histograms only
+            min_rows: Live rows needed before drift is scored
+        """
+        self.categories: Dict[str, List[str]] = {col: list(labels) for col, labels
+                                                 in layout['categorical'].items()}
+        self.edges: Dict[str, List[float]] = {col: list(edges) for col, edges
+                                              in layout['numeric'].items()}
+        self.reference = reference
+        self.min_rows = min_rows
+
+        self._index = {col: {label: i for i, label in enumerate(labels)}
+                       for col, labels in self.categories.items()}
+        self._sizes = {col: len(labels) + 1 for col, labels in self.categories.items()}
+        self._sizes.update({col: len(edges) + 1 for col, edges in self.edges.items()})
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._lock = threading.Lock()
+        self._generation = 0
+
+    @classmethod
+    def from_reference(cls, reference: Mapping[str, Any],
+                       min_rows: int = DEFAULT_MIN_ROWS) -> "DriftMonitor":
+        """Monitor laid out like a saved reference and scored against it."""
+        return cls(reference['layout'], reference, min_rows=min_rows)
+
+    def layout(self) -> Dict[str, Any]:
+        """Categories and bin edges, as stored in a reference."""
+        return {'categorical': self.categories, 'numeric': self.edges}
+
+    def _shard(self) -> _Shard:
+        """This thread's counters, created on first use or after a reset."""
+        shard = getattr(self._local, 'shard', None)
+        if shard is None or shard.generation != self._generation:
+            with self._lock:
+                shard = _Shard(self._sizes, self._generation)
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def observe(self, scenario: Mapping[str, Any]):
+        """
+        Record one raw scenario.
+
+        Args:
+            scenario: Raw input values; missing or unknown categories count as other
+        """
+        shard = self._shard()
+        counts = shard.counts
+        for col, index in self._index.items():
+            counts[col][index.get(str(scenario.get(col)), len(index))] += 1
+        for col, edges in self.edges.items():
+            value = scenario.get(col)
+            if value is not None and value == value:
+                counts[col][_bin(edges, value)] += 1
+        shard.rows += 1
+
+    def observe_frame(self, frame: pd.DataFrame):
+        """
+        Record a batch of raw scenarios.
+
+        Args:
+            frame: Raw scenarios, one row per scenario
+        """
+        if len(frame) == 0:
+            return
+        shard = self._shard()
+        for col, labels in self.categories.items():
+            if col not in frame:
+                continue
+            codes = pd.Categorical(frame[col].astype(str), categories=labels).codes.astype(np.int64)
+            codes[codes < 0] = len(labels)
+            self._add(shard.counts[col], np.bincount(codes, minlength=len(labels) + 1))
+        for col, edges in self.edges.items():
+            if col not in frame:
+                continue
+            values = pd.to_numeric(frame[col], errors='coerce').to_numpy(dtype=np.float64)
+            values = values[~np.isnan(values)]
+            slots = np.searchsorted(edges, values, side='right')
+            slots[(slots == len(edges)) & (values == edges[-1])] -= 1
+            self._add(shard.counts[col], np.bincount(slots, minlength=len(edges) + 1))
+        shard.rows += len(frame)
+
+    @staticmethod
+    def _add(counts: List[int], increments: np.ndarray):
+        """Add a bincount into a shard's counters."""
+        for slot, increment in enumerate(increments.tolist()):
+            if increment:
+                counts[slot] += increment
+
+    def reset(self):
+        """Start counting from zero; threads move to fresh shards on their next update."""
+        with self._lock:
+            self._generation += 1
+            self._shards = []
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Current totals across all threads.
+
+        Returns:
+            Dict with 'rows', 'layout' and 'counts' (column -> list); the
+            same shape as a reference
+        """
+        with self._lock:
+            shards = list(self._shards)
+        counts = {col: np.zeros(size, dtype=np.int64) for col, size in self._sizes.items()}
+        for shard in shards:
+            for col, values in shard.counts.items():
+                counts[col] += values
+        return {
+            'rows': sum(shard.rows for shard in shards),
+            'layout': self.layout(),
+            'counts': {col: values.tolist() for col, values in counts.items()},
+        }
+
+    def bin_labels(self, col: str) -> List[str]:
+        """Readable names of a column's slots."""
+        if col in self.categories:
+            return self.categories[col] + [OTHER]
+        edges = self.edges[col]
+        return ([f"<{edges[0]}"]
+                + [f"[{lo}, {hi})" for lo, hi in zip(edges[:-2], edges[1:-1])]
+                + [f"[{edges[-2]}, {edges[-1]}]", f">{edges[-1]}"])
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Drift of the live traffic against the reference.
+
+        Returns:
+            Dict with 'status' ('no_reference', 'insufficient_data' or 'ok'),
+            row counts, the largest PSI and per-column PSI, KL, verdict and
+            live/reference proportions
+        """
+        live = self.snapshot()
+        report: Dict[str, Any] = {
+            'rows': live['rows'],
+            'reference_rows': self.reference['rows'] if self.reference else 0,
+            'min_rows': self.min_rows,
+            'features': {},
+        }
+        if self.reference is None:
+            report['status'] = 'no_reference'
+        elif live['rows'] < self.min_rows:
+            report['status'] = 'insufficient_data'
+        else:
+            report['status'] = 'ok'
+
+        for col, counts in live['counts'].items():
+            labels = self.bin_labels(col)
+            total = max(sum(counts), 1)
+            feature = {'live': dict(zip(labels, (c / total for c in counts)))}
+            if self.reference is not None:
+                reference = self.reference['counts'][col]
+                reference_total = max(sum(reference), 1)
+                feature['reference'] = dict(zip(labels, (c / reference_total for c in reference)))
+                if report['status'] == 'ok':
+                    feature['psi'] = psi(reference, counts)
+                    feature['kl'] = kl_divergence(reference, counts)
+                    feature['drift'] = drift_level(feature['psi'])
+            report['features'][col] = feature
+
+        if report['status'] == 'ok':
+            report['max_psi'] = max(f['psi'] for f in report['features'].values())
+        return report
+
+
+def build_reference(data: pd.DataFrame, vocabularies: Mapping[str, Sequence]) -> Dict[str, Any]:
+    """
+    Reference sketch of the training data.
+
+    Args:
+        data: Raw training rows (string categories, as in train.csv)
+        vocabularies: Categorical column to classes
+
+    Returns:
+        JSON-serializable reference with 'rows', 'layout' and 'counts'
+    """
+    monitor = DriftMonitor(default_layout(vocabularies))
+    monitor.observe_frame(data)
+    return monitor.snapshot()
+
+
+def save_reference(path: Union[str, Path], reference: Mapping[str, Any]):
+    """Write a reference sketch as JSON."""
+    with open(path, 'w') as f:
+        json.dump(reference, f, indent=2)
+
+
+def load_reference(path: Union[str, Path]) -> Dict[str, Any]:
+    """Read a reference sketch written by save_reference."""
+    with open(path) as f:
+        return json.load(f)
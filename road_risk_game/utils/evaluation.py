@@ -0,0 +1,235 @@
+"""
+Model Evaluation
+================
+One-pass regression metrics, per-segment breakdowns and bootstrap intervals.
+
+MAE, RMSE and R² are all read off one residual vector instead of three
+separate sklearn calls. Train metrics are estimated on a random subsample,
+since predicting the whole training set only to report a train score costs
+as much as scoring the test set several times over. Per-segment metrics
+(road_type, weather, lighting, ...) come from ``np.bincount`` over the
+label-encoded codes, and bootstrap confidence intervals are computed for all
+resamples at once as multinomial-weighted sums.
+"""
+
+from typing import Dict, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+METRICS = ('mae', 'rmse', 'r2')
+SEGMENT_COLUMNS = ('road_type', 'weather', 'lighting', 'time_of_day')
+DEFAULT_TRAIN_SAMPLE = 50_000
+DEFAULT_BOOTSTRAP = 200
+
+# Cap on resample weights held in memory at once (float64 cells)
+_MAX_WEIGHT_CELLS = 2 ** 24
+
+
+def _terms(y_true, y_pred) -> np.ndarray:
+    """
+    Per-row terms every metric is built from.
+
+    The target is centered on its mean so the total sum of squares can be
+    taken from weighted sums without cancellation.
+
+    Returns:
+        (n, 4) array of |error|, error², centered target, centered target²
+    """
+    y_true = np.asarray(y_true, dtype=np.float64)
+    error = y_true - np.asarray(y_pred, dtype=np.float64)
+    centered = y_true - y_true.mean()
+    return np.column_stack([np.abs(error), error ** 2, centered, centered ** 2])
+
+
+def _from_sums(sums: np.ndarray, counts: np.ndarray) -> Dict[str, np.ndarray]:
+    """
+    MAE, RMSE and R² from summed terms.
+
+    Args:
+        sums: (..., 4) sums of the columns of _terms
+        counts: Matching row counts (or total weights)
+
+    Returns:
+        Dict of metric arrays; groups without rows or target variance get NaN
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sst = sums[..., 3] - sums[..., 2] ** 2 / counts
+        return {
+            'mae': sums[..., 0] / counts,
+            'rmse': np.sqrt(sums[..., 1] / counts),
+            'r2': np.where(sst > 0, 1.0 - sums[..., 1] / sst, np.nan),
+        }
+
+
+def regression_metrics(y_true, y_pred) -> Dict[str, float]:
+    """
+    MAE, RMSE and R² in one pass over the residuals.
+
+    Args:
+        y_true: True target values
+        y_pred: Predictions
+
+    Returns:
+        Dict with 'mae', 'rmse' and 'r2'
+    """
+    terms = _terms(y_true, y_pred)
+    metrics = _from_sums(terms.sum(axis=0), len(terms))
+    return {name: float(value) for name, value in metrics.items()}
+
+
+def segment_metrics(y_true, y_pred, codes, labels: Optional[Sequence] = None) -> pd.DataFrame:
+    """
+    Metrics for every value of one encoded categorical column.
+
+    Args:
+        y_true: True target values
+        y_pred: Predictions
+        codes: Non-negative integer code of each row's segment
+        labels: Segment names indexed by code (e.g. LabelEncoder.classes_)
+
+    Returns:
+        DataFrame indexed by segment with count, mean_risk, mae, rmse and r2;
+        codes with no rows are left out
+    """
+    codes = np.asarray(codes, dtype=np.int64)
+    terms = _terms(y_true, y_pred)
+    size = int(codes.max()) + 1 if len(codes) else 0
+    if labels is not None:
+        if size > len(labels):
+            raise ValueError(f"code {size - 1} has no label")
+        size = len(labels)
+
+    counts = np.bincount(codes, minlength=size).astype(np.float64)
+    sums = np.column_stack([np.bincount(codes, weights=terms[:, i], minlength=size)
+                            for i in range(terms.shape[1])])
+    # The sum of squares is shift-invariant, so globally centered terms still
+    # give each segment's SST about its own mean
+    metrics = _from_sums(sums, counts)
+    y_sums = np.bincount(codes, weights=np.asarray(y_true, dtype=np.float64), minlength=size)
+
+    frame = pd.DataFrame({
+        'count': counts.astype(np.int64),
+        'mean_risk': y_sums / np.maximum(counts, 1),
+        **metrics,
+    })
+    frame.index = pd.Index(labels if labels is not None else np.arange(size), name='segment')
+    return frame[frame['count'] > 0]
+
+
+def bootstrap_ci(y_true, y_pred, n_bootstrap: int = DEFAULT_BOOTSTRAP, confidence: float = 0.95,
+                 seed: Optional[int] = None) -> Dict[str, Tuple[float, float]]:
+    """
+    Percentile bootstrap intervals for MAE, RMSE and R².
+
+    Each resample is a row of multinomial counts, so the metric sums of a
+    whole block of resamples are one matrix product with the per-row terms.
+
+    Args:
+        y_true: True target values
+        y_pred: Predictions
+        n_bootstrap: Number of resamples
+        confidence: Interval coverage
+        seed: Random seed
+
+    Returns:
+        Dict mapping each metric to its (low, high) bounds
+    """
+    terms = _terms(y_true, y_pred)
+    n = len(terms)
+    rng = np.random.default_rng(seed)
+    block = max(1, min(n_bootstrap, _MAX_WEIGHT_CELLS // max(n, 1)))
+
+    sums = []
+    for start in range(0, n_bootstrap, block):
+        weights = rng.multinomial(n, np.full(n, 1.0 / n), size=min(block, n_bootstrap - start))
+        sums.append(weights.astype(np.float64) @ terms)
+    metrics = _from_sums(np.vstack(sums), float(n))
+
+    tail = (1.0 - confidence) / 2 * 100
+    return {name: tuple(float(bound) for bound in np.nanpercentile(values, [tail, 100 - tail]))
+            for name, values in metrics.items()}
+
+
+def _take(X, rows: np.ndarray):
+    """Rows of a DataFrame or array by position."""
+    return X.iloc[rows] if hasattr(X, 'iloc') else X[rows]
+
+
+class ModelEvaluator:
+    """Scores fitted models on sampled train rows and the full test set."""
+
+    def __init__(self, train_sample: Optional[int] = DEFAULT_TRAIN_SAMPLE,
+                 n_bootstrap: int = DEFAULT_BOOTSTRAP, confidence: float = 0.95,
+                 seed: Optional[int] = 42):
+        """
+        Initialize the evaluator.
+
+        Args:
+            train_sample: Train rows to score; None scores all of them
+            n_bootstrap: Resamples for test confidence intervals; 0 skips them
+            confidence: Interval coverage
+            seed: Seed for the train sample and the bootstrap
+        """
+        self.train_sample = train_sample
+        self.n_bootstrap = n_bootstrap
+        self.confidence = confidence
+        self.seed = seed
+
+    def sample_rows(self, n_rows: int) -> np.ndarray:
+        """
+        Positions of the train rows used for train metrics.
+
+        Args:
+            n_rows: Size of the training set
+
+        Returns:
+            Sorted row positions (all rows when the sample would cover them)
+        """
+        if self.train_sample is None or self.train_sample >= n_rows:
+            return np.arange(n_rows)
+        rng = np.random.default_rng(self.seed)
+        return np.sort(rng.choice(n_rows, size=self.train_sample, replace=False))
+
+    def evaluate(self, model, X_train, y_train, X_test, y_test,
+                 segments: Optional[pd.DataFrame] = None,
+                 labels: Optional[Mapping[str, Sequence]] = None) -> Dict:
+        """
+        Evaluate one fitted model.
+
+        Args:
+            model: Fitted regressor
+            X_train: Training features, as the model expects them
+            y_train: Training target
+            X_test: Test features, as the model expects them
+            y_test: Test target
+            segments: Encoded categorical columns aligned with X_test
+            labels: Optional segment names per column, indexed by code
+
+        Returns:
+            Dict with 'train' and 'test' metrics, 'train_rows', 'test_ci'
+            (empty when bootstrapping is off), 'segments' (column -> DataFrame)
+            and the test predictions as 'y_pred_test'
+        """
+        rows = self.sample_rows(len(y_train))
+        y_pred_train = model.predict(_take(X_train, rows))
+        y_pred_test = model.predict(X_test)
+
+        report = {
+            'train': regression_metrics(_take(np.asarray(y_train), rows), y_pred_train),
+            'train_rows': len(rows),
+            'test': regression_metrics(y_test, y_pred_test),
+            'test_ci': {},
+            'segments': {},
+            'y_pred_test': y_pred_test,
+        }
+        if self.n_bootstrap:
+            report['test_ci'] = bootstrap_ci(y_test, y_pred_test, self.n_bootstrap,
+                                             self.confidence, self.seed)
+        if segments is not None:
+            labels = labels or {}
+            report['segments'] = {
+                column: segment_metrics(y_test, y_pred_test, segments[column], labels.get(column))
+                for column in segments.columns
+            }
+        return report
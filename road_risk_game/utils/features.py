@@ -0,0 +1,228 @@
+"""
+Feature Encoding
+================
+Turns raw road scenarios into model features without sklearn.
+
+Categorical columns are encoded with plain lookup tables exported from the
+training vocabularies; boolean columns map straight to 0/1. Every lookup
+is vectorized, so one call encodes a single scenario or a whole batch.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Mapping, Optional, Sequence, Union
+
+# Raw input columns, in the order they appear in train.csv
+INPUT_FEATURES = ['road_type', 'num_lanes', 'curvature', 'speed_limit', 'lighting', 'weather',
+                  'road_signs_present', 'public_road', 'time_of_day', 'holiday',
+                  'school_season', 'num_reported_accidents']
+
+CATEGORICAL_FEATURES = ['road_type', 'lighting', 'weather', 'road_signs_present',
+                        'public_road', 'time_of_day', 'holiday', 'school_season']
+
+BOOLEAN_FEATURES = ['road_signs_present', 'public_road', 'holiday', 'school_season']
+
+ENGINEERED_FEATURES = ['speed_curvature', 'lanes_accidents', 'high_speed', 'sharp_curve']
+
+# How to encode a category that was not seen during training
+UNKNOWN_POLICIES = ('error', 'default', 'nan')
+
+ScenarioBatch = Union[pd.DataFrame, Mapping[str, Sequence], Sequence[Mapping]]
+
+
+class UnknownCategoryError(ValueError):
+    """Raised when a value is outside the training vocabulary and the policy is 'error'."""
+
+
+class CategoryVocabulary:
+    """Lookup table from category values to the integer codes used in training."""
+
+    def __init__(self, name: str, classes: Sequence, unknown: str = 'error',
+                 default_code: int = 0):
+        """
+        Initialize the vocabulary.
+
+        Args:
+            name: Column name, used in error messages
+            classes: Categories in code order (code i is classes[i])
+            unknown: Policy for unseen values: 'error', 'default' or 'nan'
+            default_code: Code used for unseen values when unknown='default'
+        """
+        if unknown not in UNKNOWN_POLICIES:
+            raise ValueError(f"Unknown policy '{unknown}'. Choose from {UNKNOWN_POLICIES}")
+
+        self.name = name
+        self.classes_ = np.asarray(list(classes))
+        self.unknown = unknown
+        self.default_code = default_code
+        self.is_boolean = self.classes_.dtype == bool and self.classes_.tolist() == [False, True]
+        self._index = pd.Index(self.classes_)
+        self._codes = {value: code for code, value in enumerate(self.classes_.tolist())}
+
+    def __len__(self) -> int:
+        return len(self.classes_)
+
+    def transform(self, values) -> np.ndarray:
+        """
+        Encode values to integer codes.
+
+        Args:
+            values: Array-like of raw category values
+
+        Returns:
+            int64 codes, or float64 with NaN for unseen values when unknown='nan'
+        """
+        values = np.asarray(values)
+
+        # Booleans are already 0/1; False sorts first in the training vocabulary
+        if self.is_boolean and values.dtype == bool:
+            return values.astype(np.int64)
+
+        codes = self._index.get_indexer(values).astype(np.int64)
+        missing = codes < 0
+        if not missing.any():
+            return codes
+
+        if self.unknown == 'error':
+            unseen = pd.unique(values[missing])[:5]
+            raise UnknownCategoryError(
+                f"Unknown {self.name} value(s) {list(unseen)}; "
+                f"expected one of {self.classes_.tolist()}"
+            )
+        if self.unknown == 'default':
+            codes[missing] = self.default_code
+            return codes
+
+        codes = codes.astype(np.float64)
+        codes[missing] = np.nan
+        return codes
+
+    def code(self, value):
+        """
+        Encode a single value with a dict lookup.
+
+        Args:
+            value: Raw category value
+
+        Returns:
+            Training code; unseen values follow the unknown policy
+        """
+        code = self._codes.get(value)
+        if code is None:
+            return self.transform([value])[0]
+        return code
+
+    def recode_table(self, categories: Sequence) -> np.ndarray:
+        """
+        Build a table mapping codes over another category list to training codes.
+
+        ``table[codes]`` encodes integer-coded data without touching the
+        raw values again.
+
+        Args:
+            categories: Category list the external codes refer to
+
+        Returns:
+            Array where entry i is the training code of categories[i]
+        """
+        return self.transform(np.asarray(list(categories)))
+
+
+def add_engineered_features(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Add the interaction features used by the model, in place.
+
+    Args:
+        df: DataFrame with encoded input columns
+
+    Returns:
+        The same DataFrame
+    """
+    df['speed_curvature'] = df['speed_limit'] * df['curvature']
+    df['lanes_accidents'] = df['num_lanes'] * df['num_reported_accidents']
+    df['high_speed'] = (df['speed_limit'] >= 60).astype(int)
+    df['sharp_curve'] = (df['curvature'] >= 0.7).astype(int)
+    return df
+
+
+class FeatureEncoder:
+    """Vectorized scenario encoder built from bundle vocabularies."""
+
+    def __init__(self, vocabularies: Dict[str, Sequence], feature_names: Sequence[str],
+                 unknown: str = 'error'):
+        """
+        Initialize the encoder.
+
+        Args:
+            vocabularies: Mapping of categorical column to classes, in code order
+            feature_names: Model feature order
+            unknown: Policy for unseen categories: 'error', 'default' or 'nan'
+        """
+        self.feature_names: List[str] = list(feature_names)
+        self.unknown = unknown
+        self.vocabularies: Dict[str, CategoryVocabulary] = {
+            col: CategoryVocabulary(col, classes, unknown=unknown)
+            for col, classes in vocabularies.items()
+        }
+
+    def to_frame(self, data: ScenarioBatch) -> pd.DataFrame:
+        """
+        Normalize a single scenario or a batch of scenarios into a raw DataFrame.
+
+        Args:
+            data: Scenario dict, list of scenario dicts, dict of columns or DataFrame
+
+        Returns:
+            DataFrame with one row per scenario
+        """
+        if isinstance(data, pd.DataFrame):
+            return data
+        if isinstance(data, Mapping):
+            first = next(iter(data.values()), None)
+            if np.ndim(first) == 0:
+                return pd.DataFrame([data])
+            return pd.DataFrame(dict(data))
+        return pd.DataFrame(list(data))
+
+    def encode_column(self, col: str, values, categories: Optional[Sequence] = None) -> np.ndarray:
+        """
+        Encode one categorical column.
+
+        Args:
+            col: Column name
+            values: Raw values, or integer codes over ``categories``
+            categories: When given, ``values`` are codes into this list
+
+        Returns:
+            Training codes for the column
+        """
+        vocabulary = self.vocabularies[col]
+        if categories is not None:
+            return vocabulary.recode_table(categories)[np.asarray(values)]
+        return vocabulary.transform(values)
+
+    def transform(self, data: ScenarioBatch,
+                  categories: Optional[Mapping[str, Sequence]] = None) -> pd.DataFrame:
+        """
+        Encode scenarios into the model feature matrix.
+
+        Args:
+            data: Scenario dict, list of scenario dicts, dict of columns or DataFrame
+            categories: For integer-coded categorical columns, the category
+                        list their codes refer to (e.g. ScenarioGenerator.BATCH_CATEGORIES)
+
+        Returns:
+            DataFrame with columns in model feature order
+        """
+        raw = self.to_frame(data)
+        df = pd.DataFrame(index=raw.index)
+        categories = categories or {}
+
+        for col in INPUT_FEATURES:
+            if col in self.vocabularies:
+                df[col] = self.encode_column(col, raw[col].to_numpy(), categories.get(col))
+            else:
+                df[col] = raw[col].to_numpy()
+
+        add_engineered_features(df)
+        return df[self.feature_names]
@@ -18,6 +18,15 @@ class ScenarioGenerator:
     LIGHTING_CONDITIONS = ['daylight', 'dim', 'night']
     WEATHER_CONDITIONS = ['clear', 'foggy', 'rainy']
     TIME_OF_DAY = ['morning', 'afternoon', 'evening']
+    SPEED_LIMITS = [25, 35, 45, 60, 70]
+    
+    # Categorical columns of generate_batch are integer codes into these lists
+    BATCH_CATEGORIES = {
+        'road_type': ROAD_TYPES,
+        'lighting': LIGHTING_CONDITIONS,
+        'weather': WEATHER_CONDITIONS,
+        'time_of_day': TIME_OF_DAY
+    }
     
     # Difficulty levels affect how different the scenarios are
     DIFFICULTY_SETTINGS = {
@@ -38,7 +47,7 @@ class ScenarioGenerator:
             'road_type': random.choice(ScenarioGenerator.ROAD_TYPES),
             'num_lanes': random.randint(1, 4),
             'curvature': round(random.uniform(0.0, 1.0), 2),
-            'speed_limit': random.choice([25, 35, 45, 60, 70]),
+            'speed_limit': random.choice(ScenarioGenerator.SPEED_LIMITS),
             'lighting': random.choice(ScenarioGenerator.LIGHTING_CONDITIONS),
             'weather': random.choice(ScenarioGenerator.WEATHER_CONDITIONS),
             'road_signs_present': random.choice([True, False]),
@@ -78,7 +87,9 @@ class ScenarioGenerator:
             if random.random() > 0.5:
                 scenario2['lighting'] = random.choice([l for l in ScenarioGenerator.LIGHTING_CONDITIONS if l != scenario1['lighting']])
             scenario2['curvature'] = round(1.0 - scenario1['curvature'], 2)
-            scenario2['speed_limit'] = random.choice([s for s in [25, 35, 45, 60, 70] if abs(s - scenario1['speed_limit']) >= 20])
+            scenario2['speed_limit'] = random.choice(
+                [s for s in ScenarioGenerator.SPEED_LIMITS
+                 if abs(s - scenario1['speed_limit']) >= 20])
         
         else:  # hard
             # Subtle differences
@@ -88,6 +99,112 @@ class ScenarioGenerator:
             scenario2['road_signs_present'] = not scenario1['road_signs_present']
         
         return scenario1, scenario2
+    
+    @staticmethod
+    def generate_batch(n: int, seed=None) -> Dict[str, np.ndarray]:
+        """
+        Generate many random road scenarios at once.
+        
+        Draws every field with one NumPy call, using the same distributions
+        as generate_scenario.
+        
+        Args:
+            n: Number of scenarios
+            seed: Seed or numpy Generator
+        
+        Returns:
+            Dictionary of column arrays; categorical columns hold integer
+            codes into BATCH_CATEGORIES, boolean columns hold bools
+        """
+        rng = np.random.default_rng(seed)
+        speed_limits = np.asarray(ScenarioGenerator.SPEED_LIMITS)
+        
+        return {
+            'road_type': rng.integers(0, len(ScenarioGenerator.ROAD_TYPES), n, dtype=np.int8),
+            'num_lanes': rng.integers(1, 5, n),
+            'curvature': np.round(rng.uniform(0.0, 1.0, n), 2),
+            'speed_limit': speed_limits[rng.integers(0, len(speed_limits), n)],
+            'lighting': rng.integers(0, len(ScenarioGenerator.LIGHTING_CONDITIONS), n,
+                                     dtype=np.int8),
+            'weather': rng.integers(0, len(ScenarioGenerator.WEATHER_CONDITIONS), n, dtype=np.int8),
+            'road_signs_present': rng.random(n) < 0.5,
+            'public_road': rng.random(n) < 0.5,
+            'time_of_day': rng.integers(0, len(ScenarioGenerator.TIME_OF_DAY), n, dtype=np.int8),
+            'holiday': rng.random(n) < 0.5,
+            'school_season': rng.random(n) < 0.5,
+            'num_reported_accidents': rng.integers(0, 4, n)
+        }
+    
+    @staticmethod
+    def generate_contrasting_batch(
+            n: int, difficulty: str = 'medium',
+            seed=None) -> Tuple[Dict[str, np.ndarray], Dict[str, np.ndarray]]:
+        """
+        Vectorized counterpart of generate_contrasting_scenarios.
+        
+        Args:
+            n: Number of pairs
+            difficulty: Game difficulty level (easy, medium, hard)
+            seed: Seed or numpy Generator
+        
+        Returns:
+            Tuple of (batch1, batch2) column dictionaries, as generate_batch
+        """
+        rng = np.random.default_rng(seed)
+        batch1 = ScenarioGenerator.generate_batch(n, rng)
+        batch2 = {col: values.copy() for col, values in batch1.items()}
+        
+        lighting = ScenarioGenerator.LIGHTING_CONDITIONS
+        weather = ScenarioGenerator.WEATHER_CONDITIONS
+        
+        if difficulty == 'easy':
+            batch2['lighting'] = np.where(batch1['lighting'] == lighting.index('daylight'),
+                                          lighting.index('night'), lighting.index('daylight'))
+            batch2['weather'] = np.where(batch1['weather'] == weather.index('clear'),
+                                         weather.index('foggy'), weather.index('clear'))
+            batch2['curvature'] = np.where(batch1['curvature'] < 0.3, 0.9, 0.1)
+            batch2['speed_limit'] = np.where(batch1['speed_limit'] <= 45, 70, 25)
+        
+        elif difficulty == 'medium':
+            # Half the pairs move lighting to one of the other two conditions
+            change_lighting = rng.random(n) > 0.5
+            shifted = (batch1['lighting'] + rng.integers(1, len(lighting), n)) % len(lighting)
+            batch2['lighting'] = np.where(change_lighting, shifted, batch1['lighting'])
+            batch2['curvature'] = np.round(1.0 - batch1['curvature'], 2)
+            
+            # Uniform pick among speed limits at least 20 apart from the original
+            speed_limits = np.asarray(ScenarioGenerator.SPEED_LIMITS)
+            allowed = np.abs(speed_limits[None, :] - batch1['speed_limit'][:, None]) >= 20
+            scores = np.where(allowed, rng.random((n, len(speed_limits))), -1.0)
+            batch2['speed_limit'] = speed_limits[scores.argmax(axis=1)]
+        
+        else:  # hard
+            lanes = batch1['num_lanes']
+            step = rng.choice([-1, 1], n)
+            batch2['num_lanes'] = np.where((lanes > 1) & (lanes < 4), lanes + step, lanes)
+            curvature = np.round(batch1['curvature'] + rng.uniform(-0.2, 0.2, n), 2)
+            batch2['curvature'] = np.clip(curvature, 0.0, 1.0)
+            batch2['road_signs_present'] = ~batch1['road_signs_present']
+        
+        batch2['lighting'] = batch2['lighting'].astype(np.int8)
+        batch2['weather'] = batch2['weather'].astype(np.int8)
+        return batch1, batch2
+    
+    @staticmethod
+    def batch_to_frame(batch: Dict[str, np.ndarray]) -> pd.DataFrame:
+        """
+        Decode a generated batch into a DataFrame of raw values.
+        
+        Args:
+            batch: Column dictionary from generate_batch
+        
+        Returns:
+            DataFrame with category names instead of codes
+        """
+        columns = dict(batch)
+        for col, categories in ScenarioGenerator.BATCH_CATEGORIES.items():
+            columns[col] = np.asarray(categories, dtype=object)[batch[col]]
+        return pd.DataFrame(columns)
 
 
 class GameScoring:
@@ -185,6 +302,25 @@ class RoadVisualizer:
         'evening': '🌆'
     }
     
+    FEATURE_LABELS = {
+        'road_type': 'Tipo de camino',
+        'num_lanes': 'Carriles',
+        'curvature': 'Curvatura',
+        'speed_limit': 'Límite de velocidad',
+        'lighting': 'Iluminación',
+        'weather': 'Clima',
+        'road_signs_present': 'Señalización',
+        'public_road': 'Camino público',
+        'time_of_day': 'Momento del día',
+        'holiday': 'Feriado',
+        'school_season': 'Temporada escolar',
+        'num_reported_accidents': 'Accidentes previos',
+        'speed_curvature': 'Velocidad × Curvatura',
+        'lanes_accidents': 'Carriles × Accidentes',
+        'high_speed': 'Alta velocidad',
+        'sharp_curve': 'Curva cerrada'
+    }
+    
     @staticmethod
     def get_scenario_description(scenario: Dict) -> str:
         """
@@ -244,6 +380,25 @@ class RoadVisualizer:
         """
         return description.strip()
     
+    @staticmethod
+    def get_explanation_lines(top_features: List[Dict]) -> List[str]:
+        """
+        Describe which features made Camino B riskier or safer than Camino A.
+        
+        Args:
+            top_features: Contribution differences from explain_comparison
+        
+        Returns:
+            One formatted line per feature
+        """
+        lines = []
+        for item in top_features:
+            label = RoadVisualizer.FEATURE_LABELS.get(item['feature'], item['feature'])
+            delta = item['contribution']
+            road = 'B' if delta > 0 else 'A'
+            lines.append(f"{label}: +{abs(delta):.1%} de riesgo para el Camino {road}")
+        return lines
+    
     @staticmethod
     def get_risk_color(risk_score: float) -> str:
         """
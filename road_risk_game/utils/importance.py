@@ -0,0 +1,204 @@
+"""
+Permutation Importance
+======================
+Drop in a model's score when one feature's values are shuffled.
+
+Unlike impurity importances, this works for any fitted model (linear or
+tree) and is measured on held-out rows. Three things keep it fast on a
+large test set:
+
+* a stratified subsample: rows are drawn within target quantile bins (or
+  given strata) so the sample keeps the distribution of the full set
+* one preallocated buffer per worker: each permutation shuffles one
+  column in place, predicts, and writes the original column back, instead
+  of copying the feature matrix per permutation
+* (feature, repeat) permutations split across joblib workers; each
+  permutation has its own seed, so results do not depend on the number
+  of workers
+
+The result is a ranked table of the mean score drop and its spread over
+the repeats.
+"""
+
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed, effective_n_jobs
+
+from utils.evaluation import METRICS, regression_metrics
+
+DEFAULT_SAMPLE = 20_000
+DEFAULT_REPEATS = 5
+DEFAULT_BINS = 10
+
+
+def stratified_sample(y, size: Optional[int], strata=None, bins: int = DEFAULT_BINS,
+                      seed: Optional[int] = 42) -> np.ndarray:
+    """
+    Row positions of a sample that keeps each stratum's share.
+
+    Args:
+        y: Target values
+        size: Rows to draw; None (or at least len(y)) takes every row
+        strata: Stratum label per row; defaults to quantile bins of y
+        bins: Number of target quantile bins when strata is not given
+        seed: Random seed
+
+    Returns:
+        Sorted row positions
+    """
+    y = np.asarray(y, dtype=np.float64)
+    if size is None or size >= len(y):
+        return np.arange(len(y))
+    if strata is None:
+        edges = np.unique(np.quantile(y, np.linspace(0, 1, bins + 1)[1:-1]))
+        codes = np.searchsorted(edges, y, side='right')
+    else:
+        codes = pd.factorize(np.asarray(strata))[0]
+
+    # Largest-remainder quotas, so the shares add up to exactly size rows
+    counts = np.bincount(codes)
+    exact = counts * size / len(y)
+    quotas = np.floor(exact).astype(np.int64)
+    quotas[np.argsort(quotas - exact)[:size - quotas.sum()]] += 1
+
+    # Shuffle, group by stratum, and keep each stratum's first rows
+    rng = np.random.default_rng(seed)
+    shuffled = rng.permutation(len(y))
+    grouped = shuffled[np.argsort(codes[shuffled], kind='stable')]
+    starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    rank = np.arange(len(y)) - np.repeat(starts, counts)
+    return np.sort(grouped[rank < np.repeat(quotas, counts)])
+
+
+def _score(y: np.ndarray, predictions: np.ndarray, scoring: str) -> float:
+    """Metric oriented so that higher is better."""
+    value = regression_metrics(y, predictions)[scoring]
+    return value if scoring == 'r2' else -value
+
+
+def _permuted_scores(model, X: np.ndarray, y: np.ndarray, columns: Optional[List[str]],
+                     tasks: Sequence[Tuple[int, int]], scoring: str, seed: int) -> List[float]:
+    """
+    Scores of one worker's permutations.
+
+    Args:
+        model: Fitted model
+        X: Sampled feature matrix (not modified)
+        y: Sampled target
+        columns: Feature names to predict with, for models fitted on frames
+        tasks: (feature index, repeat) pairs to score
+        scoring: Metric name
+        seed: Base seed; each task's permutation depends only on it and the task
+
+    Returns:
+        One score per task
+    """
+    # The only copy this worker makes; every permutation reuses it
+    buffer = np.array(X, dtype=np.float64, order='F')
+    original = np.empty(len(buffer))
+    scores = []
+    for feature, repeat in tasks:
+        column = buffer[:, feature]
+        original[:] = column
+        permutation = np.random.default_rng([seed, feature, repeat]).permutation(len(buffer))
+        column[:] = original[permutation]
+        if columns is not None:
+            features = pd.DataFrame(buffer, columns=columns, copy=False)
+        else:
+            features = buffer
+        scores.append(_score(y, model.predict(features), scoring))
+        column[:] = original
+    return scores
+
+
+def permutation_scores(model, X, y, n_repeats: int = DEFAULT_REPEATS, scoring: str = 'r2',
+                       n_jobs: Optional[int] = -1, seed: int = 42) -> Tuple[float, np.ndarray]:
+    """
+    Baseline score and the score after every (feature, repeat) permutation.
+
+    Args:
+        model: Fitted model
+        X: Feature matrix (DataFrame or array); the model's own feature names
+           are kept for DataFrames
+        y: Target
+        n_repeats: Permutations per feature
+        scoring: 'r2', 'mae' or 'rmse'; errors are negated so higher is better
+        n_jobs: Parallel workers, as in joblib
+        seed: Random seed
+
+    Returns:
+        Tuple of (baseline score, scores of shape (features, repeats))
+
+    Raises:
+        ValueError: For an unknown scoring name
+    """
+    if scoring not in METRICS:
+        raise ValueError(f"scoring must be one of {METRICS}, got '{scoring}'")
+    columns = [str(col) for col in X.columns] if hasattr(X, 'columns') else None
+    X_array = np.asarray(X, dtype=np.float64)
+    y_array = np.asarray(y, dtype=np.float64)
+    baseline = _score(y_array, model.predict(X), scoring)
+
+    # One chunk of tasks per worker, so each worker allocates one buffer
+    tasks = [(feature, repeat) for feature in range(X_array.shape[1])
+             for repeat in range(n_repeats)]
+    n_chunks = max(1, min(effective_n_jobs(n_jobs), len(tasks)))
+    chunks = np.array_split(np.arange(len(tasks)), n_chunks)
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_permuted_scores)(model, X_array, y_array, columns, [tasks[i] for i in chunk],
+                                  scoring, seed)
+        for chunk in chunks
+    )
+    scores = np.concatenate(results).reshape(X_array.shape[1], n_repeats)
+    return baseline, scores
+
+
+def permutation_importance(model, X, y, n_repeats: int = DEFAULT_REPEATS,
+                           sample: Optional[int] = DEFAULT_SAMPLE, strata=None,
+                           scoring: str = 'r2', n_jobs: Optional[int] = -1, seed: int = 42,
+                           feature_names: Optional[Sequence[str]] = None) -> pd.DataFrame:
+    """
+    Ranked permutation importances on a stratified subsample.
+
+    Args:
+        model: Fitted model
+        X: Held-out feature matrix (DataFrame or array)
+        y: Held-out target
+        n_repeats: Permutations per feature
+        sample: Rows to use; None uses all of them
+        strata: Stratum label per row; defaults to target quantile bins
+        scoring: 'r2', 'mae' or 'rmse'
+        n_jobs: Parallel workers, as in joblib
+        seed: Random seed for the sample and the permutations
+        feature_names: Names for the table; defaults to X's columns
+
+    Returns:
+        DataFrame with feature, importance_mean, importance_std and
+        importance_var (drop in score over the repeats), most important
+        first; attrs hold the baseline score and rows used
+    """
+    rows = stratified_sample(y, sample, strata=strata, seed=seed)
+    X_sample = X.iloc[rows] if hasattr(X, 'iloc') else np.asarray(X)[rows]
+    y_sample = np.asarray(y, dtype=np.float64)[rows]
+    baseline, scores = permutation_scores(model, X_sample, y_sample, n_repeats=n_repeats,
+                                          scoring=scoring, n_jobs=n_jobs, seed=seed)
+
+    drops = baseline - scores
+    if feature_names is not None:
+        names = list(feature_names)
+    elif hasattr(X, 'columns'):
+        names = list(X.columns)
+    else:
+        names = [f"x{i}" for i in range(drops.shape[0])]
+    table = pd.DataFrame({
+        'feature': names,
+        'importance_mean': drops.mean(axis=1),
+        'importance_std': drops.std(axis=1, ddof=1) if n_repeats > 1 else np.zeros(len(names)),
+    })
+    table['importance_var'] = table['importance_std'] ** 2
+    table = table.sort_values('importance_mean', ascending=False,
+                              kind='stable').reset_index(drop=True)
+    table.attrs.update(baseline=baseline, scoring=scoring, rows=len(rows), n_repeats=n_repeats)
+    return table
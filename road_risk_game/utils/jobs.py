@@ -0,0 +1,382 @@
+"""
+Bulk Scoring Jobs
+=================
+Asynchronous scoring of whole CSV or Parquet files.
+
+A job reads its input in fixed-size chunks, scores each chunk with the
+duplicate-collapsing path and writes it to its own part file before
+recording progress. Job metadata lives in a local SQLite file, so a job
+interrupted by a restart resumes after its last completed chunk, and a
+cancel request is honoured between chunks. Jobs run in a process pool
+whose size is the concurrency limit; jobs beyond it wait in the pool's
+queue.
+"""
+
+import multiprocessing
+import os
+import sqlite3
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+import pandas as pd
+
+JOB_FORMATS = ('csv', 'parquet')
+
+QUEUED = 'queued'
+RUNNING = 'running'
+COMPLETED = 'completed'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+FINISHED_STATUSES = (COMPLETED, FAILED, CANCELLED)
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+RESULT_FILENAME = "result.csv"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    input_path TEXT NOT NULL,
+    format TEXT NOT NULL,
+    chunk_rows INTEGER NOT NULL,
+    total_rows INTEGER,
+    rows_done INTEGER NOT NULL DEFAULT 0,
+    chunks_done INTEGER NOT NULL DEFAULT 0,
+    cancel_requested INTEGER NOT NULL DEFAULT 0,
+    result_path TEXT,
+    error TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+)
+"""
+
+
+class JobNotFoundError(KeyError):
+    """Raised for an unknown job id."""
+
+
+class JobStore:
+    """Job metadata in a SQLite file, safe to share between processes."""
+
+    def __init__(self, db_path: Union[str, Path]):
+        """
+        Open (and create if needed) the job database.
+
+        Args:
+            db_path: SQLite file
+        """
+        self.db_path = str(db_path)
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Short-lived connection; each call commits on exit."""
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def create(self, input_path: Union[str, Path], fmt: str,
+               chunk_rows: int = DEFAULT_CHUNK_ROWS) -> str:
+        """
+        Register a new queued job.
+
+        Args:
+            input_path: File to score
+            fmt: 'csv' or 'parquet'
+            chunk_rows: Rows scored and written per chunk
+
+        Returns:
+            Job id
+        """
+        if fmt not in JOB_FORMATS:
+            raise ValueError(f"Unknown format '{fmt}'. Choose from {JOB_FORMATS}")
+        if chunk_rows < 1:
+            raise ValueError("chunk_rows must be positive")
+
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, input_path, format, chunk_rows, created_at, "
+                "updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job_id, QUEUED, str(input_path), fmt, chunk_rows, now, now))
+        return job_id
+
+    def get(self, job_id: str) -> Dict:
+        """
+        Current state of a job.
+
+        Raises:
+            JobNotFoundError: If the id is unknown
+        """
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            raise JobNotFoundError(job_id)
+        return dict(row)
+
+    def list(self, status: Optional[str] = None) -> List[Dict]:
+        """Every job, newest first, optionally filtered by status."""
+        query, params = "SELECT * FROM jobs", ()
+        if status is not None:
+            query, params = query + " WHERE status = ?", (status,)
+        with self._connect() as conn:
+            rows = conn.execute(query + " ORDER BY created_at DESC", params).fetchall()
+        return [dict(row) for row in rows]
+
+    def update(self, job_id: str, **fields):
+        """Set columns of a job and bump its updated_at."""
+        fields['updated_at'] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._connect() as conn:
+            conn.execute(f"UPDATE jobs SET {assignments} WHERE id = ?", (*fields.values(), job_id))
+
+    def request_cancel(self, job_id: str) -> Dict:
+        """
+        Ask a job to stop.
+
+        Queued jobs are cancelled at once; running jobs stop after their
+        current chunk. Finished jobs are left untouched.
+
+        Returns:
+            The job's state after the request
+        """
+        job = self.get(job_id)
+        if job['status'] == QUEUED:
+            self.update(job_id, status=CANCELLED, cancel_requested=1)
+        elif job['status'] == RUNNING:
+            self.update(job_id, cancel_requested=1)
+        return self.get(job_id)
+
+    def cancel_requested(self, job_id: str) -> bool:
+        """Whether a cancel request is pending for a job."""
+        with self._connect() as conn:
+            row = conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?",
+                               (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    def unfinished(self) -> List[Dict]:
+        """Jobs that were queued or running, oldest first, e.g. after a restart."""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM jobs WHERE status IN (?, ?) ORDER BY created_at",
+                (QUEUED, RUNNING)).fetchall()
+        return [dict(row) for row in rows]
+
+
+def count_rows(path: Union[str, Path], fmt: str) -> int:
+    """
+    Number of data rows in an input file, without parsing it.
+
+    Args:
+        path: Input file
+        fmt: 'csv' or 'parquet'
+
+    Returns:
+        Row count (CSV rows are counted as newlines minus the header)
+    """
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        return pq.ParquetFile(path).metadata.num_rows
+
+    newlines, last = 0, b"\n"
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            newlines += block.count(b"\n")
+            last = block[-1:]
+    # A final line without a trailing newline still counts
+    return max(0, newlines + (last != b"\n") - 1)
+
+
+def iter_chunks(path: Union[str, Path], fmt: str, chunk_rows: int,
+                skip_chunks: int = 0) -> Iterator[pd.DataFrame]:
+    """
+    Read an input file in fixed-size chunks.
+
+    Args:
+        path: Input file
+        fmt: 'csv' or 'parquet'
+        chunk_rows: Rows per chunk
+        skip_chunks: Leading chunks to skip (already scored)
+
+    Yields:
+        DataFrames of up to chunk_rows rows
+    """
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        batches = pq.ParquetFile(path).iter_batches(batch_size=chunk_rows)
+        for index, batch in enumerate(batches):
+            if index >= skip_chunks:
+                yield batch.to_pandas()
+        return
+
+    # Skip already-scored rows without parsing them; the header row stays
+    skip = range(1, skip_chunks * chunk_rows + 1) if skip_chunks else None
+    yield from pd.read_csv(path, chunksize=chunk_rows, skiprows=skip)
+
+
+def part_path(job_dir: Path, index: int) -> Path:
+    """Output file of one chunk."""
+    return job_dir / f"part-{index:06d}.csv"
+
+
+# One predictor per worker process, loaded on its first job
+_predictors = {}
+
+
+def _predictor(models_dir: str):
+    """Cached RiskPredictor for this process."""
+    if models_dir not in _predictors:
+        from utils.model_utils import RiskPredictor
+        _predictors[models_dir] = RiskPredictor(models_dir=models_dir)
+    return _predictors[models_dir]
+
+
+def run_job(db_path: str, jobs_dir: str, job_id: str, models_dir: str,
+            id_column: str = 'id') -> str:
+    """
+    Score a job's input, resuming after its last completed chunk.
+
+    Each chunk is written to a temporary file and renamed into place
+    before progress is recorded, so a crash never leaves a half-written
+    part counted as done.
+
+    Args:
+        db_path: Job database
+        jobs_dir: Directory holding one subdirectory per job
+        job_id: Job to run
+        models_dir: Model directory for RiskPredictor
+        id_column: Input column copied to the output when present
+
+    Returns:
+        Final job status
+    """
+    from utils.batch_scoring import score_scenarios
+
+    store = JobStore(db_path)
+    job = store.get(job_id)
+    if job['status'] in FINISHED_STATUSES:
+        return job['status']
+
+    job_dir = Path(jobs_dir) / job_id
+    job_dir.mkdir(parents=True, exist_ok=True)
+    try:
+        if store.cancel_requested(job_id):
+            store.update(job_id, status=CANCELLED)
+            return CANCELLED
+
+        predictor = _predictor(models_dir)
+        store.update(job_id, status=RUNNING, error=None,
+                     total_rows=job['total_rows'] or count_rows(job['input_path'], job['format']))
+
+        chunks_done, rows_done = job['chunks_done'], job['rows_done']
+        for chunk in iter_chunks(job['input_path'], job['format'], job['chunk_rows'],
+                                 skip_chunks=chunks_done):
+            if store.cancel_requested(job_id):
+                store.update(job_id, status=CANCELLED)
+                return CANCELLED
+
+            risks, _ = score_scenarios(predictor, chunk)
+            output = pd.DataFrame({'accident_risk': risks})
+            if id_column in chunk.columns:
+                output.insert(0, id_column, chunk[id_column].to_numpy())
+
+            target = part_path(job_dir, chunks_done)
+            temporary = target.with_suffix('.tmp')
+            output.to_csv(temporary, index=False)
+            os.replace(temporary, target)
+
+            chunks_done += 1
+            rows_done += len(chunk)
+            store.update(job_id, chunks_done=chunks_done, rows_done=rows_done)
+
+        result = job_dir / RESULT_FILENAME
+        with open(result, 'wb') as out:
+            for index in range(chunks_done):
+                with open(part_path(job_dir, index), 'rb') as part:
+                    if index:
+                        part.readline()  # header
+                    out.write(part.read())
+        for index in range(chunks_done):
+            part_path(job_dir, index).unlink()
+
+        store.update(job_id, status=COMPLETED, result_path=str(result))
+        return COMPLETED
+
+    except Exception as e:
+        store.update(job_id, status=FAILED, error=f"{type(e).__name__}: {e}")
+        return FAILED
+
+
+class JobManager:
+    """Submits jobs to a process pool and resumes unfinished ones."""
+
+    def __init__(self, db_path: Union[str, Path], jobs_dir: Union[str, Path],
+                 models_dir: Union[str, Path], max_workers: int = 2):
+        """
+        Initialize the manager.
+
+        Args:
+            db_path: Job database
+            jobs_dir: Directory for per-job outputs
+            models_dir: Model directory passed to the workers
+            max_workers: Jobs running at the same time
+        """
+        self.jobs_dir = Path(jobs_dir)
+        self.jobs_dir.mkdir(parents=True, exist_ok=True)
+        self.store = JobStore(db_path)
+        self.models_dir = str(models_dir)
+        self.max_workers = max_workers
+        # spawn keeps workers independent of the server's threads and event loop
+        self.executor = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+
+    def _start(self, job_id: str):
+        """Queue a job on the pool."""
+        self.executor.submit(run_job, self.store.db_path, str(self.jobs_dir), job_id,
+                             self.models_dir)
+
+    def submit(self, input_path: Union[str, Path], fmt: Optional[str] = None,
+               chunk_rows: int = DEFAULT_CHUNK_ROWS) -> str:
+        """
+        Create a job and queue it.
+
+        Args:
+            input_path: CSV or Parquet file
+            fmt: 'csv' or 'parquet'; inferred from the extension when omitted
+            chunk_rows: Rows per chunk
+
+        Returns:
+            Job id
+        """
+        input_path = Path(input_path)
+        if not input_path.is_file():
+            raise FileNotFoundError(f"Input file not found: {input_path}")
+        if fmt is None:
+            fmt = 'parquet' if input_path.suffix.lower() in ('.parquet', '.pq') else 'csv'
+
+        job_id = self.store.create(input_path.resolve(), fmt, chunk_rows)
+        self._start(job_id)
+        return job_id
+
+    def resume(self) -> List[str]:
+        """
+        Requeue jobs left queued or running by a previous process.
+
+        Returns:
+            Ids of the requeued jobs
+        """
+        job_ids = [job['id'] for job in self.store.unfinished()]
+        for job_id in job_ids:
+            self.store.update(job_id, status=QUEUED)
+            self._start(job_id)
+        return job_ids
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pool; unfinished jobs are resumed by the next manager."""
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
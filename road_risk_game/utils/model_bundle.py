@@ -0,0 +1,229 @@
+"""
+Model Bundle
+============
+Single-file model artifact holding the fitted model, the categorical
+vocabularies, the feature order and a schema hash.
+
+Bundles are written with joblib, which stores every numpy array of the
+model in its own block. Uncompressed bundles can therefore be loaded with
+``mmap_mode='r'``; compressed bundles trade that for a smaller file.
+"""
+
+import argparse
+import hashlib
+import json
+import warnings
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+import joblib
+
+BUNDLE_FILENAME = "model_bundle.joblib"
+BUNDLE_FORMAT_VERSION = 1
+COMPRESSION_CODECS = ('zlib', 'gzip', 'bz2', 'lzma', 'lz4')
+
+# Legacy artifacts written by save_model.py before bundles existed
+LEGACY_MODEL_FILENAME = "accident_risk_model.joblib"
+LEGACY_ENCODERS_FILENAME = "label_encoders.joblib"
+LEGACY_FEATURES_FILENAME = "feature_names.joblib"
+
+_REQUIRED_KEYS = ('format_version', 'model', 'vocabularies', 'feature_names', 'schema_hash')
+
+
+class BundleError(ValueError):
+    """Raised when a bundle is malformed or its parts do not agree."""
+
+
+def vocabularies_from_encoders(label_encoders: Dict[str, Any]) -> Dict[str, List]:
+    """
+    Extract plain vocabularies from fitted LabelEncoders.
+
+    Args:
+        label_encoders: Mapping of column name to fitted LabelEncoder
+
+    Returns:
+        Mapping of column name to the list of classes, in code order
+    """
+    return {col: encoder.classes_.tolist() for col, encoder in label_encoders.items()}
+
+
+def compute_schema_hash(feature_names: Sequence[str], vocabularies: Dict[str, Sequence]) -> str:
+    """
+    Hash the feature order and the vocabularies.
+
+    Any change to a category list or to the column order yields a
+    different hash, so a model and encoders from different training runs
+    cannot be mixed silently.
+
+    Args:
+        feature_names: Model feature order
+        vocabularies: Mapping of column name to classes
+
+    Returns:
+        Hex-encoded SHA-256 digest
+    """
+    payload = {
+        'features': list(feature_names),
+        'vocabularies': {col: list(classes) for col, classes in sorted(vocabularies.items())},
+    }
+    encoded = json.dumps(payload, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+def _check_model_schema(model: Any, feature_names: Sequence[str]):
+    """Raise BundleError if the model was fitted on a different feature set."""
+    n_features = getattr(model, 'n_features_in_', None)
+    if n_features is not None and n_features != len(feature_names):
+        raise BundleError(
+            f"Model expects {n_features} features but bundle lists {len(feature_names)}"
+        )
+
+    fitted_names = getattr(model, 'feature_names_in_', None)
+    if fitted_names is not None and list(fitted_names) != list(feature_names):
+        raise BundleError("Model feature order does not match bundle feature_names")
+
+
+def _parse_compress(compress: Union[None, str, Tuple[str, int]]) -> Union[int, Tuple[str, int]]:
+    """Translate a codec name or (codec, level) pair into joblib's compress argument."""
+    if compress is None:
+        return 0
+
+    if isinstance(compress, str):
+        codec, level = compress, 3
+    else:
+        codec, level = compress
+
+    if codec not in COMPRESSION_CODECS:
+        raise ValueError(f"Unknown compression codec '{codec}'. Choose from {COMPRESSION_CODECS}")
+    return codec, int(level)
+
+
+def save_bundle(path: Union[str, Path],
+                model: Any,
+                vocabularies: Dict[str, Sequence],
+                feature_names: Sequence[str],
+                compress: Union[None, str, Tuple[str, int]] = None,
+                metadata: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Write a model bundle.
+
+    Args:
+        path: Output file
+        model: Fitted estimator
+        vocabularies: Mapping of categorical column to classes, in code order
+        feature_names: Model feature order
+        compress: None for an uncompressed, memory-mappable file, or a codec
+                  name / (codec, level) pair from COMPRESSION_CODECS
+        metadata: Extra information stored alongside the model
+
+    Returns:
+        Schema hash of the written bundle
+    """
+    feature_names = list(feature_names)
+    vocabularies = {col: list(classes) for col, classes in vocabularies.items()}
+    _check_model_schema(model, feature_names)
+
+    schema_hash = compute_schema_hash(feature_names, vocabularies)
+    bundle_metadata = {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'model_type': type(model).__name__,
+        'sklearn_version': getattr(model, '_sklearn_version', None),
+    }
+    bundle_metadata.update(metadata or {})
+
+    bundle = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'model': model,
+        'vocabularies': vocabularies,
+        'feature_names': feature_names,
+        'schema_hash': schema_hash,
+        'metadata': bundle_metadata,
+    }
+    joblib.dump(bundle, path, compress=_parse_compress(compress))
+    return schema_hash
+
+
+def load_bundle(path: Union[str, Path], mmap_mode: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load and validate a model bundle.
+
+    Args:
+        path: Bundle file
+        mmap_mode: Passed to joblib; 'r' memory-maps the model arrays of an
+                   uncompressed bundle and is ignored for compressed ones
+
+    Returns:
+        Dictionary with model, vocabularies, feature_names, schema_hash and metadata
+
+    Raises:
+        BundleError: If the bundle is incomplete or its parts disagree
+    """
+    with warnings.catch_warnings():
+        # joblib warns when mmap_mode is requested on a compressed file
+        warnings.filterwarnings('ignore', message='.*mmap_mode.*compressed.*')
+        bundle = joblib.load(path, mmap_mode=mmap_mode)
+
+    if not isinstance(bundle, dict):
+        raise BundleError(f"{path} is not a model bundle")
+
+    missing = [key for key in _REQUIRED_KEYS if key not in bundle]
+    if missing:
+        raise BundleError(f"Bundle {path} is missing keys: {missing}")
+
+    if bundle['format_version'] > BUNDLE_FORMAT_VERSION:
+        raise BundleError(
+            f"Bundle format {bundle['format_version']} is newer than supported "
+            f"version {BUNDLE_FORMAT_VERSION}"
+        )
+
+    expected_hash = compute_schema_hash(bundle['feature_names'], bundle['vocabularies'])
+    if expected_hash != bundle['schema_hash']:
+        raise BundleError("Bundle schema hash mismatch: encoders and feature order are out of sync")
+
+    _check_model_schema(bundle['model'], bundle['feature_names'])
+    bundle.setdefault('metadata', {})
+    return bundle
+
+
+def bundle_from_legacy(models_dir: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Read the three legacy joblib artifacts into bundle form.
+
+    Args:
+        models_dir: Directory containing the legacy model, encoders and feature names
+
+    Returns:
+        Dictionary with model, vocabularies and feature_names
+    """
+    models_dir = Path(models_dir)
+    label_encoders = joblib.load(models_dir / LEGACY_ENCODERS_FILENAME)
+    return {
+        'model': joblib.load(models_dir / LEGACY_MODEL_FILENAME),
+        'vocabularies': vocabularies_from_encoders(label_encoders),
+        'feature_names': list(joblib.load(models_dir / LEGACY_FEATURES_FILENAME)),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Convert a directory of legacy artifacts into a single bundle."""
+    parser = argparse.ArgumentParser(
+        description="Build a model bundle from legacy joblib artifacts")
+    parser.add_argument('models_dir', help="Directory with the legacy artifacts")
+    parser.add_argument('--output', help=f"Bundle path (default: <models_dir>/{BUNDLE_FILENAME})")
+    parser.add_argument('--compress', choices=COMPRESSION_CODECS,
+                        help="Compression codec (default: uncompressed, memory-mappable)")
+    parser.add_argument('--level', type=int, default=3, help="Compression level")
+    args = parser.parse_args(argv)
+
+    parts = bundle_from_legacy(args.models_dir)
+    output = Path(args.output) if args.output else Path(args.models_dir) / BUNDLE_FILENAME
+    compress = (args.compress, args.level) if args.compress else None
+
+    schema_hash = save_bundle(output, parts['model'], parts['vocabularies'],
+                              parts['feature_names'], compress=compress)
+    print(f"✓ Saved bundle to: {output} (schema {schema_hash[:12]})")
+
+
+if __name__ == "__main__":
+    main()
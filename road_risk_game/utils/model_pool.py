@@ -0,0 +1,334 @@
+"""
+Model Pool
+==========
+Several models served side by side from one process.
+
+Each PooledModel holds a fitted model with its own feature encoder (and
+explainer, when the model supports one), so models trained on different
+vocabularies can share the process. A request names its model in the
+X-Model header or, without one, is routed by a weighted random split.
+
+Every model keeps request, row and error counters and a fixed-bucket
+latency histogram, so the cost of each model can be compared on live
+traffic before routing latency-sensitive callers to the cheaper one.
+"""
+
+import random
+import threading
+from bisect import bisect_left
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+from utils.explain import TreePathExplainer
+from utils.features import FeatureEncoder
+from utils.model_bundle import load_bundle
+
+MODEL_HEADER = "X-Model"
+
+# Upper bucket edges in milliseconds; slower requests land in an overflow bucket
+LATENCY_BUCKETS_MS = (0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 25.0, 50.0, 100.0, 250.0, 500.0, 1000.0)
+
+
+class UnknownModelError(KeyError):
+    """Raised when a request names a model that is not in the pool."""
+
+
+class LatencyHistogram:
+    """Request latencies counted in fixed buckets."""
+
+    def __init__(self, edges: Sequence[float] = LATENCY_BUCKETS_MS):
+        """
+        Initialize the histogram.
+
+        Args:
+            edges: Increasing upper bucket edges in milliseconds
+        """
+        self.edges = list(edges)
+        self.counts = [0] * (len(self.edges) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, latency_ms: float):
+        """Count one latency; a value on an edge belongs to that edge's bucket."""
+        self.counts[bisect_left(self.edges, latency_ms)] += 1
+        self.total += 1
+        self.sum_ms += latency_ms
+        if latency_ms > self.max_ms:
+            self.max_ms = latency_ms
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Upper edge of the bucket holding the q-quantile.
+
+        Args:
+            q: Quantile in (0, 1]
+
+        Returns:
+            Bucket edge in milliseconds, the maximum seen for the overflow
+            bucket, or None when empty
+        """
+        if not self.total:
+            return None
+        rank = q * self.total
+        seen = 0
+        for edge, count in zip(self.edges, self.counts):
+            seen += count
+            if seen >= rank:
+                return edge
+        return self.max_ms
+
+    def summary(self) -> Dict[str, Any]:
+        """Count, mean, max, bucketed p50/p95/p99 and the bucket counts."""
+        labels = [f"<={edge:g}" for edge in self.edges] + [f">{self.edges[-1]:g}"]
+        return {
+            'count': self.total,
+            'mean_ms': self.sum_ms / self.total if self.total else None,
+            'max_ms': self.max_ms if self.total else None,
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+def accepts_missing(model: Any) -> bool:
+    """Whether a model predicts on NaN features (scikit-learn's allow_nan tag)."""
+    if hasattr(model, '__sklearn_tags__'):
+        return bool(model.__sklearn_tags__().input_tags.allow_nan)
+    if hasattr(model, '_get_tags'):
+        # scikit-learn < 1.6
+        return bool(model._get_tags().get('allow_nan', False))
+    return False
+
+
+class PooledModel:
+    """One servable model with its encoder, explainer and usage counters."""
+
+    def __init__(self, name: str, model: Any, encoder: FeatureEncoder,
+                 schema_hash: Optional[str] = None, explainer: Optional[TreePathExplainer] = None,
+                 weight: float = 0.0, source: Optional[str] = None):
+        """
+        Initialize the entry.
+
+        Args:
+            name: Name clients use in the X-Model header
+            model: Fitted model with predict
+            encoder: Encoder for the model's vocabularies and feature order
+            schema_hash: Bundle schema hash; None for legacy artifacts
+            explainer: Explainer for ?explain=true, if the model supports one
+            weight: Share of unrouted traffic
+            source: Where the model was loaded from
+
+        Raises:
+            ValueError: If the encoder turns unseen categories into NaN and
+                        the model does not accept missing values
+        """
+        if encoder is not None and encoder.unknown == 'nan' and not accepts_missing(model):
+            raise ValueError(f"Model '{name}' ({type(model).__name__}) does not accept missing "
+                             f"values; the 'nan' unknown category policy needs a model that does")
+        self.name = name
+        self.model = model
+        self.encoder = encoder
+        self.schema_hash = schema_hash
+        self.explainer = explainer
+        self.weight = weight
+        self.source = source
+
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.rows = 0
+        self.errors = 0
+        self.latency = LatencyHistogram()
+
+    @property
+    def version(self) -> str:
+        """Name and short schema hash, e.g. 'gbr@ea2be9e05077'."""
+        return f"{self.name}@{self.schema_hash[:12] if self.schema_hash else 'legacy'}"
+
+    def record(self, latency_ms: float, rows: int = 1):
+        """Count one answered request."""
+        with self._lock:
+            self.requests += 1
+            self.rows += rows
+            self.latency.record(latency_ms)
+
+    def record_error(self):
+        """Count one failed request."""
+        with self._lock:
+            self.errors += 1
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters, latency histogram and description of the model."""
+        with self._lock:
+            return {
+                'version': self.version,
+                'model_type': type(self.model).__name__,
+                'source': self.source,
+                'weight': self.weight,
+                'explainable': self.explainer is not None,
+                'requests': self.requests,
+                'rows': self.rows,
+                'errors': self.errors,
+                'latency': self.latency.summary(),
+            }
+
+
+def load_pooled_model(name: str, bundle_path: Union[str, Path], weight: float = 0.0,
+                      unknown: str = 'error', mmap_mode: Optional[str] = 'r') -> PooledModel:
+    """
+    Load a bundle as a pool entry.
+
+    Args:
+        name: Name of the entry
+        bundle_path: Model bundle
+        weight: Share of unrouted traffic
+        unknown: Unseen category policy of the entry's encoder
+        mmap_mode: Passed to load_bundle
+
+    Returns:
+        PooledModel; explanations are off for models TreePathExplainer
+        does not support
+    """
+    bundle = load_bundle(bundle_path, mmap_mode=mmap_mode)
+    try:
+        explainer = TreePathExplainer(bundle['model'], bundle['feature_names'])
+    except ValueError:
+        explainer = None
+    encoder = FeatureEncoder(bundle['vocabularies'], bundle['feature_names'], unknown=unknown)
+    return PooledModel(name, bundle['model'], encoder,
+                       schema_hash=bundle['schema_hash'], explainer=explainer, weight=weight,
+                       source=str(bundle_path))
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """
+    Parse a traffic split such as 'gbr=0.9,compact=0.1'.
+
+    Args:
+        spec: Comma-separated name=weight pairs
+
+    Returns:
+        Model name to weight
+
+    Raises:
+        ValueError: For a malformed pair or a negative weight
+    """
+    weights = {}
+    for part in spec.split(','):
+        if not part.strip():
+            continue
+        name, sep, value = part.partition('=')
+        if not sep or not name.strip():
+            raise ValueError(f"Expected name=weight, got '{part}'")
+        weight = float(value)
+        if weight < 0:
+            raise ValueError(f"Weight of '{name.strip()}' must not be negative")
+        weights[name.strip()] = weight
+    return weights
+
+
+class ModelPool:
+    """Named models and the rule choosing one per request."""
+
+    def __init__(self, seed: Optional[int] = None):
+        """
+        Initialize an empty pool.
+
+        Args:
+            seed: Seed of the weighted split
+        """
+        self._models: Dict[str, PooledModel] = {}
+        self._random = random.Random(seed)
+        self._names: List[str] = []
+        self._cum_weights: List[float] = []
+
+    def add(self, entry: PooledModel):
+        """Add or replace a model; the first one added is the default."""
+        self._models[entry.name] = entry
+        self._rebuild()
+
+    def _rebuild(self):
+        """Recompute the cumulative weights of the split."""
+        names = [name for name, entry in self._models.items() if entry.weight > 0]
+        cum_weights, total = [], 0.0
+        for name in names:
+            total += self._models[name].weight
+            cum_weights.append(total)
+        self._names, self._cum_weights = names, cum_weights
+
+    @property
+    def names(self) -> List[str]:
+        """Model names, default first."""
+        return list(self._models)
+
+    @property
+    def default(self) -> PooledModel:
+        """Model used when nothing else applies."""
+        return next(iter(self._models.values()))
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._models
+
+    def __getitem__(self, name: str) -> PooledModel:
+        if name not in self._models:
+            raise UnknownModelError(f"Unknown model '{name}'. Available: {self.names}")
+        return self._models[name]
+
+    def __len__(self) -> int:
+        return len(self._models)
+
+    def set_weights(self, weights: Mapping[str, float]):
+        """
+        Change the traffic split; models not listed get weight 0.
+
+        Args:
+            weights: Model name to weight
+
+        Raises:
+            UnknownModelError: If a name is not in the pool
+            ValueError: If a weight is negative
+        """
+        for name, weight in weights.items():
+            if name not in self._models:
+                raise UnknownModelError(f"Unknown model '{name}'. Available: {self.names}")
+            if weight < 0:
+                raise ValueError(f"Weight of '{name}' must not be negative")
+        for name, entry in self._models.items():
+            entry.weight = float(weights.get(name, 0.0))
+        self._rebuild()
+
+    def select(self, name: Optional[str] = None) -> PooledModel:
+        """
+        Choose the model for one request.
+
+        Args:
+            name: Model requested by the client, if any
+
+        Returns:
+            The named model, otherwise a weighted random pick, otherwise the
+            default when no model has a weight
+
+        Raises:
+            UnknownModelError: If the requested name is not in the pool
+        """
+        if name:
+            return self[name]
+        names, cum_weights = self._names, self._cum_weights
+        if not names:
+            return self.default
+        if len(names) == 1:
+            return self._models[names[0]]
+        return self._models[self._random.choices(names, cum_weights=cum_weights)[0]]
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Routing weights and per-model usage.
+
+        Returns:
+            Dict with 'default' and 'models' (name -> PooledModel.stats())
+        """
+        return {
+            'default': self.default.name if self._models else None,
+            'models': {name: entry.stats() for name, entry in self._models.items()},
+        }
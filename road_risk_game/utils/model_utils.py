@@ -5,46 +5,83 @@ Handles model loading and predictions.
 """
 
 import joblib
+import numpy as np
 import pandas as pd
 import os
-from typing import Dict, Tuple
+from typing import Dict, List, Optional, Sequence, Tuple
 from pathlib import Path
 
+from utils.explain import TreePathExplainer
+from utils.features import FeatureEncoder, ScenarioBatch
+from utils.model_bundle import (
+    BUNDLE_FILENAME,
+    LEGACY_ENCODERS_FILENAME,
+    LEGACY_FEATURES_FILENAME,
+    LEGACY_MODEL_FILENAME,
+    load_bundle,
+    vocabularies_from_encoders,
+)
+from utils.sensitivity import MAX_GRID_SIZE, build_sweep_grid, grid_shape
+
 
 class RiskPredictor:
     """Handles model loading and predictions."""
     
-    def __init__(self, models_dir: str = "models"):
+    def __init__(self, models_dir: str = "models", unknown: str = 'error'):
         """
         Initialize the predictor.
         
         Args:
             models_dir: Directory containing model files
+            unknown: Policy for unseen categories: 'error', 'default' or 'nan'
         """
         # Get the absolute path to the models directory
         # This file is in utils/, so we go up one level to road_risk_game/
         current_dir = Path(__file__).parent.parent
         self.models_dir = current_dir / models_dir
         
+        self.unknown = unknown
+        
         self.model = None
+        self.encoder = None
         self.label_encoders = None
         self.feature_names = None
+        self.schema_hash = None
+        self._explainer = None
         self.load_model()
     
     def load_model(self):
-        """Load the trained model and encoders."""
+        """
+        Load the trained model and encoders.
+        
+        Prefers the single-file bundle and falls back to the legacy
+        model/encoders/feature-names artifacts when no bundle exists.
+        """
         try:
-            model_path = self.models_dir / "accident_risk_model.joblib"
-            encoders_path = self.models_dir / "label_encoders.joblib"
-            features_path = self.models_dir / "feature_names.joblib"
+            bundle_path = self.models_dir / BUNDLE_FILENAME
             
-            # Debug: print paths
-            print(f"Loading model from: {model_path}")
-            print(f"Model exists: {model_path.exists()}")
+            if bundle_path.exists():
+                print(f"Loading model bundle from: {bundle_path}")
+                bundle = load_bundle(bundle_path, mmap_mode='r')
+                self.model = bundle['model']
+                vocabularies = bundle['vocabularies']
+                self.feature_names = bundle['feature_names']
+                self.schema_hash = bundle['schema_hash']
+            else:
+                model_path = self.models_dir / LEGACY_MODEL_FILENAME
+                
+                # Debug: print paths
+                print(f"Loading model from: {model_path}")
+                print(f"Model exists: {model_path.exists()}")
+                
+                self.model = joblib.load(model_path)
+                vocabularies = vocabularies_from_encoders(
+                    joblib.load(self.models_dir / LEGACY_ENCODERS_FILENAME))
+                self.feature_names = joblib.load(self.models_dir / LEGACY_FEATURES_FILENAME)
             
-            self.model = joblib.load(model_path)
-            self.label_encoders = joblib.load(encoders_path)
-            self.feature_names = joblib.load(features_path)
+            self.encoder = FeatureEncoder(vocabularies, self.feature_names, unknown=self.unknown)
+            # Per-column lookup tables; each exposes a vectorized transform()
+            self.label_encoders = self.encoder.vocabularies
             
             print("✓ Model loaded successfully")
         except Exception as e:
@@ -54,6 +91,13 @@ class RiskPredictor:
             print(f"Models directory: {self.models_dir}")
             raise
     
+    @property
+    def explainer(self) -> TreePathExplainer:
+        """Tree-path explainer for the loaded model, built on first use."""
+        if self._explainer is None:
+            self._explainer = TreePathExplainer(self.model, self.feature_names)
+        return self._explainer
+    
     def preprocess_scenario(self, scenario: Dict) -> pd.DataFrame:
         """
         Preprocess a road scenario for prediction.
@@ -64,22 +108,22 @@ class RiskPredictor:
         Returns:
             Preprocessed DataFrame ready for prediction
         """
-        df = pd.DataFrame([scenario])
-        
-        # Encode categorical variables
-        categorical_features = ['road_type', 'lighting', 'weather', 'road_signs_present',
-                              'public_road', 'time_of_day', 'holiday', 'school_season']
-        
-        for col in categorical_features:
-            df[col] = self.label_encoders[col].transform(df[col])
+        return self.encoder.transform([scenario])
+    
+    def preprocess_batch(self, scenarios: ScenarioBatch,
+                         categories: Optional[Dict[str, Sequence]] = None) -> pd.DataFrame:
+        """
+        Preprocess many road scenarios at once.
         
-        # Create engineered features
-        df['speed_curvature'] = df['speed_limit'] * df['curvature']
-        df['lanes_accidents'] = df['num_lanes'] * df['num_reported_accidents']
-        df['high_speed'] = (df['speed_limit'] >= 60).astype(int)
-        df['sharp_curve'] = (df['curvature'] >= 0.7).astype(int)
+        Args:
+            scenarios: List of scenario dicts, dict of columns or DataFrame
+            categories: Category lists for integer-coded categorical columns,
+                        e.g. ScenarioGenerator.BATCH_CATEGORIES
         
-        return df
+        Returns:
+            Preprocessed DataFrame with one row per scenario
+        """
+        return self.encoder.transform(scenarios, categories=categories)
     
     def predict(self, scenario: Dict) -> float:
         """
@@ -95,6 +139,21 @@ class RiskPredictor:
         prediction = self.model.predict(processed_data)[0]
         return float(prediction)
     
+    def predict_batch(self, scenarios: ScenarioBatch,
+                      categories: Optional[Dict[str, Sequence]] = None) -> np.ndarray:
+        """
+        Predict accident risk for many road scenarios in one model call.
+        
+        Args:
+            scenarios: List of scenario dicts, dict of columns or DataFrame
+            categories: Category lists for integer-coded categorical columns,
+                        e.g. ScenarioGenerator.BATCH_CATEGORIES
+        
+        Returns:
+            Array of predicted risks, one per scenario
+        """
+        return self.model.predict(self.preprocess_batch(scenarios, categories=categories))
+    
     def compare_scenarios(self, scenario1: Dict, scenario2: Dict) -> Tuple[float, float, int]:
         """
         Compare two scenarios and return which has higher risk.
@@ -113,3 +172,110 @@ class RiskPredictor:
         higher_risk_index = 0 if risk1 > risk2 else 1
         
         return risk1, risk2, higher_risk_index
+    
+    def explain(self, scenario: Dict, top_k: int = 3) -> Tuple[float, List[Dict]]:
+        """
+        Predict accident risk and the features that drove it.
+        
+        Args:
+            scenario: Dictionary with road characteristics
+            top_k: Number of contributing features to return
+        
+        Returns:
+            Tuple of (risk, top features as {'feature', 'contribution'} dicts)
+        """
+        risks, explanations = self.explain_batch([scenario], top_k=top_k)
+        return float(risks[0]), explanations[0]
+    
+    def explain_batch(self, scenarios: ScenarioBatch,
+                      top_k: int = 3) -> Tuple[np.ndarray, List[List[Dict]]]:
+        """
+        Predict and explain many road scenarios at once.
+        
+        Risks are reconstructed from the contributions, which sum exactly
+        to the model prediction, so no separate predict call is needed.
+        
+        Args:
+            scenarios: List of scenario dicts, dict of columns or DataFrame
+            top_k: Number of contributing features to return per scenario
+        
+        Returns:
+            Tuple of (risks array, one top-feature list per scenario)
+        """
+        contributions = self.explainer.contributions(self.preprocess_batch(scenarios))
+        risks = self.explainer.bias + contributions.sum(axis=1)
+        return risks, self.explainer.top_features(contributions, top_k=top_k)
+    
+    def explain_comparison(self, scenario1: Dict, scenario2: Dict, top_k: int = 3) -> Dict:
+        """
+        Compare two scenarios and explain the risk gap between them.
+        
+        Args:
+            scenario1: First road scenario
+            scenario2: Second road scenario
+            top_k: Number of features to return
+        
+        Returns:
+            Dictionary with risk1, risk2, higher_risk_index and the features
+            whose contributions differ most (positive means scenario2 riskier)
+        """
+        contributions = self.explainer.contributions(
+            self.preprocess_batch([scenario1, scenario2]))
+        risk1, risk2 = self.explainer.bias + contributions.sum(axis=1)
+        
+        return {
+            'risk1': float(risk1),
+            'risk2': float(risk2),
+            'higher_risk_index': 0 if risk1 > risk2 else 1,
+            'top_features': self.explainer.top_features(
+                contributions[1] - contributions[0], top_k=top_k)[0],
+        }
+    
+    def sensitivity(self, base: Dict, sweeps: Dict[str, Sequence],
+                    max_grid_size: int = MAX_GRID_SIZE) -> Dict:
+        """
+        Score every combination of feature sweeps around a base scenario.
+        
+        Args:
+            base: Base road scenario
+            sweeps: Mapping of feature name to the values to try
+            max_grid_size: Maximum number of variants to score
+        
+        Returns:
+            Dictionary with base_risk, the swept features and values, and
+            risks as an array with one axis per swept feature
+        """
+        grid = build_sweep_grid(base, sweeps, max_grid_size=max_grid_size)
+        
+        # Score the base scenario in the same batch as the variants
+        risks = self.predict_batch(pd.concat([grid, self.encoder.to_frame(base)],
+                                             ignore_index=True))
+        
+        return {
+            'base_risk': float(risks[-1]),
+            'features': list(sweeps),
+            'values': [list(values) for values in sweeps.values()],
+            'risks': risks[:-1].reshape(grid_shape(sweeps)),
+        }
+    
+    def score_routes(self, routes: Sequence[Sequence[Dict]],
+                     reference_length: Optional[float] = None) -> Tuple[List[Dict], Dict]:
+        """
+        Score whole routes, each an ordered list of road segments.
+        
+        Every segment of every route is scored in one batched call, with
+        segments shared between routes predicted once.
+        
+        Args:
+            routes: Routes as lists of scenario dicts, each with an
+                    optional 'length'
+            reference_length: Length one predicted risk refers to, used to
+                              scale each segment's share of combined_risk
+        
+        Returns:
+            Tuple of (per route: segment risks, max_risk, length-weighted
+            mean_risk and combined_risk; stats with segment counts)
+        """
+        # Imported here: batch_scoring, which routes builds on, imports this module
+        from utils.routes import score_routes
+        return score_routes(self.model, self.encoder, routes, reference_length=reference_length)
@@ -0,0 +1,444 @@
+"""
+Out-of-Fold Store
+=================
+K-fold predictions of every candidate model, kept for blending.
+
+run_oof fits each candidate in the model zoo on K folds of the training
+data. Every (model, fold) fit is one joblib task, so all of them run in
+parallel. Each candidate yields:
+
+* out-of-fold predictions: every training row predicted by the fold model
+  that did not see it
+* test predictions: the mean of the K fold models on the test rows
+
+Both are stored as float32 under the hash of the data and a key built
+from the model configuration (estimator class and parameters, scaling,
+folds and seed). A candidate already in the store is not refitted, so
+adding one model to the zoo costs one model's K fits.
+
+Blender then fits weights on the stored out-of-fold matrix. Two methods
+are available: non-negative linear weights, or a stacked level-2
+regressor. It predicts the test rows from the stored test predictions.
+No base model is refitted, so trying a blend takes seconds.
+
+Store layout, one directory per dataset:
+
+    <store>/<data hash>/data.npz       target and test ids
+    <store>/<data hash>/<key>.npz      oof and test predictions, fold scores, config
+
+Usage:
+    python -m utils.oof oof_store --method linear --output submission.csv
+"""
+
+import argparse
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from joblib import Parallel, delayed
+from scipy.optimize import nnls
+from sklearn.base import clone
+from sklearn.linear_model import Ridge
+from sklearn.metrics import r2_score
+from sklearn.model_selection import KFold
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import StandardScaler
+
+# Hex digits of the hashes used in file names
+KEY_LENGTH = 16
+
+DATA_FILENAME = "data.npz"
+BLEND_METHODS = ('linear', 'stacked')
+
+
+class OOFStoreError(ValueError):
+    """Raised for a missing dataset or model in the store."""
+
+
+def data_hash(X, y, X_test) -> str:
+    """
+    Hash of the training features, target and test features.
+
+    Args:
+        X: Training features (DataFrame or array)
+        y: Target
+        X_test: Test features
+
+    Returns:
+        Hex-encoded SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(col) for col in getattr(X, 'columns', [])]).encode('utf-8'))
+    for values in (X, y, X_test):
+        array = np.ascontiguousarray(np.asarray(values, dtype=np.float64))
+        digest.update(str(array.shape).encode('utf-8'))
+        digest.update(array.data)
+    return digest.hexdigest()
+
+
+def model_key(estimator, scaled: bool, n_splits: int, seed: int) -> str:
+    """
+    Hash of everything that determines a candidate's predictions on given data.
+
+    Args:
+        estimator: Unfitted estimator
+        scaled: Whether features are standardized before fitting
+        n_splits: Number of folds
+        seed: Fold shuffling seed
+
+    Returns:
+        Hex-encoded SHA-256 digest
+    """
+    config = {
+        'estimator': f"{type(estimator).__module__}.{type(estimator).__qualname__}",
+        'params': estimator.get_params(deep=True),
+        'scaled': scaled,
+        'n_splits': n_splits,
+        'seed': seed,
+    }
+    encoded = json.dumps(config, sort_keys=True, default=repr).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()
+
+
+class OOFStore:
+    """Directory of out-of-fold and test predictions, keyed by data and model config."""
+
+    def __init__(self, directory: Union[str, Path]):
+        """
+        Open (or start) a store.
+
+        Args:
+            directory: Store directory, created on first write
+        """
+        self.directory = Path(directory)
+
+    def _dataset(self, digest: str) -> Path:
+        return self.directory / digest[:KEY_LENGTH]
+
+    def _write(self, path: Path, **arrays):
+        """Write an .npz atomically, so readers never see half a file."""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        temporary = path.with_suffix('.tmp.npz')
+        np.savez(temporary, **arrays)
+        os.replace(temporary, path)
+
+    def save_data(self, digest: str, y, test_ids):
+        """Store the target and test ids of a dataset."""
+        self._write(self._dataset(digest) / DATA_FILENAME,
+                    y=np.asarray(y, dtype=np.float64), test_ids=np.asarray(test_ids))
+
+    def has_data(self, digest: str) -> bool:
+        """Whether a dataset is in the store."""
+        return (self._dataset(digest) / DATA_FILENAME).is_file()
+
+    def load_data(self, digest: str) -> Dict[str, np.ndarray]:
+        """
+        Target and test ids of a dataset.
+
+        Raises:
+            OOFStoreError: If the dataset is not in the store
+        """
+        path = self._dataset(digest) / DATA_FILENAME
+        if not self.has_data(digest):
+            raise OOFStoreError(f"No dataset {digest[:KEY_LENGTH]} in {self.directory}")
+        with np.load(path, allow_pickle=False) as data:
+            return {'y': data['y'], 'test_ids': data['test_ids']}
+
+    def has(self, digest: str, key: str) -> bool:
+        """Whether a candidate's predictions are stored for a dataset."""
+        return (self._dataset(digest) / f"{key[:KEY_LENGTH]}.npz").is_file()
+
+    def save(self, digest: str, key: str, name: str, config: Mapping[str, Any],
+             oof: np.ndarray, test: np.ndarray, fold_scores: Sequence[float]):
+        """
+        Store one candidate's predictions.
+
+        Args:
+            digest: Dataset hash
+            key: Model key
+            name: Display name
+            config: Description of the candidate, kept as JSON
+            oof: Out-of-fold prediction per training row
+            test: Mean fold prediction per test row
+            fold_scores: Validation R² of every fold
+        """
+        meta = {'name': name, 'key': key, 'config': dict(config),
+                'oof_r2': float(r2_score(self.load_data(digest)['y'], oof))}
+        self._write(self._dataset(digest) / f"{key[:KEY_LENGTH]}.npz",
+                    oof=np.asarray(oof, dtype=np.float32), test=np.asarray(test, dtype=np.float32),
+                    fold_scores=np.asarray(fold_scores, dtype=np.float64),
+                    meta=np.array(json.dumps(meta, default=repr)))
+
+    def load(self, digest: str, key: str) -> Dict[str, Any]:
+        """
+        One candidate's predictions and metadata.
+
+        Raises:
+            OOFStoreError: If the candidate is not stored for the dataset
+        """
+        path = self._dataset(digest) / f"{key[:KEY_LENGTH]}.npz"
+        if not path.is_file():
+            raise OOFStoreError(f"No predictions for model {key[:KEY_LENGTH]} "
+                                f"on dataset {digest[:KEY_LENGTH]}")
+        with np.load(path, allow_pickle=False) as data:
+            entry = json.loads(str(data['meta']))
+            entry.update(oof=data['oof'], test=data['test'], fold_scores=data['fold_scores'])
+        return entry
+
+    def entries(self, digest: str) -> List[Dict[str, Any]]:
+        """Every stored candidate of a dataset, oldest first."""
+        paths = [path for path in self._dataset(digest).glob("*.npz")
+                 if path.name != DATA_FILENAME and not path.name.endswith('.tmp.npz')]
+        paths.sort(key=lambda path: path.stat().st_mtime)
+        return [self.load(digest, path.stem) for path in paths]
+
+    def latest_dataset(self) -> str:
+        """
+        Hash prefix of the most recently written dataset.
+
+        Raises:
+            OOFStoreError: If the store is empty
+        """
+        datasets = (list(self.directory.glob(f"*/{DATA_FILENAME}")) if self.directory.is_dir()
+                    else [])
+        if not datasets:
+            raise OOFStoreError(f"No datasets in {self.directory}")
+        return max(datasets, key=lambda path: path.stat().st_mtime).parent.name
+
+    def frames(self, digest: str,
+               names: Optional[Sequence[str]] = None) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """
+        Out-of-fold and test predictions, one column per candidate.
+
+        Args:
+            digest: Dataset hash
+            names: Candidates to include; defaults to all
+
+        Returns:
+            Tuple of (oof frame, test frame)
+
+        Raises:
+            OOFStoreError: If a named candidate is not stored
+        """
+        entries = {entry['name']: entry for entry in self.entries(digest)}
+        names = list(names) if names is not None else list(entries)
+        missing = [name for name in names if name not in entries]
+        if missing:
+            raise OOFStoreError(f"Models not in the store: {missing}")
+        return (pd.DataFrame({name: entries[name]['oof'] for name in names}),
+                pd.DataFrame({name: entries[name]['test'] for name in names}))
+
+
+def _fit_fold(estimator, scaled: bool, X: np.ndarray, y: np.ndarray, X_test: np.ndarray,
+              train_idx: np.ndarray, val_idx: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Fit one fold.
+
+    Returns:
+        Tuple of (predictions for the held-out rows, predictions for the test rows)
+    """
+    model = clone(estimator)
+    if scaled:
+        # Scaling statistics come from the fold's training rows only
+        model = make_pipeline(StandardScaler(), model)
+    model.fit(X[train_idx], y[train_idx])
+    return model.predict(X[val_idx]), model.predict(X_test)
+
+
+def run_oof(candidates: Mapping[str, Any], X, y, X_test, store: OOFStore, test_ids=None,
+            scaled: Sequence[str] = (), n_splits: int = 5, seed: int = 42,
+            n_jobs: Optional[int] = -1) -> Dict[str, Dict[str, Any]]:
+    """
+    Out-of-fold and test predictions for every candidate not yet stored.
+
+    Args:
+        candidates: Model name to unfitted (or fitted; it is cloned) estimator
+        X: Training features
+        y: Target
+        X_test: Test features
+        store: Where predictions are kept
+        test_ids: Ids of the test rows, for submissions; defaults to the
+                  stored ids, or positions for a new dataset
+        scaled: Candidates whose features are standardized first
+        n_splits: Number of folds
+        seed: Fold shuffling seed
+        n_jobs: Parallel (model, fold) fits, as in joblib
+
+    Returns:
+        Per candidate: key, oof_r2, fold_scores and whether it came from the store
+    """
+    X_array = np.asarray(X, dtype=np.float64)
+    y_array = np.asarray(y, dtype=np.float64)
+    X_test_array = np.asarray(X_test, dtype=np.float64)
+    digest = data_hash(X, y_array, X_test)
+    if test_ids is not None or not store.has_data(digest):
+        ids = np.arange(len(X_test_array)) if test_ids is None else test_ids
+        store.save_data(digest, y_array, ids)
+
+    keys = {name: model_key(estimator, name in scaled, n_splits, seed)
+            for name, estimator in candidates.items()}
+    pending = [name for name in candidates if not store.has(digest, keys[name])]
+    folds = list(KFold(n_splits, shuffle=True, random_state=seed).split(X_array))
+    fits = Parallel(n_jobs=n_jobs)(
+        delayed(_fit_fold)(candidates[name], name in scaled, X_array, y_array, X_test_array,
+                           train_idx, val_idx)
+        for name in pending for train_idx, val_idx in folds
+    )
+
+    for index, name in enumerate(pending):
+        oof = np.empty(len(y_array))
+        test = np.zeros(len(X_test_array))
+        fold_scores = []
+        model_fits = fits[index * n_splits:(index + 1) * n_splits]
+        for (_, val_idx), (val_pred, test_pred) in zip(folds, model_fits):
+            oof[val_idx] = val_pred
+            test += test_pred / n_splits
+            fold_scores.append(r2_score(y_array[val_idx], val_pred))
+        config = {'estimator': repr(candidates[name]), 'scaled': name in scaled,
+                  'n_splits': n_splits, 'seed': seed}
+        store.save(digest, keys[name], name, config, oof, test, fold_scores)
+
+    summary = {}
+    for name in candidates:
+        entry = store.load(digest, keys[name])
+        summary[name] = {'key': keys[name], 'oof_r2': entry['oof_r2'],
+                         'fold_scores': entry['fold_scores'].tolist(),
+                         'cached': name not in pending}
+    return summary
+
+
+class Blender:
+    """Blend of stored candidate predictions, fitted on out-of-fold rows."""
+
+    def __init__(self, method: str = 'linear', stacker=None, cv: int = 5,
+                 random_state: Optional[int] = 42):
+        """
+        Initialize the blender.
+
+        Args:
+            method: 'linear' for non-negative weights without intercept, or
+                    'stacked' for a level-2 regressor on the predictions
+            stacker: Level-2 regressor for 'stacked'; defaults to Ridge
+            cv: Folds used to score the blend itself on the out-of-fold rows
+            random_state: Seed for shuffling those folds
+
+        Raises:
+            ValueError: For an unknown method
+        """
+        if method not in BLEND_METHODS:
+            raise ValueError(f"method must be one of {BLEND_METHODS}, got '{method}'")
+        self.method = method
+        self.stacker = stacker
+        self.cv = cv
+        self.random_state = random_state
+
+    def _fit_level2(self, P: np.ndarray, y: np.ndarray):
+        """Weights (linear) or a fitted stacker."""
+        if self.method == 'linear':
+            weights, _ = nnls(P, y)
+            return weights
+        return clone(self.stacker if self.stacker is not None else Ridge(alpha=1.0)).fit(P, y)
+
+    def _predict_level2(self, fitted, P: np.ndarray) -> np.ndarray:
+        return P @ fitted if self.method == 'linear' else fitted.predict(P)
+
+    def fit(self, oof: pd.DataFrame, y) -> "Blender":
+        """
+        Fit the blend.
+
+        Args:
+            oof: Out-of-fold predictions, one column per candidate
+            y: Target
+
+        Returns:
+            self, with columns_, cv_score_ (R² of the blend refitted
+            within folds of the out-of-fold rows) and weights_ (linear) or
+            stacker_ (stacked) set
+        """
+        P = oof.to_numpy(dtype=np.float64)
+        y = np.asarray(y, dtype=np.float64)
+        self.columns_ = list(oof.columns)
+
+        blended = np.empty(len(y))
+        folds = KFold(self.cv, shuffle=True, random_state=self.random_state).split(P)
+        for train_idx, val_idx in folds:
+            level2 = self._fit_level2(P[train_idx], y[train_idx])
+            blended[val_idx] = self._predict_level2(level2, P[val_idx])
+        self.cv_score_ = float(r2_score(y, blended))
+
+        self.level2_ = self._fit_level2(P, y)
+        if self.method == 'linear':
+            self.weights_ = dict(zip(self.columns_, self.level2_.tolist()))
+        else:
+            self.stacker_ = self.level2_
+        return self
+
+    def predict(self, predictions: pd.DataFrame) -> np.ndarray:
+        """
+        Blend candidate predictions.
+
+        Args:
+            predictions: One column per candidate, as in fit
+
+        Returns:
+            Blended predictions
+        """
+        return self._predict_level2(self.level2_,
+                                    predictions[self.columns_].to_numpy(dtype=np.float64))
+
+
+def blend_submission(store: OOFStore, output: Union[str, Path], digest: Optional[str] = None,
+                     names: Optional[Sequence[str]] = None,
+                     method: str = 'linear') -> Dict[str, Any]:
+    """
+    Fit a blend on stored predictions and write a submission.
+
+    Args:
+        store: Store holding the predictions
+        output: Submission CSV path (id, accident_risk)
+        digest: Dataset hash or its prefix; defaults to the latest dataset
+        names: Candidates to blend; defaults to all stored
+        method: Blend method, see Blender
+
+    Returns:
+        Summary with the candidates' oof_r2, the blend's cv_score and weights
+    """
+    digest = digest or store.latest_dataset()
+    data = store.load_data(digest)
+    oof, test = store.frames(digest, names)
+    blender = Blender(method=method).fit(oof, data['y'])
+
+    submission = pd.DataFrame({'id': data['test_ids'], 'accident_risk': blender.predict(test)})
+    submission.to_csv(output, index=False)
+    return {
+        'models': {name: float(r2_score(data['y'], oof[name])) for name in oof.columns},
+        'cv_score': blender.cv_score_,
+        'weights': getattr(blender, 'weights_', None),
+    }
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Blend stored out-of-fold predictions into a submission."""
+    parser = argparse.ArgumentParser(
+        description="Blend stored out-of-fold predictions without refitting")
+    parser.add_argument('store', help="OOF store directory")
+    parser.add_argument('--dataset', help="Dataset hash prefix; defaults to the latest")
+    parser.add_argument('--models', nargs='+', help="Candidates to blend; defaults to all stored")
+    parser.add_argument('--method', choices=BLEND_METHODS, default='linear')
+    parser.add_argument('--output', default='submission.csv')
+    args = parser.parse_args(argv)
+
+    summary = blend_submission(OOFStore(args.store), args.output, digest=args.dataset,
+                               names=args.models, method=args.method)
+    for name, score in summary['models'].items():
+        weight = f"  weight {summary['weights'][name]:.4f}" if summary['weights'] else ""
+        print(f"  {name}: OOF R² {score:.4f}{weight}")
+    print(f"✓ Blend ({args.method}) CV R² {summary['cv_score']:.4f}; saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
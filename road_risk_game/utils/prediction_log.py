@@ -0,0 +1,384 @@
+"""
+Prediction Log
+==============
+Background audit log of API predictions in rotating columnar files.
+
+Request handlers only append a record to a bounded in-memory buffer; a
+writer thread drains it in large batches and appends each batch to the
+current Parquet (or Arrow IPC) file, rotating to a new file after a
+number of rows or seconds. Files are written under an ``.inprogress``
+name and renamed once closed, so every finished file is complete.
+
+When the buffer is full the 'drop' policy discards the new record and
+counts it; 'block' waits (up to a timeout) for the writer to make room.
+Closing the log flushes whatever is buffered.
+
+Needs pyarrow.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Deque, Dict, List, Mapping, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from utils.features import BOOLEAN_FEATURES, INPUT_FEATURES
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+    pq = None
+
+LOG_FORMATS = ('parquet', 'arrow')
+OVERFLOW_POLICIES = ('drop', 'block')
+DEFAULT_CAPACITY = 100_000
+DEFAULT_BATCH_ROWS = 10_000
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_ROTATE_ROWS = 1_000_000
+DEFAULT_ROTATE_SECONDS = 3600.0
+IN_PROGRESS_SUFFIX = ".inprogress"
+
+_INTEGER_COLUMNS = ('num_lanes', 'speed_limit', 'num_reported_accidents')
+
+
+def log_schema() -> "pa.Schema":
+    """Arrow schema of a log record: metadata, then the raw inputs."""
+    fields = [
+        pa.field('timestamp', pa.timestamp('us', tz='UTC')),
+        pa.field('endpoint', pa.string()),
+        pa.field('model_version', pa.string()),
+        pa.field('latency_ms', pa.float32()),
+        pa.field('accident_risk', pa.float64()),
+    ]
+    for col in INPUT_FEATURES:
+        if col in BOOLEAN_FEATURES:
+            fields.append(pa.field(col, pa.bool_()))
+        elif col in _INTEGER_COLUMNS:
+            fields.append(pa.field(col, pa.int32()))
+        elif col == 'curvature':
+            fields.append(pa.field(col, pa.float32()))
+        else:
+            # Parquet dictionary-encodes strings itself; Arrow IPC files
+            # cannot change a dictionary between batches
+            fields.append(pa.field(col, pa.string()))
+    return pa.schema(fields)
+
+
+class PredictionLog:
+    """Bounded buffer of prediction records drained by a background writer."""
+
+    def __init__(self, directory: Union[str, Path], fmt: str = 'parquet',
+                 capacity: int = DEFAULT_CAPACITY, policy: str = 'drop',
+                 batch_rows: int = DEFAULT_BATCH_ROWS,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 rotate_rows: int = DEFAULT_ROTATE_ROWS,
+                 rotate_seconds: float = DEFAULT_ROTATE_SECONDS,
+                 block_timeout: float = 1.0):
+        """
+        Initialize the log and start its writer thread.
+
+        Args:
+            directory: Where log files are written
+            fmt: 'parquet' or 'arrow' (Arrow IPC file)
+            capacity: Records the buffer holds before the policy applies
+            policy: 'drop' new records or 'block' until there is room
+            batch_rows: Buffered records that trigger a flush
+            flush_interval: Longest time a record waits before being flushed
+            rotate_rows: Rows per file before rotating
+            rotate_seconds: Age of a file before rotating
+            block_timeout: Longest wait under the 'block' policy before dropping
+
+        Raises:
+            ValueError: For an unknown format or policy
+            ImportError: If pyarrow is not installed
+        """
+        if fmt not in LOG_FORMATS:
+            raise ValueError(f"Unknown log format '{fmt}'. Choose from {LOG_FORMATS}")
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}'. Choose from {OVERFLOW_POLICIES}")
+        if pa is None:
+            raise ImportError("The prediction log needs pyarrow")
+
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.fmt = fmt
+        self.capacity = capacity
+        self.policy = policy
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.rotate_rows = rotate_rows
+        self.rotate_seconds = rotate_seconds
+        self.block_timeout = block_timeout
+        self.schema = log_schema()
+
+        # Each entry is one record (dict of scalars) or one batch (dict of columns)
+        self._buffer: Deque[Mapping[str, Any]] = deque()
+        self._buffered_rows = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flush_requested = False
+
+        self._writer = None
+        self._path: Optional[Path] = None
+        self._file_rows = 0
+        self._file_opened = 0.0
+        self._sequence = 0
+
+        self.logged = 0
+        self.dropped = 0
+        self.written = 0
+        self.failed = 0
+        self.flushes = 0
+        self.files_closed = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+        self._flush_seconds: List[float] = []
+
+        self._thread = threading.Thread(target=self._run, name="prediction-log", daemon=True)
+        self._thread.start()
+
+    def _reserve(self, rows: int) -> bool:
+        """Make room for rows under the lock; False if they must be dropped."""
+        if self._closed:
+            self.dropped += rows
+            return False
+        if self._buffered_rows + rows > self.capacity:
+            if self.policy == 'block':
+                deadline = time.monotonic() + self.block_timeout
+                while self._buffered_rows + rows > self.capacity and not self._closed:
+                    self._cond.notify_all()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or not self._cond.wait(remaining):
+                        break
+            if self._buffered_rows + rows > self.capacity or self._closed:
+                self.dropped += rows
+                return False
+        return True
+
+    def log(self, record: Mapping[str, Any]) -> bool:
+        """
+        Buffer one prediction record.
+
+        Args:
+            record: Raw inputs plus endpoint, model_version, latency_ms and
+                    accident_risk; timestamp defaults to now
+
+        Returns:
+            False if the record was dropped
+        """
+        record = dict(record)
+        record.setdefault('timestamp', time.time())
+        with self._cond:
+            if not self._reserve(1):
+                return False
+            self._buffer.append(record)
+            self._buffered_rows += 1
+            self.logged += 1
+            if self._buffered_rows >= self.batch_rows:
+                self._cond.notify_all()
+        return True
+
+    def log_batch(self, inputs: pd.DataFrame, risks: np.ndarray, endpoint: str,
+                  model_version: str, latency_ms: float) -> bool:
+        """
+        Buffer the predictions of one batch request.
+
+        Args:
+            inputs: Raw scenarios, one row per prediction
+            risks: Predicted risks
+            endpoint: Endpoint that served the batch
+            model_version: Model that produced the risks
+            latency_ms: Time to score the whole batch, recorded on every row
+
+        Returns:
+            False if the batch was dropped
+        """
+        rows = len(inputs)
+        columns = {col: inputs[col].to_numpy() for col in INPUT_FEATURES if col in inputs}
+        columns.update({
+            'timestamp': np.full(rows, time.time()),
+            'endpoint': np.full(rows, endpoint, dtype=object),
+            'model_version': np.full(rows, model_version, dtype=object),
+            'latency_ms': np.full(rows, latency_ms),
+            'accident_risk': np.asarray(risks),
+        })
+        with self._cond:
+            if not self._reserve(rows):
+                return False
+            self._buffer.append(columns)
+            self._buffered_rows += rows
+            self.logged += rows
+            if self._buffered_rows >= self.batch_rows:
+                self._cond.notify_all()
+        return True
+
+    def _to_table(self, entries: List[Mapping[str, Any]]) -> "pa.Table":
+        """Turn buffered records and batches into one table of the log schema."""
+        records = [entry for entry in entries if np.ndim(entry.get('accident_risk')) == 0]
+        frames = [pd.DataFrame(records)] if records else []
+        frames += [pd.DataFrame(entry) for entry in entries
+                   if np.ndim(entry.get('accident_risk')) > 0]
+        frame = pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+        # Whole microseconds, so the cast to the schema's unit is exact
+        micros = np.round(frame['timestamp'].to_numpy(dtype=np.float64) * 1e6).astype(np.int64)
+        frame['timestamp'] = pd.to_datetime(micros, unit='us', utc=True)
+        for field in self.schema:
+            if field.name not in frame:
+                frame[field.name] = None
+            elif pa.types.is_string(field.type):
+                frame[field.name] = frame[field.name].astype(str)
+        return pa.Table.from_pandas(frame[self.schema.names], schema=self.schema,
+                                    preserve_index=False)
+
+    def _open(self):
+        """Start a new log file."""
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S")
+        self._sequence += 1
+        extension = 'parquet' if self.fmt == 'parquet' else 'arrow'
+        self._path = self.directory / f"predictions-{stamp}-{self._sequence:04d}.{extension}"
+        in_progress = str(self._path) + IN_PROGRESS_SUFFIX
+        if self.fmt == 'parquet':
+            self._writer = pq.ParquetWriter(in_progress, self.schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_file(in_progress, self.schema)
+        self._file_rows = 0
+        self._file_opened = time.monotonic()
+
+    def _close_file(self):
+        """Finish the current file and give it its final name."""
+        if self._writer is None:
+            return
+        self._writer.close()
+        os.replace(str(self._path) + IN_PROGRESS_SUFFIX, self._path)
+        self._writer = None
+        self.files_closed += 1
+
+    def _write(self, entries: List[Mapping[str, Any]]):
+        """Append one drained batch, rotating first if the file is full or old."""
+        start = time.perf_counter()
+        table = self._to_table(entries)
+        full = self._file_rows >= self.rotate_rows
+        old = time.monotonic() - self._file_opened >= self.rotate_seconds
+        if self._writer is not None and (full or old):
+            self._close_file()
+        if self._writer is None:
+            self._open()
+        self._writer.write_table(table)
+        self._file_rows += table.num_rows
+        self.written += table.num_rows
+        self.flushes += 1
+        self._flush_seconds.append(time.perf_counter() - start)
+        del self._flush_seconds[:-1000]
+
+    def _run(self):
+        """Writer loop: wait for a full batch, the flush interval or close."""
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while (self._buffered_rows < self.batch_rows and not self._closed
+                       and not self._flush_requested and time.monotonic() < deadline):
+                    self._cond.wait(max(0.0, deadline - time.monotonic()))
+                entries = list(self._buffer)
+                self._buffer.clear()
+                self._buffered_rows = 0
+                self._flush_requested = False
+                closed = self._closed
+                # Wake producers blocked on a full buffer
+                self._cond.notify_all()
+
+            if entries:
+                try:
+                    self._write(entries)
+                except Exception as e:  # keep logging after a bad batch
+                    self.errors += 1
+                    self.failed += sum(np.size(entry['accident_risk']) for entry in entries)
+                    self.last_error = str(e)
+            if closed:
+                self._close_file()
+                return
+
+    def flush(self, timeout: float = 10.0) -> bool:
+        """
+        Write everything buffered so far without waiting for a full batch.
+
+        Args:
+            timeout: Longest wait in seconds
+
+        Returns:
+            True if those records were written (or failed) in time
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self.logged
+            self._flush_requested = True
+            self._cond.notify_all()
+        while self.written + self.failed < target and time.monotonic() < deadline:
+            time.sleep(0.005)
+        return self.written + self.failed >= target
+
+    def close(self, timeout: float = 10.0):
+        """
+        Flush the buffer, close the current file and stop the writer.
+
+        Args:
+            timeout: Longest wait for the writer thread
+        """
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Counters and flush latency.
+
+        Returns:
+            Dict of logged/written records, records dropped on a full buffer,
+            records lost to write errors, buffered rows, flushes, files and
+            flush latency in milliseconds
+        """
+        with self._cond:
+            buffered = self._buffered_rows
+        latencies = np.asarray(self._flush_seconds) * 1000
+        return {
+            'logged': self.logged,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'buffered': buffered,
+            'capacity': self.capacity,
+            'policy': self.policy,
+            'flushes': self.flushes,
+            'files_closed': self.files_closed,
+            'current_file': str(self._path) if self._writer is not None else None,
+            'errors': self.errors,
+            'last_error': self.last_error,
+            'flush_ms_mean': float(latencies.mean()) if len(latencies) else None,
+            'flush_ms_p99': float(np.percentile(latencies, 99)) if len(latencies) else None,
+            'flush_ms_max': float(latencies.max()) if len(latencies) else None,
+        }
+
+
+def read_log(path: Union[str, Path]) -> pd.DataFrame:
+    """
+    Read one finished log file.
+
+    Args:
+        path: .parquet or .arrow file written by PredictionLog
+
+    Returns:
+        DataFrame of the logged predictions
+    """
+    path = Path(path)
+    if path.suffix == '.arrow':
+        with pa.memory_map(str(path)) as source:
+            return pa.ipc.open_file(source).read_all().to_pandas()
+    return pq.read_table(path).to_pandas()
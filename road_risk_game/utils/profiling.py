@@ -0,0 +1,363 @@
+"""
+Pipeline Profiling
+==================
+Opt-in per-stage timing and memory profiling for the training scripts.
+
+Every stage records wall time, CPU time and peak resident memory. With
+allocation tracing on, the biggest allocation sites of each stage are
+listed via tracemalloc; one chosen stage can also be run under cProfile
+and dumped for ``snakeviz``/``pstats``. A summary table is printed and a
+JSON report written at the end, and two reports can be compared to spot
+regressions between runs.
+
+Profiling is off unless enabled, e.g.:
+
+    PIPELINE_PROFILE=1 PIPELINE_PROFILE_CPROFILE="8. Hyperparameter tuning (optional)" \\
+        python accident_prediction.py
+
+Environment variables:
+    PIPELINE_PROFILE             '1' to enable
+    PIPELINE_PROFILE_TRACEMALLOC '1' to record allocation hot spots (slower)
+    PIPELINE_PROFILE_CPROFILE    Stage name to run under cProfile
+    PIPELINE_PROFILE_DIR         Where the report and .prof files go
+
+Compare two reports:
+    python -m utils.profiling old_report.json new_report.json
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Union
+
+try:
+    import resource
+except ImportError:
+    # Windows: peak RSS is reported as unavailable
+    resource = None
+
+REPORT_FILENAME = "profile_report.json"
+
+_CLEAR_REFS = "/proc/self/clear_refs"
+_STATUS = "/proc/self/status"
+
+
+def _read_peak_rss() -> Optional[int]:
+    """Peak resident memory in bytes since the last reset (or process start); None if unknown."""
+    try:
+        with open(_STATUS) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and kilobytes elsewhere
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _reset_peak_rss() -> bool:
+    """Reset the kernel's peak RSS counter; False where that is not supported."""
+    try:
+        with open(_CLEAR_REFS, "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _snapshot() -> tracemalloc.Snapshot:
+    """Allocation snapshot without the profiler's own bookkeeping."""
+    return tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, __file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+    ])
+
+
+def _format_mb(value: Optional[float], width: int) -> str:
+    """Right-aligned megabytes, or n/a where peak RSS is unavailable."""
+    return f"{value:>{width}.1f}" if value is not None else f"{'n/a':>{width}}"
+
+
+def _slug(name: str) -> str:
+    """File-name-safe version of a stage name."""
+    return re.sub(r"[^A-Za-z0-9]+", "_", name).strip("_").lower()
+
+
+class _Stage:
+    """Book-keeping for one open stage."""
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.wall_start = time.perf_counter()
+        self.cpu_start = time.process_time()
+        self.peak_rss = 0
+        self.snapshot = None
+        self.profile = None
+
+
+class StageProfiler:
+    """Records wall time, CPU time and memory for named pipeline stages."""
+
+    def __init__(self, enabled: bool = True, trace_allocations: bool = False,
+                 cprofile_stage: Optional[str] = None,
+                 output_dir: Union[str, Path] = ".", top_allocations: int = 5):
+        """
+        Initialize the profiler.
+
+        Args:
+            enabled: When False every method is a cheap no-op
+            trace_allocations: Record allocation hot spots with tracemalloc
+            cprofile_stage: Name of a stage to run under cProfile
+            output_dir: Directory for the JSON report and .prof dumps
+            top_allocations: Allocation sites kept per stage
+        """
+        self.enabled = enabled
+        self.trace_allocations = trace_allocations
+        self.cprofile_stage = cprofile_stage
+        self.output_dir = Path(output_dir)
+        self.top_allocations = top_allocations
+        self.records: List[Dict] = []
+        self._stack: List[_Stage] = []
+        self._linear: Optional[_Stage] = None
+        self._started = time.perf_counter()
+        self._rss_resettable = False
+        self._rss_available = False
+
+        if self.enabled:
+            self._rss_available = _read_peak_rss() is not None
+            self._rss_resettable = _reset_peak_rss()
+            if self.trace_allocations and not tracemalloc.is_tracing():
+                tracemalloc.start()
+
+    @classmethod
+    def from_env(cls, prefix: str = "PIPELINE_PROFILE") -> "StageProfiler":
+        """
+        Build a profiler configured by environment variables.
+
+        Args:
+            prefix: Variable name prefix
+
+        Returns:
+            StageProfiler, disabled unless ``{prefix}=1``
+        """
+        return cls(
+            enabled=os.environ.get(prefix, "") == "1",
+            trace_allocations=os.environ.get(f"{prefix}_TRACEMALLOC", "") == "1",
+            cprofile_stage=os.environ.get(f"{prefix}_CPROFILE") or None,
+            output_dir=os.environ.get(f"{prefix}_DIR", "."),
+        )
+
+    def _begin(self, name: str) -> _Stage:
+        """Open a stage nested under the current one."""
+        if self._stack:
+            parent = self._stack[-1]
+            parent.peak_rss = max(parent.peak_rss, _read_peak_rss() or 0)
+        if self._rss_resettable:
+            _reset_peak_rss()
+
+        stage = _Stage(name, depth=len(self._stack))
+        if self.trace_allocations:
+            stage.snapshot = _snapshot()
+        if self.cprofile_stage == name:
+            stage.profile = cProfile.Profile()
+            stage.profile.enable()
+        self._stack.append(stage)
+        return stage
+
+    def _end(self, stage: _Stage):
+        """Close a stage and record its measurements."""
+        if stage.profile is not None:
+            stage.profile.disable()
+
+        peak_rss = _read_peak_rss()
+        record = {
+            'name': stage.name,
+            'depth': stage.depth,
+            'start_s': stage.wall_start - self._started,
+            'wall_s': time.perf_counter() - stage.wall_start,
+            'cpu_s': time.process_time() - stage.cpu_start,
+            'peak_rss_mb': max(stage.peak_rss, peak_rss) / 2**20 if peak_rss is not None else None,
+        }
+        self._stack.remove(stage)
+        if self._stack and peak_rss is not None:
+            parent = self._stack[-1]
+            parent.peak_rss = max(parent.peak_rss, record['peak_rss_mb'] * 2**20)
+
+        if stage.snapshot is not None:
+            stats = _snapshot().compare_to(stage.snapshot, 'lineno')
+            record['top_allocations'] = [
+                {'location': f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                 'size_diff_mb': stat.size_diff / 2**20,
+                 'count_diff': stat.count_diff}
+                for stat in stats[:self.top_allocations]
+            ]
+        if stage.profile is not None:
+            self.output_dir.mkdir(parents=True, exist_ok=True)
+            path = self.output_dir / f"profile_{_slug(stage.name)}.prof"
+            stage.profile.dump_stats(str(path))
+            record['cprofile'] = str(path)
+
+        self.records.append(record)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        Profile the enclosed block as one stage; stages may nest.
+
+        Args:
+            name: Stage name shown in the report
+        """
+        if not self.enabled:
+            yield
+            return
+        stage = self._begin(name)
+        try:
+            yield
+        finally:
+            self._end(stage)
+
+    def next_stage(self, name: str):
+        """
+        End the current top-level section and start the next one.
+
+        Suits scripts made of consecutive numbered sections, where wrapping
+        every section in a ``with`` block would re-indent the script.
+
+        Args:
+            name: Stage name shown in the report
+        """
+        if not self.enabled:
+            return
+        self.end_stage()
+        self._linear = self._begin(name)
+
+    def end_stage(self):
+        """End the section started by next_stage, if any."""
+        if self.enabled and self._linear is not None:
+            self._end(self._linear)
+            self._linear = None
+
+    def summary(self) -> str:
+        """
+        Recorded stages as a text table, in start order.
+
+        Returns:
+            Table with wall, CPU and peak RSS per stage (n/a where unavailable)
+        """
+        total = time.perf_counter() - self._started
+        lines = [f"{'Stage':<44} {'Wall (s)':>9} {'CPU (s)':>9} {'Peak RSS (MB)':>14} "
+                 f"{'% wall':>7}"]
+        for record in sorted(self.records, key=lambda r: r['start_s']):
+            name = "  " * record['depth'] + record['name']
+            lines.append(f"{name[:44]:<44} {record['wall_s']:>9.2f} {record['cpu_s']:>9.2f} "
+                         f"{_format_mb(record['peak_rss_mb'], 14)} "
+                         f"{100 * record['wall_s'] / total:>6.1f}%")
+        lines.append(f"{'Total':<44} {total:>9.2f}")
+        return "\n".join(lines)
+
+    def report(self) -> Dict:
+        """Full report as a JSON-serializable dict."""
+        return {
+            'created_at': time.time(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'peak_rss_scope': (('stage' if self._rss_resettable else 'process')
+                               if self._rss_available else 'unavailable'),
+            'total_wall_s': time.perf_counter() - self._started,
+            'stages': self.records,
+        }
+
+    def write_report(self, path: Optional[Union[str, Path]] = None) -> Path:
+        """
+        Write the JSON report.
+
+        Args:
+            path: Output file; defaults to REPORT_FILENAME in output_dir
+
+        Returns:
+            Path written
+        """
+        path = Path(path) if path is not None else self.output_dir / REPORT_FILENAME
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.report(), f, indent=2)
+        return path
+
+    def finish(self) -> Optional[Path]:
+        """
+        Close any open section, print the summary and write the report.
+
+        Returns:
+            Report path, or None when profiling is disabled
+        """
+        if not self.enabled:
+            return None
+        self.end_stage()
+        while self._stack:
+            self._end(self._stack[-1])
+
+        print("\n" + "=" * 60)
+        print("PIPELINE PROFILE")
+        print("=" * 60)
+        print(self.summary())
+        path = self.write_report()
+        print(f"✓ Saved: {path}")
+        return path
+
+
+def compare_reports(old: Dict, new: Dict) -> str:
+    """
+    Per-stage wall time and peak memory changes between two reports.
+
+    Args:
+        old: Baseline report
+        new: Report to compare
+
+    Returns:
+        Text table; stages missing from either report are marked
+    """
+    before = {record['name']: record for record in old['stages']}
+    lines = [f"{'Stage':<44} {'Wall (s)':>18} {'Change':>8} {'Peak RSS (MB)':>20}"]
+    for record in new['stages']:
+        base = before.pop(record['name'], None)
+        if base is None:
+            lines.append(f"{record['name'][:44]:<44} {'new':>18}")
+            continue
+        change = (record['wall_s'] / base['wall_s'] - 1) * 100 if base['wall_s'] else 0.0
+        lines.append(f"{record['name'][:44]:<44} {base['wall_s']:>8.2f} → {record['wall_s']:<7.2f} "
+                     f"{change:>+7.1f}% {_format_mb(base['peak_rss_mb'], 9)} → "
+                     f"{_format_mb(record['peak_rss_mb'], 8).strip():<8}")
+    for name in before:
+        lines.append(f"{name[:44]:<44} {'removed':>18}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Compare two profile reports."""
+    parser = argparse.ArgumentParser(description="Compare two pipeline profile reports")
+    parser.add_argument('old', help="Baseline report JSON")
+    parser.add_argument('new', help="Report to compare")
+    args = parser.parse_args(argv)
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    print(compare_reports(old, new))
+
+
+if __name__ == "__main__":
+    main()
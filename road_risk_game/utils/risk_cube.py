@@ -0,0 +1,291 @@
+"""
+Risk Cube
+=========
+Dense pre-aggregation of accident risk over the categorical features.
+
+Every categorical column takes only a few values, so their combinations
+form a small dense cube (3*3*3*2*2*3*2*2 = 1296 cells for the eight
+categorical features). Building it is one pass over the data: each row's
+category codes are folded into a mixed-radix cell index and np.bincount
+accumulates count, sum and sum of squares per cell.
+
+Any group-by or filter over those columns is then answered from the cube
+alone, by selecting slices and summing out the other axes. The answer
+is exact: it matches the same groupby over the full data. aggregate()
+returns plain arrays in microseconds; query() wraps the same totals in a
+labelled DataFrame.
+
+Usage:
+    python -m utils.risk_cube train.csv risk_cube.npz --by road_type weather
+"""
+
+import argparse
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+CUBE_DIMENSIONS = ['road_type', 'lighting', 'weather', 'road_signs_present',
+                   'public_road', 'time_of_day', 'holiday', 'school_season']
+
+TARGET = 'accident_risk'
+
+# Refuse cubes whose dense layout would not fit comfortably in memory
+MAX_CELLS = 50_000_000
+
+
+class CubeQueryError(ValueError):
+    """Raised for unknown dimensions or values in a query."""
+
+
+class RiskCube:
+    """Count, sum and sum of squares of a target per combination of categories."""
+
+    def __init__(self, dimensions: Mapping[str, Sequence], counts: np.ndarray,
+                 sums: np.ndarray, sums_sq: np.ndarray, shift: float = 0.0, target: str = TARGET):
+        """
+        Initialize from accumulated arrays; use RiskCube.build to aggregate data.
+
+        Args:
+            dimensions: Dimension name to its labels, in axis order
+            counts: Rows per cell, shaped one axis per dimension
+            sums: Sum of (target - shift) per cell
+            sums_sq: Sum of (target - shift) ** 2 per cell
+            shift: Constant subtracted before accumulating, for precision
+            target: Name of the aggregated column
+        """
+        self.dimensions: Dict[str, List] = {name: list(labels)
+                                            for name, labels in dimensions.items()}
+        self.counts = counts
+        self.sums = sums
+        self.sums_sq = sums_sq
+        self.shift = shift
+        self.target = target
+        self._axis = {name: axis for axis, name in enumerate(self.dimensions)}
+        self._position = {name: {label: i for i, label in enumerate(labels)}
+                          for name, labels in self.dimensions.items()}
+
+    @classmethod
+    def build(cls, data: pd.DataFrame, dimensions: Sequence[str] = CUBE_DIMENSIONS,
+              target: str = TARGET,
+              vocabularies: Optional[Mapping[str, Sequence]] = None) -> "RiskCube":
+        """
+        Aggregate a frame into a cube.
+
+        Args:
+            data: Rows with the dimension columns and the target
+            dimensions: Columns to aggregate over, in axis order
+            target: Column to aggregate
+            vocabularies: Labels per dimension; defaults to the sorted values
+                          present in the data
+
+        Returns:
+            RiskCube
+
+        Raises:
+            ValueError: For missing values, values outside a vocabulary or
+                        a cube larger than MAX_CELLS
+        """
+        vocabularies = vocabularies or {}
+        labels: Dict[str, List] = {}
+        codes = []
+        for name in dimensions:
+            values = data[name]
+            if values.isna().any():
+                raise ValueError(f"Column '{name}' has missing values")
+            if name in vocabularies:
+                labels[name] = list(vocabularies[name])
+                column_codes = pd.Index(labels[name]).get_indexer(values.to_numpy())
+                if (column_codes < 0).any():
+                    unknown = pd.unique(values.to_numpy()[column_codes < 0])[:5]
+                    raise ValueError(f"Column '{name}' has values outside its vocabulary: "
+                                     f"{list(unknown)}")
+            else:
+                column_codes, uniques = pd.factorize(values, sort=True)
+                labels[name] = uniques.tolist()
+            codes.append(column_codes)
+
+        shape = tuple(len(labels[name]) for name in dimensions)
+        size = int(np.prod(shape, dtype=np.int64))
+        if size > MAX_CELLS:
+            raise ValueError(f"Cube of shape {shape} has {size} cells; the limit is {MAX_CELLS}")
+
+        # Mixed-radix cell index: the last dimension varies fastest
+        index = np.ravel_multi_index(codes, shape) if codes else np.zeros(len(data), dtype=np.intp)
+        values = data[target].to_numpy(dtype=np.float64)
+        shift = float(values.mean()) if len(values) else 0.0
+        centered = values - shift
+        counts = np.bincount(index, minlength=size).astype(np.int64)
+        sums = np.bincount(index, weights=centered, minlength=size)
+        sums_sq = np.bincount(index, weights=centered * centered, minlength=size)
+        return cls(labels, counts.reshape(shape), sums.reshape(shape), sums_sq.reshape(shape),
+                   shift=shift, target=target)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """Cells along each dimension."""
+        return self.counts.shape
+
+    def _select(self,
+                where: Optional[Mapping[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Sub-cubes of the cells matching a filter."""
+        counts, sums, sums_sq = self.counts, self.sums, self.sums_sq
+        for name, wanted in (where or {}).items():
+            axis = self._axis_of(name)
+            wanted = list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+            try:
+                positions = [self._position[name][value] for value in wanted]
+            except KeyError as e:
+                raise CubeQueryError(f"Unknown {name} value {e.args[0]!r}; "
+                                     f"expected one of {self.dimensions[name]}") from None
+            counts = np.take(counts, positions, axis=axis)
+            sums = np.take(sums, positions, axis=axis)
+            sums_sq = np.take(sums_sq, positions, axis=axis)
+        return counts, sums, sums_sq
+
+    def _axis_of(self, name: str) -> int:
+        """Axis of a dimension."""
+        if name not in self._axis:
+            raise CubeQueryError(f"Unknown dimension '{name}'; "
+                                 f"the cube has {list(self.dimensions)}")
+        return self._axis[name]
+
+    def aggregate(self, by: Union[str, Sequence[str]] = (),
+                  where: Optional[Mapping[str, Any]] = None) -> Dict[str, np.ndarray]:
+        """
+        Group totals as plain arrays, without building a DataFrame.
+
+        Args:
+            by: Dimension or dimensions to group by; none gives the total
+            where: Dimension to one allowed value or a list of them
+
+        Returns:
+            Dict of count, sum, mean and std (sample) arrays shaped one
+            axis per ``by`` dimension, in the order given; empty groups have
+            count 0 and NaN mean
+
+        Raises:
+            CubeQueryError: For unknown dimensions or values
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        axes = [self._axis_of(name) for name in by]
+        counts, sums, sums_sq = self._select(where)
+
+        # Sum out every other axis, then order the kept axes as requested
+        other = tuple(axis for axis in range(counts.ndim) if axis not in axes)
+        kept = sorted(axes)
+        order = [kept.index(axis) for axis in axes]
+        n = counts.sum(axis=other).transpose(order)
+        s = sums.sum(axis=other).transpose(order)
+        q = sums_sq.sum(axis=other).transpose(order)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean_shifted = s / n
+            variance = np.where(n > 1, (q - s * mean_shifted) / (n - 1), np.nan)
+        return {
+            'count': n,
+            'sum': s + n * self.shift,
+            'mean': mean_shifted + self.shift,
+            'std': np.sqrt(np.maximum(variance, 0.0, where=~np.isnan(variance), out=variance)),
+        }
+
+    def query(self, by: Union[str, Sequence[str]] = (), where: Optional[Mapping[str, Any]] = None,
+              keep_empty: bool = False) -> pd.DataFrame:
+        """
+        Group-by over cube dimensions, optionally filtered.
+
+        Equivalent to ``data[filter].groupby(by)[target].agg(['count', 'sum',
+        'mean', 'std'])`` over the rows the cube was built from.
+
+        Args:
+            by: Dimension or dimensions to group by; none gives one total row
+            where: Dimension to one allowed value or a list of them
+            keep_empty: Also return groups without rows
+
+        Returns:
+            DataFrame with count, sum, mean and std (sample), indexed by
+            the group labels
+
+        Raises:
+            CubeQueryError: For unknown dimensions or values
+        """
+        by = [by] if isinstance(by, str) else list(by)
+        totals = self.aggregate(by, where)
+        frame = pd.DataFrame({name: np.ravel(values) for name, values in totals.items()})
+
+        if by:
+            labels = [self._selected_labels(name, where) for name in by]
+            frame.index = (pd.MultiIndex.from_product(labels, names=by) if len(by) > 1
+                           else pd.Index(labels[0], name=by[0]))
+        if not keep_empty:
+            frame = frame[frame['count'].to_numpy() > 0]
+        return frame
+
+    def _selected_labels(self, name: str, where: Optional[Mapping[str, Any]]) -> List:
+        """Labels left along a dimension after filtering, in axis order."""
+        if not where or name not in where:
+            return self.dimensions[name]
+        wanted = where[name]
+        return list(wanted) if isinstance(wanted, (list, tuple, set)) else [wanted]
+
+    def mean(self, by: Union[str, Sequence[str]],
+             where: Optional[Mapping[str, Any]] = None) -> pd.Series:
+        """
+        Mean target per group, like ``groupby(by)[target].mean()``.
+
+        Args:
+            by: Dimension or dimensions to group by
+            where: Filter, as in query
+
+        Returns:
+            Series of group means
+        """
+        return self.query(by, where)['mean'].rename(self.target)
+
+    def save(self, path: Union[str, Path]):
+        """Write the cube to an .npz file."""
+        meta = {'dimensions': self.dimensions, 'shift': self.shift, 'target': self.target}
+        np.savez_compressed(path, counts=self.counts, sums=self.sums, sums_sq=self.sums_sq,
+                            meta=np.array(json.dumps(meta, default=_json_label)))
+
+    @classmethod
+    def load(cls, path: Union[str, Path]) -> "RiskCube":
+        """Read a cube written by save."""
+        with np.load(path, allow_pickle=False) as data:
+            meta = json.loads(str(data['meta']))
+            return cls(meta['dimensions'], data['counts'], data['sums'], data['sums_sq'],
+                       shift=meta['shift'], target=meta['target'])
+
+
+def _json_label(value: Any) -> Any:
+    """JSON form of numpy labels."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot store label {value!r}")
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Build a risk cube from a CSV and print one query."""
+    parser = argparse.ArgumentParser(
+        description="Pre-aggregate accident risk over the categorical features")
+    parser.add_argument('data', help=f"CSV with the categorical columns and {TARGET}")
+    parser.add_argument('output', nargs='?', help="Where to save the cube (.npz)")
+    parser.add_argument('--dimensions', nargs='+', default=CUBE_DIMENSIONS,
+                        help="Columns to aggregate over")
+    parser.add_argument('--by', nargs='*', default=[],
+                        help="Dimensions to group the printed query by")
+    args = parser.parse_args(argv)
+
+    data = pd.read_csv(args.data, usecols=list(args.dimensions) + [TARGET])
+    cube = RiskCube.build(data, dimensions=args.dimensions)
+    print(f"✓ Aggregated {len(data)} rows into {cube.counts.size} cells {cube.shape}")
+    if args.output:
+        cube.save(args.output)
+        print(f"✓ Saved cube to: {args.output}")
+    print(cube.query(args.by).to_string())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""
+Route Scoring
+=============
+Risk of whole trips, scored as ordered sequences of road segments.
+
+All segments of all routes in a call are flattened into one frame and
+scored with a single duplicate-collapsing model call, so a segment shared
+by several routes (or repeated within one) is predicted once. Per-route
+aggregates are then computed with segmented reductions over the flat
+risk array:
+
+* max_risk: the riskiest segment
+* mean_risk: mean segment risk, weighted by segment length when lengths
+  are given
+* combined_risk: probability of at least one incident along the route,
+  1 - prod((1 - risk_i) ** exposure_i), where exposure_i is
+  length_i / reference_length when a reference length is given and 1
+  (each segment counted once) otherwise
+"""
+
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from utils.batch_scoring import dedup_predict
+from utils.features import FeatureEncoder
+
+LENGTH_COLUMN = 'length'
+
+# Upper bound on segments per call; keeps a single call's latency bounded
+MAX_ROUTE_SEGMENTS = 100_000
+
+
+class RouteError(ValueError):
+    """Raised for empty routes, bad lengths or too many segments."""
+
+
+def flatten_routes(
+        routes: Sequence[Sequence[Mapping[str, Any]]],
+        max_segments: int = MAX_ROUTE_SEGMENTS) -> Tuple[pd.DataFrame, np.ndarray, np.ndarray]:
+    """
+    Stack the segments of many routes.
+
+    Args:
+        routes: Routes, each an ordered list of segment dicts with the
+                scenario attributes and an optional length
+        max_segments: Most segments accepted in one call
+
+    Returns:
+        Tuple of (segments frame, start offset of every route, segment
+        lengths with NaN where none was given)
+
+    Raises:
+        RouteError: For no routes, an empty route or too many segments
+    """
+    if not routes:
+        raise RouteError("No routes given")
+    counts = np.array([len(route) for route in routes], dtype=np.int64)
+    if (counts == 0).any():
+        raise RouteError(f"Route(s) {np.flatnonzero(counts == 0).tolist()[:10]} have no segments")
+    if counts.sum() > max_segments:
+        raise RouteError(f"{int(counts.sum())} segments exceed the limit of {max_segments}")
+
+    segments = pd.DataFrame([segment for route in routes for segment in route])
+    if LENGTH_COLUMN in segments:
+        lengths = pd.to_numeric(segments[LENGTH_COLUMN], errors='coerce').to_numpy(dtype=np.float64)
+    else:
+        lengths = np.full(len(segments), np.nan)
+    offsets = np.concatenate([[0], np.cumsum(counts)[:-1]])
+    return segments, offsets, lengths
+
+
+def route_aggregates(risks: np.ndarray, offsets: np.ndarray, lengths: np.ndarray,
+                     reference_length: Optional[float] = None) -> Dict[str, np.ndarray]:
+    """
+    Per-route aggregates of segment risks.
+
+    A route's segments must either all have a length or none; routes
+    without lengths weight every segment equally.
+
+    Args:
+        risks: Flat segment risks, routes back to back
+        offsets: Start of every route in risks
+        lengths: Segment lengths, NaN where none was given
+        reference_length: Length one predicted risk refers to; scales the
+                          exposure of each segment in combined_risk
+
+    Returns:
+        Dict of per-route arrays: segments, length (NaN without lengths),
+        max_risk, mean_risk and combined_risk
+
+    Raises:
+        RouteError: For mixed or negative lengths, or a non-positive
+                    reference length
+    """
+    if reference_length is not None and reference_length <= 0:
+        raise RouteError(f"reference_length must be positive, got {reference_length}")
+    counts = np.diff(np.append(offsets, len(risks)))
+    has_length = ~np.isnan(lengths)
+    with_lengths = np.add.reduceat(has_length.astype(np.int64), offsets)
+    mixed = (with_lengths > 0) & (with_lengths < counts)
+    if mixed.any():
+        raise RouteError(f"Route(s) {np.flatnonzero(mixed).tolist()[:10]} give lengths "
+                         "for only some segments")
+    if (lengths[has_length] < 0).any():
+        raise RouteError("Segment lengths must not be negative")
+
+    route_has_length = np.repeat(with_lengths == counts, counts)
+    weights = np.where(route_has_length, lengths, 1.0)
+    total_weight = np.add.reduceat(weights, offsets)
+    route_length = np.where(with_lengths == counts, total_weight, np.nan)
+
+    if reference_length is None:
+        exposure = np.ones_like(risks)
+    else:
+        exposure = np.where(route_has_length, lengths / reference_length, 1.0)
+    # Risks are regression outputs; keep them a valid probability first
+    probabilities = np.clip(risks, 0.0, 1.0)
+    with np.errstate(divide='ignore'):
+        log_survival = np.add.reduceat(exposure * np.log1p(-probabilities), offsets)
+
+    with np.errstate(invalid='ignore'):
+        mean_risk = np.add.reduceat(weights * risks, offsets) / total_weight
+    equal_weight_risk = np.add.reduceat(risks, offsets) / counts
+    return {
+        'segments': counts,
+        'length': route_length,
+        'max_risk': np.maximum.reduceat(risks, offsets),
+        # Zero-length routes have no weight to average over; fall back to equal weights
+        'mean_risk': np.where(total_weight > 0, mean_risk, equal_weight_risk),
+        'combined_risk': -np.expm1(log_survival),
+    }
+
+
+def score_routes(
+        model: Any, encoder: FeatureEncoder, routes: Sequence[Sequence[Mapping[str, Any]]],
+        reference_length: Optional[float] = None,
+        max_segments: int = MAX_ROUTE_SEGMENTS) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Score many routes with one batched prediction.
+
+    Args:
+        model: Fitted model with predict
+        encoder: Encoder for the model
+        routes: Routes, each an ordered list of segment dicts with the
+                scenario attributes and an optional length
+        reference_length: See route_aggregates
+        max_segments: Most segments accepted in one call
+
+    Returns:
+        Tuple of (one dict per route with segment 'risks' and the
+        aggregates, stats with 'segments', 'unique_segments' and
+        'dedup_ratio')
+    """
+    segments, offsets, lengths = flatten_routes(routes, max_segments=max_segments)
+    risks, stats = dedup_predict(model, encoder.transform(segments))
+    aggregates = route_aggregates(risks, offsets, lengths, reference_length=reference_length)
+
+    results = []
+    for i, route_risks in enumerate(np.split(risks, offsets[1:])):
+        length = aggregates['length'][i]
+        results.append({
+            'risks': route_risks,
+            'segments': int(aggregates['segments'][i]),
+            'length': None if np.isnan(length) else float(length),
+            'max_risk': float(aggregates['max_risk'][i]),
+            'mean_risk': float(aggregates['mean_risk'][i]),
+            'combined_risk': float(aggregates['combined_risk'][i]),
+        })
+    stats = {
+        'segments': stats['rows'],
+        'unique_segments': stats['unique_rows'],
+        'dedup_ratio': stats['dedup_ratio'],
+    }
+    return results, stats
@@ -0,0 +1,257 @@
+"""
+Scenario Bank
+=============
+Precomputed scenario pairs for the game.
+
+An offline builder generates many contrasting pairs per difficulty, scores
+them in bulk and keeps the ones whose risk gap fits the difficulty. Pairs
+are stored as a structured NumPy array in a ``.npy`` file, which every
+Streamlit process memory-maps, so drawing a round does no model work.
+"""
+
+import argparse
+import random
+from pathlib import Path
+from types import ModuleType
+from typing import Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from utils.game_logic import ScenarioGenerator
+from utils.model_utils import RiskPredictor
+
+BANK_FILENAME = "scenario_bank_{difficulty}.npy"
+
+# Categorical columns are stored as codes into the generator's value lists,
+# the same codes ScenarioGenerator.generate_batch produces
+BANK_CATEGORIES = ScenarioGenerator.BATCH_CATEGORIES
+
+_SCENARIO_FIELDS = [
+    ('road_type', 'u1'),
+    ('num_lanes', 'u1'),
+    ('curvature', 'f4'),
+    ('speed_limit', 'u1'),
+    ('lighting', 'u1'),
+    ('weather', 'u1'),
+    ('road_signs_present', '?'),
+    ('public_road', '?'),
+    ('time_of_day', 'u1'),
+    ('holiday', '?'),
+    ('school_season', '?'),
+    ('num_reported_accidents', 'u1'),
+]
+
+PAIR_DTYPE = np.dtype(
+    [(f'a_{name}', kind) for name, kind in _SCENARIO_FIELDS]
+    + [(f'b_{name}', kind) for name, kind in _SCENARIO_FIELDS]
+    + [('risk_a', 'f4'), ('risk_b', 'f4'), ('gap', 'f4')]
+)
+
+
+def bank_path(models_dir: Union[str, Path], difficulty: str) -> Path:
+    """Location of the bank file for a difficulty."""
+    return Path(models_dir) / BANK_FILENAME.format(difficulty=difficulty)
+
+
+def pack_pairs(batch_a: Dict[str, np.ndarray], batch_b: Dict[str, np.ndarray],
+               risks_a: np.ndarray, risks_b: np.ndarray) -> np.ndarray:
+    """
+    Pack columnar scenario batches and their risks into the bank record layout.
+
+    Categorical columns must already be codes into BANK_CATEGORIES, as
+    returned by ScenarioGenerator.generate_batch.
+
+    Args:
+        batch_a: Columns of the first scenario of every pair
+        batch_b: Columns of the second scenario of every pair
+        risks_a: Predicted risk of each first scenario
+        risks_b: Predicted risk of each second scenario
+
+    Returns:
+        Structured array with PAIR_DTYPE
+    """
+    records = np.zeros(len(risks_a), dtype=PAIR_DTYPE)
+    for prefix, batch in (('a_', batch_a), ('b_', batch_b)):
+        for name, _ in _SCENARIO_FIELDS:
+            records[prefix + name] = batch[name]
+
+    records['risk_a'] = risks_a
+    records['risk_b'] = risks_b
+    records['gap'] = np.abs(np.asarray(risks_a) - np.asarray(risks_b))
+    return records
+
+
+def decode_scenario(record, prefix: str) -> Dict:
+    """
+    Rebuild one scenario dict from a bank record.
+
+    Args:
+        record: Row of a PAIR_DTYPE array
+        prefix: 'a_' or 'b_'
+
+    Returns:
+        Scenario dictionary as produced by ScenarioGenerator
+    """
+    scenario = {}
+    for name, kind in _SCENARIO_FIELDS:
+        value = record[prefix + name]
+        if name in BANK_CATEGORIES:
+            scenario[name] = BANK_CATEGORIES[name][int(value)]
+        elif kind == '?':
+            scenario[name] = bool(value)
+        elif kind == 'f4':
+            # Generated curvatures have two decimals; undo the float32 rounding
+            scenario[name] = round(float(value), 2)
+        else:
+            scenario[name] = int(value)
+    return scenario
+
+
+def build_bank(predictor: RiskPredictor, difficulty: str, n_pairs: int, seed: int = 42,
+               filter_by_gap: bool = True, batch_size: int = 20_000) -> np.ndarray:
+    """
+    Generate and score contrasting pairs for one difficulty.
+
+    Candidates are generated as columnar batches and scored with two bulk
+    predictions per batch, straight from the generator's integer codes.
+    With ``filter_by_gap`` only pairs whose risk gap lies within the
+    difficulty's DIFFICULTY_SETTINGS range are kept.
+
+    Args:
+        predictor: RiskPredictor used for scoring
+        difficulty: 'easy', 'medium' or 'hard'
+        n_pairs: Number of pairs to keep
+        seed: Random seed for reproducible banks
+        filter_by_gap: Keep only pairs within the difficulty's gap range
+        batch_size: Candidates generated per scoring batch
+
+    Returns:
+        Structured array of n_pairs records (fewer if candidates run out)
+    """
+    settings = ScenarioGenerator.DIFFICULTY_SETTINGS[difficulty]
+    rng = np.random.default_rng(seed)
+
+    kept: List[np.ndarray] = []
+    n_kept = 0
+    # Give up after a generous number of batches if the gap filter is too strict
+    for _ in range(max(10, 50 * n_pairs // batch_size)):
+        batch_a, batch_b = ScenarioGenerator.generate_contrasting_batch(
+            batch_size, difficulty, seed=rng)
+        records = pack_pairs(
+            batch_a, batch_b,
+            predictor.predict_batch(batch_a, categories=BANK_CATEGORIES),
+            predictor.predict_batch(batch_b, categories=BANK_CATEGORIES))
+
+        if filter_by_gap:
+            in_range = ((records['gap'] >= settings['min_difference'])
+                        & (records['gap'] <= settings['max_difference']))
+            records = records[in_range]
+
+        kept.append(records)
+        n_kept += len(records)
+        if n_kept >= n_pairs:
+            break
+
+    return np.concatenate(kept)[:n_pairs]
+
+
+def save_bank(path: Union[str, Path], records: np.ndarray):
+    """Write a bank file."""
+    np.save(path, records, allow_pickle=False)
+
+
+class ScenarioBank:
+    """Read-only, memory-mapped bank of scored scenario pairs."""
+
+    def __init__(self, path: Union[str, Path]):
+        """
+        Open a bank file.
+
+        Args:
+            path: Bank ``.npy`` file
+        """
+        self.path = Path(path)
+        self.records = np.load(self.path, mmap_mode='r', allow_pickle=False)
+        if self.records.dtype != PAIR_DTYPE:
+            raise ValueError(f"{self.path} does not have the scenario bank layout")
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def pair(self, index: int) -> Tuple[Dict, Dict, float, float]:
+        """
+        Decode one stored pair.
+
+        Args:
+            index: Record index
+
+        Returns:
+            Tuple of (scenario1, scenario2, risk1, risk2)
+        """
+        record = self.records[index]
+        return (decode_scenario(record, 'a_'), decode_scenario(record, 'b_'),
+                float(record['risk_a']), float(record['risk_b']))
+
+    def draw_index(self, rng: Union[random.Random, ModuleType], seen: Set[int]) -> int:
+        """
+        Pick a random pair index not yet in ``seen`` and record it.
+
+        Once every pair has been seen the set is cleared and drawing
+        starts over.
+
+        Args:
+            rng: Random source (a random.Random or the random module)
+            seen: Indices already shown in this session; updated in place
+
+        Returns:
+            Index of the drawn pair
+        """
+        if len(seen) >= len(self):
+            seen.clear()
+
+        index = rng.randrange(len(self))
+        while index in seen:
+            index = rng.randrange(len(self))
+        seen.add(index)
+        return index
+
+
+def load_banks(models_dir: Union[str, Path]) -> Dict[str, ScenarioBank]:
+    """
+    Open every available bank in a directory.
+
+    Args:
+        models_dir: Directory containing bank files
+
+    Returns:
+        Mapping of difficulty to ScenarioBank, for the difficulties found
+    """
+    banks = {}
+    for difficulty in ScenarioGenerator.DIFFICULTY_SETTINGS:
+        path = bank_path(models_dir, difficulty)
+        if path.exists():
+            banks[difficulty] = ScenarioBank(path)
+    return banks
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Build scenario banks for every difficulty."""
+    parser = argparse.ArgumentParser(description="Build precomputed scenario-pair banks")
+    parser.add_argument('--models-dir', default=str(Path(__file__).parent.parent / "models"))
+    parser.add_argument('--pairs', type=int, default=10_000, help="Pairs per difficulty")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--no-gap-filter', action='store_true',
+                        help="Keep pairs regardless of DIFFICULTY_SETTINGS gap range")
+    args = parser.parse_args(argv)
+
+    predictor = RiskPredictor(models_dir=args.models_dir)
+    for offset, difficulty in enumerate(ScenarioGenerator.DIFFICULTY_SETTINGS):
+        records = build_bank(predictor, difficulty, args.pairs, seed=args.seed + offset,
+                             filter_by_gap=not args.no_gap_filter)
+        path = bank_path(args.models_dir, difficulty)
+        save_bank(path, records)
+        print(f"✓ {difficulty}: {len(records)} pairs -> {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,255 @@
+"""
+Road Segment Store
+==================
+Pre-encoded static road attributes, looked up by segment ID.
+
+The static attributes of a road (type, lanes, curvature, speed limit,
+signage, public access and accident history) rarely change; only the
+conditions (lighting, weather, time of day, holiday, school season) vary
+from one request to the next. A segment store keeps one row per segment
+already in model feature order: static columns encoded, the engineered
+features (speed_curvature, lanes_accidents, high_speed, sharp_curve)
+computed, and the condition columns left at zero.
+
+Scoring a request is then a vectorized join: look the segment IDs up in
+the sorted ID array, gather their rows, and write the encoded condition
+columns over them. Nothing about the road is re-encoded per request.
+
+On disk a store is a directory of three files:
+
+    segment_ids.npy   sorted segment IDs
+    features.npy      (segments, features) float64 matrix, memory-mapped
+    manifest.json     feature order, column roles and schema hash
+"""
+
+import argparse
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+from utils.features import FeatureEncoder
+from utils.model_bundle import compute_schema_hash
+
+STATIC_FEATURES = ['road_type', 'num_lanes', 'curvature', 'speed_limit', 'road_signs_present',
+                   'public_road', 'num_reported_accidents']
+DYNAMIC_FEATURES = ['lighting', 'weather', 'time_of_day', 'holiday', 'school_season']
+
+SEGMENT_ID_COLUMN = 'segment_id'
+STORE_FORMAT_VERSION = 1
+
+IDS_FILENAME = "segment_ids.npy"
+FEATURES_FILENAME = "features.npy"
+MANIFEST_FILENAME = "manifest.json"
+
+
+class SegmentStoreError(ValueError):
+    """Raised when a store is malformed or does not match the model."""
+
+
+class UnknownSegmentError(KeyError):
+    """Raised when a request refers to segments that are not in the store."""
+
+    def __init__(self, missing: Sequence[str]):
+        super().__init__(f"Unknown segment id(s): {list(missing)[:10]}")
+        self.missing = list(missing)
+
+
+def build_segment_store(segments: pd.DataFrame, directory: Union[str, Path],
+                        vocabularies: Mapping[str, Sequence],
+                        feature_names: Sequence[str]) -> Dict[str, Any]:
+    """
+    Encode static segment attributes and write a store.
+
+    Args:
+        segments: One row per segment with segment_id and the static columns
+        directory: Output directory, created if needed
+        vocabularies: Categorical column to classes of the serving model
+        feature_names: Model feature order
+
+    Returns:
+        The written manifest
+
+    Raises:
+        SegmentStoreError: For missing columns or duplicate segment IDs
+    """
+    missing = [col for col in [SEGMENT_ID_COLUMN] + STATIC_FEATURES if col not in segments]
+    if missing:
+        raise SegmentStoreError(f"Segment table is missing columns: {missing}")
+    ids = segments[SEGMENT_ID_COLUMN].astype(str).to_numpy()
+    order = np.argsort(ids, kind='stable')
+    ids = ids[order]
+    duplicated = ids[1:][ids[1:] == ids[:-1]]
+    if len(duplicated):
+        raise SegmentStoreError(f"Duplicate segment id(s): {pd.unique(duplicated)[:10].tolist()}")
+
+    # Any valid condition works as a placeholder; those columns are zeroed below
+    static = segments.iloc[order][STATIC_FEATURES].reset_index(drop=True)
+    for col in DYNAMIC_FEATURES:
+        static[col] = vocabularies[col][0] if col in vocabularies else 0
+    features = FeatureEncoder(vocabularies, feature_names).transform(static)
+    matrix = features.to_numpy(dtype=np.float64)
+    matrix[:, [list(feature_names).index(col) for col in DYNAMIC_FEATURES]] = 0.0
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    np.save(directory / IDS_FILENAME, ids.astype(str))
+    np.save(directory / FEATURES_FILENAME, np.ascontiguousarray(matrix))
+    manifest = {
+        'format_version': STORE_FORMAT_VERSION,
+        'segments': len(ids),
+        'feature_names': list(feature_names),
+        'static_features': STATIC_FEATURES,
+        'dynamic_features': DYNAMIC_FEATURES,
+        'schema_hash': compute_schema_hash(feature_names, vocabularies),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+    # Written last: a directory without a manifest is not a store
+    with open(directory / MANIFEST_FILENAME, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+class SegmentStore:
+    """Memory-mapped segment rows joined with per-request conditions."""
+
+    def __init__(self, directory: Union[str, Path], mmap_mode: Optional[str] = 'r'):
+        """
+        Open a store written by build_segment_store.
+
+        Args:
+            directory: Store directory
+            mmap_mode: Passed to np.load; None reads the arrays into memory
+
+        Raises:
+            SegmentStoreError: If the files are missing or inconsistent
+        """
+        self.directory = Path(directory)
+        manifest_path = self.directory / MANIFEST_FILENAME
+        if not manifest_path.is_file():
+            raise SegmentStoreError(f"No segment store at {self.directory}")
+        with open(manifest_path) as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        if self.manifest['format_version'] > STORE_FORMAT_VERSION:
+            raise SegmentStoreError(f"Segment store format {self.manifest['format_version']} "
+                                    f"is newer than supported version {STORE_FORMAT_VERSION}")
+
+        self.ids = np.load(self.directory / IDS_FILENAME, mmap_mode=mmap_mode)
+        self.features = np.load(self.directory / FEATURES_FILENAME, mmap_mode=mmap_mode)
+        self.feature_names: List[str] = self.manifest['feature_names']
+        self.schema_hash: str = self.manifest['schema_hash']
+        if self.features.shape != (len(self.ids), len(self.feature_names)):
+            raise SegmentStoreError(f"Segment store arrays disagree: {len(self.ids)} ids, "
+                                    f"features of shape {self.features.shape}")
+        self._dynamic_index = [self.feature_names.index(col) for col in DYNAMIC_FEATURES]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def check_schema(self, schema_hash: Optional[str]):
+        """
+        Refuse to serve a model encoded differently from the store.
+
+        Raises:
+            SegmentStoreError: If the hashes differ
+        """
+        if schema_hash != self.schema_hash:
+            raise SegmentStoreError(f"Segment store was built for schema {self.schema_hash[:12]}, "
+                                    f"model has {str(schema_hash)[:12]}")
+
+    def rows(self, segment_ids: Sequence) -> np.ndarray:
+        """
+        Row positions of segments.
+
+        Args:
+            segment_ids: IDs to look up
+
+        Returns:
+            int64 row index per ID
+
+        Raises:
+            UnknownSegmentError: If any ID is not in the store
+        """
+        query = np.asarray(segment_ids).astype(str)
+        rows = np.searchsorted(self.ids, query)
+        found = rows < len(self.ids)
+        found[found] = self.ids[rows[found]] == query[found]
+        if not found.all():
+            raise UnknownSegmentError(pd.unique(query[~found]).tolist())
+        return rows.astype(np.int64)
+
+    def join(self, segment_ids: Sequence, conditions: Mapping[str, Any],
+             encoder: FeatureEncoder) -> pd.DataFrame:
+        """
+        Feature matrix for segments under the given conditions.
+
+        Args:
+            segment_ids: One ID per row
+            conditions: Each dynamic column as one value for every row or a
+                        sequence with one value per row
+            encoder: Encoder of the serving model, used for the condition columns
+
+        Returns:
+            DataFrame in model feature order
+
+        Raises:
+            UnknownSegmentError: If any ID is not in the store
+            UnknownCategoryError: For a condition outside the vocabulary
+        """
+        rows = self.rows(segment_ids)
+        X = self.features[rows]
+        for col, position in zip(DYNAMIC_FEATURES, self._dynamic_index):
+            values = conditions[col]
+            if np.ndim(values) == 0:
+                X[:, position] = encoder.vocabularies[col].code(values)
+            else:
+                X[:, position] = encoder.encode_column(col, values)
+        return pd.DataFrame(X, columns=self.feature_names, copy=False)
+
+    def static_frame(self, segment_ids: Sequence) -> pd.DataFrame:
+        """
+        Encoded static and engineered columns of segments, for inspection.
+
+        Args:
+            segment_ids: IDs to look up
+
+        Returns:
+            DataFrame indexed by segment ID
+        """
+        rows = self.rows(segment_ids)
+        columns = [col for col in self.feature_names if col not in DYNAMIC_FEATURES]
+        frame = pd.DataFrame(self.features[rows], columns=self.feature_names)[columns]
+        frame.index = pd.Index(np.asarray(self.ids[rows]), name=SEGMENT_ID_COLUMN)
+        return frame
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Build a segment store from a CSV or Parquet table of road segments."""
+    from utils.model_bundle import BUNDLE_FILENAME, load_bundle
+
+    parser = argparse.ArgumentParser(description="Build a road segment feature store")
+    parser.add_argument('segments',
+                        help=f"CSV or Parquet file with {SEGMENT_ID_COLUMN} and the static columns")
+    parser.add_argument('output', help="Store directory")
+    parser.add_argument('--bundle',
+                        default=str(Path(__file__).parent.parent / "models" / BUNDLE_FILENAME),
+                        help="Model bundle whose vocabularies and feature order to use")
+    args = parser.parse_args(argv)
+
+    path = Path(args.segments)
+    if path.suffix.lower() in ('.parquet', '.pq'):
+        segments = pd.read_parquet(path)
+    else:
+        segments = pd.read_csv(path)
+    bundle = load_bundle(args.bundle)
+    manifest = build_segment_store(segments, args.output, bundle['vocabularies'],
+                                   bundle['feature_names'])
+    print(f"✓ Stored {manifest['segments']} segments in {args.output} "
+          f"(schema {manifest['schema_hash'][:12]})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Sensitivity Analysis
+====================
+Builds what-if grids around a base road scenario.
+
+Every combination of the swept feature values becomes one row of a single
+DataFrame, so the whole risk surface is scored with one batched model call.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import Dict, Sequence
+
+from utils.features import INPUT_FEATURES
+
+# Upper bound on variants per request; keeps a single call's latency bounded
+MAX_GRID_SIZE = 10_000
+
+
+class InvalidSweepError(ValueError):
+    """Raised when sweeps are empty, name an unknown feature or have no values."""
+
+
+class GridTooLargeError(ValueError):
+    """Raised when a sweep would produce more variants than allowed."""
+
+
+def grid_shape(sweeps: Dict[str, Sequence]) -> tuple:
+    """
+    Shape of the risk surface for a set of sweeps.
+
+    Args:
+        sweeps: Mapping of feature name to the values to try
+
+    Returns:
+        One axis per swept feature, in sweep order
+    """
+    return tuple(len(values) for values in sweeps.values())
+
+
+def build_sweep_grid(base: Dict, sweeps: Dict[str, Sequence],
+                     max_grid_size: int = MAX_GRID_SIZE) -> pd.DataFrame:
+    """
+    Materialize the cartesian grid of scenario variants.
+
+    Rows are laid out in C order over the sweep axes, so reshaping the
+    scored column to ``grid_shape(sweeps)`` gives the risk surface.
+
+    Args:
+        base: Base road scenario
+        sweeps: Mapping of feature name to the values to try
+        max_grid_size: Maximum number of variants
+
+    Returns:
+        Raw scenario DataFrame with one row per variant
+
+    Raises:
+        InvalidSweepError: If there are no sweeps, or a sweep names an
+                           unknown feature or has no values
+        GridTooLargeError: If the grid exceeds max_grid_size
+    """
+    if not sweeps:
+        raise InvalidSweepError("No features to sweep")
+    for feature, values in sweeps.items():
+        if feature not in INPUT_FEATURES:
+            raise InvalidSweepError(f"Cannot sweep unknown feature '{feature}'")
+        if len(values) == 0:
+            raise InvalidSweepError(f"Sweep for '{feature}' has no values")
+
+    shape = grid_shape(sweeps)
+    size = int(np.prod(shape, dtype=np.int64))
+    if size > max_grid_size:
+        raise GridTooLargeError(
+            f"Sweep grid has {size} variants; the limit is {max_grid_size}"
+        )
+
+    # Column i of ``axes`` holds the value index of every row along sweep i
+    axes = np.indices(shape).reshape(len(shape), -1)
+
+    columns = {}
+    for feature in INPUT_FEATURES:
+        if feature in sweeps:
+            values = np.asarray(list(sweeps[feature]))
+            columns[feature] = values[axes[list(sweeps).index(feature)]]
+        else:
+            columns[feature] = np.repeat(np.asarray([base[feature]]), size)
+
+    return pd.DataFrame(columns)
@@ -0,0 +1,377 @@
+"""
+Shadow Model Evaluation
+=======================
+Scores a sample of live requests with a candidate model, off the serving path.
+
+The API hands each sampled /predict input, with the risk the primary
+model returned and the time it took, to a ShadowEvaluator once the
+response has been sent. The evaluator only appends it to a bounded
+buffer; a dispatcher thread ships the buffer in micro-batches to its own
+process pool, where the candidate bundle is loaded once per worker and
+scores a whole batch in one model call. Request threads therefore never
+run the candidate model, and the candidate's CPU time is spent in other
+processes.
+
+Results are aggregated into ShadowStats:
+
+* mean and max absolute delta, and mean signed delta, against the primary risk
+* rank agreement over consecutive sampled requests, taken as pairs the
+  way RiskPredictor.compare_scenarios compares two scenarios
+* CPU time of the candidate per prediction, next to the primary latency
+
+When the workers fall behind, the buffer fills and further samples are
+dropped and counted rather than queued without bound.
+"""
+
+import multiprocessing
+import random
+import threading
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Tuple
+
+import numpy as np
+
+DEFAULT_FRACTION = 0.05
+DEFAULT_BATCH_ROWS = 256
+DEFAULT_FLUSH_INTERVAL = 1.0
+DEFAULT_MAX_PENDING = 10_000
+
+# Per-prediction CPU times kept for percentiles
+_CPU_WINDOW = 10_000
+
+
+def higher_risk_index(risk1: np.ndarray, risk2: np.ndarray) -> np.ndarray:
+    """
+    Which scenario of each pair is riskier, as compare_scenarios reports it.
+
+    Args:
+        risk1: Risks of the first scenarios
+        risk2: Risks of the second scenarios
+
+    Returns:
+        0 where the first scenario is riskier, 1 otherwise
+    """
+    return np.where(np.asarray(risk1) > np.asarray(risk2), 0, 1)
+
+
+class ShadowStats:
+    """Running divergence and cost of a shadow model against the primary."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Start aggregating from zero."""
+        with self._lock:
+            self.count = 0
+            self.abs_delta_sum = 0.0
+            self.delta_sum = 0.0
+            self.max_abs_delta = 0.0
+            self.pairs = 0
+            self.pairs_agreeing = 0
+            self.primary_latency_ms_sum = 0.0
+            self.shadow_cpu_ms_sum = 0.0
+            self._cpu_ms: List[float] = []
+            # Last scored request, paired with the first one of the next batch
+            self._last: Optional[Tuple[float, float]] = None
+
+    def add(self, primary: Sequence[float], shadow: Sequence[float],
+            primary_latency_ms: float, shadow_cpu_ms: float):
+        """
+        Record one scored batch.
+
+        Args:
+            primary: Risks returned to the clients, in request order
+            shadow: Shadow risks for the same requests
+            primary_latency_ms: Summed primary latency of those requests
+            shadow_cpu_ms: CPU time the shadow model spent on the batch
+        """
+        primary = np.asarray(primary, dtype=np.float64)
+        shadow = np.asarray(shadow, dtype=np.float64)
+        if len(primary) == 0:
+            return
+        delta = shadow - primary
+        abs_delta = np.abs(delta)
+
+        with self._lock:
+            if self._last is not None:
+                primary = np.concatenate([[self._last[0]], primary])
+                shadow = np.concatenate([[self._last[1]], shadow])
+            agree = (higher_risk_index(primary[:-1], primary[1:])
+                     == higher_risk_index(shadow[:-1], shadow[1:]))
+            self._last = (float(primary[-1]), float(shadow[-1]))
+
+            self.count += len(delta)
+            self.abs_delta_sum += float(abs_delta.sum())
+            self.delta_sum += float(delta.sum())
+            self.max_abs_delta = max(self.max_abs_delta, float(abs_delta.max()))
+            self.pairs += len(agree)
+            self.pairs_agreeing += int(agree.sum())
+            self.primary_latency_ms_sum += primary_latency_ms
+            self.shadow_cpu_ms_sum += shadow_cpu_ms
+            self._cpu_ms.append(shadow_cpu_ms / len(delta))
+            del self._cpu_ms[:-_CPU_WINDOW]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        Aggregates so far.
+
+        Returns:
+            Dict of scored count, absolute/signed deltas, pair rank
+            agreement and per-prediction primary latency and shadow CPU
+            time in milliseconds; averages are None before any result
+        """
+        with self._lock:
+            count = self.count
+            cpu = np.asarray(self._cpu_ms)
+            primary_ms = self.primary_latency_ms_sum / count if count else None
+            shadow_ms = self.shadow_cpu_ms_sum / count if count else None
+            return {
+                'scored': count,
+                'mean_abs_delta': self.abs_delta_sum / count if count else None,
+                'max_abs_delta': self.max_abs_delta if count else None,
+                'mean_delta': self.delta_sum / count if count else None,
+                'pairs': self.pairs,
+                'rank_agreement': self.pairs_agreeing / self.pairs if self.pairs else None,
+                'primary_latency_ms': primary_ms,
+                'shadow_cpu_ms': shadow_ms,
+                'shadow_cpu_ms_p99': float(np.percentile(cpu, 99)) if len(cpu) else None,
+                'shadow_cpu_ms_total': self.shadow_cpu_ms_sum,
+                'cpu_overhead': shadow_ms / primary_ms if count and primary_ms else None,
+            }
+
+
+# One shadow model per worker process, loaded on its first batch
+_shadow_models = {}
+
+
+def _shadow_model(bundle_path: str):
+    """Cached (model, encoder) of a bundle for this process."""
+    if bundle_path not in _shadow_models:
+        from utils.features import FeatureEncoder
+        from utils.model_bundle import load_bundle
+        bundle = load_bundle(bundle_path)
+        # The primary has already validated the request; map anything the
+        # candidate has not seen to its first category rather than fail the batch
+        encoder = FeatureEncoder(bundle['vocabularies'], bundle['feature_names'], unknown='default')
+        _shadow_models[bundle_path] = (bundle['model'], encoder)
+    return _shadow_models[bundle_path]
+
+
+def score_shadow(bundle_path: str, columns: Mapping[str, Sequence]) -> Tuple[np.ndarray, float]:
+    """
+    Score one batch with the shadow model.
+
+    Runs in a worker process.
+
+    Args:
+        bundle_path: Shadow model bundle
+        columns: Raw scenario columns
+
+    Returns:
+        Tuple of (risks, CPU milliseconds spent encoding and predicting)
+    """
+    model, encoder = _shadow_model(bundle_path)
+    start = time.process_time()
+    risks = model.predict(encoder.transform(columns))
+    return risks, (time.process_time() - start) * 1000
+
+
+class ShadowEvaluator:
+    """Samples live requests and scores them with a candidate model in a separate pool."""
+
+    def __init__(self, bundle_path: str, fraction: float = DEFAULT_FRACTION,
+                 max_workers: int = 1, batch_rows: int = DEFAULT_BATCH_ROWS,
+                 flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 max_pending: int = DEFAULT_MAX_PENDING, seed: Optional[int] = None):
+        """
+        Initialize the evaluator and start its dispatcher.
+
+        Args:
+            bundle_path: Candidate model bundle, e.g. written by save_model.py
+            fraction: Share of requests copied to the shadow model
+            max_workers: Shadow worker processes
+            batch_rows: Samples sent to a worker per model call
+            flush_interval: Longest time a sample waits before being sent
+            max_pending: Samples buffered before new ones are dropped
+            seed: Seed of the sampling decision
+
+        Raises:
+            ValueError: If fraction is outside [0, 1]
+        """
+        if not 0.0 <= fraction <= 1.0:
+            raise ValueError(f"Shadow fraction must be between 0 and 1, got {fraction}")
+
+        self.bundle_path = str(bundle_path)
+        self.fraction = fraction
+        self.max_workers = max_workers
+        self.batch_rows = batch_rows
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.stats = ShadowStats()
+
+        self._random = random.Random(seed)
+        self._pending: List[Tuple[Mapping[str, Any], float, float]] = []
+        self._cond = threading.Condition()
+        self._closed = False
+        self._flush_requested = False
+        # Batches sent but not scored; bounded so a slow pool backs up into the buffer
+        self._in_flight = threading.Semaphore(2 * max_workers)
+
+        self.sampled = 0
+        self.dropped = 0
+        self.scored = 0
+        self.failed = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+        # spawn keeps workers independent of the server's threads and event loop
+        self.executor = ProcessPoolExecutor(max_workers=max_workers,
+                                            mp_context=multiprocessing.get_context('spawn'))
+        self._thread = threading.Thread(target=self._run, name="shadow-dispatch", daemon=True)
+        self._thread.start()
+
+    def sample(self) -> bool:
+        """Whether to copy the current request to the shadow model."""
+        return self._random.random() < self.fraction
+
+    def submit(self, scenario: Mapping[str, Any], primary_risk: float,
+               primary_latency_ms: float) -> bool:
+        """
+        Queue one request for shadow scoring.
+
+        Args:
+            scenario: Raw request inputs
+            primary_risk: Risk the primary model returned
+            primary_latency_ms: Time the primary path took
+
+        Returns:
+            False if the buffer was full (or the evaluator closed) and the
+            sample was dropped
+        """
+        with self._cond:
+            if self._closed or len(self._pending) >= self.max_pending:
+                self.dropped += 1
+                return False
+            self._pending.append((scenario, primary_risk, primary_latency_ms))
+            self.sampled += 1
+            if len(self._pending) >= self.batch_rows:
+                self._cond.notify_all()
+        return True
+
+    def _run(self):
+        """Dispatcher loop: ship full batches, or whatever waited flush_interval."""
+        while True:
+            with self._cond:
+                deadline = time.monotonic() + self.flush_interval
+                while (len(self._pending) < self.batch_rows and not self._closed
+                       and not self._flush_requested and time.monotonic() < deadline):
+                    self._cond.wait(max(0.0, deadline - time.monotonic()))
+                batch = self._pending[:self.batch_rows]
+                del self._pending[:self.batch_rows]
+                self._flush_requested = bool(self._pending) and self._flush_requested
+                closed = self._closed and not self._pending
+            if batch:
+                self._dispatch(batch)
+            if closed:
+                return
+
+    def _dispatch(self, batch: List[Tuple[Mapping[str, Any], float, float]]):
+        """Send one batch to the pool; results are aggregated when it finishes."""
+        scenarios = [scenario for scenario, _, _ in batch]
+        columns = {col: [scenario.get(col) for scenario in scenarios] for col in scenarios[0]}
+        primary = np.array([risk for _, risk, _ in batch])
+        latency_ms = sum(latency for _, _, latency in batch)
+
+        self._in_flight.acquire()
+        try:
+            future = self.executor.submit(score_shadow, self.bundle_path, columns)
+        except RuntimeError as e:  # pool already shut down
+            self._in_flight.release()
+            self._fail(str(e), len(batch))
+            return
+        future.add_done_callback(lambda f: self._collect(f, primary, latency_ms))
+
+    def _collect(self, future: Future, primary: np.ndarray, latency_ms: float):
+        """Aggregate a finished batch."""
+        self._in_flight.release()
+        try:
+            risks, cpu_ms = future.result()
+        except Exception as e:
+            self._fail(str(e), len(primary))
+            return
+        self.stats.add(primary, risks, latency_ms, cpu_ms)
+        with self._cond:
+            self.scored += len(primary)
+
+    def _fail(self, message: str, rows: int):
+        """Count a batch the shadow model could not score."""
+        with self._cond:
+            self.errors += 1
+            self.failed += rows
+            self.last_error = message
+
+    def drain(self, timeout: float = 30.0) -> bool:
+        """
+        Send what is buffered now and wait for it to be scored.
+
+        Args:
+            timeout: Longest wait in seconds
+
+        Returns:
+            True if every sample so far was scored (or failed) in time
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            target = self.sampled
+            self._flush_requested = True
+            self._cond.notify_all()
+        while self.scored + self.failed < target and time.monotonic() < deadline:
+            time.sleep(0.01)
+        return self.scored + self.failed >= target
+
+    def report(self) -> Dict[str, Any]:
+        """
+        Sampling counters and shadow statistics.
+
+        Returns:
+            Dict with the bundle, fraction, sampled/dropped/pending counts,
+            errors and the ShadowStats summary
+        """
+        with self._cond:
+            pending = len(self._pending)
+        report = {
+            'bundle_path': self.bundle_path,
+            'fraction': self.fraction,
+            'sampled': self.sampled,
+            'dropped': self.dropped,
+            'pending': pending,
+            'failed': self.failed,
+            'errors': self.errors,
+            'last_error': self.last_error,
+        }
+        report.update(self.stats.summary())
+        return report
+
+    def reset(self):
+        """Start a new statistics window, e.g. after swapping the candidate."""
+        self.stats.reset()
+
+    def close(self, wait: bool = True):
+        """
+        Stop sampling and shut the pool down.
+
+        Args:
+            wait: Score what is buffered before returning; otherwise
+                  pending samples are abandoned
+        """
+        with self._cond:
+            self._closed = True
+            if not wait:
+                self.dropped += len(self._pending)
+                self._pending.clear()
+            self._cond.notify_all()
+        self._thread.join()
+        self.executor.shutdown(wait=wait, cancel_futures=not wait)
@@ -0,0 +1,327 @@
+"""
+Similar Roads
+=============
+Nearest historical training rows for a road scenario.
+
+Training rows are partitioned by their exact key: every categorical and
+integer column (road type, conditions, flags, lanes, speed limit and
+reported accidents). Within a partition rows are sorted by curvature, the
+only continuous column. Rows of one partition are contiguous, so the
+index is a handful of flat arrays:
+
+    partition_keys.npy  (partitions, key columns) label codes
+    offsets.npy         start of every partition, plus the row count
+    curvature.npy       curvature, sorted within each partition
+    accident_risk.npy   observed risk per row
+    ids.npy             training row id per row
+    manifest.json       key columns, their labels and the curvature range
+
+Rows are ranked by the weighted distance
+
+    sum(weight[col] * d(col)) + weight['curvature'] * |delta curvature| / range
+
+where d is 0/1 for categorical columns and |delta| / range for the
+integer ones. A lookup hashes the query key to its partition and
+binary-searches the curvature there; partitions one key column away (one
+more lane, a different weather) are probed the same way. Any other row
+differs in at least two columns, so when the k-th distance found is
+within the two smallest column steps the answer is final. Otherwise (or
+for a value never seen in training) every partition within the k-th
+distance is re-ranked, which keeps the result exact.
+
+Usage:
+    python -m utils.similar_roads train.csv models/similar_roads
+"""
+
+import argparse
+import json
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Sequence, Union
+
+import numpy as np
+import pandas as pd
+
+KEY_COLUMNS = ['road_type', 'lighting', 'weather', 'road_signs_present', 'public_road',
+               'time_of_day', 'holiday', 'school_season', 'num_lanes', 'speed_limit',
+               'num_reported_accidents']
+ORDINAL_COLUMNS = ['num_lanes', 'speed_limit', 'num_reported_accidents']
+SORT_COLUMN = 'curvature'
+TARGET = 'accident_risk'
+ID_COLUMN = 'id'
+
+# Distance per mismatched categorical column, or per full range of an
+# integer column or of curvature
+DEFAULT_WEIGHTS = dict({col: 1.0 for col in KEY_COLUMNS}, **{SORT_COLUMN: 1.0})
+
+INDEX_FORMAT_VERSION = 1
+MANIFEST_FILENAME = "manifest.json"
+ARRAY_FILENAMES = {
+    'keys': "partition_keys.npy",
+    'offsets': "offsets.npy",
+    'curvature': "curvature.npy",
+    'risk': "accident_risk.npy",
+    'ids': "ids.npy",
+}
+
+
+class SimilarRoadsError(ValueError):
+    """Raised when an index is missing, malformed or given bad training data."""
+
+
+def build_similar_roads_index(data: pd.DataFrame, directory: Union[str, Path]) -> Dict[str, Any]:
+    """
+    Partition training rows and write an index.
+
+    Args:
+        data: Training rows with the key columns, curvature and accident_risk;
+              an id column is kept when present, else the row position
+        directory: Output directory, created if needed
+
+    Returns:
+        The written manifest
+
+    Raises:
+        SimilarRoadsError: For missing columns or missing values
+    """
+    missing = [col for col in KEY_COLUMNS + [SORT_COLUMN, TARGET] if col not in data]
+    if missing:
+        raise SimilarRoadsError(f"Training data is missing columns: {missing}")
+    if data[KEY_COLUMNS + [SORT_COLUMN, TARGET]].isna().any().any():
+        raise SimilarRoadsError("Training data has missing values")
+
+    labels: Dict[str, List] = {}
+    codes = []
+    for col in KEY_COLUMNS:
+        column_codes, uniques = pd.factorize(data[col], sort=True)
+        labels[col] = uniques.tolist()
+        codes.append(column_codes)
+    shape = tuple(len(labels[col]) for col in KEY_COLUMNS)
+    packed = np.ravel_multi_index(codes, shape)
+    curvature = data[SORT_COLUMN].to_numpy(dtype=np.float64)
+
+    # Partition by key, then curvature within each partition
+    order = np.lexsort((curvature, packed))
+    packed = packed[order]
+    starts = np.flatnonzero(np.r_[True, packed[1:] != packed[:-1]])
+    keys = np.column_stack(np.unravel_index(packed[starts], shape)).astype(np.int16)
+    offsets = np.append(starts, len(packed)).astype(np.int64)
+    if ID_COLUMN in data:
+        ids = data[ID_COLUMN].to_numpy(dtype=np.int64)
+    else:
+        ids = np.arange(len(data), dtype=np.int64)
+
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    np.save(directory / ARRAY_FILENAMES['keys'], keys)
+    np.save(directory / ARRAY_FILENAMES['offsets'], offsets)
+    np.save(directory / ARRAY_FILENAMES['curvature'], curvature[order])
+    np.save(directory / ARRAY_FILENAMES['risk'], data[TARGET].to_numpy(dtype=np.float64)[order])
+    np.save(directory / ARRAY_FILENAMES['ids'], ids[order])
+    manifest = {
+        'format_version': INDEX_FORMAT_VERSION,
+        'rows': len(data),
+        'partitions': len(keys),
+        'key_columns': KEY_COLUMNS,
+        'labels': labels,
+        'curvature_range': ([float(curvature.min()), float(curvature.max())] if len(data)
+                            else [0.0, 0.0]),
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+    # Written last: a directory without a manifest is not an index
+    with open(directory / MANIFEST_FILENAME, 'w') as f:
+        json.dump(manifest, f, indent=2, default=_json_label)
+    return manifest
+
+
+class SimilarRoadsIndex:
+    """Memory-mapped training rows, searched by key partition and curvature."""
+
+    def __init__(self, directory: Union[str, Path], weights: Optional[Mapping[str, float]] = None,
+                 mmap_mode: Optional[str] = 'r'):
+        """
+        Open an index written by build_similar_roads_index.
+
+        Args:
+            directory: Index directory
+            weights: Distance weights overriding DEFAULT_WEIGHTS per column
+            mmap_mode: Passed to np.load; None reads the arrays into memory
+
+        Raises:
+            SimilarRoadsError: If the files are missing or inconsistent, or a
+                               weight names an unknown column
+        """
+        self.directory = Path(directory)
+        manifest_path = self.directory / MANIFEST_FILENAME
+        if not manifest_path.is_file():
+            raise SimilarRoadsError(f"No similar-roads index at {self.directory}")
+        with open(manifest_path) as f:
+            self.manifest: Dict[str, Any] = json.load(f)
+        if self.manifest['format_version'] > INDEX_FORMAT_VERSION:
+            raise SimilarRoadsError(f"Similar-roads index format {self.manifest['format_version']} "
+                                    f"is newer than supported version {INDEX_FORMAT_VERSION}")
+        unknown = set(weights or {}) - set(DEFAULT_WEIGHTS)
+        if unknown:
+            raise SimilarRoadsError(f"Weights for unknown columns: {sorted(unknown)}")
+        self.weights = dict(DEFAULT_WEIGHTS, **(weights or {}))
+
+        arrays = {name: np.load(self.directory / filename, mmap_mode=mmap_mode)
+                  for name, filename in ARRAY_FILENAMES.items()}
+        self.keys = np.asarray(arrays['keys'])
+        self.offsets = np.asarray(arrays['offsets'])
+        self.curvature = arrays['curvature']
+        self.risk = arrays['risk']
+        self.ids = arrays['ids']
+        self.columns: List[str] = self.manifest['key_columns']
+        self.labels: Dict[str, List] = self.manifest['labels']
+        if (self.keys.shape != (len(self.offsets) - 1, len(self.columns))
+                or not len(self.curvature) == len(self.risk) == len(self.ids) == self.offsets[-1]):
+            raise SimilarRoadsError("Similar-roads index arrays disagree in length")
+
+        low, high = self.manifest['curvature_range']
+        self._curvature_scale = self.weights[SORT_COLUMN] / ((high - low) or 1.0)
+        self._position = {col: {label: i for i, label in enumerate(self.labels[col])}
+                          for col in self.columns}
+        shape = [len(self.labels[col]) for col in self.columns]
+        self._radix = np.array([int(np.prod(shape[i + 1:])) for i in range(len(shape))],
+                               dtype=np.int64)
+        # The hash probe: packed key -> partition
+        packed_keys = (self.keys.astype(np.int64) @ self._radix).tolist()
+        self._partition = dict(zip(packed_keys, range(len(self.keys))))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _column_distances(self, col: str, value: Any) -> np.ndarray:
+        """Weighted distance from a query value to every label of a column."""
+        labels = self.labels[col]
+        weight = self.weights[col]
+        if col in ORDINAL_COLUMNS:
+            values = np.asarray(labels, dtype=np.float64)
+            span = (values.max() - values.min()) or 1.0
+            return weight * np.abs(values - float(value)) / span
+        return np.array([0.0 if label == value else weight for label in labels])
+
+    def _nearest_in(self, partition: int, curvature: float, k: int) -> np.ndarray:
+        """Rows of a partition that can be among its k nearest by curvature."""
+        start, end = int(self.offsets[partition]), int(self.offsets[partition + 1])
+        i = start + int(np.searchsorted(self.curvature[start:end], curvature))
+        return np.arange(max(start, i - k), min(end, i + k))
+
+    def _total(self, rows: np.ndarray, key_distance: np.ndarray, curvature: float) -> np.ndarray:
+        """Key distance plus the weighted curvature difference of rows."""
+        curvature_distance = np.abs(np.asarray(self.curvature[rows]) - curvature)
+        return key_distance + self._curvature_scale * curvature_distance
+
+    def neighbors(self, scenario: Mapping[str, Any], k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Most similar training rows to a scenario.
+
+        Args:
+            scenario: Raw scenario with the key columns and curvature
+            k: Rows to return
+
+        Returns:
+            Up to k dicts, nearest first, with id, distance, accident_risk,
+            curvature and the key columns
+
+        Raises:
+            SimilarRoadsError: If a key column or curvature is missing, or k < 1
+        """
+        if k < 1:
+            raise SimilarRoadsError(f"k must be at least 1, got {k}")
+        missing = [col for col in self.columns + [SORT_COLUMN] if col not in scenario]
+        if missing:
+            raise SimilarRoadsError(f"Scenario is missing columns: {missing}")
+        curvature = float(scenario[SORT_COLUMN])
+        codes = [self._position[col].get(scenario[col]) for col in self.columns]
+        distances = [self._column_distances(col, scenario[col]) for col in self.columns]
+
+        rows = np.empty(0, dtype=np.int64)
+        total = np.empty(0)
+        if None not in codes:
+            packed = int(np.dot(codes, self._radix))
+            # The query's own partition, then every partition one column away
+            probes = [(packed, 0.0)]
+            for axis, (code, column_distances) in enumerate(zip(codes, distances)):
+                for other in range(len(column_distances)):
+                    if other != code:
+                        probes.append((packed + (other - code) * int(self._radix[axis]),
+                                       column_distances[other]))
+            found = [(self._nearest_in(self._partition[key], curvature, k), distance)
+                     for key, distance in probes if key in self._partition]
+            if found:
+                rows = np.concatenate([candidates for candidates, _ in found])
+                key_distance = np.concatenate([np.full(len(candidates), distance)
+                                               for candidates, distance in found])
+                total = self._total(rows, key_distance, curvature)
+
+        # Rows two or more columns away are at least the two smallest column
+        # steps from the query, so a k-th distance within that is final
+        bound = 0.0
+        if None not in codes:
+            steps = sorted(np.min(np.delete(column_distances, code))
+                           if len(column_distances) > 1 else np.inf
+                           for code, column_distances in zip(codes, distances))
+            bound = steps[0] + steps[1]
+        kth = np.partition(total, k - 1)[k - 1] if len(total) >= k else np.inf
+        if kth > bound:
+            # Re-rank every partition that could hold a row within the bound
+            partition_distance = sum(column_distances[self.keys[:, axis]]
+                                     for axis, column_distances in enumerate(distances))
+            selected = np.flatnonzero(partition_distance <= kth)
+            starts, counts = self.offsets[selected], np.diff(self.offsets)[selected]
+            rows = np.repeat(starts - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())
+            total = self._total(rows, np.repeat(partition_distance[selected], counts), curvature)
+
+        if len(rows) > k:
+            best = np.argpartition(total, k - 1)[:k]
+            rows, total = rows[best], total[best]
+        order = np.lexsort((np.asarray(self.ids[rows]), total))
+        rows, total = rows[order], total[order]
+
+        partitions = np.searchsorted(self.offsets, rows, side='right') - 1
+        keys = self.keys[partitions].tolist()
+        return [
+            dict({ID_COLUMN: int(self.ids[row]), 'distance': float(distance),
+                  TARGET: float(self.risk[row]), SORT_COLUMN: float(self.curvature[row])},
+                 **{col: self.labels[col][code] for col, code in zip(self.columns, key)})
+            for row, distance, key in zip(rows.tolist(), total.tolist(), keys)
+        ]
+
+    def query(self, scenario: Mapping[str, Any], k: int = 5) -> pd.DataFrame:
+        """
+        neighbors() as a DataFrame.
+
+        Args:
+            scenario: Raw scenario with the key columns and curvature
+            k: Rows to return
+
+        Returns:
+            DataFrame of up to k rows, nearest first
+        """
+        columns = [ID_COLUMN, 'distance', TARGET, SORT_COLUMN] + self.columns
+        return pd.DataFrame(self.neighbors(scenario, k), columns=columns)
+
+
+def _json_label(value: Any) -> Any:
+    """JSON form of numpy labels."""
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot store label {value!r}")
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Build a similar-roads index from the training CSV."""
+    parser = argparse.ArgumentParser(description="Index training rows for similar-road lookups")
+    parser.add_argument('data', help=f"CSV with the key columns, {SORT_COLUMN} and {TARGET}")
+    parser.add_argument('output', help="Index directory")
+    args = parser.parse_args(argv)
+
+    manifest = build_similar_roads_index(pd.read_csv(args.data), args.output)
+    print(f"✓ Indexed {manifest['rows']} rows in {manifest['partitions']} partitions "
+          f"at {args.output}")
+
+
+if __name__ == "__main__":
+    main()
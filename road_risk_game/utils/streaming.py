@@ -0,0 +1,163 @@
+"""
+Streaming Scoring
+=================
+Newline-delimited JSON scoring in bounded memory.
+
+Request bytes are split into lines as they arrive and grouped into
+micro-batches; each batch is validated and scored as one frame and its
+results are written out before the next batch is read. At most one
+batch of scenarios and one partial line are held at a time, whatever the
+size of the stream, and a slow reader simply stops the pulling of more
+input.
+
+Every input line produces exactly one output line, in order:
+
+    {"line": 1, "id": "a1", "accident_risk": 0.31}
+    {"line": 2, "error": "Expecting value: line 1 column 1 (char 0)"}
+
+``id`` is echoed when the scenario has one.
+"""
+
+import json
+from typing import AsyncIterable, AsyncIterator, Callable, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+MEDIA_NDJSON = "application/x-ndjson"
+
+# Scenarios scored per model call
+DEFAULT_BATCH_ROWS = 2_000
+
+# Longest accepted line; guards against a stream without newlines
+MAX_LINE_BYTES = 64 * 1024
+
+
+class LineTooLongError(ValueError):
+    """Raised when a line exceeds MAX_LINE_BYTES before its newline arrives."""
+
+
+async def iter_lines(chunks: AsyncIterable[bytes],
+                     max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[bytes]:
+    """
+    Split a byte stream into lines as the bytes arrive.
+
+    Args:
+        chunks: Body chunks in arrival order
+        max_line_bytes: Longest allowed line
+
+    Yields:
+        Each line without its newline; blank lines included, so line
+        numbers stay aligned with the input
+    """
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            yield line
+        if len(pending) > max_line_bytes:
+            raise LineTooLongError(f"Line longer than {max_line_bytes} bytes")
+    if pending:
+        yield pending
+
+
+async def iter_batches(chunks: AsyncIterable[bytes], batch_rows: int = DEFAULT_BATCH_ROWS,
+                       max_line_bytes: int = MAX_LINE_BYTES) -> AsyncIterator[List[bytes]]:
+    """
+    Group streamed lines into micro-batches.
+
+    Args:
+        chunks: Body chunks in arrival order
+        batch_rows: Lines per batch
+        max_line_bytes: Longest allowed line
+
+    Yields:
+        Lists of up to batch_rows lines
+    """
+    batch = []
+    async for line in iter_lines(chunks, max_line_bytes):
+        batch.append(line)
+        if len(batch) >= batch_rows:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _record(line_number: int, scenario: Optional[Dict], **fields) -> str:
+    """One output line."""
+    record = {'line': line_number}
+    if scenario is not None and 'id' in scenario:
+        record['id'] = scenario['id']
+    record.update(fields)
+    return json.dumps(record) + "\n"
+
+
+class NDJSONScorer:
+    """Turns batches of NDJSON scenario lines into NDJSON result lines."""
+
+    def __init__(self, score_frame: Callable[[pd.DataFrame], np.ndarray]):
+        """
+        Initialize the scorer.
+
+        Args:
+            score_frame: Validates and scores a DataFrame of raw scenarios;
+                         raises ValueError for invalid input
+        """
+        self.score_frame = score_frame
+
+    def _score(self, scenarios: List[Dict]) -> List:
+        """
+        Risks for a list of scenarios, isolating the ones that fail.
+
+        A failing list is split in half and each half retried, so a few
+        bad rows cost a handful of extra model calls rather than one per row.
+
+        Returns:
+            Per scenario, either a float risk or the ValueError it raised
+        """
+        try:
+            return [float(risk) for risk in self.score_frame(pd.DataFrame(scenarios))]
+        except ValueError as e:
+            if len(scenarios) == 1:
+                return [e]
+        middle = len(scenarios) // 2
+        return self._score(scenarios[:middle]) + self._score(scenarios[middle:])
+
+    def score_lines(self, lines: List[bytes], first_line: int = 1) -> bytes:
+        """
+        Score one batch of lines.
+
+        Args:
+            lines: Raw NDJSON lines
+            first_line: 1-based line number of lines[0]
+
+        Returns:
+            Encoded result lines, one per input line
+        """
+        output: List[Optional[str]] = [None] * len(lines)
+        scenarios, positions = [], []
+        for i, line in enumerate(lines):
+            if not line.strip():
+                output[i] = _record(first_line + i, None, error="Empty line")
+                continue
+            try:
+                scenario = json.loads(line)
+            except ValueError as e:
+                output[i] = _record(first_line + i, None, error=str(e))
+                continue
+            if not isinstance(scenario, dict):
+                output[i] = _record(first_line + i, None, error="Line is not a JSON object")
+                continue
+            scenarios.append(scenario)
+            positions.append(i)
+
+        results = self._score(scenarios) if scenarios else []
+        for i, scenario, result in zip(positions, scenarios, results):
+            if isinstance(result, ValueError):
+                output[i] = _record(first_line + i, scenario, error=str(result))
+            else:
+                output[i] = _record(first_line + i, scenario, accident_risk=result)
+
+        return "".join(output).encode()
@@ -0,0 +1,335 @@
+"""
+Training Benchmark
+==================
+Fit time, peak memory and validation R² as the training set grows.
+
+The production GradientBoostingRegressor configuration from save_model.py
+and alternative trainers are fitted on geometric subsamples of train.csv
+(10k rows doubling up to the full file) and on synthetically upsampled
+copies (2x, 5x), at each requested thread count. A fixed validation split
+is held out before sampling so every fit is scored on the same rows.
+
+The results are printed as a table and written as JSON, with the smallest
+size at which each alternative fits faster than production (its
+break-even point).
+
+Usage:
+    python -m utils.training_benchmark ../train.csv --threads 1 2 4 --output training_benchmark.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import (
+    GradientBoostingRegressor, HistGradientBoostingRegressor, RandomForestRegressor
+)
+from threadpoolctl import threadpool_limits
+
+from utils.evaluation import regression_metrics
+from utils.features import CATEGORICAL_FEATURES, INPUT_FEATURES, add_engineered_features
+from utils.profiling import StageProfiler
+
+try:
+    import lightgbm
+except ImportError:  # optional trainer
+    lightgbm = None
+
+BASELINE = 'gbr_production'
+DEFAULT_MIN_ROWS = 10_000
+DEFAULT_UPSAMPLE = (2, 5)
+VALIDATION_ROWS = 50_000
+
+# Noise added to curvature in synthetic rows, so upsampled data is not
+# just exact duplicates that tree builders could collapse
+CURVATURE_JITTER = 0.01
+
+# name -> (factory taking a thread count, whether the trainer uses threads)
+Trainer = Tuple[Callable[[int], object], bool]
+
+
+def _production_gbr(n_threads: int):
+    """The configuration save_model.py ships (single-threaded)."""
+    return GradientBoostingRegressor(n_estimators=100, max_depth=5, learning_rate=0.1,
+                                     random_state=42)
+
+
+def _hist_gbr(n_threads: int):
+    """Histogram boosting with the same depth, rounds and learning rate."""
+    return HistGradientBoostingRegressor(max_iter=100, max_depth=5, learning_rate=0.1,
+                                         early_stopping=False, random_state=42)
+
+
+def _random_forest(n_threads: int):
+    """The forest the training scripts compare against."""
+    return RandomForestRegressor(n_estimators=100, max_depth=20, n_jobs=n_threads, random_state=42)
+
+
+def _lightgbm(n_threads: int):
+    """LightGBM with the production depth, rounds and learning rate."""
+    return lightgbm.LGBMRegressor(n_estimators=100, max_depth=5, num_leaves=31, learning_rate=0.1,
+                                  n_jobs=n_threads, random_state=42, verbose=-1)
+
+
+TRAINERS: Dict[str, Trainer] = {
+    BASELINE: (_production_gbr, False),
+    'hist_gbr': (_hist_gbr, True),
+    'random_forest': (_random_forest, True),
+}
+if lightgbm is not None:
+    TRAINERS['lightgbm'] = (_lightgbm, True)
+
+
+def encode_training_frame(df: pd.DataFrame) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Encode train.csv the way save_model.py does.
+
+    Categorical codes follow sorted category order, as LabelEncoder assigns them.
+
+    Args:
+        df: Raw training data with accident_risk
+
+    Returns:
+        Tuple of (feature matrix in model order, target)
+    """
+    X = df[INPUT_FEATURES].copy()
+    for col in CATEGORICAL_FEATURES:
+        X[col] = np.unique(X[col].to_numpy(), return_inverse=True)[1]
+    add_engineered_features(X)
+    return X, df['accident_risk'].to_numpy(dtype=np.float64)
+
+
+def upsample(X: pd.DataFrame, y: np.ndarray, factor: float,
+             seed: Optional[int] = None) -> Tuple[pd.DataFrame, np.ndarray]:
+    """
+    Grow a training set with synthetic rows.
+
+    The original rows are kept; the extra rows are resampled with replacement
+    and get a small curvature jitter, with the engineered features recomputed.
+
+    Args:
+        X: Encoded feature matrix
+        y: Target
+        factor: Size of the result relative to X
+        seed: Random seed
+
+    Returns:
+        Tuple of (features, target) with about ``factor * len(X)`` rows
+    """
+    rng = np.random.default_rng(seed)
+    extra = int(round(len(X) * (factor - 1)))
+    rows = rng.integers(0, len(X), extra)
+
+    synthetic = X.iloc[rows].reset_index(drop=True)
+    jitter = rng.normal(0.0, CURVATURE_JITTER, extra)
+    synthetic['curvature'] = np.clip(synthetic['curvature'].to_numpy() + jitter, 0.0, 1.0)
+    add_engineered_features(synthetic)
+
+    return (pd.concat([X.reset_index(drop=True), synthetic], ignore_index=True),
+            np.concatenate([y, y[rows]]))
+
+
+def size_grid(n_rows: int, min_rows: int = DEFAULT_MIN_ROWS, factor: float = 2.0,
+              upsample_factors: Sequence[float] = DEFAULT_UPSAMPLE) -> List[int]:
+    """
+    Training sizes to benchmark.
+
+    Args:
+        n_rows: Rows available for training
+        min_rows: Smallest subsample
+        factor: Growth between subsamples
+        upsample_factors: Multiples of n_rows to reach by upsampling
+
+    Returns:
+        Increasing sizes: geometric subsamples, the full set, then upsampled sizes
+    """
+    sizes = []
+    size = float(min_rows)
+    while size < n_rows:
+        sizes.append(int(size))
+        size *= factor
+    sizes.append(n_rows)
+    sizes.extend(int(round(n_rows * f)) for f in upsample_factors if f > 1)
+    return sizes
+
+
+def measure_fit(trainer: Callable[[int], object], n_threads: int, X: pd.DataFrame, y: np.ndarray,
+                X_val: pd.DataFrame, y_val: np.ndarray) -> Dict:
+    """
+    Fit one trainer and measure it.
+
+    Args:
+        trainer: Factory returning an unfitted estimator
+        n_threads: Thread count for the estimator and native thread pools
+        X: Training features
+        y: Training target
+        X_val: Validation features
+        y_val: Validation target
+
+    Returns:
+        Dict with fit_s, cpu_s, peak_rss_mb and val_r2
+    """
+    profiler = StageProfiler()
+    with threadpool_limits(limits=n_threads):
+        model = trainer(n_threads)
+        with profiler.stage('fit'):
+            model.fit(X, y)
+        predictions = model.predict(X_val)
+
+    record = profiler.records[0]
+    return {
+        'fit_s': record['wall_s'],
+        'cpu_s': record['cpu_s'],
+        'peak_rss_mb': record['peak_rss_mb'],
+        'val_r2': regression_metrics(y_val, predictions)['r2'],
+    }
+
+
+def run_benchmark(X: pd.DataFrame, y: np.ndarray, sizes: Sequence[int],
+                  threads: Sequence[int] = (1,), trainers: Optional[Dict[str, Trainer]] = None,
+                  validation_rows: int = VALIDATION_ROWS, seed: int = 42,
+                  log: Optional[Callable[[str], None]] = print) -> List[Dict]:
+    """
+    Fit every trainer at every size and thread count.
+
+    Args:
+        X: Encoded feature matrix
+        y: Target
+        sizes: Training sizes; sizes above the available rows are upsampled
+        threads: Thread counts for threaded trainers (others run once with 1)
+        trainers: Trainers to run; defaults to TRAINERS
+        validation_rows: Rows held out for validation (at most a fifth of X)
+        seed: Seed for the split, the subsamples and the upsampling
+        log: Progress callback; None for silence
+
+    Returns:
+        One result dict per fit
+    """
+    trainers = trainers or TRAINERS
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(X))
+    n_val = min(validation_rows, len(X) // 5)
+    X_val, y_val = X.iloc[order[:n_val]], y[order[:n_val]]
+    X_pool, y_pool = X.iloc[order[n_val:]].reset_index(drop=True), y[order[n_val:]]
+
+    results = []
+    for size in sizes:
+        if size <= len(X_pool):
+            # The pool is already shuffled, so a prefix is a random subsample
+            X_fit, y_fit = X_pool.iloc[:size], y_pool[:size]
+            source = 'subsample' if size < len(X_pool) else 'full'
+        else:
+            X_fit, y_fit = upsample(X_pool, y_pool, size / len(X_pool), seed=seed)
+            source = 'upsampled'
+
+        for name, (trainer, threaded) in trainers.items():
+            for n_threads in (threads if threaded else (1,)):
+                result = {'trainer': name, 'rows': len(X_fit), 'source': source,
+                          'threads': n_threads}
+                result.update(measure_fit(trainer, n_threads, X_fit, y_fit, X_val, y_val))
+                results.append(result)
+                if log is not None:
+                    log(f"  {name:<16} {len(X_fit):>10,} rows {n_threads:>3} threads "
+                        f"{result['fit_s']:>8.2f}s R²={result['val_r2']:.4f}")
+    return results
+
+
+def break_even(results: Sequence[Dict], baseline: str = BASELINE) -> Dict[str, Optional[int]]:
+    """
+    Smallest size at which each alternative fits faster than the baseline.
+
+    Args:
+        results: Output of run_benchmark
+        baseline: Trainer to compare against
+
+    Returns:
+        Mapping of 'trainer@threads' to a row count, or None if it never wins
+    """
+    base_time = {r['rows']: r['fit_s'] for r in results if r['trainer'] == baseline}
+    points: Dict[str, Optional[int]] = {}
+    for result in sorted(results, key=lambda r: r['rows']):
+        if result['trainer'] == baseline or result['rows'] not in base_time:
+            continue
+        key = f"{result['trainer']}@{result['threads']}"
+        points.setdefault(key, None)
+        if points[key] is None and result['fit_s'] < base_time[result['rows']]:
+            points[key] = result['rows']
+    return points
+
+
+def format_table(results: Sequence[Dict]) -> str:
+    """
+    Results as a text table grouped by trainer.
+
+    Args:
+        results: Output of run_benchmark
+
+    Returns:
+        Table with fit time, rows per second, peak RSS and validation R²
+    """
+    lines = [f"{'Trainer':<16} {'Rows':>10} {'Source':<10} {'Threads':>7} {'Fit (s)':>9} "
+             f"{'Rows/s':>10} {'Peak RSS (MB)':>14} {'Val R²':>8}"]
+    for r in sorted(results, key=lambda r: (r['trainer'], r['threads'], r['rows'])):
+        lines.append(f"{r['trainer']:<16} {r['rows']:>10,} {r['source']:<10} {r['threads']:>7} "
+                     f"{r['fit_s']:>9.2f} {r['rows'] / max(r['fit_s'], 1e-9):>10,.0f} "
+                     f"{r['peak_rss_mb']:>14.1f} {r['val_r2']:>8.4f}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[Sequence[str]] = None):
+    """Run the training benchmark on a CSV."""
+    parser = argparse.ArgumentParser(
+        description="Benchmark training time and memory against data size")
+    parser.add_argument('train_csv', help="Training data with accident_risk")
+    parser.add_argument('--trainers', nargs='+', choices=sorted(TRAINERS), default=sorted(TRAINERS))
+    parser.add_argument('--threads', nargs='+', type=int, default=[1, os.cpu_count() or 1])
+    parser.add_argument('--min-rows', type=int, default=DEFAULT_MIN_ROWS)
+    parser.add_argument('--factor', type=float, default=2.0, help="Growth between subsample sizes")
+    parser.add_argument('--upsample', nargs='*', type=float, default=list(DEFAULT_UPSAMPLE))
+    parser.add_argument('--max-rows', type=int, default=None, help="Skip sizes above this")
+    parser.add_argument('--output', default="training_benchmark.json")
+    args = parser.parse_args(argv)
+
+    X, y = encode_training_frame(pd.read_csv(args.train_csv))
+    n_train = len(X) - min(VALIDATION_ROWS, len(X) // 5)
+    sizes = size_grid(n_train, args.min_rows, args.factor, args.upsample)
+    if args.max_rows is not None:
+        sizes = [size for size in sizes if size <= args.max_rows]
+
+    print(f"Benchmarking {', '.join(args.trainers)} on {len(sizes)} sizes "
+          f"({sizes[0]:,} to {sizes[-1]:,} rows), threads {args.threads}")
+    started = time.time()
+    results = run_benchmark(X, y, sizes, args.threads,
+                            trainers={name: TRAINERS[name] for name in args.trainers})
+
+    points = break_even(results)
+    print("\n" + format_table(results))
+    if points:
+        print("\nBreak-even vs production GBR (smallest size where it fits faster):")
+        for key, rows in points.items():
+            print(f"  {key:<24} {f'{rows:,} rows' if rows is not None else 'never'}")
+
+    report = {
+        'created_at': started,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'source_rows': len(X),
+        'validation_rows': len(X) - n_train,
+        'results': results,
+        'break_even': points,
+    }
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✓ Saved: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
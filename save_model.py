@@ -5,12 +5,21 @@ This script trains the final model and saves it for use in the game.
 """
 
 import pandas as pd
-import numpy as np
-from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 from sklearn.ensemble import GradientBoostingRegressor
 import joblib
 import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'road_risk_game'))
+from utils.compact_model import (COMPACT_BUNDLE_FILENAME, CompactionRejectedError, compact_bundle,
+                                 format_report)
+from utils.drift import REFERENCE_FILENAME, build_reference, save_reference
+from utils.model_bundle import BUNDLE_FILENAME, save_bundle, vocabularies_from_encoders
+from utils.similar_roads import build_similar_roads_index
+
+# Where the API loads its models and training-data artifacts from
+API_MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'road_risk_game', 'models')
 
 print("="*60)
 print("TRAINING AND SAVING MODEL FOR GAME")
@@ -77,6 +86,34 @@ feature_names = list(X.columns)
 joblib.dump(feature_names, 'game_models/feature_names.joblib')
 print("✓ Saved feature names")
 
+# Single-file bundle: model, vocabularies, feature order and schema hash
+bundle_path = os.path.join('game_models', BUNDLE_FILENAME)
+schema_hash = save_bundle(bundle_path, final_model, vocabularies_from_encoders(label_encoders),
+                          feature_names, metadata={'training_rows': len(X)})
+print(f"✓ Saved bundle to: {bundle_path} (schema {schema_hash[:12]})")
+
+# Prediction-only bundle (merged leaves, float32 arrays), kept only if it
+# stays within the allowed deviation of the full model on the training rows
+compact_path = os.path.join('game_models', COMPACT_BUNDLE_FILENAME)
+try:
+    compaction = compact_bundle(bundle_path, compact_path, X)
+    print(f"✓ Saved compacted bundle to: {compact_path}")
+    print(format_report(compaction))
+except CompactionRejectedError as e:
+    compact_path = None
+    print(f"⚠️ Compaction rejected: {e}")
+
+# Training-time feature histograms the API compares live traffic against;
+# they depend only on train.csv, so they go straight to the API's models dir
+reference_path = os.path.join(API_MODELS_DIR, REFERENCE_FILENAME)
+save_reference(reference_path, build_reference(train_df, vocabularies_from_encoders(label_encoders)))
+print(f"✓ Saved drift reference to: {reference_path}")
+
+# Historical rows the API shows next to a prediction (/similar_roads)
+similar_path = os.path.join(API_MODELS_DIR, 'similar_roads')
+similar_manifest = build_similar_roads_index(train_df, similar_path)
+print(f"✓ Indexed {similar_manifest['partitions']} road partitions in: {similar_path}")
+
 # Test the saved model
 print("\n[6] Testing saved model...")
 loaded_model = joblib.load('game_models/accident_risk_model.joblib')
@@ -90,4 +127,9 @@ print("\nSaved files:")
 print("  - game_models/accident_risk_model.joblib")
 print("  - game_models/label_encoders.joblib")
 print("  - game_models/feature_names.joblib")
+print(f"  - game_models/{BUNDLE_FILENAME}")
+print(f"  - {os.path.relpath(reference_path)}")
+print(f"  - {os.path.relpath(similar_path)}/")
+if compact_path:
+    print(f"  - game_models/{COMPACT_BUNDLE_FILENAME}")
 print("="*60)